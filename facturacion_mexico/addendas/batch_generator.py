@@ -0,0 +1,287 @@
+"""
+Generación de addendas por lote, agrupada por (cliente, tipo de addenda).
+
+El flujo por factura (un job por Sales Invoice) recargaba en cada job la configuración del cliente,
+el Addenda Type y los `Item Customer Detail`, y hacía commit del estado intermedio. Las cadenas
+comerciales envían cientos de facturas diarias con el mismo tipo de addenda, así que aquí:
+
+	- las facturas se agrupan por (customer, fm_addenda_type); por grupo se cargan una sola vez el
+	  Addenda Type, el template compilado (`template_registry`), el XSD compilado
+	  (`xsd_schema_cache`), los defaults del cliente y los mapeos de producto (una consulta)
+	- los contextos se arman en el hilo principal (todo acceso a frappe/BD ocurre ahí); el render
+	  Jinja2 y la validación XML/XSD, que son CPU puro, corren en un pool de hilos
+	- los estados se escriben al final con un solo `bulk_update`; cada factura conserva su propio
+	  estado (Completada/Error) y sus errores
+
+Uso:
+
+	from facturacion_mexico.addendas import batch_generator
+
+	results = batch_generator.run(["ACC-SINV-2025-00001", "ACC-SINV-2025-00002"])
+"""
+
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from facturacion_mexico.addendas.generic_addenda_generator import (
+	AddendaGenerator,
+	get_customer_addenda_defaults,
+)
+from facturacion_mexico.addendas.validators.xsd_validator import XSDValidator
+
+DEFAULT_WORKERS = 4
+
+
+@dataclass
+class _RenderTask:
+	"""Factura lista para renderizar: contexto armado y validador del grupo."""
+
+	sales_invoice: str
+	template: object
+	context: dict
+	validator: XSDValidator | None = None
+	result: dict = field(default_factory=dict)
+
+
+def get_workers() -> int:
+	"""Hilos del pool de render (site_config `fm_addenda_batch_workers`)."""
+	return max(1, cint(frappe.conf.get("fm_addenda_batch_workers") or DEFAULT_WORKERS))
+
+
+def run(sales_invoices: list[str], max_workers: int | None = None) -> dict[str, dict]:
+	"""
+	Generar las addendas de `sales_invoices` y guardar el estado de cada factura.
+
+	Returns:
+		{sales_invoice: {"success", "status", "errors", "validation"}}
+	"""
+	results: dict[str, dict] = {}
+	groups: dict[tuple[str, str], list] = {}
+
+	for name in dict.fromkeys(sales_invoices or []):
+		try:
+			doc = frappe.get_doc("Sales Invoice", name)
+		except frappe.DoesNotExistError:
+			results[name] = _error(_("Factura no encontrada"))
+			continue
+		if not cint(doc.get("fm_addenda_required")) or not doc.get("fm_addenda_type"):
+			results[name] = _error(_("La factura no requiere addenda o no tiene tipo configurado"))
+			continue
+		groups.setdefault((doc.customer, doc.fm_addenda_type), []).append(doc)
+
+	tasks = []
+	for (customer, addenda_type), docs in groups.items():
+		tasks.extend(_prepare_group(customer, addenda_type, docs, results))
+
+	workers = min(max_workers or get_workers(), len(tasks))
+	if workers > 1:
+		with ThreadPoolExecutor(max_workers=workers) as pool:
+			list(pool.map(_render, tasks))
+	else:
+		for task in tasks:
+			_render(task)
+
+	for task in tasks:
+		results[task.sales_invoice] = task.result
+		if task.result["validation"].get("errors"):
+			frappe.logger().warning(
+				f"Addenda de {task.sales_invoice} generada con advertencias XSD: "
+				f"{'; '.join(task.result['validation']['errors'])}"
+			)
+
+	_save_statuses(results)
+	return results
+
+
+def _prepare_group(customer: str, addenda_type: str, docs: list, results: dict) -> list[_RenderTask]:
+	"""Cargar una vez lo compartido por el grupo y armar el contexto de cada factura."""
+	try:
+		generator = AddendaGenerator(addenda_type)
+		addenda_values = get_customer_addenda_defaults(customer, addenda_type)
+		validation = generator._validate_values(addenda_values)
+		if not validation["valid"]:
+			raise frappe.ValidationError("; ".join(validation["errors"]))
+		generator.prefetch_product_mappings(
+			customer, [item.item_code for doc in docs for item in doc.get("items") or []]
+		)
+	except Exception as e:
+		for doc in docs:
+			results[doc.name] = _error(str(e))
+		return []
+
+	type_doc = generator.addenda_type_doc
+	tasks = []
+	for doc in docs:
+		try:
+			tasks.append(
+				_RenderTask(
+					sales_invoice=doc.name,
+					template=generator.template,
+					context=generator._prepare_template_context(doc.as_dict(), addenda_values),
+					# Un validador por tarea: guarda los errores de su última validación
+					validator=XSDValidator.for_addenda_type(type_doc) if type_doc.xsd_schema else None,
+				)
+			)
+		except Exception as e:
+			results[doc.name] = _error(str(e))
+	return tasks
+
+
+def _render(task: _RenderTask) -> None:
+	"""Render + validación de una factura. Corre en el pool: sin llamadas a frappe."""
+	try:
+		xml_content = task.template.render(**task.context)
+		ET.fromstring(xml_content)
+	except ET.ParseError as e:
+		task.result = _error(f"XML mal formado: {e!s}")
+		return
+	except Exception as e:
+		task.result = _error(f"Error en template: {e!s}")
+		return
+
+	validation = {"valid": True, "errors": [], "warnings": []}
+	if task.validator:
+		is_valid, errors, warnings = task.validator.validate_with_details(xml_content)
+		validation = {"valid": is_valid, "errors": errors, "warnings": warnings}
+
+	task.result = {
+		"success": True,
+		"status": "Completada",
+		"errors": [],
+		"validation": validation,
+		"xml": xml_content,
+	}
+
+
+def _save_statuses(results: dict[str, dict]) -> None:
+	"""Escribir el estado de todas las facturas en un solo `bulk_update`."""
+	now = frappe.utils.now()
+	updates = {}
+	for name, result in results.items():
+		if result["success"]:
+			updates[name] = {
+				"fm_addenda_status": "Completada",
+				"fm_addenda_xml": result.pop("xml"),
+				"fm_addenda_generated_date": now,
+				"fm_addenda_errors": "",
+			}
+		else:
+			updates[name] = {
+				"fm_addenda_status": "Error",
+				"fm_addenda_xml": "",
+				"fm_addenda_generated_date": None,
+				"fm_addenda_errors": "\n".join(result["errors"]),
+			}
+	if updates:
+		frappe.db.bulk_update("Sales Invoice", updates)
+		frappe.db.commit()  # nosemgrep: frappe-manual-commit - estados del lote visibles al terminar el job
+
+
+def _error(message: str) -> dict:
+	return {"success": False, "status": "Error", "errors": [message], "validation": {}}
+
+
+@frappe.whitelist()
+def generate_addendas(sales_invoices, enqueue: int = 1) -> dict:
+	"""
+	API: generar addendas de varias facturas en un job.
+
+	Args:
+		sales_invoices: lista de Sales Invoice (o JSON)
+		enqueue: 1 para cola `long`, 0 para generar en la misma petición
+	"""
+	frappe.has_permission("Sales Invoice", "write", throw=True)
+	if isinstance(sales_invoices, str):
+		sales_invoices = json.loads(sales_invoices)
+	sales_invoices = list(dict.fromkeys(sales_invoices or []))
+	if not sales_invoices:
+		return {"success": False, "message": _("No se indicaron facturas")}
+
+	sales_invoices, skipped = _addenda_candidates(sales_invoices)
+	if not cint(enqueue):
+		results = run(sales_invoices) if sales_invoices else {}
+		return {"success": True, "queued": False, "results": {**skipped, **results}}
+
+	if sales_invoices:
+		frappe.db.bulk_update(
+			"Sales Invoice",
+			{name: {"fm_addenda_status": "Generando"} for name in sales_invoices},
+		)
+		frappe.enqueue(
+			run_job,
+			queue="long",
+			timeout=3600,
+			sales_invoices=sales_invoices,
+			user=frappe.session.user,
+			# El job no debe ver las facturas antes de que "Generando" confirme (ni tras un rollback)
+			enqueue_after_commit=True,
+		)
+	return {"success": True, "queued": bool(sales_invoices), "count": len(sales_invoices), "skipped": skipped}
+
+
+def _addenda_candidates(sales_invoices: list[str]) -> tuple[list[str], dict[str, dict]]:
+	"""
+	Separar las facturas que el usuario puede ver y requieren addenda del resto.
+
+	`frappe.get_list` aplica los permisos del usuario (User Permissions, solo propias) por factura;
+	las que no devuelve no se tocan. Las que no requieren addenda tampoco se marcan "Generando":
+	el job no les escribiría un estado final.
+	"""
+	rows = frappe.get_list(
+		"Sales Invoice",
+		filters={"name": ["in", sales_invoices]},
+		fields=["name", "fm_addenda_required", "fm_addenda_type"],
+		limit_page_length=0,
+	)
+	visible = {row.name: row for row in rows}
+
+	candidates, skipped = [], {}
+	for name in sales_invoices:
+		row = visible.get(name)
+		if not row:
+			skipped[name] = _error(_("Factura no encontrada o sin permiso"))
+		elif not cint(row.fm_addenda_required) or not row.fm_addenda_type:
+			skipped[name] = _error(_("La factura no requiere addenda o no tiene tipo configurado"))
+		else:
+			candidates.append(name)
+	return candidates, skipped
+
+
+def run_job(sales_invoices: list[str], user: str) -> None:
+	"""Job de cola para `generate_addendas`."""
+	frappe.set_user(user)
+	try:
+		run(sales_invoices)
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Addenda Batch Generation")
+		_fail_pending(sales_invoices, str(e))
+		raise
+
+
+def _fail_pending(sales_invoices: list[str], message: str) -> None:
+	"""Marcar como Error las facturas que el job dejó en "Generando" sin estado final."""
+	frappe.db.rollback()
+	pending = frappe.get_all(
+		"Sales Invoice",
+		filters={"name": ["in", sales_invoices], "fm_addenda_status": "Generando"},
+		pluck="name",
+	)
+	if not pending:
+		return
+	frappe.db.bulk_update(
+		"Sales Invoice",
+		{
+			name: {
+				"fm_addenda_status": "Error",
+				"fm_addenda_errors": _("Error en la generación por lote: {0}").format(message),
+			}
+			for name in pending
+		},
+	)
+	frappe.db.commit()  # nosemgrep: frappe-manual-commit - el job termina con error
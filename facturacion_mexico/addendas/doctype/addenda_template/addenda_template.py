@@ -136,7 +136,7 @@ class AddendaTemplate(Document):
 		"""Validar template contra XSD del tipo de addenda."""
 		try:
 			# Obtener tipo de addenda
-			addenda_type_doc = frappe.get_doc("Addenda Type", self.addenda_type)
+			addenda_type_doc = frappe.get_cached_doc("Addenda Type", self.addenda_type)
 
 			if not addenda_type_doc.xsd_schema:
 				return {"valid": True, "message": _("No hay esquema XSD para validar"), "errors": []}
@@ -147,7 +147,7 @@ class AddendaTemplate(Document):
 			# Validar contra XSD
 			from facturacion_mexico.addendas.validators.xsd_validator import XSDValidator
 
-			validator = XSDValidator(addenda_type_doc.xsd_schema)
+			validator = XSDValidator.for_addenda_type(addenda_type_doc)
 			is_valid, errors, warnings = validator.validate_with_details(test_xml)
 
 			return {
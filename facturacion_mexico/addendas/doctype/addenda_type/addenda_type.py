@@ -143,7 +143,7 @@ class AddendaType(Document):
 		try:
 			from facturacion_mexico.addendas.validators.xsd_validator import XSDValidator
 
-			validator = XSDValidator(self.xsd_schema)
+			validator = XSDValidator.for_addenda_type(self)
 			is_valid = validator.validate(xml_content)
 
 			if not is_valid:
@@ -12,8 +12,9 @@ from typing import Any
 
 import frappe
 from frappe import _
-from jinja2 import Environment, Template, TemplateError, meta
+from jinja2 import TemplateError
 
+from facturacion_mexico.addendas import template_registry
 from facturacion_mexico.addendas.validators.xsd_validator import validate_addenda_xml
 from facturacion_mexico.cfdi_recibidos.services.uom_policy import try_normalize_uom_to_sat_code
 
@@ -45,7 +46,11 @@ class AddendaGenerator:
 		self.addenda_type = addenda_type
 		self.addenda_type_doc = None
 		self.template = None
+		self.compiled_template = None
 		self.validator = None
+		# Datos compartidos entre facturas del mismo generador (ver batch_generator)
+		self._company_contexts: dict[str, dict] = {}
+		self._mapping_rows: dict[str, dict[str, dict | None]] = {}
 		self._load_addenda_type()
 
 	def _load_addenda_type(self):
@@ -56,9 +61,14 @@ class AddendaGenerator:
 			if not self.addenda_type_doc.is_active:
 				frappe.throw(_("El tipo de addenda '{0}' no está activo").format(self.addenda_type))
 
-			# Cargar template Jinja2 con autoescape habilitado para prevenir XSS
+			# Template Jinja2 compilado una vez por versión del Addenda Type (autoescape contra XSS)
 			if self.addenda_type_doc.xml_template:
-				self.template = Template(self.addenda_type_doc.xml_template, autoescape=True)
+				self.compiled_template = template_registry.get(
+					self.addenda_type,
+					self.addenda_type_doc.xml_template,
+					self.addenda_type_doc.modified,
+				)
+				self.template = self.compiled_template.template
 			else:
 				frappe.throw(
 					_("El tipo de addenda '{0}' no tiene template XML configurado").format(self.addenda_type)
@@ -201,40 +211,7 @@ class AddendaGenerator:
 		# 4. Empresa emisora — dirección principal via Dynamic Link
 		company_name = invoice_data.get("company")
 		if company_name:
-			try:
-				company_doc = frappe.get_cached_doc("Company", company_name)
-				context["company"] = {
-					"name": getattr(company_doc, "company_name", "N/A"),
-					"tax_id": getattr(company_doc, "tax_id", "N/A"),
-					"country": getattr(company_doc, "country", "N/A"),
-					"default_currency": getattr(company_doc, "default_currency", "MXN"),
-				}
-				company_addr = frappe.db.sql(
-					"SELECT a.pincode, a.address_line1, a.city, a.state"
-					" FROM tabAddress a"
-					" INNER JOIN `tabDynamic Link` dl ON dl.parent = a.name"
-					" WHERE dl.link_doctype = 'Company' AND dl.link_name = %s"
-					" ORDER BY a.is_primary_address DESC, a.modified DESC"
-					" LIMIT 1",
-					company_name,
-					as_dict=True,
-				)
-				addr = company_addr[0] if company_addr else {}
-				context["emisor_cp"] = addr.get("pincode") or ""
-				context["emisor_calle"] = addr.get("address_line1") or ""
-				context["emisor_ciudad"] = addr.get("city") or ""
-				context["emisor_estado"] = addr.get("state") or ""
-			except Exception:
-				context["company"] = {
-					"name": "N/A",
-					"tax_id": "N/A",
-					"country": "N/A",
-					"default_currency": "MXN",
-				}
-				context["emisor_cp"] = ""
-				context["emisor_calle"] = ""
-				context["emisor_ciudad"] = ""
-				context["emisor_estado"] = ""
+			context.update(self._company_context(company_name))
 
 		# 5. Customer — fuente de buyer_gln y dias_credito
 		customer_name = invoice_data.get("customer")
@@ -288,6 +265,72 @@ class AddendaGenerator:
 
 		return context
 
+	def _company_context(self, company_name: str) -> dict:
+		"""Empresa emisora y su dirección principal (una lectura por empresa y generador)."""
+		if company_name in self._company_contexts:
+			return self._company_contexts[company_name]
+
+		try:
+			company_doc = frappe.get_cached_doc("Company", company_name)
+			company_addr = frappe.db.sql(
+				"SELECT a.pincode, a.address_line1, a.city, a.state"
+				" FROM tabAddress a"
+				" INNER JOIN `tabDynamic Link` dl ON dl.parent = a.name"
+				" WHERE dl.link_doctype = 'Company' AND dl.link_name = %s"
+				" ORDER BY a.is_primary_address DESC, a.modified DESC"
+				" LIMIT 1",
+				company_name,
+				as_dict=True,
+			)
+			addr = company_addr[0] if company_addr else {}
+			context = {
+				"company": {
+					"name": getattr(company_doc, "company_name", "N/A"),
+					"tax_id": getattr(company_doc, "tax_id", "N/A"),
+					"country": getattr(company_doc, "country", "N/A"),
+					"default_currency": getattr(company_doc, "default_currency", "MXN"),
+				},
+				"emisor_cp": addr.get("pincode") or "",
+				"emisor_calle": addr.get("address_line1") or "",
+				"emisor_ciudad": addr.get("city") or "",
+				"emisor_estado": addr.get("state") or "",
+			}
+		except Exception:
+			context = {
+				"company": {
+					"name": "N/A",
+					"tax_id": "N/A",
+					"country": "N/A",
+					"default_currency": "MXN",
+				},
+				"emisor_cp": "",
+				"emisor_calle": "",
+				"emisor_ciudad": "",
+				"emisor_estado": "",
+			}
+		self._company_contexts[company_name] = context
+		return context
+
+	def prefetch_product_mappings(self, customer: str | None, item_codes) -> None:
+		"""Cargar en una consulta los Item Customer Detail de `item_codes` para `customer`."""
+		if not customer:
+			return
+		known = self._mapping_rows.setdefault(customer, {})
+		missing = tuple(dict.fromkeys(code for code in item_codes if code and code not in known))
+		if not missing:
+			return
+		rows = frappe.db.sql(
+			"""SELECT parent AS item_code, ref_code AS customer_item_code,
+			          fm_customer_uom, fm_customer_description
+			   FROM `tabItem Customer Detail`
+			   WHERE customer_name = %s AND parent IN %s AND ref_code IS NOT NULL""",
+			(customer, missing),
+			as_dict=True,
+		)
+		known.update(dict.fromkeys(missing))
+		for r in rows:
+			known[r["item_code"]] = r
+
 	def _load_product_mappings(self, customer: str | None, items: list) -> dict:
 		"""Cargar códigos de cliente desde Item Customer Detail (pestaña Sales del Item).
 
@@ -306,16 +349,11 @@ class AddendaGenerator:
 			return {}
 
 		try:
-			rows = frappe.db.sql(
-				"""SELECT parent AS item_code, ref_code AS customer_item_code,
-				          fm_customer_uom, fm_customer_description
-				   FROM `tabItem Customer Detail`
-				   WHERE customer_name = %s AND parent IN %s AND ref_code IS NOT NULL""",
-				(customer, tuple(item_codes)),
-				as_dict=True,
-			)
+			self.prefetch_product_mappings(customer, item_codes)
 		except Exception:
 			return {}
+		known = self._mapping_rows[customer]
+		rows = [known[code] for code in dict.fromkeys(item_codes) if known.get(code)]
 
 		items_by_code = {i.get("item_code"): i for i in items if i.get("item_code")}
 		result = {}
@@ -376,18 +414,9 @@ class AddendaGenerator:
 
 	def get_template_variables(self) -> list[str]:
 		"""Obtener variables utilizadas en el template"""
-		if not self.template:
-			return []
-
-		try:
-			# Usar Jinja2 meta para extraer variables del template con autoescape
-			env = Environment(autoescape=True)
-			ast = env.parse(self.addenda_type_doc.xml_template)
-			variables = meta.find_undeclared_variables(ast)
-			return sorted(list(variables))
-		except Exception as e:
-			frappe.log_error(f"Error extrayendo variables del template: {e!s}", "Template Variables")
+		if not self.compiled_template:
 			return []
+		return list(self.compiled_template.variables)
 
 
 class AddendaValidator:
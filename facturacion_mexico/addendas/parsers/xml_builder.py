@@ -6,12 +6,34 @@ Constructor dinámico de XML para addendas usando templates
 import re
 import xml.etree.ElementTree as ET
 from datetime import datetime
+from functools import lru_cache
 
 import frappe
 from frappe import _
 
 from facturacion_mexico.utils.secure_xml import secure_parse_xml
 
+# Variables {{ expr }}: `_VARIABLE_PATTERN` para sustituir, `_USED_VARIABLE_PATTERN` (greedy) para listar
+_VARIABLE_PATTERN = re.compile(r"\{\{\s*([^}]+?)\s*\}\}")
+_USED_VARIABLE_PATTERN = re.compile(r"\{\{\s*([^}]+)\s*\}\}")
+
+
+@lru_cache(maxsize=128)
+def _template_parts(template: str) -> tuple[tuple[str, str | None], ...]:
+	"""Template partido una sola vez en (texto literal, expresión siguiente o None)."""
+	parts = []
+	position = 0
+	for match in _VARIABLE_PATTERN.finditer(template):
+		parts.append((template[position : match.start()], match.group(1).strip()))
+		position = match.end()
+	parts.append((template[position:], None))
+	return tuple(parts)
+
+
+@lru_cache(maxsize=128)
+def _variables_used(template: str) -> tuple[str, ...]:
+	return tuple(_USED_VARIABLE_PATTERN.findall(template))
+
 
 class AddendaXMLBuilder:
 	"""Constructor de XML para addendas usando templates dinámicos."""
@@ -86,20 +108,15 @@ class AddendaXMLBuilder:
 	def replace_variables(self):
 		"""Reemplazar variables {{ }} con valores."""
 		try:
-			xml_content = self.template
-
-			# Encontrar todas las variables en el template con espacios exactos
-			variable_pattern = r"\{\{\s*([^}]+?)\s*\}\}"
-
-			def replace_variable(match):
-				var_expression = match.group(1).strip()
-				var_value = self._resolve_variable(var_expression)
-				return self._escape_xml_value(str(var_value))
-
-			# Reemplazar todas las variables usando regex substitution
-			xml_content = re.sub(variable_pattern, replace_variable, xml_content)
-
-			self.xml_content = xml_content
+			# El template se parte una sola vez por contenido (ver `_template_parts`)
+			chunks = []
+			for literal, var_expression in _template_parts(self.template):
+				chunks.append(literal)
+				if var_expression is not None:
+					var_value = self._resolve_variable(var_expression)
+					chunks.append(self._escape_xml_value(str(var_value)))
+
+			self.xml_content = "".join(chunks)
 			return self
 
 		except Exception as e:
@@ -445,8 +462,7 @@ class AddendaXMLBuilder:
 
 	def get_variables_used(self):
 		"""Obtener lista de variables usadas en el template."""
-		variable_pattern = r"\{\{\s*([^}]+)\s*\}\}"
-		return re.findall(variable_pattern, self.template)
+		return list(_variables_used(self.template))
 
 	def validate_template(self):
 		"""Validar que el template tenga estructura correcta."""
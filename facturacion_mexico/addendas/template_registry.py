@@ -0,0 +1,118 @@
+"""
+Registro de templates Jinja2 de Addenda Type compilados una sola vez.
+
+`AddendaGenerator` se instancia por factura y cada instancia construía `Template(xml_template)`,
+es decir, parseaba y compilaba el template completo antes de renderizar. Aquí:
+
+	- un `Environment` por proceso (autoescape, mismo comportamiento que `Template(..., autoescape=True)`)
+	  con un loader propio: el nombre del template es `<sitio>/<addenda_type>@<modified>`, así que
+	  guardar el Addenda Type cambia el nombre y la compilación vieja deja de usarse
+	- bytecode cache en Redis (`MemcachedBytecodeCache` sobre `frappe.cache()`): los work-horse de RQ
+	  y los demás workers reutilizan el código compilado en vez de volver a compilar el template
+	- variables del template (`meta.find_undeclared_variables`) calculadas una vez por versión
+
+Uso:
+
+	from facturacion_mexico.addendas import template_registry
+
+	compiled = template_registry.get(addenda_type, doc.xml_template, doc.modified)
+	xml = compiled.template.render(**context)
+	compiled.variables
+"""
+
+import threading
+from dataclasses import dataclass
+
+import frappe
+from jinja2 import BaseLoader, Environment, MemcachedBytecodeCache, Template, TemplateNotFound, meta
+
+BYTECODE_PREFIX = "fm_addenda_jinja:"
+BYTECODE_TTL_SECONDS = 7 * 86400
+
+
+@dataclass(frozen=True)
+class CompiledAddendaTemplate:
+	"""Template compilado de un Addenda Type en una versión (`modified`) concreta."""
+
+	name: str
+	source: str
+	template: Template
+	variables: tuple[str, ...]
+
+
+class _AddendaTypeLoader(BaseLoader):
+	"""Fuentes registradas por `get`; un template sigue vigente mientras su fuente no cambie."""
+
+	def __init__(self):
+		self.sources: dict[str, str] = {}
+
+	def get_source(self, environment, template):
+		source = self.sources.get(template)
+		if source is None:
+			raise TemplateNotFound(template)
+		return source, None, lambda: self.sources.get(template) == source
+
+
+class _RedisBytecodeClient:
+	"""Cliente mínimo (get/set) para `MemcachedBytecodeCache`; sin Redis no hay bytecode cache."""
+
+	def get(self, key):
+		try:
+			cache = frappe.cache()
+			return cache.get(cache.make_key(key))
+		except Exception:
+			return None
+
+	def set(self, key, value, timeout=None):
+		try:
+			cache = frappe.cache()
+			cache.set(cache.make_key(key), value, ex=timeout)
+		except Exception:
+			pass
+
+
+_loader = _AddendaTypeLoader()
+_environment = Environment(
+	loader=_loader,
+	autoescape=True,
+	bytecode_cache=MemcachedBytecodeCache(
+		_RedisBytecodeClient(), prefix=BYTECODE_PREFIX, timeout=BYTECODE_TTL_SECONDS
+	),
+)
+_compiled: dict[tuple[str | None, str], CompiledAddendaTemplate] = {}
+_lock = threading.Lock()
+
+
+def get(addenda_type: str, xml_template: str, modified=None) -> CompiledAddendaTemplate:
+	"""
+	Template compilado del Addenda Type.
+
+	Raises:
+		jinja2.TemplateSyntaxError: si el template no compila (igual que `Template(...)`)
+	"""
+	site = getattr(frappe.local, "site", None)
+	key = (site, addenda_type)
+	name = f"{site}/{addenda_type}@{modified}"
+	compiled = _compiled.get(key)
+	if compiled is not None and compiled.name == name and compiled.source == xml_template:
+		return compiled
+
+	with _lock:
+		_loader.sources[name] = xml_template
+		if compiled is not None and compiled.name != name:
+			_loader.sources.pop(compiled.name, None)
+		compiled = CompiledAddendaTemplate(
+			name=name,
+			source=xml_template,
+			template=_environment.get_template(name),
+			variables=tuple(sorted(meta.find_undeclared_variables(_environment.parse(xml_template)))),
+		)
+		_compiled[key] = compiled
+	return compiled
+
+
+def clear_cache() -> None:
+	with _lock:
+		_compiled.clear()
+		_loader.sources.clear()
+		_environment.cache.clear()
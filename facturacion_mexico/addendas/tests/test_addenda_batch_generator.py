@@ -0,0 +1,185 @@
+"""
+Tests para la generación de addendas por lote (addendas/batch_generator).
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.addendas import batch_generator, template_registry
+
+_MOD = "facturacion_mexico.addendas.batch_generator"
+
+_TEMPLATE = (
+	'<Addenda folio="{{ invoice.name }}">'
+	"{% for code, m in product_mapping.items() %}<Linea codigo='{{ m.customer_item_code }}'/>{% endfor %}"
+	"</Addenda>"
+)
+
+
+class _Invoice(frappe._dict):
+	def as_dict(self):
+		return dict(self)
+
+
+def _invoice(name, customer, addenda_type="Walmart", items=("ITEM-1",), required=1):
+	return _Invoice(
+		name=name,
+		customer=customer,
+		company="Empresa",
+		fm_addenda_required=required,
+		fm_addenda_type=addenda_type,
+		items=[frappe._dict(item_code=code, item_name=code, uom="Pieza") for code in items],
+	)
+
+
+class TestAddendaBatchGenerator(FrappeTestCase):
+	"""Carga por grupo (cliente, tipo), estado por factura y escritura en bloque."""
+
+	def setUp(self):
+		template_registry.clear_cache()
+		self.addCleanup(template_registry.clear_cache)
+		self.invoices = {
+			"SINV-1": _invoice("SINV-1", "Walmart MX", items=("ITEM-1", "ITEM-2")),
+			"SINV-2": _invoice("SINV-2", "Walmart MX", items=("ITEM-2",)),
+			"SINV-3": _invoice("SINV-3", "Soriana"),
+			"SINV-4": _invoice("SINV-4", "Walmart MX", required=0),
+		}
+		self.type_doc = MagicMock(
+			is_active=1, xml_template=_TEMPLATE, modified="2025-07-01", field_definitions=[], xsd_schema=None
+		)
+		self.type_doc.name = "Walmart"
+
+		def get_cached_doc(doctype, name):
+			if doctype == "Addenda Type":
+				return self.type_doc
+			return SimpleNamespace(name=name, fm_addenda_defaults=None)
+
+		def sql(query, values=None, as_dict=False):
+			if "Item Customer Detail" not in query:
+				return []
+			customer, item_codes = values
+			return [
+				frappe._dict(item_code=code, customer_item_code=f"{customer[:3]}-{code}")
+				for code in item_codes
+			]
+
+		self.sql = MagicMock(side_effect=sql)
+		self.bulk_update = MagicMock()
+		for target, value in (
+			("frappe.get_doc", MagicMock(side_effect=lambda doctype, name: self.invoices[name])),
+			("frappe.get_cached_doc", MagicMock(side_effect=get_cached_doc)),
+			("frappe.db.sql", self.sql),
+			("frappe.db.bulk_update", self.bulk_update),
+			("frappe.db.commit", MagicMock()),
+		):
+			patch(target, value, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def _mapping_queries(self):
+		return [c for c in self.sql.call_args_list if "Item Customer Detail" in c.args[0]]
+
+	def test_una_carga_por_grupo_y_estado_por_factura(self):
+		with patch(f"{_MOD}.AddendaGenerator", wraps=batch_generator.AddendaGenerator) as generator:
+			results = batch_generator.run(["SINV-1", "SINV-2", "SINV-3", "SINV-4"], max_workers=3)
+
+		self.assertEqual(generator.call_count, 2)
+		self.assertEqual(len(self._mapping_queries()), 2)
+
+		self.bulk_update.assert_called_once()
+		doctype, updates = self.bulk_update.call_args.args
+		self.assertEqual(doctype, "Sales Invoice")
+		self.assertEqual(
+			{name: u["fm_addenda_status"] for name, u in updates.items()},
+			{"SINV-1": "Completada", "SINV-2": "Completada", "SINV-3": "Completada", "SINV-4": "Error"},
+		)
+		self.assertEqual(
+			updates["SINV-1"]["fm_addenda_xml"],
+			"<Addenda folio=\"SINV-1\"><Linea codigo='Wal-ITEM-1'/><Linea codigo='Wal-ITEM-2'/></Addenda>",
+		)
+		self.assertIn("Sor-ITEM-1", updates["SINV-3"]["fm_addenda_xml"])
+		self.assertTrue(updates["SINV-4"]["fm_addenda_errors"])
+		self.assertFalse(results["SINV-4"]["success"])
+
+	def test_grupo_con_error_no_afecta_al_resto(self):
+		self.invoices["SINV-1"].fm_addenda_type = "Inactiva"
+		inactive = MagicMock(is_active=0)
+		get_cached_doc = frappe.get_cached_doc.side_effect
+		frappe.get_cached_doc.side_effect = lambda doctype, name: (
+			inactive if name == "Inactiva" else get_cached_doc(doctype, name)
+		)
+		with patch(f"{_MOD}.frappe.utils.now", return_value="2025-07-01 10:00:00"):
+			results = batch_generator.run(["SINV-1", "SINV-2"], max_workers=1)
+
+		updates = self.bulk_update.call_args.args[1]
+		self.assertEqual(updates["SINV-1"]["fm_addenda_status"], "Error")
+		self.assertEqual(updates["SINV-1"]["fm_addenda_xml"], "")
+		self.assertEqual(updates["SINV-2"]["fm_addenda_status"], "Completada")
+		self.assertEqual(updates["SINV-2"]["fm_addenda_generated_date"], "2025-07-01 10:00:00")
+		self.assertTrue(results["SINV-2"]["success"])
+		self.assertEqual(len(self._mapping_queries()), 1)
+
+	def _get_list(self, doctype, filters=None, fields=None, limit_page_length=None):
+		# SINV-3 no es visible para el usuario (User Permission sobre otro cliente)
+		names = [n for n in filters["name"][1] if n in self.invoices and n != "SINV-3"]
+		return [frappe._dict({f: self.invoices[n][f] for f in fields}) for n in names]
+
+	def test_api_encola_un_solo_job(self):
+		with (
+			patch(f"{_MOD}.frappe.enqueue") as enqueue,
+			patch(f"{_MOD}.frappe.has_permission"),
+			patch(f"{_MOD}.frappe.get_list", side_effect=self._get_list),
+		):
+			response = batch_generator.generate_addendas('["SINV-1", "SINV-2", "SINV-1"]')
+
+		enqueue.assert_called_once()
+		self.assertEqual(enqueue.call_args.kwargs["sales_invoices"], ["SINV-1", "SINV-2"])
+		self.assertTrue(enqueue.call_args.kwargs["enqueue_after_commit"])
+		self.assertEqual(response["count"], 2)
+		statuses = self.bulk_update.call_args.args[1]
+		self.assertEqual({u["fm_addenda_status"] for u in statuses.values()}, {"Generando"})
+
+	def test_api_solo_marca_facturas_permitidas_que_requieren_addenda(self):
+		with (
+			patch(f"{_MOD}.frappe.enqueue") as enqueue,
+			patch(f"{_MOD}.frappe.has_permission"),
+			patch(f"{_MOD}.frappe.get_list", side_effect=self._get_list),
+		):
+			response = batch_generator.generate_addendas(["SINV-1", "SINV-3", "SINV-4", "SINV-X"])
+
+		self.assertEqual(enqueue.call_args.kwargs["sales_invoices"], ["SINV-1"])
+		self.assertEqual(list(self.bulk_update.call_args.args[1]), ["SINV-1"])
+		self.assertEqual(set(response["skipped"]), {"SINV-3", "SINV-4", "SINV-X"})
+
+	def test_api_sin_candidatas_no_encola(self):
+		with (
+			patch(f"{_MOD}.frappe.enqueue") as enqueue,
+			patch(f"{_MOD}.frappe.has_permission"),
+			patch(f"{_MOD}.frappe.get_list", side_effect=self._get_list),
+		):
+			response = batch_generator.generate_addendas(["SINV-3", "SINV-4"])
+
+		enqueue.assert_not_called()
+		self.bulk_update.assert_not_called()
+		self.assertFalse(response["queued"])
+
+	def test_job_fallido_no_deja_facturas_generando(self):
+		with (
+			patch(f"{_MOD}.frappe.set_user", create=True),
+			patch(f"{_MOD}.run", side_effect=RuntimeError("Redis caído")),
+			patch(f"{_MOD}.frappe.log_error"),
+			patch(f"{_MOD}.frappe.get_traceback", return_value="", create=True),
+			patch(f"{_MOD}.frappe.db.rollback", create=True) as rollback,
+			patch(f"{_MOD}.frappe.get_all", return_value=["SINV-2"]) as get_all,
+		):
+			with self.assertRaises(RuntimeError):
+				batch_generator.run_job(["SINV-1", "SINV-2"], "cajero@example.com")
+
+		rollback.assert_called_once()
+		self.assertEqual(get_all.call_args.kwargs["filters"]["fm_addenda_status"], "Generando")
+		updates = self.bulk_update.call_args.args[1]
+		self.assertEqual(list(updates), ["SINV-2"])
+		self.assertEqual(updates["SINV-2"]["fm_addenda_status"], "Error")
+		self.assertIn("Redis caído", updates["SINV-2"]["fm_addenda_errors"])
@@ -0,0 +1,96 @@
+"""
+Tests para el registro de templates Jinja2 de addendas (addendas/template_registry).
+"""
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.addendas import template_registry
+from facturacion_mexico.addendas.parsers.xml_builder import AddendaXMLBuilder
+
+_MOD = "facturacion_mexico.addendas.template_registry"
+
+_TEMPLATE = (
+	'<Walmart folio="{{ folio }}">'
+	"{% for item in items %}<Linea codigo='{{ item.code }}'/>{% endfor %}"
+	"<Proveedor>{{ proveedor }}</Proveedor></Walmart>"
+)
+
+
+class _FakeRedis:
+	def __init__(self):
+		self.values = {}
+
+	def make_key(self, key):
+		return f"site|{key}"
+
+	def get(self, key):
+		return self.values.get(key)
+
+	def set(self, key, value, ex=None):
+		self.values[key] = value
+
+
+class TestTemplateRegistry(FrappeTestCase):
+	"""Compilación única por versión, bytecode cache y variables precalculadas."""
+
+	def setUp(self):
+		template_registry.clear_cache()
+		self.addCleanup(template_registry.clear_cache)
+		self.redis = _FakeRedis()
+		cache = patch(f"{_MOD}.frappe.cache", return_value=self.redis)
+		cache.start()
+		self.addCleanup(cache.stop)
+		self.compile = patch.object(
+			template_registry._environment, "compile", wraps=template_registry._environment.compile
+		).start()
+		self.addCleanup(patch.stopall)
+
+	def test_una_compilacion_por_version(self):
+		for _ in range(50):
+			compiled = template_registry.get("Walmart", _TEMPLATE, "2025-07-01 10:00:00")
+		self.assertEqual(self.compile.call_count, 1)
+		self.assertEqual(compiled.variables, ("folio", "items", "proveedor"))
+		self.assertEqual(
+			compiled.template.render(folio="F<1>", items=[{"code": "A"}], proveedor="P&G"),
+			"<Walmart folio=\"F&lt;1&gt;\"><Linea codigo='A'/><Proveedor>P&amp;G</Proveedor></Walmart>",
+		)
+
+		template_registry.get("Walmart", _TEMPLATE.replace("Proveedor", "Vendor"), "2025-07-02 09:00:00")
+		self.assertEqual(self.compile.call_count, 2)
+
+	def test_fuente_distinta_con_mismo_modified_recompila(self):
+		template_registry.get("Walmart", _TEMPLATE, "2025-07-01")
+		edited = template_registry.get("Walmart", "<Walmart>{{ otro }}</Walmart>", "2025-07-01")
+		self.assertEqual(edited.variables, ("otro",))
+		self.assertEqual(edited.template.render(otro="x"), "<Walmart>x</Walmart>")
+
+	def test_otro_proceso_usa_el_bytecode_de_redis(self):
+		template_registry.get("Walmart", _TEMPLATE, "2025-07-01")
+		self.assertEqual(len(self.redis.values), 1)
+
+		# Proceso nuevo: sin templates en memoria, mismo Redis
+		template_registry.clear_cache()
+		compiled = template_registry.get("Walmart", _TEMPLATE, "2025-07-01")
+		self.assertEqual(self.compile.call_count, 1)
+		self.assertIn("<Proveedor>X</Proveedor>", compiled.template.render(proveedor="X", items=[]))
+
+	def test_generador_por_factura_no_recompila(self):
+		from facturacion_mexico.addendas.generic_addenda_generator import AddendaGenerator
+
+		type_doc = MagicMock(is_active=1, xml_template=_TEMPLATE, modified="2025-07-01", field_definitions=[])
+		with patch("frappe.get_cached_doc", return_value=type_doc):
+			generators = [AddendaGenerator("Walmart") for _ in range(20)]
+
+		self.assertEqual(self.compile.call_count, 1)
+		self.assertIs(generators[0].template, generators[-1].template)
+		self.assertEqual(generators[-1].get_template_variables(), ["folio", "items", "proveedor"])
+
+
+class TestAddendaXMLBuilderVariables(FrappeTestCase):
+	def test_sustitucion_con_partes_precalculadas(self):
+		template = '<A x="{{ folio }}">{{ proveedor }} {{ vacio }}</A>'
+		builder = AddendaXMLBuilder(template, {"folio": "1&2", "proveedor": "P"}, add_system_vars=False)
+		self.assertEqual(builder.replace_variables().xml_content, '<A x="1&amp;2">P </A>')
+		self.assertEqual(builder.get_variables_used(), ["folio ", "proveedor ", "vacio "])
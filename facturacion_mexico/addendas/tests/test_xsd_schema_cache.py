@@ -0,0 +1,85 @@
+"""
+Tests para el cache de esquemas XSD compilados (addendas/validators/xsd_schema_cache).
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.addendas.validators import xsd_schema_cache
+from facturacion_mexico.addendas.validators.xsd_validator import XSDValidator, validate_addenda_xml
+
+_MOD = "facturacion_mexico.addendas.validators.xsd_schema_cache"
+
+_XSD = """<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+	<xs:element name="Pedido">
+		<xs:complexType>
+			<xs:attribute name="numero" type="xs:integer" use="required"/>
+		</xs:complexType>
+	</xs:element>
+</xs:schema>"""
+
+
+class TestXSDSchemaCache(FrappeTestCase):
+	"""Compilación única por esquema, errores cacheados y precarga."""
+
+	def setUp(self):
+		xsd_schema_cache.clear_cache()
+		self.addCleanup(xsd_schema_cache.clear_cache)
+
+	def test_compila_una_vez_por_esquema(self):
+		with patch(f"{_MOD}.compile_schema", wraps=xsd_schema_cache.compile_schema) as compile_schema:
+			validators = [XSDValidator(_XSD, "Walmart") for _ in range(10)]
+			results = [v.validate('<Pedido numero="123"/>') for v in validators]
+			XSDValidator(_XSD.replace("Pedido", "Orden"), "Walmart")
+
+		self.assertEqual(compile_schema.call_count, 2)
+		self.assertTrue(all(results))
+		self.assertIs(validators[0].schema, validators[-1].schema)
+
+		self.assertFalse(validators[0].validate('<Pedido numero="ABC"/>'))
+		self.assertTrue(validators[0].get_errors()[0].startswith("Línea 1:"))
+
+	def test_esquema_invalido_se_cachea_con_su_error(self):
+		with patch(f"{_MOD}.compile_schema", wraps=xsd_schema_cache.compile_schema) as compile_schema:
+			first = XSDValidator("<xs:schema", "Roto")
+			second = XSDValidator("<xs:schema", "Roto")
+
+		self.assertEqual(compile_schema.call_count, 1)
+		self.assertFalse(second.is_schema_valid())
+		self.assertEqual(first.get_errors(), second.get_errors())
+		self.assertEqual(len(second.get_errors()), 1)
+
+	def test_lru_acotado(self):
+		with patch(f"{_MOD}.CACHE_SIZE", 2):
+			for i in range(3):
+				xsd_schema_cache.get(_XSD.replace("Pedido", f"Pedido{i}"), "Tipo")
+		self.assertEqual(len(xsd_schema_cache._schemas), 2)
+
+	def test_warm_up_una_vez_por_sitio(self):
+		addenda_types = [frappe._dict(name="Walmart", xsd_schema=_XSD)]
+		with patch(f"{_MOD}.frappe.get_all", return_value=addenda_types) as get_all:
+			xsd_schema_cache.warm_up()
+			xsd_schema_cache.warm_up()
+
+		get_all.assert_called_once()
+		with patch(f"{_MOD}.compile_schema") as compile_schema:
+			XSDValidator(_XSD, "Walmart")
+		compile_schema.assert_not_called()
+
+	def test_validate_addenda_xml_usa_documento_cacheado(self):
+		addenda_type = SimpleNamespace(name="Walmart", xsd_schema=_XSD)
+		with patch(
+			"facturacion_mexico.addendas.validators.xsd_validator.frappe.get_cached_doc",
+			return_value=addenda_type,
+			create=True,
+		):
+			valid = validate_addenda_xml('<Pedido numero="1"/>', "Walmart")
+			invalid = validate_addenda_xml("<Pedido/>", "Walmart")
+
+		self.assertTrue(valid["is_valid"])
+		self.assertFalse(invalid["is_valid"])
+		self.assertEqual(len(xsd_schema_cache._schemas), 1)
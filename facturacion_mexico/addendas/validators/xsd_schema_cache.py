@@ -0,0 +1,112 @@
+"""
+Esquemas XSD de addendas compilados una sola vez por proceso.
+
+`XSDValidator` parseaba y compilaba un `etree.XMLSchema` en cada instancia, y se crea uno por
+validación (generador, manager multisucursal, API, Addenda Type/Template). Los XSD de retail
+(Walmart, Soriana, Liverpool) tardan decenas de milisegundos en compilar. Aquí se guardan en un LRU
+de proceso:
+
+	- clave (sitio, addenda_type, sha1 del XSD): editar el esquema cambia la clave sin invalidación
+	  explícita; el hash cuesta microsegundos frente a la compilación
+	- los errores de compilación también se cachean para no reintentar un XSD inválido
+	- cada entrada lleva un lock: `XMLSchema.error_log` es estado de la instancia y se lee justo
+	  después de `validate()`
+
+Precarga: `warm_up` compila los XSD de los Addenda Type activos la primera vez que el proceso
+atiende al sitio (hook `before_request`; las siguientes llamadas son un lookup en un set). Los
+work-horse de RQ terminan con su job, así que ahí el LRU se llena bajo demanda.
+
+Uso:
+
+	from facturacion_mexico.addendas.validators import xsd_schema_cache
+
+	compiled = xsd_schema_cache.get(addenda_type_doc.xsd_schema, addenda_type_doc.name)
+	with compiled.lock:
+		compiled.schema.validate(xml_doc)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import frappe
+from lxml import etree
+
+from facturacion_mexico.utils.secure_xml import secure_parse_xml
+
+CACHE_SIZE = 32
+
+
+@dataclass
+class CompiledSchema:
+	"""`etree.XMLSchema` compilado, o el error de compilación si el XSD no es válido."""
+
+	schema: etree.XMLSchema | None
+	error: str | None = None
+	lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+_schemas: OrderedDict[tuple, CompiledSchema] = OrderedDict()
+_lock = threading.Lock()
+_warmed_sites: set[str | None] = set()
+
+
+def get(xsd_content: str, addenda_type: str | None = None) -> CompiledSchema:
+	"""Esquema compilado para `xsd_content` (compila y guarda en el LRU si no estaba)."""
+	key = (getattr(frappe.local, "site", None), addenda_type, _digest(xsd_content))
+	with _lock:
+		compiled = _schemas.get(key)
+		if compiled is not None:
+			_schemas.move_to_end(key)
+			return compiled
+
+	compiled = compile_schema(xsd_content)
+	with _lock:
+		compiled = _schemas.setdefault(key, compiled)
+		_schemas.move_to_end(key)
+		while len(_schemas) > CACHE_SIZE:
+			_schemas.popitem(last=False)
+	return compiled
+
+
+def compile_schema(xsd_content: str) -> CompiledSchema:
+	"""Parsear y compilar el XSD sin cache."""
+	try:
+		return CompiledSchema(etree.XMLSchema(secure_parse_xml(xsd_content, parser_type="lxml")))
+	except etree.XMLSchemaParseError as e:
+		return CompiledSchema(None, f"Error en esquema XSD: {e!s}")
+	except etree.XMLSyntaxError as e:
+		return CompiledSchema(None, f"XML sintácticamente incorrecto en esquema: {e!s}")
+	except Exception as e:
+		return CompiledSchema(None, f"Error inesperado parseando esquema: {e!s}")
+
+
+def warm_up() -> None:
+	"""Compilar los XSD de los Addenda Type activos, una vez por proceso y sitio."""
+	site = getattr(frappe.local, "site", None)
+	if site in _warmed_sites:
+		return
+	_warmed_sites.add(site)
+	try:
+		addenda_types = frappe.get_all(
+			"Addenda Type",
+			filters={"is_active": 1, "xsd_schema": ["is", "set"]},
+			fields=["name", "xsd_schema"],
+			order_by="modified desc",
+			limit_page_length=CACHE_SIZE,
+		)
+		for addenda_type in addenda_types:
+			get(addenda_type.xsd_schema, addenda_type.name)
+	except Exception:
+		frappe.logger().warning("No se pudieron precargar los esquemas XSD de addendas", exc_info=True)
+
+
+def clear_cache() -> None:
+	with _lock:
+		_schemas.clear()
+		_warmed_sites.clear()
+
+
+def _digest(xsd_content: str) -> str:
+	return hashlib.sha1((xsd_content or "").encode("utf-8"), usedforsecurity=False).hexdigest()
@@ -7,41 +7,40 @@ import frappe
 from frappe import _
 from lxml import etree
 
+from facturacion_mexico.addendas.validators import xsd_schema_cache
 from facturacion_mexico.utils.secure_xml import secure_parse_xml
 
 
 class XSDValidator:
 	"""Validador de XML contra esquemas XSD."""
 
-	def __init__(self, xsd_schema: str):
+	def __init__(self, xsd_schema: str, addenda_type: str | None = None):
 		"""
 		Inicializar con esquema XSD.
 
 		Args:
 			xsd_schema (str): Contenido del esquema XSD
+			addenda_type (str): Tipo de addenda dueño del esquema (parte de la clave del cache)
 		"""
 		self.xsd_schema = xsd_schema
+		self.addenda_type = addenda_type
 		self.schema = None
 		self.errors = []
 		self.warnings = []
 		self._parse_schema()
 
-	def _parse_schema(self):
-		"""Parsear y compilar el esquema XSD."""
-		try:
-			# Parsear esquema XSD
-			schema_doc = secure_parse_xml(self.xsd_schema, parser_type="lxml")
-			self.schema = etree.XMLSchema(schema_doc)
+	@classmethod
+	def for_addenda_type(cls, addenda_type_doc) -> "XSDValidator":
+		"""Validador con el esquema del Addenda Type."""
+		return cls(addenda_type_doc.xsd_schema, addenda_type_doc.name)
 
-		except etree.XMLSchemaParseError as e:
-			self.errors.append(f"Error en esquema XSD: {e!s}")
-			self.schema = None
-		except etree.XMLSyntaxError as e:
-			self.errors.append(f"XML sintácticamente incorrecto en esquema: {e!s}")
-			self.schema = None
-		except Exception as e:
-			self.errors.append(f"Error inesperado parseando esquema: {e!s}")
-			self.schema = None
+	def _parse_schema(self):
+		"""Obtener el esquema compilado del cache de proceso (ver `xsd_schema_cache`)."""
+		compiled = xsd_schema_cache.get(self.xsd_schema, self.addenda_type)
+		self.schema = compiled.schema
+		self._schema_lock = compiled.lock
+		if compiled.error:
+			self.errors.append(compiled.error)
 
 	def validate(self, xml_content: str) -> bool:
 		"""
@@ -64,13 +63,14 @@ class XSDValidator:
 			# Parsear XML
 			xml_doc = secure_parse_xml(xml_content, parser_type="lxml")
 
-			# Validar contra esquema
-			is_valid = self.schema.validate(xml_doc)
+			# Validar contra esquema (compartido entre hilos: error_log se lee bajo el mismo lock)
+			with self._schema_lock:
+				is_valid = self.schema.validate(xml_doc)
+				error_log = [] if is_valid else list(self.schema.error_log)
 
-			if not is_valid:
-				# Recopilar errores de validación
-				for error in self.schema.error_log:
-					self.errors.append(f"Línea {error.line}: {error.message}")
+			# Recopilar errores de validación
+			for error in error_log:
+				self.errors.append(f"Línea {error.line}: {error.message}")
 
 			return is_valid
 
@@ -204,15 +204,12 @@ class XSDValidator:
 		Returns:
 			List[str]: Lista de sugerencias
 		"""
-		suggestions = []
-
-		if not self.validate(xml_content):
-			for error in self.errors:
-				suggestion = self._analyze_error_and_suggest(error)
-				if suggestion:
-					suggestions.append(suggestion)
+		if self.validate(xml_content):
+			return []
+		return self._suggestions(self.errors)
 
-		return suggestions
+	def _suggestions(self, errors: list[str]) -> list[str]:
+		return [s for s in map(self._analyze_error_and_suggest, errors) if s]
 
 	def _analyze_error_and_suggest(self, error: str) -> str | None:
 		"""Analizar error y sugerir corrección."""
@@ -272,7 +269,7 @@ class XSDValidator:
 			"warnings": warnings,
 			"error_count": len(errors),
 			"warning_count": len(warnings),
-			"suggestions": self.suggest_fixes(xml_content) if not is_valid else [],
+			"suggestions": self._suggestions(errors),
 		}
 
 		if include_schema_info:
@@ -329,7 +326,7 @@ def validate_addenda_xml(xml_content: str, addenda_type: str) -> dict:
 	"""
 	try:
 		# Obtener esquema XSD del tipo de addenda
-		addenda_doc = frappe.get_doc("Addenda Type", addenda_type)
+		addenda_doc = frappe.get_cached_doc("Addenda Type", addenda_type)
 
 		if not addenda_doc.xsd_schema:
 			return {
@@ -340,7 +337,7 @@ def validate_addenda_xml(xml_content: str, addenda_type: str) -> dict:
 			}
 
 		# Validar
-		validator = XSDValidator(addenda_doc.xsd_schema)
+		validator = XSDValidator.for_addenda_type(addenda_doc)
 		report = validator.create_validation_report(xml_content)
 
 		return {
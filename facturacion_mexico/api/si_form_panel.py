@@ -0,0 +1,121 @@
+"""
+Panel fiscal del formulario de Sales Invoice en una sola llamada.
+
+Al abrir una Sales Invoice, cada script del formulario pedía su parte por separado
+(`get_fiscal_states`, `get_fiscal_ui_state` dos veces, `get_ffm_summary`, `get_ereceipt_summary`,
+`estado_nota_descuento`, `can_cancel_sales_invoice`) y cada endpoint releía la misma SI y FFM.
+Aquí la SI y la FFM vinculada se cargan una vez y se comparten entre todas las secciones.
+
+El panel incluye un `etag` (hash del contenido): el cliente lo reenvía al refrescar y, si nada
+cambió, recibe `{"not_modified": True}` y conserva lo que ya dibujó.
+
+Cada sección se arma por separado: si una falla se registra en el Error Log, va en None y su
+mensaje en `errors[<sección>]`, y el resto del panel se entrega igual. Un panel parcial no lleva
+etag, así que el siguiente refresh lo pide completo.
+"""
+
+import hashlib
+import json
+
+import frappe
+
+from facturacion_mexico.api.ereceipt_summary import get_ereceipt_summary
+from facturacion_mexico.api.ffm_summary import FFM_DOCTYPE, build_ffm_summary
+from facturacion_mexico.config.fiscal_states_config import FiscalStates
+from facturacion_mexico.facturacion_fiscal.api.nota_credito import estado_descuento
+from facturacion_mexico.fiscal_state.sales_invoice_state import get_sales_invoice_fiscal_state
+from facturacion_mexico.validaciones.sales_invoice_cancel_guard import get_cancel_status
+
+
+@frappe.whitelist()
+def get_sales_invoice_panel(name: str, etag: str | None = None) -> dict:
+	"""
+	Estado fiscal completo del formulario de una Sales Invoice.
+
+	Args:
+		name: Nombre de la Sales Invoice
+		etag: etag de la respuesta anterior, si el cliente ya tiene el panel
+
+	Returns:
+		dict con fiscal_states, fiscal_state, ffm_summary, ereceipt_summary, nota_descuento,
+		cancel, errors y etag; o {"not_modified": True, "etag": etag} si el contenido no cambió.
+		Las secciones que no aplican al documento van en None; las que fallaron, también en None
+		y con su mensaje en `errors`.
+	"""
+	si = frappe.get_doc("Sales Invoice", name)
+	si.check_permission("read")
+
+	errors = {}
+	ffm = _section(errors, "ffm", lambda: _get_linked_ffm(si))
+	ffm_error = errors.pop("ffm", None)
+	submitted = si.docstatus == 1
+
+	def ffm_section(key, build):
+		# Sin la FFM estas secciones no se pueden decidir: fallidas, no "sin FFM"
+		if ffm_error:
+			errors[key] = ffm_error
+			return None
+		return _section(errors, key, build)
+
+	panel = {
+		"fiscal_states": FiscalStates.to_dict(),
+		"fiscal_state": (
+			ffm_section("fiscal_state", lambda: get_sales_invoice_fiscal_state(si.name, si=si, ffm=ffm))
+			if submitted
+			else None
+		),
+		"cancel": (
+			ffm_section("cancel", lambda: get_cancel_status(si.name, si=si, si_ffm=ffm))
+			if submitted
+			else None
+		),
+		"ffm_summary": (
+			ffm_section("ffm_summary", lambda: _ffm_summary(ffm)) if si.get("fm_factura_fiscal_mx") else None
+		),
+		"ereceipt_summary": (
+			_section(errors, "ereceipt_summary", lambda: get_ereceipt_summary(si.get("fm_ereceipt_mx")))
+			if si.get("fm_ereceipt_mx")
+			else None
+		),
+		"nota_descuento": (
+			_section(errors, "nota_descuento", lambda: estado_descuento(si))
+			if si.get("is_return") and si.docstatus == 0 and si.get("return_against")
+			else None
+		),
+		"errors": errors,
+	}
+	panel["etag"] = None if errors else _etag(panel)
+
+	if etag and etag == panel["etag"]:
+		return {"not_modified": True, "etag": etag}
+	return panel
+
+
+def _get_linked_ffm(si):
+	"""FFM del campo link de la SI, cargada una sola vez para todo el panel."""
+	ffm_name = si.get("fm_factura_fiscal_mx")
+	if not ffm_name:
+		return None
+	try:
+		return frappe.get_doc(FFM_DOCTYPE, ffm_name)
+	except frappe.DoesNotExistError:
+		return None
+
+
+def _ffm_summary(ffm) -> dict:
+	return build_ffm_summary(ffm.as_dict()) if ffm else {}
+
+
+def _section(errors: dict, key: str, build):
+	"""Resultado de `build()`; si falla, lo registra, anota el error en `errors[key]` y devuelve None."""
+	try:
+		return build()
+	except Exception as e:
+		frappe.log_error(f"Error en panel fiscal de Sales Invoice ({key}): {e!s}", "SI Fiscal Panel Error")
+		errors[key] = str(e) or e.__class__.__name__
+		return None
+
+
+def _etag(panel: dict) -> str:
+	payload = json.dumps(panel, sort_keys=True, default=str)
+	return hashlib.sha1(payload.encode(), usedforsecurity=False).hexdigest()
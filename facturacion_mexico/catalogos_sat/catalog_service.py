@@ -0,0 +1,322 @@
+"""
+Catálogos SAT en memoria de proceso.
+
+Cada catálogo (`SAT Producto Servicio` con ~52k claves, `Uso CFDI SAT`, `Forma Pago SAT`, ...) se
+carga una sola vez por proceso y por sitio en arreglos compactos ordenados por clave:
+
+	- índice hash clave → posición (`exists`, `get`, `get_field`)
+	- las claves ordenadas sirven como índice de prefijos (`search_prefix`, autocompletado)
+	- índice de tokens sobre la descripción y `palabras_similares` (`search`)
+
+La vigencia (`fecha_inicio/fin_vigencia` o `vigencia_desde/hasta`) se conserva por fila para
+`is_vigente` y `codes(vigentes_al=...)`.
+
+Invalidación entre workers: cada catálogo tiene una versión en Redis
+(`fm_sat_catalog_version:<doctype>`). Guardar/eliminar un registro del catálogo (doc_events) o
+importar en bloque llama a `invalidate`, que publica una versión nueva al confirmar la transacción
+(`utils.cache_version`); los demás procesos la comparan como máximo cada `VERSION_CHECK_SECONDS` y
+recargan si cambió. Si Redis no responde, recargan cada `VERSION_CHECK_SECONDS`.
+
+Uso:
+
+	from facturacion_mexico.catalogos_sat import catalog_service
+
+	catalog_service.exists("Forma Pago SAT", "03")
+	catalog_service.get_field("SAT Producto Servicio", "84111506", "incluye_objeto_impuesto")
+	catalog_service.search("SAT Producto Servicio", "servicios contables")
+"""
+
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from datetime import date
+
+import frappe
+from frappe import _
+from frappe.utils import getdate
+
+from facturacion_mexico.utils import cache_version
+
+VERSION_CHECK_SECONDS = 30
+VERSION_KEY_PREFIX = "fm_sat_catalog_version"
+MIN_TOKEN_LENGTH = 2
+
+
+@dataclass(frozen=True)
+class CatalogSpec:
+	"""Forma de un DocType de catálogo SAT."""
+
+	code_field: str
+	description_field: str
+	extra_fields: tuple[str, ...] = ()
+	vigencia_desde: str | None = None
+	vigencia_hasta: str | None = None
+	# Campos de texto adicionales que solo alimentan el índice de tokens (no se guardan)
+	token_fields: tuple[str, ...] = ()
+
+
+CATALOGOS: dict[str, CatalogSpec] = {
+	"SAT Producto Servicio": CatalogSpec(
+		"codigo",
+		"descripcion",
+		("incluye_objeto_impuesto", "complemento"),
+		"fecha_inicio_vigencia",
+		"fecha_fin_vigencia",
+		("palabras_similares",),
+	),
+	"Uso CFDI SAT": CatalogSpec(
+		"code", "description", ("aplica_fisica", "aplica_moral"), "vigencia_desde", "vigencia_hasta"
+	),
+	"Regimen Fiscal SAT": CatalogSpec(
+		"code", "description", ("aplica_fisica", "aplica_moral"), "vigencia_desde", "vigencia_hasta"
+	),
+	"Forma Pago SAT": CatalogSpec("code", "description", (), "vigencia_desde", "vigencia_hasta"),
+	"Metodo Pago SAT": CatalogSpec("code", "description", (), "vigencia_desde", "vigencia_hasta"),
+	"Moneda SAT": CatalogSpec("code", "description", ("decimales",), "vigencia_desde", "vigencia_hasta"),
+	"Impuesto SAT": CatalogSpec("code", "description", (), "vigencia_desde", "vigencia_hasta"),
+}
+
+
+class SATCatalog:
+	"""Snapshot inmutable de un catálogo, ordenado por clave."""
+
+	__slots__ = (
+		"codes",
+		"descriptions",
+		"desde",
+		"doctype",
+		"extras",
+		"hasta",
+		"index",
+		"spec",
+		"token_list",
+		"tokens",
+		"version",
+	)
+
+	def __init__(self, doctype: str, spec: CatalogSpec, rows: list, version: str | None):
+		self.doctype = doctype
+		self.spec = spec
+		self.version = version
+		rows = sorted((r for r in rows if r[0]), key=lambda r: str(r[0]))
+		n_extra = len(spec.extra_fields)
+		self.codes: list[str] = [str(r[0]) for r in rows]
+		self.descriptions: list[str] = [r[1] or "" for r in rows]
+		self.extras: list[tuple] = [tuple(r[2 : 2 + n_extra]) for r in rows]
+		self.desde: list[date | None] = [r[2 + n_extra] for r in rows]
+		self.hasta: list[date | None] = [r[3 + n_extra] for r in rows]
+		self.index: dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+
+		postings: dict[str, set[int]] = {}
+		for i, row in enumerate(rows):
+			for text in (row[1], *row[4 + n_extra :]):
+				for token in tokenize(text):
+					postings.setdefault(token, set()).add(i)
+		# token → posiciones ordenadas; los tokens ordenados permiten buscar por prefijo
+		self.tokens: dict[str, array] = {t: array("I", sorted(p)) for t, p in postings.items()}
+		self.token_list: list[str] = sorted(self.tokens)
+
+	def __len__(self) -> int:
+		return len(self.codes)
+
+	def row(self, position: int) -> dict:
+		data = {
+			self.spec.code_field: self.codes[position],
+			self.spec.description_field: self.descriptions[position],
+		}
+		data.update(zip(self.spec.extra_fields, self.extras[position], strict=True))
+		if self.spec.vigencia_desde:
+			data[self.spec.vigencia_desde] = self.desde[position]
+		if self.spec.vigencia_hasta:
+			data[self.spec.vigencia_hasta] = self.hasta[position]
+		return frappe._dict(data)
+
+	def is_vigente(self, position: int, on_date: date) -> bool:
+		desde, hasta = self.desde[position], self.hasta[position]
+		return (not desde or getdate(desde) <= on_date) and (not hasta or getdate(hasta) >= on_date)
+
+
+_catalogs: dict[tuple[str | None, str], tuple[float, SATCatalog]] = {}
+_lock = threading.Lock()
+
+
+def tokenize(text: str | None) -> list[str]:
+	"""Normalizar a minúsculas sin acentos y dividir en palabras (>= 2 caracteres)."""
+	if not text:
+		return []
+	normalized = unicodedata.normalize("NFKD", str(text).lower())
+	normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+	return [t for t in re.split(r"[^0-9a-zñ]+", normalized) if len(t) >= MIN_TOKEN_LENGTH]
+
+
+def get_catalog(doctype: str) -> SATCatalog:
+	"""Catálogo cargado para el sitio actual (se recarga si la versión en Redis cambió)."""
+	spec = CATALOGOS.get(doctype)
+	if not spec:
+		frappe.throw(_("{0} no es un catálogo SAT soportado").format(doctype))
+
+	key = (getattr(frappe.local, "site", None), doctype)
+	now = time.monotonic()
+	cached = _catalogs.get(key)
+	if cached and cached[0] > now:
+		return cached[1]
+
+	version = _current_version(doctype)
+	# Sin Redis (None) no hay forma de saber si cambió: se recarga al expirar
+	if cached and version is not None and cached[1].version == version:
+		_catalogs[key] = (now + VERSION_CHECK_SECONDS, cached[1])
+		return cached[1]
+
+	with _lock:
+		cached = _catalogs.get(key)
+		if cached and cached[1].version == version and cached[0] > now:
+			return cached[1]
+		catalog = SATCatalog(doctype, spec, _load_rows(doctype, spec), version)
+		_catalogs[key] = (now + VERSION_CHECK_SECONDS, catalog)
+		return catalog
+
+
+def exists(doctype: str, code: str | None) -> bool:
+	"""Equivalente en memoria de `frappe.db.exists(doctype, code)`."""
+	return bool(code) and str(code) in get_catalog(doctype).index
+
+
+def get(doctype: str, code: str | None) -> dict | None:
+	"""Fila del catálogo como `frappe._dict` o None."""
+	catalog = get_catalog(doctype)
+	position = catalog.index.get(str(code)) if code else None
+	return catalog.row(position) if position is not None else None
+
+
+def get_field(doctype: str, code: str | None, fieldname: str):
+	"""Equivalente en memoria de `frappe.db.get_value(doctype, code, fieldname)`."""
+	row = get(doctype, code)
+	return row.get(fieldname) if row else None
+
+
+def is_vigente(doctype: str, code: str | None, on_date=None) -> bool:
+	"""True si la clave existe y está vigente a la fecha (hoy por defecto)."""
+	catalog = get_catalog(doctype)
+	position = catalog.index.get(str(code)) if code else None
+	if position is None:
+		return False
+	return catalog.is_vigente(position, getdate(on_date))
+
+
+def codes(doctype: str, vigentes_al=None) -> list[str]:
+	"""Claves del catálogo ordenadas; con `vigentes_al` solo las vigentes a esa fecha."""
+	catalog = get_catalog(doctype)
+	if vigentes_al is None:
+		return list(catalog.codes)
+	on_date = getdate(vigentes_al)
+	return [code for i, code in enumerate(catalog.codes) if catalog.is_vigente(i, on_date)]
+
+
+def search_prefix(doctype: str, prefix: str, limit: int = 20) -> list[dict]:
+	"""Claves que empiezan con `prefix` (búsqueda binaria sobre las claves ordenadas)."""
+	catalog = get_catalog(doctype)
+	prefix = (prefix or "").strip()
+	start = bisect.bisect_left(catalog.codes, prefix)
+	result = []
+	for position in range(start, len(catalog.codes)):
+		if len(result) >= limit or not catalog.codes[position].startswith(prefix):
+			break
+		result.append(catalog.row(position))
+	return result
+
+
+def search(doctype: str, text: str, limit: int = 20) -> list[dict]:
+	"""Búsqueda por clave o texto libre sobre descripción y sinónimos.
+
+	Todas las palabras deben coincidir; la última se trata como prefijo (autocompletado). Si
+	ninguna fila contiene todas las palabras, se ordena por número de palabras coincidentes.
+	"""
+	text = (text or "").strip()
+	if not text:
+		return []
+	catalog = get_catalog(doctype)
+	if text in catalog.index or text.isdigit():
+		return search_prefix(doctype, text, limit)
+
+	words = tokenize(text)
+	if not words:
+		return []
+
+	per_word: list[set[int]] = []
+	for i, word in enumerate(words):
+		if i == len(words) - 1:
+			per_word.append(_prefix_postings(catalog, word))
+		else:
+			per_word.append(set(catalog.tokens.get(word, ())))
+
+	matches = set.intersection(*per_word) if per_word else set()
+	if matches:
+		ranked = sorted(matches, key=lambda p: (len(catalog.descriptions[p]), catalog.codes[p]))
+	else:
+		scores: dict[int, int] = {}
+		for positions in per_word:
+			for p in positions:
+				scores[p] = scores.get(p, 0) + 1
+		ranked = sorted(scores, key=lambda p: (-scores[p], len(catalog.descriptions[p]), catalog.codes[p]))
+	return [catalog.row(p) for p in ranked[:limit]]
+
+
+def invalidate(doctype: str | None = None) -> None:
+	"""Publicar, al confirmar la transacción, una versión nueva del catálogo (o de todos)."""
+	doctypes = [doctype] if doctype else list(CATALOGOS)
+	site = getattr(frappe.local, "site", None)
+	for dt in doctypes:
+		cache_version.publish_on_commit(f"{VERSION_KEY_PREFIX}:{dt}", _catalogs.pop, ((site, dt), None))
+
+
+def on_catalog_change(doc, method=None) -> None:
+	"""doc_event on_update/on_trash de los DocTypes de catálogo."""
+	if doc.doctype in CATALOGOS:
+		invalidate(doc.doctype)
+
+
+@frappe.whitelist()
+def search_catalog(doctype: str, txt: str = "", limit: int = 20) -> list[dict]:
+	"""Autocompletado de claves SAT desde memoria."""
+	if doctype not in CATALOGOS:
+		frappe.throw(_("{0} no es un catálogo SAT soportado").format(doctype))
+	if not frappe.has_permission(doctype, "read"):
+		frappe.throw(_("Sin permisos para leer {0}").format(doctype), frappe.PermissionError)
+	return search(doctype, txt, min(int(limit or 20), 100))
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _current_version(doctype: str) -> str | None:
+	# None solo si Redis no responde; sin versión publicada todavía vale "0"
+	return cache_version.get(f"{VERSION_KEY_PREFIX}:{doctype}", default="0")
+
+
+def _load_rows(doctype: str, spec: CatalogSpec) -> list:
+	fields = [
+		spec.code_field,
+		spec.description_field,
+		*spec.extra_fields,
+		spec.vigencia_desde or "NULL",
+		spec.vigencia_hasta or "NULL",
+		*spec.token_fields,
+	]
+	columns = ", ".join(f"`{f}`" if f != "NULL" else "NULL" for f in fields)
+	return frappe.db.sql(f"SELECT {columns} FROM `tab{doctype}`", as_list=True)
+
+
+def _prefix_postings(catalog: SATCatalog, word: str) -> set[int]:
+	positions: set[int] = set()
+	start = bisect.bisect_left(catalog.token_list, word)
+	for token in catalog.token_list[start:]:
+		if not token.startswith(word):
+			break
+		positions.update(catalog.tokens[token])
+	return positions
@@ -0,0 +1,387 @@
+"""
+Importador en bloque de catálogos SAT (CSV/XLSX oficiales) con upserts por diferencia.
+
+Los catálogos del Anexo 20 se publican como hojas de cálculo grandes (`c_ClaveProdServ` ~52k
+filas). El importador:
+
+1. Lee el archivo en streaming (CSV con `csv.reader`, XLSX con openpyxl en modo `read_only`), de
+   modo que la memoria queda acotada por `chunk_size` y no por el tamaño del archivo.
+2. Localiza la fila de encabezados (la hoja oficial trae filas de título antes) y mapea columnas
+   a campos del DocType por alias normalizados (`c_ClaveProdServ` → `codigo`, `Descripción` →
+   `descripcion`, `FechaFinVigencia` → `fecha_fin_vigencia`, ...).
+3. Por cada bloque de claves consulta solo esas filas en BD y clasifica en nuevas, modificadas y
+   sin cambio (comparación por clave y vigencia).
+4. Aplica altas con `frappe.db.bulk_insert` y cambios con `frappe.db.bulk_update` (INSERT/UPDATE
+   multi-fila), con commit por bloque.
+5. En modo `full`, las claves que ya no vienen en el archivo se marcan con fin de vigencia
+   (`fecha_corte`); nunca se eliminan porque hay CFDI que las referencian.
+
+Al terminar publica una versión nueva del catálogo en memoria (`catalog_service.invalidate`).
+
+Uso:
+    bench --site <site> execute facturacion_mexico.catalogos_sat.importer.import_file \
+        --kwargs "{'doctype': 'SAT Producto Servicio', 'path': '/tmp/catCFDI.xlsx', 'full': 1}"
+"""
+
+import csv
+import os
+import re
+import unicodedata
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate, now_datetime
+
+from facturacion_mexico.catalogos_sat import catalog_service
+
+IMPORT_ROLES = ("System Manager", "Facturacion Mexico System Manager")
+DEFAULT_CHUNK_SIZE = 2000
+HEADER_SCAN_ROWS = 20
+
+# Hoja del libro oficial (catCFDI.xlsx) por catálogo; si no existe se usa la primera
+SHEET_NAMES = {
+	"SAT Producto Servicio": "c_ClaveProdServ",
+	"Uso CFDI SAT": "c_UsoCFDI",
+	"Regimen Fiscal SAT": "c_RegimenFiscal",
+	"Forma Pago SAT": "c_FormaPago",
+	"Metodo Pago SAT": "c_MetodoPago",
+	"Moneda SAT": "c_Moneda",
+	"Impuesto SAT": "c_Impuesto",
+}
+
+# Ancho de las claves numéricas (Excel entrega 1010101 en lugar de "01010101")
+CODE_WIDTH = {
+	"SAT Producto Servicio": 8,
+	"Forma Pago SAT": 2,
+	"Impuesto SAT": 3,
+	"Regimen Fiscal SAT": 3,
+}
+
+# Alias de encabezado (normalizados: minúsculas, sin acentos ni separadores) → campo del DocType.
+# El encabezado de la clave (`c_...`) y los nombres de campo literales se resuelven aparte.
+_ALIAS_DESCRIPCION = ("descripcion", "description")
+_ALIAS_DESDE = ("fechainiciovigencia", "fechadeiniciodevigencia", "iniciovigencia")
+_ALIAS_HASTA = ("fechafinvigencia", "fechadefindevigencia", "finvigencia")
+HEADER_ALIASES = {
+	"SAT Producto Servicio": {
+		"complementoquedebeincluir": "complemento",
+		"palabrassimilares": "palabras_similares",
+		"objetoimp": "incluye_objeto_impuesto",
+		"incluyeobjetoimpuesto": "incluye_objeto_impuesto",
+	},
+	"Uso CFDI SAT": {"fisica": "aplica_fisica", "moral": "aplica_moral"},
+	"Regimen Fiscal SAT": {"fisica": "aplica_fisica", "moral": "aplica_moral"},
+	"Moneda SAT": {"decimales": "decimales"},
+}
+_CHECK_FIELDS = ("aplica_fisica", "aplica_moral")
+_INT_FIELDS = ("decimales",)
+
+
+def import_file(
+	doctype: str,
+	path: str,
+	full: int = 0,
+	dry_run: int = 0,
+	fecha_corte=None,
+	chunk_size: int = DEFAULT_CHUNK_SIZE,
+	default_objeto_impuesto: str | None = "02",
+) -> dict:
+	"""Sincronizar `doctype` con el archivo oficial en `path`.
+
+	Args:
+		full: el archivo es el catálogo completo; las claves ausentes reciben fin de vigencia.
+		dry_run: solo calcula el resumen, no escribe.
+		fecha_corte: fin de vigencia para claves ausentes (por defecto, ayer).
+		default_objeto_impuesto: ObjetoImp para claves nuevas de SAT Producto Servicio cuando el
+			archivo no trae esa columna (el c_ClaveProdServ oficial no la incluye).
+
+	Returns:
+		dict con read, inserted, updated, unchanged, expired, skipped y errors (primeros 20).
+	"""
+	spec = catalog_service.CATALOGOS.get(doctype)
+	if not spec:
+		frappe.throw(_("{0} no es un catálogo SAT soportado").format(doctype))
+	if not os.path.exists(path):
+		frappe.throw(_("No existe el archivo {0}").format(path))
+
+	dry_run = cint(dry_run)
+	chunk_size = max(cint(chunk_size) or DEFAULT_CHUNK_SIZE, 1)
+	summary = {
+		"read": 0,
+		"inserted": 0,
+		"updated": 0,
+		"unchanged": 0,
+		"expired": 0,
+		"skipped": 0,
+		"errors": [],
+	}
+	seen: set[str] = set()
+	defaults = {}
+	if doctype == "SAT Producto Servicio" and default_objeto_impuesto:
+		defaults["incluye_objeto_impuesto"] = default_objeto_impuesto
+
+	chunk: dict[str, dict] = {}
+	for record in iter_records(doctype, path):
+		summary["read"] += 1
+		code = record.get(spec.code_field)
+		if not code:
+			summary["skipped"] += 1
+			continue
+		if code in seen:
+			# Clave repetida en el archivo: la primera aparición gana.
+			summary["skipped"] += 1
+			continue
+		seen.add(code)
+		chunk[code] = record
+		if len(chunk) >= chunk_size:
+			_apply_chunk(doctype, spec, chunk, defaults, summary, dry_run)
+			chunk = {}
+	if chunk:
+		_apply_chunk(doctype, spec, chunk, defaults, summary, dry_run)
+
+	if cint(full) and spec.vigencia_hasta:
+		corte = getdate(fecha_corte) if fecha_corte else getdate() - timedelta(days=1)
+		summary["expired"] = _expire_missing(doctype, spec, seen, corte, dry_run)
+
+	if not dry_run:
+		catalog_service.invalidate(doctype)
+	summary["errors"] = summary["errors"][:20]
+	summary["dry_run"] = bool(dry_run)
+	frappe.logger("facturacion_mexico.catalogos_sat").info(f"Importación {doctype}: {summary}")
+	return summary
+
+
+@frappe.whitelist()
+def import_catalog(doctype: str, file_url: str, full: int = 0, dry_run: int = 0) -> dict:
+	"""Encolar la importación de un catálogo desde un archivo adjunto (File)."""
+	frappe.only_for(IMPORT_ROLES)
+	if doctype not in catalog_service.CATALOGOS:
+		frappe.throw(_("{0} no es un catálogo SAT soportado").format(doctype))
+	path = frappe.get_doc("File", {"file_url": file_url}).get_full_path()
+	job = frappe.enqueue(
+		"facturacion_mexico.catalogos_sat.importer.import_file",
+		queue="long",
+		timeout=3600,
+		doctype=doctype,
+		path=path,
+		full=cint(full),
+		dry_run=cint(dry_run),
+	)
+	return {"job_id": getattr(job, "id", None), "doctype": doctype}
+
+
+# ---------------------------------------------------------------------------
+# Lectura en streaming
+# ---------------------------------------------------------------------------
+
+
+def iter_records(doctype: str, path: str) -> Iterator[dict]:
+	"""Registros del archivo como {campo: valor convertido}, uno a la vez."""
+	spec = catalog_service.CATALOGOS[doctype]
+	if path.lower().endswith((".xlsx", ".xlsm")):
+		rows = _iter_xlsx(path, SHEET_NAMES.get(doctype))
+	else:
+		rows = _iter_csv(path)
+
+	columns = None
+	for scanned, row in enumerate(rows):
+		columns = map_headers(doctype, row)
+		if columns and spec.code_field in columns.values():
+			break
+		if scanned >= HEADER_SCAN_ROWS:
+			frappe.throw(_("No se encontró la fila de encabezados del catálogo {0}").format(doctype))
+	else:
+		return
+
+	for row in rows:
+		record = {}
+		for position, fieldname in columns.items():
+			value = row[position] if position < len(row) else None
+			record[fieldname] = _convert(doctype, spec, fieldname, value)
+		if any(v not in (None, "") for v in record.values()):
+			yield record
+
+
+def map_headers(doctype: str, header_row) -> dict[int, str]:
+	"""Posición de columna → campo del DocType para una fila candidata a encabezado."""
+	spec = catalog_service.CATALOGOS[doctype]
+	aliases = {alias: spec.description_field for alias in _ALIAS_DESCRIPCION}
+	if spec.vigencia_desde:
+		aliases.update({alias: spec.vigencia_desde for alias in _ALIAS_DESDE})
+	if spec.vigencia_hasta:
+		aliases.update({alias: spec.vigencia_hasta for alias in _ALIAS_HASTA})
+	aliases.update(HEADER_ALIASES.get(doctype, {}))
+	known_fields = {
+		spec.code_field,
+		spec.description_field,
+		*spec.extra_fields,
+		*spec.token_fields,
+		*(f for f in (spec.vigencia_desde, spec.vigencia_hasta) if f),
+	}
+
+	columns: dict[int, str] = {}
+	for position, raw in enumerate(header_row or ()):
+		text = str(raw or "").strip()
+		if not text:
+			continue
+		if text.lower() in known_fields:
+			fieldname = text.lower()
+		elif text.lower().startswith("c_") and spec.code_field not in columns.values():
+			fieldname = spec.code_field
+		else:
+			fieldname = aliases.get(_normalize_header(text))
+		if fieldname and fieldname in known_fields and fieldname not in columns.values():
+			columns[position] = fieldname
+	return columns
+
+
+def _normalize_header(text: str) -> str:
+	text = unicodedata.normalize("NFKD", text.lower())
+	return re.sub(r"[^0-9a-z]", "", "".join(c for c in text if not unicodedata.combining(c)))
+
+
+def _iter_csv(path: str) -> Iterator[list]:
+	with open(path, encoding="utf-8-sig", newline="") as f:
+		yield from csv.reader(f)
+
+
+def _iter_xlsx(path: str, sheet_name: str | None) -> Iterator[tuple]:
+	from openpyxl import load_workbook
+
+	workbook = load_workbook(path, read_only=True, data_only=True)
+	try:
+		sheet = workbook[sheet_name] if sheet_name in workbook.sheetnames else workbook.worksheets[0]
+		yield from sheet.iter_rows(values_only=True)
+	finally:
+		workbook.close()
+
+
+def _convert(doctype: str, spec, fieldname: str, value):
+	if isinstance(value, str):
+		value = value.strip()
+	if value in (None, ""):
+		return None
+
+	if fieldname == spec.code_field:
+		if isinstance(value, float) and value.is_integer():
+			value = int(value)
+		code = str(value).strip()
+		width = CODE_WIDTH.get(doctype)
+		if width and code.isdigit():
+			code = code.zfill(width)
+		return code
+	if fieldname in (spec.vigencia_desde, spec.vigencia_hasta):
+		return _to_date(value)
+	if fieldname in _CHECK_FIELDS:
+		return 1 if _normalize_header(str(value)) in ("si", "s", "x", "1", "true") else 0
+	if fieldname in _INT_FIELDS:
+		return cint(value)
+	if fieldname == "incluye_objeto_impuesto":
+		return str(cint(value)).zfill(2) if str(value).isdigit() else str(value)
+	return str(value)
+
+
+def _to_date(value) -> date | None:
+	if isinstance(value, datetime):
+		return value.date()
+	if isinstance(value, date):
+		return value
+	text = str(value).strip()
+	for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d"):
+		try:
+			return datetime.strptime(text, fmt).date()
+		except ValueError:
+			continue
+	return getdate(text)
+
+
+# ---------------------------------------------------------------------------
+# Diferencia y escritura en bloque
+# ---------------------------------------------------------------------------
+
+
+def _apply_chunk(doctype: str, spec, chunk: dict[str, dict], defaults: dict, summary: dict, dry_run: int):
+	fields = sorted({f for record in chunk.values() for f in record} - {spec.code_field})
+	existing = {
+		row[0]: dict(zip(fields, row[1:], strict=True))
+		for row in frappe.db.sql(
+			"SELECT `name`{cols} FROM `tab{doctype}` WHERE `name` IN %(names)s".format(
+				cols="".join(f", `{f}`" for f in fields), doctype=doctype
+			),
+			{"names": list(chunk)},
+			as_list=True,
+		)
+	}
+
+	inserts, updates = [], {}
+	for code, record in chunk.items():
+		current = existing.get(code)
+		if current is None:
+			inserts.append({**defaults, **record})
+			continue
+		changes = {f: record.get(f) for f in fields if _differs(current.get(f), record.get(f))}
+		if changes:
+			updates[code] = changes
+		else:
+			summary["unchanged"] += 1
+
+	if dry_run:
+		summary["inserted"] += len(inserts)
+		summary["updated"] += len(updates)
+		return
+
+	try:
+		if inserts:
+			_bulk_insert(doctype, spec, inserts)
+		if updates:
+			frappe.db.bulk_update(doctype, updates, chunk_size=500)
+		frappe.db.commit()
+	except Exception as e:
+		frappe.db.rollback()
+		summary["errors"].append(f"{next(iter(chunk))}…: {e!s}")
+		return
+	summary["inserted"] += len(inserts)
+	summary["updated"] += len(updates)
+
+
+def _bulk_insert(doctype: str, spec, records: list[dict]) -> None:
+	now = now_datetime()
+	user = frappe.session.user
+	fields = sorted({f for record in records for f in record})
+	columns = ["name", "creation", "modified", "owner", "modified_by", "docstatus", "idx", *fields]
+	values = [
+		[record[spec.code_field], now, now, user, user, 0, 0, *(record.get(f) for f in fields)]
+		for record in records
+	]
+	frappe.db.bulk_insert(doctype, columns, values, chunk_size=1000)
+
+
+def _expire_missing(doctype: str, spec, seen: set[str], corte: date, dry_run: int) -> int:
+	"""Poner fin de vigencia a las claves vigentes que no vinieron en un archivo completo."""
+	hasta = spec.vigencia_hasta
+	vigentes = frappe.db.sql(
+		f"SELECT `name` FROM `tab{doctype}` WHERE `{hasta}` IS NULL OR `{hasta}` > %(corte)s",
+		{"corte": corte},
+		pluck="name",
+	)
+	missing = [name for name in vigentes if name not in seen]
+	if dry_run or not missing:
+		return len(missing)
+
+	for start in range(0, len(missing), DEFAULT_CHUNK_SIZE):
+		frappe.db.sql(
+			f"UPDATE `tab{doctype}` SET `{hasta}` = %(corte)s, `modified` = %(now)s WHERE `name` IN %(names)s",
+			{"corte": corte, "now": now_datetime(), "names": missing[start : start + DEFAULT_CHUNK_SIZE]},
+		)
+		frappe.db.commit()
+	return len(missing)
+
+
+def _differs(current, new) -> bool:
+	if current in (None, "") and new in (None, ""):
+		return False
+	if isinstance(new, date) or isinstance(current, date):
+		return (getdate(current) if current else None) != (getdate(new) if new else None)
+	return str(current) != str(new)
@@ -32,6 +32,7 @@ from facturacion_mexico.cfdi_recibidos.services.supplier_resolver import (
 	resolve_supplier as _resolve_supplier,
 )
 from facturacion_mexico.sat.constants import TIPO_COMPROBANTE
+from facturacion_mexico.validaciones import lista_69b_index
 
 # Tipos CFDI aceptados para el flujo de compras recibidas
 _TIPOS_COMPRA = {"I"}
@@ -54,6 +55,7 @@ def ingest_xml(xml_bytes: bytes, company: str, file_name: str = "cfdi.xml") -> d
 	    candidato_generar_proveedor — True si es candidato para acción futura
 	    message             — descripción del resultado
 	    next_action         — acción sugerida al usuario
+	    supplier_lista_69b  — situación del emisor en la Lista 69-B local (None si no aparece)
 	"""
 	if not xml_bytes:
 		return _result("XML inválido", None, None, None, False, False, "XML vacío", None)
@@ -146,7 +148,12 @@ def ingest_xml(xml_bytes: bytes, company: str, file_name: str = "cfdi.xml") -> d
 	supplier_found = bool(doc.supplier)
 	candidato = stage == "Falta proveedor"
 
-	if supplier_created:
+	lista_69b = lista_69b_index.lookup(supplier_rfc)
+	if lista_69b and lista_69b.in_lista_69b:
+		message = _("El emisor {0} está en la Lista 69-B del SAT ({1})").format(
+			supplier_rfc, lista_69b.situacion
+		)
+	elif supplier_created:
 		message = _("Proveedor nuevo creado automáticamente — revísalo y complétalo")
 	elif gen_errors and not supplier_found:
 		message = gen_errors[0].get("message") or get_stage_message(stage)
@@ -169,6 +176,7 @@ def ingest_xml(xml_bytes: bytes, company: str, file_name: str = "cfdi.xml") -> d
 		supplier_created=supplier_created,
 		supplier=doc.supplier or "",
 		supplier_name=supplier_name,
+		supplier_lista_69b=lista_69b.situacion if lista_69b else None,
 	)
 
 
@@ -248,6 +256,7 @@ def _result(
 	supplier_created: bool = False,
 	supplier: str = "",
 	supplier_name: str = "",
+	supplier_lista_69b: str | None = None,
 ) -> dict:
 	return {
 		"status": status,
@@ -261,4 +270,5 @@ def _result(
 		"supplier_created": supplier_created,
 		"supplier": supplier,
 		"supplier_name": supplier_name,
+		"supplier_lista_69b": supplier_lista_69b,
 	}
@@ -7,6 +7,8 @@ from frappe import _
 from frappe.utils import flt, now_datetime
 from frappe.utils.file_manager import save_file
 
+from facturacion_mexico.catalogos_sat import catalog_service
+
 # ---------------------------------------------------------------------------
 # Bloque 3B — Creación manual de Complemento Pago MX desde Payment Entry
 # ---------------------------------------------------------------------------
@@ -39,8 +41,11 @@ def crear_complemento_pago_desde_pe(payment_entry_name: str) -> dict:
 	if pe.payment_type != "Receive":
 		frappe.throw(_("Solo se generan complementos para pagos de tipo Receive (cobro)."))
 
+	# --- Precarga en bloque de SIs, FFMs, impuestos y parcialidades referenciadas ---
+	datos = _precargar_documentos_pe(pe)
+
 	# --- Verificar que exista al menos una SI PPD timbrada ---
-	si_ppd = _obtener_si_ppd_validas(pe)
+	si_ppd = _obtener_si_ppd_validas(pe, datos)
 	if not si_ppd:
 		frappe.throw(
 			_(
@@ -73,10 +78,10 @@ def crear_complemento_pago_desde_pe(payment_entry_name: str) -> dict:
 		complemento.num_operacion = pe.reference_no
 
 	# --- Llenar documentos_relacionados ---
-	_llenar_documentos_relacionados(complemento, pe)
+	_llenar_documentos_relacionados(complemento, pe, datos)
 
 	# --- Llenar detalles_impuestos ---
-	_llenar_detalles_impuestos(complemento, pe)
+	_llenar_detalles_impuestos(complemento, pe, datos)
 
 	# ignore_mandatory: folio_fiscal se asigna tras el timbrado con el PAC.
 	# No puede llenarse antes — es el UUID del CFDI timbrado.
@@ -153,7 +158,7 @@ def _resolver_forma_pago_sat(mode_of_payment: str | None) -> str:
 
 	codigo = match.group(1)
 
-	if not frappe.db.exists("Forma Pago SAT", codigo):
+	if not catalog_service.exists("Forma Pago SAT", codigo):
 		frappe.throw(
 			_(
 				"El código '{0}' extraído del modo de pago '{1}' no existe en el catálogo SAT de Forma de Pago. Verifique la configuración del modo de pago."
@@ -165,20 +170,12 @@ def _resolver_forma_pago_sat(mode_of_payment: str | None) -> str:
 	return codigo
 
 
-def _obtener_si_ppd_validas(pe) -> list:
+def _obtener_si_ppd_validas(pe, datos: dict | None = None) -> list:
 	"""Retorna las SI PPD timbradas válidas referenciadas en el PE."""
+	datos = datos or _precargar_documentos_pe(pe)
 	validas = []
-	for ref in pe.get("references", []):
-		if ref.reference_doctype != "Sales Invoice":
-			continue
-		if flt(ref.allocated_amount) <= 0:
-			continue
-		si = frappe.db.get_value(
-			"Sales Invoice",
-			ref.reference_name,
-			["fm_es_ppd", "fm_fiscal_status", "fm_factura_fiscal_mx"],
-			as_dict=True,
-		)
+	for ref in _referencias_si(pe):
+		si = datos["si"].get(ref.reference_name)
 		if not si:
 			continue
 		if si.fm_es_ppd == 1 and si.fm_fiscal_status == "TIMBRADO" and si.fm_factura_fiscal_mx:
@@ -186,6 +183,90 @@ def _obtener_si_ppd_validas(pe) -> list:
 	return validas
 
 
+def _referencias_si(pe) -> list:
+	"""Referencias del PE a Sales Invoice con monto asignado."""
+	return [
+		ref
+		for ref in pe.get("references", [])
+		if ref.reference_doctype == "Sales Invoice" and flt(ref.allocated_amount) > 0
+	]
+
+
+def _precargar_documentos_pe(pe) -> dict:
+	"""
+	Carga en bloque todo lo que el complemento necesita de las SIs referenciadas.
+
+	Consultas fijas sin importar el número de referencias:
+	  - Sales Invoice (campos fiscales y montos)
+	  - Factura Fiscal Mexico (UUID, serie, folio)
+	  - Sales Taxes and Charges de todas las SIs
+	  - Payment Entries enviados por SI, ordenados (para num_parcialidad)
+	  - Mapeo de cuentas de impuesto → impuesto SAT (Configuracion Fiscal Mexico)
+
+	Returns:
+		dict con llaves si, ffm, taxes, parcialidades e impuesto_sat
+	"""
+	si_names = sorted({ref.reference_name for ref in _referencias_si(pe)})
+	datos = {"si": {}, "ffm": {}, "taxes": {}, "parcialidades": {}, "impuesto_sat": {}}
+	if not si_names:
+		return datos
+
+	for si in frappe.get_all(
+		"Sales Invoice",
+		filters={"name": ["in", si_names]},
+		fields=[
+			"name",
+			"fm_es_ppd",
+			"fm_fiscal_status",
+			"fm_factura_fiscal_mx",
+			"currency",
+			"conversion_rate",
+			"grand_total",
+			"outstanding_amount",
+		],
+	):
+		datos["si"][si.name] = si
+
+	ffm_names = sorted({si.fm_factura_fiscal_mx for si in datos["si"].values() if si.fm_factura_fiscal_mx})
+	if ffm_names:
+		for ffm in frappe.get_all(
+			"Factura Fiscal Mexico",
+			filters={"name": ["in", ffm_names]},
+			fields=["name", "fm_uuid", "serie", "folio", "fm_serie_folio"],
+		):
+			datos["ffm"][ffm.name] = ffm
+
+	for tax in frappe.db.get_all(
+		"Sales Taxes and Charges",
+		filters={"parenttype": "Sales Invoice", "parent": ["in", si_names]},
+		fields=["parent", "account_head", "rate", "tax_amount", "base_tax_amount"],
+		order_by="idx asc",
+	):
+		datos["taxes"].setdefault(tax.parent, []).append(tax)
+
+	# Orden de pagos por SI (misma regla que antes: posting_date, creation del PE enviado)
+	for row in frappe.db.sql(
+		"""
+		SELECT DISTINCT per.reference_name, per.parent, pe.posting_date, pe.creation
+		FROM `tabPayment Entry Reference` per
+		JOIN `tabPayment Entry` pe ON pe.name = per.parent
+		WHERE per.reference_name IN %(si_names)s
+		  AND per.reference_doctype = 'Sales Invoice'
+		  AND pe.docstatus = 1
+		ORDER BY per.reference_name, pe.posting_date ASC, pe.creation ASC
+		""",
+		{"si_names": si_names},
+		as_dict=True,
+	):
+		parcialidades = datos["parcialidades"].setdefault(row.reference_name, [])
+		if row.parent not in parcialidades:
+			parcialidades.append(row.parent)
+
+	cuentas = sorted({t.account_head for rows in datos["taxes"].values() for t in rows if t.account_head})
+	datos["impuesto_sat"] = _get_impuestos_sat(cuentas, pe.company)
+	return datos
+
+
 def _get_currency(pe) -> str:
 	"""Obtener moneda del pago."""
 	return pe.get("paid_to_account_currency") or pe.get("paid_from_account_currency") or "MXN"
@@ -763,7 +844,7 @@ def _crear_response_log_complemento(
 		return None
 
 
-def _llenar_documentos_relacionados(complemento, pe):
+def _llenar_documentos_relacionados(complemento, pe, datos: dict | None = None):
 	"""
 	Agrega una fila en documentos_relacionados por cada SI PPD válida
 	referenciada en el Payment Entry.
@@ -773,27 +854,12 @@ def _llenar_documentos_relacionados(complemento, pe):
 	  imp_pagado      = allocated_amount del PE actual
 	  imp_saldo_insoluto = imp_saldo_ant - imp_pagado
 	  num_parcialidad = count(pagos previos) + 1
-	"""
-	for ref in pe.get("references", []):
-		if ref.reference_doctype != "Sales Invoice":
-			continue
-		if flt(ref.allocated_amount) <= 0:
-			continue
 
-		si = frappe.db.get_value(
-			"Sales Invoice",
-			ref.reference_name,
-			[
-				"fm_es_ppd",
-				"fm_fiscal_status",
-				"fm_factura_fiscal_mx",
-				"currency",
-				"conversion_rate",
-				"grand_total",
-				"outstanding_amount",
-			],
-			as_dict=True,
-		)
+	`datos` es la precarga de _precargar_documentos_pe (se calcula si no se pasa).
+	"""
+	datos = datos or _precargar_documentos_pe(pe)
+	for ref in _referencias_si(pe):
+		si = datos["si"].get(ref.reference_name)
 		if not si:
 			continue
 		if si.fm_es_ppd != 1 or si.fm_fiscal_status != "TIMBRADO":
@@ -805,12 +871,7 @@ def _llenar_documentos_relacionados(complemento, pe):
 			)
 
 		# UUID y serie/folio desde la FFM
-		ffm = frappe.db.get_value(
-			"Factura Fiscal Mexico",
-			si.fm_factura_fiscal_mx,
-			["fm_uuid", "serie", "folio", "fm_serie_folio"],
-			as_dict=True,
-		)
+		ffm = datos["ffm"].get(si.fm_factura_fiscal_mx)
 		if not ffm or not ffm.fm_uuid:
 			frappe.throw(
 				_("La Factura Fiscal Mexico {0} no tiene UUID. No se puede generar el complemento.").format(
@@ -826,29 +887,14 @@ def _llenar_documentos_relacionados(complemento, pe):
 		imp_saldo_ant = round(imp_pagado + imp_saldo_insoluto, 2)
 
 		# num_parcialidad: posición de este PE en la lista de PEs de la SI
-		pes_de_la_si = frappe.db.sql(
-			"""
-			SELECT DISTINCT per.parent
-			FROM `tabPayment Entry Reference` per
-			JOIN `tabPayment Entry` pe ON pe.name = per.parent
-			WHERE per.reference_name = %s
-			  AND per.reference_doctype = 'Sales Invoice'
-			  AND pe.docstatus = 1
-			ORDER BY pe.posting_date ASC, pe.creation ASC
-			""",
-			(ref.reference_name,),
-			pluck="parent",
-		)
+		pes_de_la_si = datos["parcialidades"].get(ref.reference_name, [])
 		try:
 			num_parcialidad = pes_de_la_si.index(pe.name) + 1
 		except ValueError:
 			num_parcialidad = len(pes_de_la_si) + 1
 
 		# Objeto de impuesto: 02 si la SI tiene taxes, 01 si no
-		tiene_taxes = frappe.db.count(
-			"Sales Taxes and Charges",
-			{"parent": ref.reference_name, "tax_amount": [">", 0]},
-		)
+		tiene_taxes = any(flt(t.tax_amount) > 0 for t in datos["taxes"].get(ref.reference_name, []))
 		objeto_imp = "02" if tiene_taxes else "01"
 
 		# Serie y folio por separado si están disponibles
@@ -882,7 +928,7 @@ def _llenar_documentos_relacionados(complemento, pe):
 		)
 
 
-def _llenar_detalles_impuestos(complemento, pe):
+def _llenar_detalles_impuestos(complemento, pe, datos: dict | None = None):
 	"""
 	Llena detalles_impuestos con los traslados reales de cada SI PPD.
 
@@ -899,43 +945,33 @@ def _llenar_detalles_impuestos(complemento, pe):
 	  base_dr       = base proporcional
 	  importe_dr    = impuesto proporcional
 	  documento_relacionado = UUID de la FFM (id_documento del doc relacionado)
-	"""
-	for ref in pe.get("references", []):
-		if ref.reference_doctype != "Sales Invoice":
-			continue
-		if flt(ref.allocated_amount) <= 0:
-			continue
 
-		si = frappe.db.get_value(
-			"Sales Invoice",
-			ref.reference_name,
-			["fm_es_ppd", "fm_fiscal_status", "fm_factura_fiscal_mx", "grand_total"],
-			as_dict=True,
-		)
+	`datos` es la precarga de _precargar_documentos_pe (se calcula si no se pasa).
+	"""
+	datos = datos or _precargar_documentos_pe(pe)
+	for ref in _referencias_si(pe):
+		si = datos["si"].get(ref.reference_name)
 		if not si or si.fm_es_ppd != 1 or si.fm_fiscal_status != "TIMBRADO":
 			continue
 		if not si.fm_factura_fiscal_mx:
 			continue
 
-		uuid = frappe.db.get_value("Factura Fiscal Mexico", si.fm_factura_fiscal_mx, "fm_uuid")
+		ffm = datos["ffm"].get(si.fm_factura_fiscal_mx)
+		uuid = ffm.fm_uuid if ffm else None
 		if not uuid:
 			continue
 
 		grand_total = flt(si.grand_total)
 		proporcion = flt(ref.allocated_amount) / grand_total if grand_total else 0
 
-		# Leer impuestos reales de la SI
-		taxes = frappe.db.get_all(
-			"Sales Taxes and Charges",
-			filters={"parent": ref.reference_name},
-			fields=["account_head", "rate", "tax_amount", "base_tax_amount"],
-		)
+		# Impuestos reales de la SI (precargados)
+		taxes = datos["taxes"].get(ref.reference_name, [])
 
 		for tax in taxes:
 			if flt(tax.tax_amount) == 0:
 				continue
 
-			impuesto_sat = _get_impuesto_sat(tax.account_head, pe.company)
+			impuesto_sat = datos["impuesto_sat"].get(tax.account_head)
 			if not impuesto_sat:
 				continue  # cuenta no mapeada a catálogo SAT — omitir silenciosamente
 
@@ -972,18 +1008,32 @@ def _get_impuesto_sat(account_head: str, company: str):
 	2. Derivar tipo de impuesto desde el rol_fiscal
 	3. Fallback: nombre de cuenta
 	"""
+	return _get_impuestos_sat([account_head], company).get(account_head)
+
+
+def _get_impuestos_sat(cuentas: list, company: str) -> dict:
+	"""Versión en bloque de _get_impuesto_sat: {account_head: tupla o None} con dos consultas."""
+	if not cuentas:
+		return {}
+
 	# Buscar rol_fiscal en Configuracion Fiscal Mexico
 	cfg_name = frappe.db.get_value("Configuracion Fiscal Mexico", {"company": company}, "name")
-	rol_fiscal = None
+	roles = {}
 	if cfg_name:
-		rol_fiscal = frappe.db.get_value(
+		for row in frappe.db.get_all(
 			"Mapeo Cuenta Fiscal Mexico",
-			{"parent": cfg_name, "cuenta_impuesto": account_head},
-			"rol_fiscal",
-		)
+			filters={"parent": cfg_name, "cuenta_impuesto": ["in", list(cuentas)]},
+			fields=["cuenta_impuesto", "rol_fiscal"],
+		):
+			roles.setdefault(row.cuenta_impuesto, row.rol_fiscal)
+
+	return {cuenta: _impuesto_sat_desde_fuente(roles.get(cuenta) or cuenta) for cuenta in cuentas}
+
 
-	# Si no hay mapeo en CFM, intentar por nombre de cuenta
-	fuente = (rol_fiscal or account_head or "").upper()
+def _impuesto_sat_desde_fuente(fuente: str | None):
+	"""Deriva (tipo_impuesto, impuesto_sat_code, tipo_factor) desde rol fiscal o nombre de cuenta."""
+	# Si no hay mapeo en CFM, se usa el nombre de cuenta
+	fuente = (fuente or "").upper()
 
 	if "IVA" in fuente and "RETEN" not in fuente:
 		return ("Traslado", "002", "Tasa")
@@ -11,3 +11,19 @@ import frappe
 def create_complement_if_required(doc, method=None):
 	"""Hook on_submit — pendiente implementación en Bloque 3B."""
 	pass
+
+
+def emit_pending_complement_event(doc, method=None):
+	"""Hook on_submit — evento fiscal de complemento pendiente, al confirmar el submit."""
+	if not doc.get("fm_require_complement"):
+		return
+
+	from facturacion_mexico.dashboard_fiscal import fiscal_events
+
+	fiscal_events.emit_on_commit(
+		fiscal_events.COMPLEMENTO_PENDIENTE,
+		doc.company,
+		branch=doc.get("branch"),
+		reference_doctype="Payment Entry",
+		reference_name=doc.name,
+	)
@@ -253,3 +253,93 @@ class TestAmendBloqueado(FrappeTestCase):
 		instance.flags.allow_fiscal_cancel = True
 
 		instance.before_cancel()  # no debe lanzar
+
+
+class TestPrecargaDocumentosRelacionados(FrappeTestCase):
+	"""Los documentos relacionados se arman con consultas en bloque, no una por referencia."""
+
+	def _pe(self, n):
+		refs = [
+			frappe._dict(
+				reference_doctype="Sales Invoice",
+				reference_name=f"SI-PRE-{i}",
+				allocated_amount=100,
+				outstanding_amount=16,
+			)
+			for i in range(n)
+		]
+		return frappe._dict(
+			name="PE-PRE-1", company="Empresa Test", references=refs, get=lambda k, d=None: refs
+		)
+
+	def _get_all(self, doctype, filters=None, fields=None, **kwargs):
+		if doctype == "Sales Invoice":
+			return [
+				frappe._dict(
+					name=name,
+					fm_es_ppd=1,
+					fm_fiscal_status="TIMBRADO",
+					fm_factura_fiscal_mx=f"FFM-{name}",
+					currency="MXN",
+					conversion_rate=1,
+					grand_total=116,
+					outstanding_amount=16,
+				)
+				for name in filters["name"][1]
+			]
+		if doctype == "Factura Fiscal Mexico":
+			return [
+				frappe._dict(name=name, fm_uuid=f"UUID-{name}", serie="A", folio=1, fm_serie_folio="A-1")
+				for name in filters["name"][1]
+			]
+		return []
+
+	def _db_get_all(self, doctype, filters=None, fields=None, **kwargs):
+		if doctype == "Sales Taxes and Charges":
+			return [
+				frappe._dict(
+					parent=name, account_head="IVA 16% - ET", rate=16, tax_amount=16, base_tax_amount=16
+				)
+				for name in filters["parent"][1]
+			]
+		return []
+
+	def _sql(self, query, values=None, **kwargs):
+		return [
+			frappe._dict(reference_name=name, parent=parent)
+			for name in values["si_names"]
+			for parent in ("PE-PRE-0", "PE-PRE-1")
+		]
+
+	def test_consultas_constantes_y_parcialidad(self):
+		from facturacion_mexico.complementos_pago import api
+
+		pe = self._pe(5)
+		complemento = MagicMock()
+		with (
+			patch.object(api.frappe, "get_all", side_effect=self._get_all) as get_all,
+			patch.object(api.frappe.db, "get_all", side_effect=self._db_get_all) as db_get_all,
+			patch.object(api.frappe.db, "sql", side_effect=self._sql) as sql,
+			patch.object(api.frappe.db, "get_value", return_value=None) as get_value,
+		):
+			datos = api._precargar_documentos_pe(pe)
+			self.assertEqual(len(api._obtener_si_ppd_validas(pe, datos)), 5)
+			api._llenar_documentos_relacionados(complemento, pe, datos)
+			api._llenar_detalles_impuestos(complemento, pe, datos)
+
+		self.assertEqual(get_all.call_count, 2)
+		self.assertEqual(db_get_all.call_count, 1)
+		self.assertEqual(sql.call_count, 1)
+		self.assertEqual(get_value.call_count, 1)  # Configuracion Fiscal Mexico
+
+		docs = [
+			c.args[1] for c in complemento.append.call_args_list if c.args[0] == "documentos_relacionados"
+		]
+		self.assertEqual(len(docs), 5)
+		self.assertTrue(all(d["num_parcialidad"] == 2 for d in docs))
+		self.assertTrue(all(d["objeto_imp_dr"] == "02" for d in docs))
+		impuestos = [
+			c.args[1] for c in complemento.append.call_args_list if c.args[0] == "detalles_impuestos"
+		]
+		self.assertEqual(len(impuestos), 5)
+		self.assertEqual(impuestos[0]["impuesto"], "002")
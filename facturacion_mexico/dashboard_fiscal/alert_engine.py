@@ -8,10 +8,21 @@ from datetime import datetime, timedelta
 
 import frappe
 from frappe import _
+from frappe.utils import cint, flt
 
+from . import fiscal_events
 from .cache_manager import DashboardCache
 from .dashboard_registry import DashboardRegistry
 
+# Tabla de métricas por compañía (Redis): las reglas que comparten métrica reutilizan el mismo valor
+METRICS_CACHE_PREFIX = "fm_alert_metrics:"
+METRICS_TTL = 300  # 5 minutos; se invalida antes al hacer submit/cancel de SI y Payment Entry
+
+# Reglas de tipo "Event": se evalúan al emitirse el evento (ver fiscal_events)
+EVENT_RULES_CACHE_KEY = "fm_alert_event_rules"
+EVENT_FIRED_PREFIX = "fm_alert_event_fired:"
+DEFAULT_EVENT_WINDOW = 10
+
 
 class AlertEngine:
 	"""Motor de evaluación de alertas del dashboard fiscal"""
@@ -33,7 +44,7 @@ class AlertEngine:
 			all_alerts = []
 
 			# Evaluar reglas de alerta definidas en DocType
-			rule_alerts = self.evaluate_rule_alerts()
+			rule_alerts = self.evaluate_rule_alerts(use_cache=use_cache)
 			all_alerts.extend(rule_alerts)
 
 			# Evaluar alertas de módulos registrados
@@ -64,7 +75,7 @@ class AlertEngine:
 			frappe.log_error(f"Error evaluando todas las alertas: {e!s}", "Alert Engine")
 			return {"success": False, "error": str(e), "alerts": [], "total_alerts": 0}
 
-	def evaluate_rule_alerts(self):
+	def evaluate_rule_alerts(self, use_cache=True):
 		"""Evaluar alertas basadas en reglas configuradas"""
 		alerts = []
 
@@ -87,18 +98,21 @@ class AlertEngine:
 					"message_template",
 					"priority",
 					"show_in_dashboard",
+					"window_minutes",
 				],
 			)
 
+			# Cada métrica distinta se calcula una vez y todas las reglas se evalúan contra la tabla
+			metrics = self.collect_metrics(rules, use_cache=use_cache)
+			triggered_rules = []
+
 			for rule in rules:
 				try:
-					alert_result = self.evaluate_single_rule(rule)
+					alert_result = self.evaluate_single_rule(rule, metrics)
 					if alert_result and alert_result.get("triggered"):
 						alert = self.format_rule_alert(rule, alert_result)
 						alerts.append(alert)
-
-						# Actualizar estadísticas de la regla
-						self.update_rule_stats(rule["name"])
+						triggered_rules.append(rule["name"])
 
 				except Exception as e:
 					frappe.log_error(
@@ -106,12 +120,63 @@ class AlertEngine:
 						"Alert Rule Evaluation",
 					)
 
+			# Estadísticas de todas las reglas activadas en una sola escritura
+			self.update_rules_stats(triggered_rules)
+
 		except Exception as e:
 			frappe.log_error(f"Error obteniendo reglas de alerta: {e!s}", "Alert Engine")
 
 		return alerts
 
-	def evaluate_single_rule(self, rule):
+	def collect_metrics(self, rules, use_cache=True):
+		"""
+		Calcular una vez cada métrica distinta que usan las reglas estándar.
+
+		Returns:
+			dict {metric_key: valor}; las métricas que fallan no se incluyen
+		"""
+		needed = {}
+		for rule in rules:
+			key = self.get_metric_key(rule)
+			if key and key not in needed:
+				needed[key] = rule
+
+		if not needed:
+			return {}
+
+		cache_key = f"{METRICS_CACHE_PREFIX}{self.company}"
+		metrics = (frappe.cache().get_value(cache_key) or {}) if use_cache else {}
+		missing = [key for key in needed if key not in metrics]
+
+		for key in missing:
+			rule = needed[key]
+			value = self.get_condition_value(rule, rule.get("condition_type"), rule.get("condition_field"))
+			if value is not None:
+				metrics[key] = value
+
+		if missing:
+			frappe.cache().set_value(cache_key, metrics, expires_in_sec=METRICS_TTL)
+
+		return {key: metrics[key] for key in needed if key in metrics}
+
+	def get_metric_key(self, rule):
+		"""Clave de la métrica que evalúa una regla estándar (None si no aplica)"""
+		condition_type = rule.get("condition_type")
+		if rule.get("custom_condition") or not all(
+			[condition_type, rule.get("condition_field"), rule.get("condition_operator")]
+		):
+			return None
+
+		module = (rule.get("module") or "").lower()
+		if condition_type == "Event":
+			return f"Event:{rule.get('condition_field')}:{self.get_event_window(rule)}"
+		if condition_type == "Count":
+			# get_count_value solo distingue la familia del módulo
+			family = "timbrado" if "timbrado" in module else "ppd" if "ppd" in module else ""
+			return f"Count:{family}"
+		return f"{condition_type}:{module}:{rule.get('condition_field')}"
+
+	def evaluate_single_rule(self, rule, metrics=None):
 		"""Evaluar una regla de alerta individual"""
 		try:
 			if rule.get("custom_condition"):
@@ -119,7 +184,7 @@ class AlertEngine:
 				return self.evaluate_custom_condition(rule)
 			else:
 				# Evaluar condición estándar
-				return self.evaluate_standard_condition(rule)
+				return self.evaluate_standard_condition(rule, metrics)
 
 		except Exception as e:
 			frappe.log_error(f"Error evaluando regla individual: {e!s}", "Alert Rule")
@@ -155,7 +220,7 @@ class AlertEngine:
 		except Exception as e:
 			return {"triggered": False, "error": f"Custom condition error: {e!s}"}
 
-	def evaluate_standard_condition(self, rule):
+	def evaluate_standard_condition(self, rule, metrics=None):
 		"""Evaluar condición estándar basada en campos"""
 		try:
 			condition_type = rule.get("condition_type")
@@ -166,8 +231,12 @@ class AlertEngine:
 			if not all([condition_type, condition_field, operator]):
 				return {"triggered": False, "message": "Incomplete rule configuration"}
 
-			# Obtener valor actual basado en el tipo de condición
-			current_value = self.get_condition_value(rule, condition_type, condition_field)
+			# Obtener valor actual: de la tabla de métricas o calculándolo
+			metric_key = self.get_metric_key(rule)
+			if metrics is not None and metric_key in metrics:
+				current_value = metrics[metric_key]
+			else:
+				current_value = self.get_condition_value(rule, condition_type, condition_field)
 
 			if current_value is None:
 				return {"triggered": False, "message": "Could not retrieve condition value"}
@@ -197,6 +266,11 @@ class AlertEngine:
 				return self.get_amount_value(rule, condition_field)
 			elif condition_type == "Days":
 				return self.get_days_value(rule, condition_field)
+			elif condition_type == "Event":
+				# Contador por ventana mantenido por los eventos; no consulta tablas
+				return fiscal_events.window_count(
+					condition_field, self.company, None, self.get_event_window(rule)
+				)
 			else:
 				return None
 
@@ -241,6 +315,86 @@ class AlertEngine:
 		# Implementar cálculos de días específicos
 		return 0
 
+	def get_event_window(self, rule):
+		"""Ventana en minutos de una regla de tipo Event"""
+		return cint(rule.get("window_minutes")) or DEFAULT_EVENT_WINDOW
+
+	def evaluate_event(self, event):
+		"""
+		Evaluar las reglas suscritas al tipo de `event` contra su contador por ventana.
+
+		Cada regla se activa una vez por ventana y alcance (sucursal del evento, o la compañía).
+
+		Returns:
+			list: alertas activadas
+		"""
+		alerts = []
+		for rule in self.get_event_rules():
+			if rule.get("condition_field") != event.event_type:
+				continue
+
+			window = self.get_event_window(rule)
+			current_value = fiscal_events.window_count(event.event_type, event.company, event.branch, window)
+			condition_value = flt(rule.get("condition_value"))
+			if not self.compare_values(current_value, rule.get("condition_operator"), condition_value):
+				continue
+
+			scope = event.branch or event.company or ""
+			cache = frappe.cache()
+			fired_key = cache.make_key(f"{EVENT_FIRED_PREFIX}{rule['name']}:{scope}")
+			if not cache.set(fired_key, 1, nx=True, ex=window * 60):
+				continue
+
+			alert_result = {
+				"triggered": True,
+				"current_value": current_value,
+				"condition_value": condition_value,
+				"data": {
+					"branch": event.branch or "",
+					"window_minutes": window,
+					"event_type": event.event_type,
+					"reference_name": event.reference_name or "",
+				},
+			}
+			alert = self.format_rule_alert(rule, alert_result)
+			alerts.append(alert)
+
+			# Estadísticas y notificaciones por email de la regla
+			frappe.get_doc("Fiscal Alert Rule", rule["name"]).trigger_alert(alert_result["data"])
+			frappe.publish_realtime("fiscal_alert", alert)
+
+		if alerts:
+			self.invalidate_cache(self.company)
+		return alerts
+
+	@staticmethod
+	def get_event_rules():
+		"""Reglas activas de tipo Event (cacheadas hasta que se edite una regla)"""
+		return frappe.cache().get_value(
+			EVENT_RULES_CACHE_KEY,
+			generator=lambda: frappe.get_all(
+				"Fiscal Alert Rule",
+				filters={"is_active": 1, "condition_type": "Event"},
+				fields=[
+					"name",
+					"alert_name",
+					"alert_type",
+					"module",
+					"condition_field",
+					"condition_operator",
+					"condition_value",
+					"window_minutes",
+					"message_template",
+					"priority",
+				],
+			),
+		)
+
+	@staticmethod
+	def clear_event_rules():
+		"""Descartar la lista cacheada de reglas de tipo Event"""
+		frappe.cache().delete_value(EVENT_RULES_CACHE_KEY)
+
 	def compare_values(self, current_value, operator, condition_value):
 		"""Comparar valores según el operador"""
 		try:
@@ -389,11 +543,22 @@ class AlertEngine:
 
 	def update_rule_stats(self, rule_name):
 		"""Actualizar estadísticas de una regla"""
+		self.update_rules_stats([rule_name])
+
+	def update_rules_stats(self, rule_names):
+		"""Actualizar estadísticas de varias reglas en una sola sentencia"""
+		if not rule_names:
+			return
+
 		try:
-			rule_doc = frappe.get_doc("Fiscal Alert Rule", rule_name)
-			rule_doc.last_triggered = datetime.now()
-			rule_doc.trigger_count = (rule_doc.trigger_count or 0) + 1
-			rule_doc.save(ignore_permissions=True)
+			frappe.db.sql(
+				"""
+				UPDATE `tabFiscal Alert Rule`
+				SET last_triggered = %s, trigger_count = IFNULL(trigger_count, 0) + 1
+				WHERE name IN %s
+				""",
+				(datetime.now(), tuple(rule_names)),
+			)
 
 		except Exception as e:
 			frappe.log_error(f"Error actualizando estadísticas de regla: {e!s}", "Alert Stats")
@@ -490,6 +655,11 @@ class AlertEngine:
 		pattern = f"*alerts_{company}*" if company else "*alerts_*"
 		DashboardCache.invalidate_pattern(pattern)
 
+	@staticmethod
+	def invalidate_metrics(company):
+		"""Descartar la tabla de métricas de una compañía"""
+		frappe.cache().delete_value(f"{METRICS_CACHE_PREFIX}{company}")
+
 	@staticmethod
 	def schedule_alert_evaluation():
 		"""Programar evaluación periódica de alertas"""
@@ -524,6 +694,18 @@ def get_alert_summary(company=None):
 	return engine.get_alert_summary()
 
 
+def invalidate_metrics(doc, method=None):
+	"""Hook doc_events: submit/cancel de Sales Invoice y Payment Entry cambia los conteos"""
+	if doc.get("company"):
+		AlertEngine.invalidate_metrics(doc.company)
+
+
+def on_fiscal_event(event):
+	"""Suscriptor de fiscal_events (hook fm_fiscal_event_handlers): alertas en el momento del evento"""
+	if event.company:
+		AlertEngine(company=event.company).evaluate_event(event)
+
+
 def dismiss_alert(alert_id, company=None, user=None):
 	"""Función de conveniencia para descartar alerta"""
 	engine = AlertEngine(company=company)
@@ -41,6 +41,18 @@ class FiscalAlertRule(Document):
 		if not self.condition_type:
 			return
 
+		if self.condition_type == "Event":
+			from facturacion_mexico.dashboard_fiscal.fiscal_events import EVENT_TYPES, MAX_WINDOW_MINUTES
+
+			if self.condition_field not in EVENT_TYPES:
+				frappe.throw(
+					_("Para condiciones de tipo Event el campo debe ser un evento: {0}").format(
+						", ".join(EVENT_TYPES)
+					)
+				)
+			if not 0 < (self.window_minutes or 0) <= MAX_WINDOW_MINUTES:
+				frappe.throw(_("La ventana debe estar entre 1 y {0} minutos").format(MAX_WINDOW_MINUTES))
+
 		if self.condition_type == "Custom":
 			if not self.custom_condition:
 				frappe.throw(_("Se requiere condición personalizada cuando el tipo es 'Custom'"))
@@ -58,6 +70,17 @@ class FiscalAlertRule(Document):
 				if not getattr(self, field, None):
 					frappe.throw(_("Campo requerido para condición estándar: {0}").format(field))
 
+	def on_update(self):
+		"""Las reglas de tipo Event se leen de cache al emitirse cada evento"""
+		from facturacion_mexico.dashboard_fiscal.alert_engine import AlertEngine
+
+		AlertEngine.clear_event_rules()
+
+	def on_trash(self):
+		from facturacion_mexico.dashboard_fiscal.alert_engine import AlertEngine
+
+		AlertEngine.clear_event_rules()
+
 	def validate_message_template(self):
 		"""Validar plantilla de mensaje"""
 		if not self.message_template:
@@ -225,10 +248,12 @@ class FiscalAlertRule(Document):
 			dict: Información de la alerta activada
 		"""
 		try:
-			# Actualizar contador y timestamp
-			self.trigger_count = (self.trigger_count or 0) + 1
-			self.last_triggered = datetime.now()
-			self.save(ignore_permissions=True)
+			# Actualizar contador y timestamp; db_set no corre on_update, así activar una alerta no
+			# vacía el cache de reglas de tipo Event
+			self.db_set(
+				{"trigger_count": (self.trigger_count or 0) + 1, "last_triggered": datetime.now()},
+				update_modified=False,
+			)
 
 			# Formatear mensaje
 			formatted_message = self.format_message(context_data)
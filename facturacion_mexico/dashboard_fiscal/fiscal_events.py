@@ -0,0 +1,157 @@
+"""
+Fiscal Events - Dashboard Fiscal
+Bus de eventos fiscales en proceso con contadores por ventana de tiempo.
+
+Los problemas que buscaban las evaluaciones periódicas (errores de timbrado, complementos
+pendientes, folios agotándose) ya se conocen en el momento en que ocurren: `write_pac_response`,
+`reserve_next_folio` y el submit de Payment Entry emiten aquí un evento tipado.
+
+	- cada evento incrementa un contador en Redis por (tipo, compañía, sucursal) en cubetas de un
+	  minuto; `window_count` suma las cubetas de la ventana sin tocar tablas
+	- los suscriptores se registran en proceso (`subscribe`) o en hooks.py:
+
+		fm_fiscal_event_handlers = {"timbrado_error": ["app.module.handler"], "*": [...]}
+
+	- `emit` nunca interrumpe al llamador: los errores de contadores y suscriptores solo se registran
+	- dentro de una transacción (reserva de folio, submit) se usa `emit_on_commit`: el evento sale
+	  al confirmar y un rollback lo descarta, así no se alerta por folios o pagos que no existen
+
+Uso:
+
+	from facturacion_mexico.dashboard_fiscal import fiscal_events
+
+	fiscal_events.emit(fiscal_events.TIMBRADO_ERROR, company, branch=branch,
+		reference_doctype="Sales Invoice", reference_name=si_name)
+	fiscal_events.window_count(fiscal_events.TIMBRADO_ERROR, company, branch, window_minutes=10)
+"""
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import partial
+
+import frappe
+
+TIMBRADO_ERROR = "timbrado_error"
+TIMBRADO_OK = "timbrado_ok"
+FOLIO_RESERVED = "folio_reserved"
+FOLIOS_LOW = "folios_low"
+COMPLEMENTO_PENDIENTE = "complemento_pendiente"
+
+EVENT_TYPES = (TIMBRADO_ERROR, TIMBRADO_OK, FOLIO_RESERVED, FOLIOS_LOW, COMPLEMENTO_PENDIENTE)
+
+COUNTER_PREFIX = "fm_fiscal_event:"
+BUCKET_SECONDS = 60
+MAX_WINDOW_MINUTES = 24 * 60
+
+
+@dataclass(frozen=True)
+class FiscalEvent:
+	"""Evento fiscal emitido por el flujo que lo detecta."""
+
+	event_type: str
+	company: str | None
+	branch: str | None = None
+	reference_doctype: str | None = None
+	reference_name: str | None = None
+	data: dict = field(default_factory=dict)
+
+
+_subscribers: dict[str, list[Callable]] = {}
+
+
+def subscribe(event_type: str, handler: Callable[[FiscalEvent], None]) -> None:
+	"""Registrar un suscriptor en proceso ("*" recibe todos los eventos)."""
+	_subscribers.setdefault(event_type, []).append(handler)
+
+
+def emit(
+	event_type: str,
+	company: str | None,
+	branch: str | None = None,
+	reference_doctype: str | None = None,
+	reference_name: str | None = None,
+	**data,
+) -> FiscalEvent:
+	"""Publicar un evento: contar en su ventana y notificar a los suscriptores."""
+	event = FiscalEvent(event_type, company, branch, reference_doctype, reference_name, data)
+
+	try:
+		_count(event)
+	except Exception:
+		frappe.logger().warning(f"No se pudo contar el evento fiscal {event_type}", exc_info=True)
+
+	for handler in _handlers(event_type):
+		try:
+			handler(event)
+		except Exception as e:
+			frappe.log_error(f"Error en suscriptor de evento {event_type}: {e!s}", "Fiscal Events")
+
+	return event
+
+
+def emit_on_commit(
+	event_type: str,
+	company: str | None,
+	branch: str | None = None,
+	reference_doctype: str | None = None,
+	reference_name: str | None = None,
+	**data,
+) -> None:
+	"""`emit` cuando la transacción actual confirme (`frappe.db.after_commit`)."""
+	try:
+		after_commit = frappe.db.after_commit
+	except AttributeError:
+		# Sin conexión a BD (scripts): no hay transacción que esperar.
+		emit(event_type, company, branch, reference_doctype, reference_name, **data)
+		return
+	after_commit.add(
+		partial(_emit_committed, event_type, company, branch, reference_doctype, reference_name, **data)
+	)
+
+
+def _emit_committed(*args, **kwargs) -> None:
+	emit(*args, **kwargs)
+	# Lo que escriben los suscriptores (estadísticas de la regla, Email Queue) ya no tiene otro commit
+	frappe.db.commit()  # nosemgrep: frappe-manual-commit - callback de after_commit
+
+
+def window_count(
+	event_type: str, company: str | None, branch: str | None = None, window_minutes: int = 10
+) -> int:
+	"""Eventos de `event_type` en los últimos `window_minutes` (por sucursal o de la compañía)."""
+	window_minutes = max(1, min(int(window_minutes or 1), MAX_WINDOW_MINUTES))
+	buckets = window_minutes * 60 // BUCKET_SECONDS
+	current = _current_bucket()
+	cache = frappe.cache()
+	keys = [cache.make_key(_counter_key(event_type, company, branch, current - i)) for i in range(buckets)]
+	return sum(int(value or 0) for value in cache.mget(keys))
+
+
+def _count(event: FiscalEvent) -> None:
+	"""Incrementar la cubeta actual de la compañía y, si aplica, de la sucursal."""
+	cache = frappe.cache()
+	bucket = _current_bucket()
+	ttl = MAX_WINDOW_MINUTES * 60 + BUCKET_SECONDS
+	pipeline = cache.pipeline()
+	for branch in {None, event.branch}:
+		key = cache.make_key(_counter_key(event.event_type, event.company, branch, bucket))
+		pipeline.incr(key)
+		pipeline.expire(key, ttl)
+	pipeline.execute()
+
+
+def _handlers(event_type: str) -> list[Callable]:
+	handlers = [*_subscribers.get(event_type, []), *_subscribers.get("*", [])]
+	hooks = frappe.get_hooks("fm_fiscal_event_handlers") or {}
+	for path in [*hooks.get(event_type, []), *hooks.get("*", [])]:
+		handlers.append(frappe.get_attr(path))
+	return handlers
+
+
+def _counter_key(event_type: str, company: str | None, branch: str | None, bucket: int) -> str:
+	return f"{COUNTER_PREFIX}{event_type}:{company or ''}:{branch or ''}:{bucket}"
+
+
+def _current_bucket() -> int:
+	return int(time.time()) // BUCKET_SECONDS
@@ -18,6 +18,7 @@ from frappe import _
 from frappe.utils import add_to_date, now, now_datetime
 
 from facturacion_mexico.config.fiscal_states_config import derive_pac_reconciliation
+from facturacion_mexico.facturacion_fiscal.pac_journal import PACFallbackJournal
 
 # Directorio fallback para respuestas PAC cuando DB no disponible
 # Usar directorio sites para compatibilidad multi-sitio
@@ -208,6 +209,31 @@ def _norm_status(s: str) -> str:
 	return (s or "").strip().upper()
 
 
+def _emit_timbrado_event(sales_invoice_name: str, factura_fiscal_name: str, fiscal_status: str) -> None:
+	"""Evento fiscal de resultado de timbrado (alertas en tiempo real). Nunca interrumpe al writer."""
+	from facturacion_mexico.dashboard_fiscal import fiscal_events
+
+	event_type = {"TIMBRADO": fiscal_events.TIMBRADO_OK, "ERROR": fiscal_events.TIMBRADO_ERROR}.get(
+		fiscal_status
+	)
+	if not event_type:
+		return
+	try:
+		si = frappe.db.get_value("Sales Invoice", sales_invoice_name, ["company", "fm_branch"], as_dict=True)
+		fiscal_events.emit(
+			event_type,
+			si.company if si else None,
+			branch=si.fm_branch if si else None,
+			reference_doctype="Factura Fiscal Mexico",
+			reference_name=factura_fiscal_name,
+			sales_invoice=sales_invoice_name,
+		)
+	except Exception:
+		frappe.logger().warning(
+			f"No se pudo emitir evento de timbrado de {sales_invoice_name}", exc_info=True
+		)
+
+
 class PACResponseWriter:
 	"""
 	Writer ultra-resiliente para respuestas PAC.
@@ -242,6 +268,7 @@ class PACResponseWriter:
 		*,
 		factura_fiscal_name: str | None = None,
 		skip_state_persist: bool = False,
+		journal_on_failure: bool = True,
 	) -> dict[str, Any]:
 		"""
 		Escribir respuesta PAC con máxima resilencia.
@@ -254,6 +281,9 @@ class PACResponseWriter:
 			factura_fiscal_name: Nombre EXPLÍCITO del FFM que inició la operación.
 				Obligatorio. La respuesta se asocia exclusivamente a este FFM —
 				nunca se resuelve por Sales Invoice. Ver Corrección 1 (integridad fiscal).
+			journal_on_failure: Agregar la respuesta al journal de fallback si el estado fiscal
+				no pudo persistirse en BD. El replay (`recover_all`) lo desactiva para no duplicar
+				la entrada que está recuperando.
 
 		Returns:
 			Dict con status y referencias creadas
@@ -274,15 +304,30 @@ class PACResponseWriter:
 		# fm_sync_status). Valida correlación estricta (Corrección 1) y commitea el FFM.
 		# - FiscalCorrelationError → propaga (no se toca nada).
 		# - Otro fallo de actualización → _update_factura_fiscal alerta y relanza:
-		#   NO se crea el Response Log y NO se presenta como persistido (punto 3).
-		self._update_factura_fiscal(
-			sales_invoice_name,
-			response_data,
-			None,  # fm_last_response_log se asigna después, cuando el log exista
-			operation_type,
-			factura_fiscal_name=factura_fiscal_name,
-			skip_state_persist=skip_state_persist,
-		)
+		#   NO se crea el Response Log y NO se presenta como persistido (punto 3). La
+		#   respuesta del PAC sí se agrega al journal de fallback antes de relanzar, para que
+		#   `recover_all` la aplique cuando la BD vuelva a estar disponible.
+		try:
+			self._update_factura_fiscal(
+				sales_invoice_name,
+				response_data,
+				None,  # fm_last_response_log se asigna después, cuando el log exista
+				operation_type,
+				factura_fiscal_name=factura_fiscal_name,
+				skip_state_persist=skip_state_persist,
+			)
+		except FiscalCorrelationError:
+			raise
+		except Exception as persist_error:
+			if journal_on_failure:
+				persist_error.pac_fallback_file = self._journal_response(
+					sales_invoice_name,
+					request_data,
+					response_data,
+					operation_type,
+					factura_fiscal_name=factura_fiscal_name,
+				)
+			raise
 		result["success"] = True
 		result["method"] = "database"
 		result["fiscal_updated"] = True
@@ -608,11 +653,15 @@ class PACResponseWriter:
 		*,
 		factura_fiscal_name: str | None = None,
 	) -> str:
-		"""Escribir respuesta a filesystem como fallback."""
-		timestamp = now().replace(" ", "_").replace(":", "-")
-		filename = f"pac_response_{sales_invoice_name}_{operation_type}_{timestamp}.json"
-		fallback_dir = _get_fallback_dir()
-		filepath = os.path.join(fallback_dir, filename)
+		"""Escribir respuesta al journal append-only del fallback (ver pac_journal).
+
+		El registro queda sincronizado a disco antes de devolver. Devuelve la ubicación
+		`<segmento>#<id de registro>`.
+		"""
+		# request_id estable: el replay lo reutiliza para el Response Log (campo único), lo que
+		# hace idempotente la recuperación aunque se ejecute más de una vez.
+		request_data = dict(request_data or {})
+		request_data.setdefault("request_id", frappe.generate_hash(length=16))
 
 		fallback_data = {
 			"sales_invoice": sales_invoice_name,
@@ -622,14 +671,38 @@ class PACResponseWriter:
 			"request_data": request_data,
 			"response_data": response_data,
 			"timestamp": now(),
-			"recovery_status": "pending",
 			"created_by": frappe.session.user if frappe.session else "System",
 		}
 
-		with open(filepath, "w") as f:
-			json.dump(fallback_data, f, indent=2, default=str)
+		journal = PACFallbackJournal(_get_fallback_dir())
+		# Segmento elegido bajo el lock: otro writer o una rotación posterior no lo cambian
+		record_id, segment = journal.append_located(fallback_data)
+		return f"{segment}#{record_id}"
 
-		return filepath
+	def _journal_response(
+		self,
+		sales_invoice_name: str,
+		request_data: dict[str, Any],
+		response_data: dict[str, Any],
+		operation_type: str,
+		*,
+		factura_fiscal_name: str | None = None,
+	) -> str | None:
+		"""Agregar la respuesta al journal sin ocultar el error original de BD si también falla."""
+		try:
+			return self._write_to_filesystem(
+				sales_invoice_name,
+				request_data,
+				response_data,
+				operation_type,
+				factura_fiscal_name=factura_fiscal_name,
+			)
+		except Exception:
+			frappe.log_error(
+				f"Error agregando respuesta PAC al journal: {traceback.format_exc()}",
+				"PAC Writer Fallback",
+			)
+			return None
 
 	def _update_factura_fiscal(
 		self,
@@ -722,6 +795,9 @@ class PACResponseWriter:
 			# del Response Log (Corrección 2). Commit ya existente — no se agrega ninguno.
 			frappe.db.commit()
 
+			if _normalized_op == "Timbrado" and not _skip_fiscal and new_status is not None:
+				_emit_timbrado_event(sales_invoice_name, factura_fiscal_name, _norm_status(new_status))
+
 		except FiscalCorrelationError:
 			# Contradicción de correlación (Corrección 1): propagar sin tocar nada.
 			raise
@@ -895,7 +971,12 @@ def write_pac_response(
 		raise
 	except Exception as e:
 		frappe.log_error(f"Error en write_pac_response API: {traceback.format_exc()}", "PAC API Error")
-		return {"success": False, "error": str(e), "timestamp": now()}
+		return {
+			"success": False,
+			"error": str(e),
+			"fallback_file": getattr(e, "pac_fallback_file", None),
+			"timestamp": now(),
+		}
 
 
 @frappe.whitelist()
@@ -948,7 +1029,12 @@ def write_pac_timeout(
 		raise
 	except Exception as e:
 		frappe.log_error(f"Error en write_pac_timeout: {traceback.format_exc()}", "PAC Timeout Error")
-		return {"success": False, "error": str(e), "timestamp": now()}
+		return {
+			"success": False,
+			"error": str(e),
+			"fallback_file": getattr(e, "pac_fallback_file", None),
+			"timestamp": now(),
+		}
 
 
 @frappe.whitelist()
@@ -989,6 +1075,7 @@ def recover_from_file(fallback_file_path: str) -> dict[str, Any]:
 			fallback_data["response_data"],
 			fallback_data["operation_type"],
 			factura_fiscal_name=fallback_data.get("factura_fiscal_name"),
+			journal_on_failure=False,
 		)
 
 		if result["success"] and result.get("method") == "database":
@@ -1009,13 +1096,139 @@ def recover_from_file(fallback_file_path: str) -> dict[str, Any]:
 		return {"success": False, "error": str(e), "timestamp": now()}
 
 
+RECOVERY_ROLES = ("System Manager", "Facturacion Mexico System Manager", "Facturacion Mexico Manager")
+
+
+@frappe.whitelist()
+def recover_all(batch_size: int = 200, include_legacy_files: bool = True) -> dict[str, Any]:
+	"""
+	Recuperar en bloque las respuestas PAC pendientes del journal de fallback.
+
+	Idempotente: el `request_id` de cada entrada se reutiliza como `request_id` del Response
+	Log (campo único), así que una entrada ya recuperada en una ejecución previa se detecta con
+	una sola consulta por lote y solo se marca. La correlación estricta del writer (Corrección 1)
+	sigue vigente: una entrada que contradice su FFM se registra completa en Error Log y se marca
+	como rechazada, sin reintentarse en cada ejecución.
+
+	Si la BD vuelve a fallar a mitad del proceso se detiene; lo ya recuperado queda marcado y el
+	resto se procesa en la siguiente ejecución.
+
+	Args:
+		batch_size: Entradas por lote (una consulta de deduplicación y un fsync de `ack` por lote)
+		include_legacy_files: También recuperar archivos JSON del esquema anterior
+
+	Returns:
+		Dict con contadores (recovered, duplicates, rejected, failed, pending)
+	"""
+	frappe.only_for(RECOVERY_ROLES)
+	batch_size = max(int(batch_size or 200), 1)
+
+	journal = PACFallbackJournal(_get_fallback_dir())
+	pending = journal.pending()
+	summary = {
+		"success": True,
+		"total": len(pending),
+		"recovered": 0,
+		"duplicates": 0,
+		"rejected": 0,
+		"failed": 0,
+		"stopped": False,
+		"legacy": None,
+		"timestamp": now(),
+	}
+
+	writer = PACResponseWriter()
+	for start in range(0, len(pending), batch_size):
+		batch = pending[start : start + batch_size]
+		entries = [r.payload.get("data") or {} for r in batch]
+		request_ids = [(d.get("request_data") or {}).get("request_id") for d in entries]
+		already = set(
+			frappe.get_all(
+				"FacturAPI Response Log",
+				filters={"request_id": ["in", [rid for rid in request_ids if rid] or [""]]},
+				pluck="request_id",
+			)
+		)
+
+		recovered, duplicates, rejected = [], [], []
+		for record, data, request_id in zip(batch, entries, request_ids, strict=True):
+			if request_id and request_id in already:
+				duplicates.append(record.payload["id"])
+				continue
+			try:
+				result = writer.write_pac_response(
+					data.get("sales_invoice"),
+					data.get("request_data") or {},
+					data.get("response_data") or {},
+					data.get("operation_type") or "timbrado",
+					factura_fiscal_name=data.get("factura_fiscal_name"),
+					journal_on_failure=False,
+				)
+			except FiscalCorrelationError:
+				frappe.log_error(
+					json.dumps(record.payload, default=str, indent=2), "PAC Journal Entrada Rechazada"
+				)
+				rejected.append(record.payload["id"])
+				continue
+			except Exception:
+				frappe.db.rollback()
+				frappe.log_error(f"Error en recover_all: {traceback.format_exc()}", "PAC Recovery Error")
+				summary["failed"] += 1
+				summary["stopped"] = True
+				break
+
+			if result.get("success"):
+				recovered.append(record.payload["id"])
+			else:
+				summary["failed"] += 1
+
+		journal.acknowledge(recovered, status="recovered")
+		journal.acknowledge(duplicates, status="duplicate")
+		journal.acknowledge(rejected, status="rejected")
+		summary["recovered"] += len(recovered)
+		summary["duplicates"] += len(duplicates)
+		summary["rejected"] += len(rejected)
+
+		done = start + len(batch)
+		frappe.publish_progress(
+			done * 100 / len(pending),
+			title=_("Recuperación PAC"),
+			description=_("{0} de {1} respuestas procesadas").format(done, len(pending)),
+		)
+		if summary["stopped"]:
+			break
+
+	journal.compact()
+	summary["pending"] = len(journal.pending())
+
+	if include_legacy_files and not summary["stopped"]:
+		summary["legacy"] = _recover_legacy_files()
+
+	summary["success"] = not summary["stopped"] and summary["failed"] == 0
+	return summary
+
+
+def _recover_legacy_files() -> dict[str, int]:
+	"""Recuperar archivos `pac_response_*.json` del esquema previo al journal (uno a uno)."""
+	counts = {"recovered": 0, "failed": 0}
+	for item in get_fallback_files():
+		if item.get("source") != "file" or item.get("recovery_status") == "completed":
+			continue
+		result = recover_from_file(item["filepath"])
+		if result.get("success"):
+			counts["recovered"] += 1
+		else:
+			counts["failed"] += 1
+	return counts
+
+
 @frappe.whitelist()
 def get_fallback_files() -> list[dict[str, Any]]:
 	"""
-	Listar archivos fallback pendientes de recovery.
+	Listar archivos fallback y entradas del journal pendientes de recovery.
 
 	Returns:
-		Lista de archivos fallback con metadata
+		Lista de archivos fallback con metadata (`source`: "file" o "journal")
 	"""
 	try:
 		fallback_dir = _get_fallback_dir()
@@ -1041,6 +1254,7 @@ def get_fallback_files() -> list[dict[str, Any]]:
 							"timestamp": data.get("timestamp"),
 							"recovery_status": data.get("recovery_status", "pending"),
 							"file_size": os.path.getsize(filepath),
+							"source": "file",
 						}
 					)
 
@@ -1048,6 +1262,22 @@ def get_fallback_files() -> list[dict[str, Any]]:
 					# Skip archivos corruptos
 					continue
 
+		# Entradas pendientes del journal append-only
+		for record in PACFallbackJournal(fallback_dir).pending():
+			data = record.payload.get("data") or {}
+			fallback_files.append(
+				{
+					"filename": record.segment,
+					"filepath": os.path.join(fallback_dir, record.segment),
+					"record_id": record.payload.get("id"),
+					"sales_invoice": data.get("sales_invoice"),
+					"operation_type": data.get("operation_type"),
+					"timestamp": data.get("timestamp") or record.payload.get("ts"),
+					"recovery_status": "pending",
+					"source": "journal",
+				}
+			)
+
 		# Ordenar por timestamp
 		fallback_files.sort(key=lambda x: x["timestamp"], reverse=True)
 
@@ -69,6 +69,50 @@ def get_system_health_metrics():
 		frappe.throw(_("Error obteniendo métricas de salud del sistema"))
 
 
+@frappe.whitelist()
+def get_timbrado_latency_metrics(company: str | None = None, branch: str | None = None):
+	"""
+	Latencia por fase del timbrado (prepare, payload, pac_call, persist, frappe_update,
+	download, email, total) agregada entre workers.
+
+	Args:
+		company: Filtrar por empresa
+		branch: Filtrar por sucursal
+
+	Returns:
+		list: Series con labels, count, avg_ms y p50/p95/p99 en ms
+	"""
+	if not frappe.has_permission("FacturAPI Response Log", "read"):
+		frappe.throw(_("Permisos insuficientes para acceder métricas sistema"))
+
+	from facturacion_mexico.facturacion_fiscal.timbrado_api import TIMBRADO_PHASE_METRIC
+	from facturacion_mexico.utils import metrics
+
+	return metrics.snapshot(TIMBRADO_PHASE_METRIC, company=company, branch=branch)
+
+
+@frappe.whitelist()
+def get_timbrado_latency_prometheus():
+	"""
+	Exportador de texto estilo Prometheus de los histogramas de latencia del timbrado.
+
+	Returns:
+		Response: text/plain (formato de exposición 0.0.4)
+	"""
+	if not frappe.has_permission("FacturAPI Response Log", "read"):
+		frappe.throw(_("Permisos insuficientes para acceder métricas sistema"))
+
+	from werkzeug.wrappers import Response
+
+	from facturacion_mexico.facturacion_fiscal.timbrado_api import TIMBRADO_PHASE_METRIC
+	from facturacion_mexico.utils import metrics
+
+	return Response(
+		metrics.prometheus_text([TIMBRADO_PHASE_METRIC]),
+		content_type="text/plain; version=0.0.4; charset=utf-8",
+	)
+
+
 @frappe.whitelist()
 def get_os_health_metrics():
 	"""
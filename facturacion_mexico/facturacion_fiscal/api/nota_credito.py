@@ -166,6 +166,11 @@ def estado_nota_descuento(sales_invoice: str) -> dict:
 	doc = frappe.get_doc("Sales Invoice", sales_invoice)
 	# Solo lectura de estado → exigir permiso de lectura sobre la nota.
 	doc.check_permission("read")
+	return estado_descuento(doc)
+
+
+def estado_descuento(doc) -> dict:
+	"""Estado de descuento de una nota ya cargada (ver `estado_nota_descuento`)."""
 	cuenta = get_cuenta_descuentos(doc.get("company"))
 	return {
 		"cuenta_configurada": bool(cuenta),
@@ -6,6 +6,7 @@ from frappe.contacts.doctype.address.address import get_address_display
 from frappe.model.document import Document
 from frappe.utils import cint, flt, now_datetime
 
+from facturacion_mexico.catalogos_sat import catalog_service
 from facturacion_mexico.config.fiscal_states_config import FiscalStates
 from facturacion_mexico.sat.constants import TIPO_COMPROBANTE, TIPO_RELACION, parse_select_code
 
@@ -222,11 +223,14 @@ class FacturaFiscalMexico(Document):
 		"""Verificar que todos los ítems del SI tienen Clave SAT Producto/Servicio."""
 		if not self.sales_invoice:
 			return
+		from facturacion_mexico.utils.item_fiscal_profile import load_for_document
+
 		si = frappe.get_doc("Sales Invoice", self.sales_invoice)
+		profiles = load_for_document(si)
 		missing = []
 		for item in si.items:
-			clave = frappe.db.get_value("Item", item.item_code, "fm_producto_servicio_sat")
-			if not clave:
+			profile = profiles.get(item.item_code)
+			if not (profile and profile.producto_servicio_sat):
 				missing.append(f"• {item.item_code} ({item.item_name or item.item_code})")
 		if missing:
 			frappe.throw(
@@ -951,7 +955,7 @@ class FacturaFiscalMexico(Document):
 			)
 
 		# 2. Validar que el uso de CFDI existe en catálogo SAT
-		if not frappe.db.exists("Uso CFDI SAT", self.fm_cfdi_use):
+		if not catalog_service.exists("Uso CFDI SAT", self.fm_cfdi_use):
 			frappe.throw(_("El Uso de CFDI '{0}' no existe en el catálogo SAT").format(self.fm_cfdi_use))
 
 		# 3. Validar que el uso de CFDI está activo
@@ -20,6 +20,22 @@ class MapeoReclasificacionFiscalPaymentEntry(Document):
 		self._validar_cuenta("cuenta_destino")
 		self._validar_sin_duplicado_activo()
 
+	def on_update(self):
+		self._invalidar_cache()
+
+	def on_trash(self):
+		self._invalidar_cache()
+
+	def _invalidar_cache(self):
+		from facturacion_mexico.facturacion_fiscal.services.payment_entry_reclasificacion import (
+			invalidar_cache_mapeo,
+		)
+
+		anterior = self.get_doc_before_save()
+		for company in {self.company, anterior.company if anterior else None}:
+			if company:
+				invalidar_cache_mapeo(company)
+
 	def _validar_cuentas_distintas(self):
 		if self.cuenta_origen and self.cuenta_destino and self.cuenta_origen == self.cuenta_destino:
 			frappe.throw(_("Cuenta Origen y Cuenta Destino no pueden ser la misma cuenta."))
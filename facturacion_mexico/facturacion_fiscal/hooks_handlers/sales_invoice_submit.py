@@ -3,29 +3,25 @@ from frappe import _
 from frappe.utils import flt
 
 from facturacion_mexico.config.fiscal_states_config import FiscalStates
+from facturacion_mexico.utils.tracing import get_tracer
+
+_tracer = get_tracer(__name__)
 
 
 def create_fiscal_event(doc, method):
 	"""Crear evento fiscal cuando se envía Sales Invoice."""
 
-	frappe.log_error(f"🚀 INICIO create_fiscal_event para {doc.name}", "TIMBRADO TRACE")
-
-	# Solo para facturas con datos fiscales
-	if not _should_create_fiscal_event(doc):
-		frappe.log_error(f"❌ _should_create_fiscal_event = False para {doc.name}", "TIMBRADO TRACE")
-		return
+	with _tracer.span("create_fiscal_event", doc=doc.name) as span:
+		# Solo para facturas con datos fiscales
+		if not _should_create_fiscal_event(doc):
+			span.set(outcome="skipped", reason="sin_datos_fiscales")
+			return
 
-	frappe.log_error(f"✅ _should_create_fiscal_event = True para {doc.name}", "TIMBRADO TRACE")
+		# Crear evento de emisión
+		_create_emission_event(doc)
 
-	# Crear evento de emisión
-	_create_emission_event(doc)
-	frappe.log_error(f"📄 _create_emission_event completado para {doc.name}", "TIMBRADO TRACE")
-
-	# NUEVO FLUJO: No auto-timbrar, usar botón manual
-	frappe.log_error(
-		f"✅ Evento fiscal creado para {doc.name}. Usar botón 'Timbrar Factura' para procesar.",
-		"SUBMIT FISCAL",
-	)
+		# NUEVO FLUJO: No auto-timbrar, usar botón manual
+		span.set(outcome="created")
 
 
 def _should_create_fiscal_event(doc):
@@ -52,10 +48,7 @@ def _create_emission_event(doc):
 	factura_fiscal = _get_or_create_factura_fiscal(doc)
 
 	# LEGACY: FiscalEventMX eliminado - reemplazado por FacturAPIResponseLog en nueva arquitectura
-	frappe.log_error(
-		f"Factura fiscal {factura_fiscal.name} creada para {doc.name}",
-		"Sales Invoice Fiscal Creation",
-	)
+	_tracer.event("factura_fiscal_creada", doc=doc.name, level="info", factura_fiscal=factura_fiscal.name)
 
 	# Actualizar estado fiscal
 	frappe.db.set_value("Sales Invoice", doc.name, "fm_fiscal_status", FiscalStates.BORRADOR)
@@ -75,9 +68,6 @@ def _get_or_create_factura_fiscal(doc):
 	factura_fiscal.status = FiscalStates.BORRADOR
 
 	# Agregar montos del Sales Invoice para validación posterior
-	frappe.log_error(
-		f"DEBUG: doc.net_total={doc.net_total}, doc.grand_total={doc.grand_total}", "MONTOS DEBUG"
-	)
 	factura_fiscal.si_total_antes_iva = flt(doc.net_total)
 	factura_fiscal.si_total_neto = flt(doc.grand_total)
 
@@ -86,12 +76,8 @@ def _get_or_create_factura_fiscal(doc):
 	otros_impuestos = 0
 
 	if doc.get("taxes"):
-		frappe.log_error(f"DEBUG: Taxes count={len(doc.taxes)}", "MONTOS DEBUG")
 		for tax in doc.taxes:
 			tax_amount = flt(tax.tax_amount)
-			frappe.log_error(
-				f"DEBUG: tax.account_head={tax.account_head}, tax_amount={tax_amount}", "MONTOS DEBUG"
-			)
 			# Identificar IVA por el account_head
 			if tax.account_head and ("IVA" in tax.account_head.upper()):
 				iva_total += tax_amount
@@ -100,9 +86,13 @@ def _get_or_create_factura_fiscal(doc):
 
 	factura_fiscal.si_iva = iva_total
 	factura_fiscal.si_otros_impuestos = otros_impuestos
-	frappe.log_error(
-		f"DEBUG: Final values - si_total_antes_iva={factura_fiscal.si_total_antes_iva}, si_iva={factura_fiscal.si_iva}, si_total_neto={factura_fiscal.si_total_neto}",
-		"MONTOS DEBUG",
+	_tracer.event(
+		"montos_si",
+		doc=doc.name,
+		si_total_antes_iva=factura_fiscal.si_total_antes_iva,
+		si_iva=iva_total,
+		si_otros_impuestos=otros_impuestos,
+		si_total_neto=factura_fiscal.si_total_neto,
 	)
 
 	factura_fiscal.save()
@@ -117,62 +107,51 @@ def _should_auto_timbrar(doc):
 	"""Determinar si se debe auto-timbrar. E-Receipt vs timbrado normal se decide
 	por fm_ereceipt_mode en el Sales Invoice, no por un flag global."""
 
-	frappe.log_error(f"🔍 EVALUANDO auto-timbrado para {doc.name}", "Auto-Timbrado Check")
+	with _tracer.span("should_auto_timbrar", doc=doc.name) as span:
+		# Si el SI está en modo E-Receipt, no timbrar
+		if doc.get("fm_ereceipt_mode") == "E-Receipt":
+			span.set(outcome="skipped", reason="ereceipt")
+			return False
 
-	# Si el SI está en modo E-Receipt, no timbrar
-	if doc.get("fm_ereceipt_mode") == "E-Receipt":
-		frappe.log_error(f"📱 SI en modo E-Receipt para {doc.name} - NO timbrar", "Auto-Timbrado Check")
-		return False
+		# Solo si hay datos fiscales completos
+		if not doc.fm_cfdi_use:
+			span.set(outcome="skipped", reason="sin_fm_cfdi_use")
+			return False
 
-	frappe.log_error(f"📄 Proceder con timbrado normal para {doc.name}", "Auto-Timbrado Check")
+		# Solo si el cliente tiene RFC en tax_id
+		customer = frappe.get_doc("Customer", doc.customer)
+		has_rfc = bool(customer.get("tax_id"))
+		if not has_rfc:
+			span.set(outcome="skipped", reason="cliente_sin_rfc", customer=doc.customer)
+			return False
 
-	# Solo si hay datos fiscales completos
-	if not doc.fm_cfdi_use:
-		frappe.log_error(f"❌ Sin fm_cfdi_use para {doc.name}", "Auto-Timbrado Check")
-		return False
-
-	# Solo si el cliente tiene RFC en tax_id
-	customer = frappe.get_doc("Customer", doc.customer)
-	has_rfc = bool(customer.get("tax_id"))
-	if not has_rfc:
-		frappe.log_error(
-			f"❌ Cliente {doc.customer} sin RFC en tax_id: {customer.get('tax_id')}",
-			"Auto-Timbrado Check",
-		)
-		return False
-
-	frappe.log_error(f"✅ TIMBRADO NORMAL APROBADO para {doc.name}", "Auto-Timbrado Check")
-	return True
+		span.set(outcome="approved")
+		return True
 
 
 def _auto_timbrar_factura(doc):
 	"""Auto-timbrar factura si está configurado."""
 
-	frappe.log_error(f"🎯 EJECUTANDO _auto_timbrar_factura para {doc.name}", "TIMBRADO TRACE")
-
 	try:
-		from facturacion_mexico.facturacion_fiscal.timbrado_api import TimbradoAPI
-
-		frappe.log_error(f"📦 TimbradoAPI importado para {doc.name}", "TIMBRADO TRACE")
-
-		# Crear instancia de API
-		_api = TimbradoAPI(company=doc.company)
-		frappe.log_error(f"🔧 TimbradoAPI instanciado para {doc.name}", "TIMBRADO TRACE")
-
-		# Timbrar en background job para no bloquear el submit
-		frappe.log_error(f"⏳ ENQUEUE timbrado para {doc.name}", "TIMBRADO TRACE")
-		frappe.enqueue(
-			method="facturacion_mexico.facturacion_fiscal.timbrado_api.timbrar_factura",
-			queue="default",
-			timeout=300,
-			sales_invoice_name=doc.name,
-		)
+		with _tracer.span("auto_timbrar_factura", doc=doc.name):
+			from facturacion_mexico.facturacion_fiscal.timbrado_api import TimbradoAPI
+
+			# Crear instancia de API
+			_api = TimbradoAPI(company=doc.company)
+
+			# Timbrar en background job para no bloquear el submit
+			frappe.enqueue(
+				method="facturacion_mexico.facturacion_fiscal.timbrado_api.timbrar_factura",
+				queue="default",
+				timeout=300,
+				sales_invoice_name=doc.name,
+			)
 
-		frappe.log_error(f"✅ ENQUEUE exitoso para {doc.name}", "TIMBRADO TRACE")
 		frappe.msgprint(_("La factura se está timbrando automáticamente"))
 
 	except Exception as e:
-		frappe.log_error(f"💥 ERROR en _auto_timbrar_factura para {doc.name}: {e!s}", "TIMBRADO TRACE")
+		# El span ya registró el error; el Error Log se reserva para fallos reales.
+		frappe.log_error(f"Error en _auto_timbrar_factura para {doc.name}: {e!s}", "Auto-Timbrado Error")
 		frappe.logger().error(f"Error auto-timbrando factura {doc.name}: {e!s}")
 		# No lanzar error para no bloquear el submit
 		frappe.msgprint(_("Error al auto-timbrar:") + str(e))
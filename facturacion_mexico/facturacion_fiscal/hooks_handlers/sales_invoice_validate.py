@@ -87,11 +87,16 @@ def _validate_cfdi_use(doc):
 
 def _validate_items_sat_codes(doc):
 	"""Validar códigos SAT en items."""
+	from facturacion_mexico.utils.item_fiscal_profile import load_for_document
+
+	profiles = load_for_document(doc)
 	for item in doc.items:
-		item_doc = frappe.get_doc("Item", item.item_code)
+		profile = profiles.get(item.item_code)
+		if not profile:
+			frappe.throw(_("Item {0} no existe").format(item.item_code))
 
 		# Validar código de producto/servicio SAT
-		if not item_doc.fm_producto_servicio_sat:
+		if not profile.producto_servicio_sat:
 			frappe.throw(_(f"El item {item.item_name} no tiene código de producto/servicio SAT configurado"))
 
 		# Validar UOM con formato SAT (NUEVA VALIDACIÓN)
@@ -104,6 +109,7 @@ def _validate_uom_sat_format(item):
 	Acepta formato canónico "H87 - Pieza", legacy "H87 Pieza" y código puro "H87".
 	"""
 	from facturacion_mexico.cfdi_recibidos.services.uom_policy import try_normalize_uom_to_sat_code
+	from facturacion_mexico.utils.item_fiscal_profile import get_uom_profiles
 
 	if not item.uom:
 		frappe.throw(_(f"Item {item.item_code}: UOM es obligatoria"))
@@ -118,11 +124,11 @@ def _validate_uom_sat_format(item):
 		)
 
 	# Verificar que la UOM existe y está activa
-	if not frappe.db.exists("UOM", item.uom):
+	uom_profile = get_uom_profiles([item.uom]).get(item.uom)
+	if not uom_profile:
 		frappe.throw(_(f"Item {item.item_code}: UOM '{item.uom}' no existe"))
 
-	uom_enabled = frappe.db.get_value("UOM", item.uom, "enabled")
-	if not uom_enabled:
+	if not uom_profile.enabled:
 		frappe.throw(
 			_(
 				f"Item {item.item_code}: UOM '{item.uom}' está desactivada. "
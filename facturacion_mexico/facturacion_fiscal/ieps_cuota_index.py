@@ -0,0 +1,197 @@
+"""
+Cuotas IEPS (`IEPS Cuota SAT`) en memoria de proceso, indexadas por empresa y clave SAT.
+
+Las facturas de combustibles y bebidas repiten las mismas claves en muchas líneas y cada línea
+consultaba la tabla. Aquí cada empresa se carga una sola vez por proceso y sitio en un índice de
+intervalos por clave:
+
+	- vigencias ordenadas por `vigencia_desde` (búsqueda binaria de la última que inicia <= fecha)
+	- máximo acumulado de `vigencia_hasta` (sin fin = `date.max`) para dejar de recorrer en cuanto
+	  ninguna vigencia anterior puede cubrir la fecha
+
+Invalidación entre workers igual que `catalog_service`: versión por empresa en Redis
+(`fm_ieps_cuota_version:<company>`), publicada al confirmar la transacción por los doc_events de
+`IEPS Cuota SAT`; los demás procesos la comparan como máximo cada `VERSION_CHECK_SECONDS` (y
+recargan con esa frecuencia si Redis no responde).
+
+Uso:
+
+	from facturacion_mexico.facturacion_fiscal import ieps_cuota_index
+
+	cuota = ieps_cuota_index.find(company, "50202301", posting_date, cuenta_ieps=account_head)
+	if cuota:
+		cuota.cuota, cuota.uom
+"""
+
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+
+import frappe
+from frappe.utils import flt, getdate
+
+from facturacion_mexico.utils import cache_version
+
+DOCTYPE = "IEPS Cuota SAT"
+VERSION_CHECK_SECONDS = 30
+VERSION_KEY_PREFIX = "fm_ieps_cuota_version"
+
+
+@dataclass(frozen=True)
+class CuotaIEPS:
+	name: str
+	clave_prod_serv: str
+	uom: str | None
+	cuota: float
+	cuenta_ieps: str | None
+	vigencia_desde: date
+	vigencia_hasta: date | None
+
+	def as_dict(self) -> dict:
+		return {"cuenta_ieps": self.cuenta_ieps, "cuota": self.cuota, "uom": self.uom}
+
+
+class _ClaveIntervals:
+	"""Vigencias de una clave ordenadas por inicio, con el máximo acumulado de los fines."""
+
+	__slots__ = ("cuotas", "max_hasta", "starts")
+
+	def __init__(self, cuotas: list[CuotaIEPS]):
+		self.cuotas = sorted(cuotas, key=lambda c: c.vigencia_desde)
+		self.starts = [c.vigencia_desde for c in self.cuotas]
+		self.max_hasta: list[date] = []
+		current = date.min
+		for cuota in self.cuotas:
+			current = max(current, cuota.vigencia_hasta or date.max)
+			self.max_hasta.append(current)
+
+	def vigentes(self, fecha: date) -> list[CuotaIEPS]:
+		"""Cuotas que cubren `fecha`, de la más reciente a la más antigua."""
+		result = []
+		i = bisect.bisect_right(self.starts, fecha) - 1
+		while i >= 0 and self.max_hasta[i] >= fecha:
+			cuota = self.cuotas[i]
+			if cuota.vigencia_hasta is None or cuota.vigencia_hasta >= fecha:
+				result.append(cuota)
+			i -= 1
+		return result
+
+
+class CompanyCuotaIndex:
+	"""Snapshot inmutable de las cuotas IEPS de una empresa."""
+
+	__slots__ = ("claves", "company", "version")
+
+	def __init__(self, company: str, rows: list, version: str | None):
+		self.company = company
+		self.version = version
+		by_clave: dict[str, list[CuotaIEPS]] = {}
+		for row in rows:
+			if not row.clave_prod_serv or not row.vigencia_desde:
+				continue
+			by_clave.setdefault(row.clave_prod_serv, []).append(
+				CuotaIEPS(
+					name=row.name,
+					clave_prod_serv=row.clave_prod_serv,
+					uom=row.uom,
+					cuota=flt(row.cuota),
+					cuenta_ieps=row.cuenta_ieps,
+					vigencia_desde=getdate(row.vigencia_desde),
+					vigencia_hasta=getdate(row.vigencia_hasta) if row.vigencia_hasta else None,
+				)
+			)
+		self.claves = {clave: _ClaveIntervals(cuotas) for clave, cuotas in by_clave.items()}
+
+	def __len__(self) -> int:
+		return sum(len(intervals.cuotas) for intervals in self.claves.values())
+
+	def vigentes(self, clave_sat: str, fecha, cuenta_ieps: str | None = None) -> list[CuotaIEPS]:
+		intervals = self.claves.get(clave_sat)
+		if not intervals:
+			return []
+		cuotas = intervals.vigentes(getdate(fecha))
+		if cuenta_ieps:
+			cuotas = [c for c in cuotas if c.cuenta_ieps == cuenta_ieps]
+		return cuotas
+
+
+_indexes: dict[tuple[str | None, str], tuple[float, CompanyCuotaIndex]] = {}
+_lock = threading.Lock()
+
+
+def get_index(company: str) -> CompanyCuotaIndex:
+	"""Índice de la empresa para el sitio actual (se recarga si la versión en Redis cambió)."""
+	key = (getattr(frappe.local, "site", None), company)
+	now = time.monotonic()
+	cached = _indexes.get(key)
+	if cached and cached[0] > now:
+		return cached[1]
+
+	version = _current_version(company)
+	# Sin Redis (None) no hay forma de saber si cambió: se recarga al expirar
+	if cached and version is not None and cached[1].version == version:
+		_indexes[key] = (now + VERSION_CHECK_SECONDS, cached[1])
+		return cached[1]
+
+	with _lock:
+		cached = _indexes.get(key)
+		if cached and cached[1].version == version and cached[0] > now:
+			return cached[1]
+		index = CompanyCuotaIndex(company, _load_rows(company), version)
+		_indexes[key] = (now + VERSION_CHECK_SECONDS, index)
+		return index
+
+
+def vigentes(company: str, clave_sat: str, fecha, cuenta_ieps: str | None = None) -> list[CuotaIEPS]:
+	"""Cuotas vigentes en `fecha` para la clave (y cuenta IEPS si se indica), más reciente primero."""
+	if not company or not clave_sat or not fecha:
+		return []
+	return get_index(company).vigentes(clave_sat, fecha, cuenta_ieps)
+
+
+def find(company: str, clave_sat: str, fecha, cuenta_ieps: str | None = None) -> CuotaIEPS | None:
+	"""Cuota vigente más reciente o None."""
+	cuotas = vigentes(company, clave_sat, fecha, cuenta_ieps)
+	return cuotas[0] if cuotas else None
+
+
+def invalidate(company: str | None = None) -> None:
+	"""Publicar, al confirmar la transacción, una versión nueva de la empresa (o de las cargadas)."""
+	site = getattr(frappe.local, "site", None)
+	if company:
+		cache_version.publish_on_commit(
+			f"{VERSION_KEY_PREFIX}:{company}", _indexes.pop, ((site, company), None)
+		)
+		return
+	for cached_site, cached_company in list(_indexes):
+		if cached_site == site:
+			invalidate(cached_company)
+
+
+def on_cuota_change(doc, method=None) -> None:
+	"""doc_event on_update/on_trash de IEPS Cuota SAT."""
+	invalidate(doc.company)
+	previous = doc.get_doc_before_save() if hasattr(doc, "get_doc_before_save") else None
+	if previous and previous.company and previous.company != doc.company:
+		invalidate(previous.company)
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _current_version(company: str) -> str | None:
+	# None solo si Redis no responde; sin versión publicada todavía vale "0"
+	return cache_version.get(f"{VERSION_KEY_PREFIX}:{company}", default="0")
+
+
+def _load_rows(company: str) -> list:
+	return frappe.get_all(
+		DOCTYPE,
+		filters={"company": company, "docstatus": ["<", 2]},
+		fields=["name", "clave_prod_serv", "uom", "cuota", "cuenta_ieps", "vigencia_desde", "vigencia_hasta"],
+		limit_page_length=0,
+	)
@@ -0,0 +1,289 @@
+# Copyright (c) 2026, Buzola and contributors
+# For license information, please see license.txt
+"""Journal append-only del fallback de respuestas PAC.
+
+Sustituye el esquema "un archivo JSON por respuesta" de `facturacion_mexico_pac_fallback`: las
+respuestas que no pudieron persistirse en BD se agregan a segmentos `pac_journal_NNNNNN.seg`
+con registros de longitud prefijada y checksum, y cada escritura se sincroniza a disco (fsync)
+antes de devolver. La recuperación se registra agregando registros `ack` al mismo journal; nunca
+se reescribe un registro existente.
+
+Formato de registro (big-endian):
+
+    magic (4 bytes, b"FMJ1") | longitud (uint32) | crc32 del payload (uint32) | payload JSON UTF-8
+
+Tipos de payload:
+    {"kind": "entry", "id": ..., "ts": ..., "data": {...}}       respuesta PAC pendiente
+    {"kind": "ack", "ids": [...], "ts": ..., "status": ...}     recuperación de entradas
+
+Un registro truncado (caída a mitad de escritura) o con checksum inválido se omite y la lectura
+se resincroniza en el siguiente `magic`; no invalida el resto del segmento.
+
+Este módulo no depende de la BD: el replay contra Frappe vive en `facturacion_fiscal.api`
+(`recover_all`).
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import struct
+import uuid
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+
+RECORD_MAGIC = b"FMJ1"
+_HEADER = struct.Struct(">4sII")
+SEGMENT_PREFIX = "pac_journal_"
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+LOCK_FILENAME = ".pac_journal.lock"
+
+
+@dataclass(frozen=True)
+class JournalRecord:
+	"""Registro leído del journal con su ubicación física."""
+
+	segment: str
+	offset: int
+	payload: dict
+
+
+def encode_record(payload: dict) -> bytes:
+	"""Serializar un payload a su representación binaria (cabecera + JSON)."""
+	body = json.dumps(payload, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+	return _HEADER.pack(RECORD_MAGIC, len(body), zlib.crc32(body)) + body
+
+
+def decode_records(buffer: bytes) -> Iterator[tuple[int, dict | None]]:
+	"""Decodificar registros de un segmento.
+
+	Produce (offset, payload). Para un registro dañado produce (offset, None) y continúa en el
+	siguiente `magic`, de modo que un registro truncado no oculta los posteriores.
+	"""
+	pos = 0
+	size = len(buffer)
+	while pos + _HEADER.size <= size:
+		magic, length, checksum = _HEADER.unpack_from(buffer, pos)
+		start = pos + _HEADER.size
+		end = start + length
+		if magic == RECORD_MAGIC and end <= size:
+			body = buffer[start:end]
+			if zlib.crc32(body) == checksum:
+				try:
+					yield pos, json.loads(body.decode("utf-8"))
+					pos = end
+					continue
+				except ValueError:
+					pass
+		yield pos, None
+		next_magic = buffer.find(RECORD_MAGIC, pos + 1)
+		if next_magic < 0:
+			return
+		pos = next_magic
+	if pos < size:
+		# Cola más corta que una cabecera: escritura interrumpida.
+		yield pos, None
+
+
+class PACFallbackJournal:
+	"""Journal segmentado y sincronizado a disco para respuestas PAC no persistidas."""
+
+	def __init__(self, directory: str, segment_max_bytes: int = SEGMENT_MAX_BYTES):
+		self.directory = directory
+		self.segment_max_bytes = segment_max_bytes
+		os.makedirs(directory, mode=0o700, exist_ok=True)
+
+	# ------------------------------------------------------------------
+	# Escritura
+	# ------------------------------------------------------------------
+
+	def append(self, data: dict) -> str:
+		"""Agregar una respuesta pendiente. Devuelve el id del registro."""
+		return self.append_many([data])[0]
+
+	def append_located(self, data: dict) -> tuple[str, str]:
+		"""Como `append`, pero devuelve también la ruta del segmento donde se escribió el registro."""
+		ids, segment = self._append_many([data])
+		return ids[0], segment
+
+	def append_many(self, items: Iterable[dict]) -> list[str]:
+		"""Agregar varias respuestas con un único fsync. Devuelve sus ids en orden."""
+		return self._append_many(items)[0]
+
+	def _append_many(self, items: Iterable[dict]) -> tuple[list[str], str | None]:
+		ids = []
+		chunks = []
+		ts = datetime.now().isoformat(sep=" ")
+		for data in items:
+			record_id = uuid.uuid4().hex
+			ids.append(record_id)
+			chunks.append(encode_record({"kind": "entry", "id": record_id, "ts": ts, "data": data}))
+		segment = self._write(b"".join(chunks)) if chunks else None
+		return ids, segment
+
+	def acknowledge(self, record_ids: Iterable[str], status: str = "recovered", **meta) -> None:
+		"""Marcar entradas como procesadas agregando un registro `ack` (un fsync por llamada)."""
+		ids = [rid for rid in record_ids if rid]
+		if not ids:
+			return
+		payload = {"kind": "ack", "ids": ids, "ts": datetime.now().isoformat(sep=" "), "status": status}
+		payload.update(meta)
+		self._write(encode_record(payload))
+
+	def _write(self, blob: bytes) -> str:
+		"""Escribir `blob` en el segmento activo. Devuelve la ruta elegida bajo el lock."""
+		with self._lock():
+			path = self._active_segment(len(blob))
+			fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+			try:
+				view = memoryview(blob)
+				while view:
+					written = os.write(fd, view)
+					view = view[written:]
+				os.fsync(fd)
+			finally:
+				os.close(fd)
+		return path
+
+	def _active_segment(self, incoming: int) -> str:
+		segments = self.segments()
+		if segments:
+			last = segments[-1]
+			path = os.path.join(self.directory, last)
+			if os.path.getsize(path) + incoming <= self.segment_max_bytes or os.path.getsize(path) == 0:
+				return path
+			number = self._segment_number(last) + 1
+		else:
+			number = 1
+		path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+		fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+		os.close(fd)
+		self._fsync_directory()
+		return path
+
+	def _fsync_directory(self) -> None:
+		# La entrada de directorio del segmento nuevo también debe sobrevivir a una caída.
+		try:
+			fd = os.open(self.directory, os.O_RDONLY)
+		except OSError:
+			return
+		try:
+			os.fsync(fd)
+		except OSError:
+			pass
+		finally:
+			os.close(fd)
+
+	def _lock(self):
+		return _FileLock(os.path.join(self.directory, LOCK_FILENAME))
+
+	# ------------------------------------------------------------------
+	# Lectura
+	# ------------------------------------------------------------------
+
+	def segments(self) -> list[str]:
+		"""Nombres de segmento ordenados (el último es el activo)."""
+		try:
+			names = os.listdir(self.directory)
+		except FileNotFoundError:
+			return []
+		return sorted(n for n in names if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+
+	@staticmethod
+	def _segment_number(name: str) -> int:
+		return int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+
+	def iter_records(self) -> Iterator[JournalRecord]:
+		"""Recorrer todos los registros válidos en orden de escritura."""
+		for name in self.segments():
+			for offset, payload in self._read_segment(name):
+				if payload is not None:
+					yield JournalRecord(name, offset, payload)
+
+	def _read_segment(self, name: str) -> Iterator[tuple[int, dict | None]]:
+		with open(os.path.join(self.directory, name), "rb") as f:
+			buffer = f.read()
+		yield from decode_records(buffer)
+
+	def pending(self) -> list[JournalRecord]:
+		"""Entradas sin `ack`, en orden de escritura."""
+		entries: dict[str, JournalRecord] = {}
+		for record in self.iter_records():
+			kind = record.payload.get("kind")
+			if kind == "entry":
+				entries[record.payload.get("id")] = record
+			elif kind == "ack":
+				for rid in record.payload.get("ids") or []:
+					entries.pop(rid, None)
+		return list(entries.values())
+
+	def stats(self) -> dict:
+		"""Resumen del journal: segmentos, bytes, pendientes y registros dañados."""
+		segments = self.segments()
+		corrupt = 0
+		for name in segments:
+			corrupt += sum(1 for _offset, payload in self._read_segment(name) if payload is None)
+		return {
+			"segments": len(segments),
+			"bytes": sum(os.path.getsize(os.path.join(self.directory, n)) for n in segments),
+			"pending": len(self.pending()),
+			"corrupt_records": corrupt,
+		}
+
+	# ------------------------------------------------------------------
+	# Compactación
+	# ------------------------------------------------------------------
+
+	def compact(self) -> int:
+		"""Eliminar el prefijo de segmentos cerrados cuyas entradas ya tienen `ack`.
+
+		Solo se elimina un prefijo contiguo: los `ack` de un segmento se refieren a entradas del
+		mismo segmento o anteriores, así que nunca se pierde el `ack` de una entrada que se
+		conserva. El segmento activo (el último) no se elimina. Devuelve segmentos eliminados.
+		"""
+		with self._lock():
+			segments = self.segments()
+			if len(segments) < 2:
+				return 0
+			acked = set()
+			entries_by_segment: dict[str, list[str]] = {name: [] for name in segments}
+			for record in self.iter_records():
+				kind = record.payload.get("kind")
+				if kind == "entry":
+					entries_by_segment[record.segment].append(record.payload.get("id"))
+				elif kind == "ack":
+					acked.update(record.payload.get("ids") or [])
+
+			removed = 0
+			for name in segments[:-1]:
+				if any(rid not in acked for rid in entries_by_segment[name]):
+					break
+				os.remove(os.path.join(self.directory, name))
+				removed += 1
+			if removed:
+				self._fsync_directory()
+			return removed
+
+
+class _FileLock:
+	"""Lock exclusivo entre procesos (workers) sobre un archivo del directorio del journal."""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.fd = None
+
+	def __enter__(self):
+		self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600)
+		fcntl.flock(self.fd, fcntl.LOCK_EX)
+		return self
+
+	def __exit__(self, *exc):
+		try:
+			fcntl.flock(self.fd, fcntl.LOCK_UN)
+		finally:
+			os.close(self.fd)
+			self.fd = None
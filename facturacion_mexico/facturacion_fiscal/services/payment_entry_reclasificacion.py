@@ -24,6 +24,8 @@ GL resultante (sin Cash extra):
   Cr  cuenta_destino  monto_reclasificar
 """
 
+import hashlib
+import json
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -37,6 +39,15 @@ _DOCTYPES_SOPORTADOS = {
 	"Purchase Invoice": "Pago",
 }
 
+_TAX_CHILD_DOCTYPE = {
+	"Sales Invoice": "Sales Taxes and Charges",
+	"Purchase Invoice": "Purchase Taxes and Charges",
+}
+
+_MAPEO_CACHE_KEY = "fm_reclas_mapeo"
+_GRUPOS_CACHE_PREFIX = "fm_pe_reclas_grupos"
+_GRUPOS_CACHE_TTL = 3600
+
 
 # ---------------------------------------------------------------------------
 # Hook principal
@@ -132,54 +143,125 @@ def _calcular_grupos_desde_doc(doc) -> tuple[dict, list]:
 	"""
 	Devuelve ({(cuenta_origen, cuenta_destino, tipo_op): monto_total}, [sin_mapeo])
 	con los montos proporcionales reales a reclasificar y las cuentas sin mapeo.
+
+	Carga en bloque: grand_total y filas de impuesto de todas las facturas referenciadas
+	(dos consultas por doctype) y el mapeo completo de la compañía (una vez, en caché).
+	Si referencias, montos y mapeo no cambiaron desde el último validate del mismo PE,
+	reutiliza el resultado anterior sin consultar facturas (una factura referenciada está
+	submitted y sus impuestos no cambian).
 	"""
-	grupos: dict = {}
-	sin_mapeo: set = set()
 	company = doc.company
-
+	referencias = []
 	for ref in doc.get("references", []):
 		if flt(ref.allocated_amount) <= 0:
 			continue
-
-		tipo_operacion = _DOCTYPES_SOPORTADOS.get(ref.reference_doctype)
-		if not tipo_operacion:
+		if ref.reference_doctype not in _DOCTYPES_SOPORTADOS:
 			continue
+		referencias.append((ref.reference_doctype, ref.reference_name, flt(ref.allocated_amount)))
+
+	mapeo = _cargar_mapeo(company)
+	firma = _firma_calculo(company, referencias, mapeo)
+	cache_key = f"{_GRUPOS_CACHE_PREFIX}:{doc.get('name')}" if doc.get("name") else None
+	if cache_key:
+		anterior = frappe.cache().get_value(cache_key)
+		if anterior and anterior.get("firma") == firma:
+			return dict(anterior["grupos"]), list(anterior["sin_mapeo"])
+
+	facturas = _cargar_facturas(referencias)
 
-		try:
-			invoice = frappe.get_doc(ref.reference_doctype, ref.reference_name)
-		except Exception:
+	grupos: dict = {}
+	sin_mapeo: set = set()
+	for doctype, name, allocated in referencias:
+		tipo_operacion = _DOCTYPES_SOPORTADOS[doctype]
+		invoice = facturas.get((doctype, name))
+		if not invoice:
 			continue
 
-		grand_total = flt(invoice.grand_total)
+		grand_total = flt(invoice["grand_total"])
 		if not grand_total:
 			continue
 
-		proporcion = flt(ref.allocated_amount) / grand_total
+		proporcion = allocated / grand_total
 
-		for tax in invoice.get("taxes", []):
-			tax_amount = flt(tax.tax_amount)
+		for account_head, tax_amount in invoice["taxes"]:
+			tax_amount = flt(tax_amount)
 			if tax_amount == 0:
 				continue
 
-			cuenta_destino = frappe.db.get_value(
-				"Mapeo Reclasificacion Fiscal Payment Entry",
-				{
-					"company": company,
-					"tipo_operacion": tipo_operacion,
-					"cuenta_origen": tax.account_head,
-					"activo": 1,
-				},
-				"cuenta_destino",
-			)
+			cuenta_destino = mapeo.get((tipo_operacion, account_head))
 			if not cuenta_destino:
-				sin_mapeo.add(tax.account_head)
+				sin_mapeo.add(account_head)
 				continue
 
-			key = (tax.account_head, cuenta_destino, tipo_operacion)
+			key = (account_head, cuenta_destino, tipo_operacion)
 			monto = round(tax_amount * proporcion, 6)
 			grupos[key] = grupos.get(key, 0.0) + monto
 
-	return grupos, sorted(sin_mapeo)
+	resultado = (grupos, sorted(sin_mapeo))
+	if cache_key:
+		frappe.cache().set_value(
+			cache_key,
+			{"firma": firma, "grupos": resultado[0], "sin_mapeo": resultado[1]},
+			expires_in_sec=_GRUPOS_CACHE_TTL,
+		)
+	return resultado
+
+
+def _cargar_facturas(referencias: list[tuple[str, str, float]]) -> dict:
+	"""
+	Carga grand_total y filas de impuesto de todas las facturas referenciadas.
+
+	Devuelve {(doctype, name): {"grand_total": float, "taxes": [(account_head, tax_amount)]}}.
+	Dos consultas por doctype, sin importar el número de referencias.
+	"""
+	por_doctype: dict[str, set] = {}
+	for doctype, name, _allocated in referencias:
+		por_doctype.setdefault(doctype, set()).add(name)
+
+	facturas: dict = {}
+	for doctype, names in por_doctype.items():
+		names = sorted(names)
+		for row in frappe.get_all(doctype, filters={"name": ["in", names]}, fields=["name", "grand_total"]):
+			facturas[(doctype, row.name)] = {"grand_total": row.grand_total, "taxes": []}
+
+		for tax in frappe.db.get_all(
+			_TAX_CHILD_DOCTYPE[doctype],
+			filters={"parenttype": doctype, "parent": ["in", names]},
+			fields=["parent", "account_head", "tax_amount"],
+			order_by="idx asc",
+		):
+			factura = facturas.get((doctype, tax.parent))
+			if factura:
+				factura["taxes"].append((tax.account_head, tax.tax_amount))
+	return facturas
+
+
+def _cargar_mapeo(company: str) -> dict:
+	"""Mapeo activo de la compañía {(tipo_operacion, cuenta_origen): cuenta_destino}, en caché."""
+
+	def _generar():
+		rows = frappe.get_all(
+			"Mapeo Reclasificacion Fiscal Payment Entry",
+			filters={"company": company, "activo": 1},
+			fields=["tipo_operacion", "cuenta_origen", "cuenta_destino"],
+		)
+		return {(r.tipo_operacion, r.cuenta_origen): r.cuenta_destino for r in rows}
+
+	return frappe.cache().hget(_MAPEO_CACHE_KEY, company, generator=_generar)
+
+
+def invalidar_cache_mapeo(company: str) -> None:
+	"""Descartar el mapeo en caché de la compañía (al modificar un Mapeo)."""
+	frappe.cache().hdel(_MAPEO_CACHE_KEY, company)
+
+
+def _firma_calculo(company: str, referencias: list, mapeo: dict) -> str:
+	"""Huella de las entradas del cálculo: referencias, montos asignados y mapeo vigente."""
+	payload = json.dumps(
+		[company, sorted(referencias), sorted((list(k), v) for k, v in mapeo.items())],
+		default=str,
+	)
+	return hashlib.sha1(payload.encode(), usedforsecurity=False).hexdigest()
 
 
 # ---------------------------------------------------------------------------
@@ -132,6 +132,16 @@ def _make_si_mock(grand_total=1160.0, tax_amount=160.0, account_head=None, orige
 	return si
 
 
+def _facturas_de(si_mock, si_name="MOCK-SI-001"):
+	"""Resultado de _cargar_facturas equivalente a la SI ficticia."""
+	return {
+		("Sales Invoice", si_name): {
+			"grand_total": si_mock.grand_total,
+			"taxes": [(t.account_head, t.tax_amount) for t in si_mock["taxes"]],
+		}
+	}
+
+
 class TestPaymentEntryReclasificacion(unittest.TestCase):
 	@classmethod
 	def setUpClass(cls):
@@ -142,6 +152,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		cls.otro = _ensure_account("Test IVA Sin Mapeo - _TC", "Test IVA Sin Mapeo")
 		_ensure_mapeo(cls.origen, cls.destino)
 		frappe.db.commit()  # nosemgrep: frappe-manual-commit - Required to persist test fixtures
+		payment_entry_reclasificacion.invalidar_cache_mapeo(_COMPANY)
 
 	@classmethod
 	def tearDownClass(cls):
@@ -153,6 +164,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 			if frappe.db.exists("Account", acc):
 				frappe.delete_doc("Account", acc, ignore_permissions=True, force=True)
 		frappe.db.commit()  # nosemgrep: frappe-manual-commit
+		payment_entry_reclasificacion.invalidar_cache_mapeo(_COMPANY)
 
 	def tearDown(self):
 		frappe.db.rollback()
@@ -168,7 +180,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		si_mock = _make_si_mock(grand_total, tax_amount, origen=self.origen)
 		pe = _make_pe_mock(allocated, grand_total=grand_total)
 
-		with mock.patch.object(payment_entry_reclasificacion.frappe, "get_doc", return_value=si_mock):
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=_facturas_de(si_mock)):
 			grupos, sin_mapeo = _calcular_grupos_desde_doc(pe)
 
 		key = (self.origen, self.destino, "Cobro")
@@ -182,7 +194,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		si_mock = _make_si_mock(grand_total, tax_amount, origen=self.origen)
 		pe = _make_pe_mock(allocated, allocated=allocated, grand_total=grand_total)
 
-		with mock.patch.object(payment_entry_reclasificacion.frappe, "get_doc", return_value=si_mock):
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=_facturas_de(si_mock)):
 			grupos, sin_mapeo = _calcular_grupos_desde_doc(pe)
 
 		key = (self.origen, self.destino, "Cobro")
@@ -195,7 +207,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		si_mock = _make_si_mock(1160.0, 160.0, origen=self.otro)
 		pe = _make_pe_mock(1160.0, grand_total=1160.0)
 
-		with mock.patch.object(payment_entry_reclasificacion.frappe, "get_doc", return_value=si_mock):
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=_facturas_de(si_mock)):
 			grupos, sin_mapeo = _calcular_grupos_desde_doc(pe)
 
 		self.assertEqual(len(grupos), 0)
@@ -206,7 +218,7 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		si_mock = _make_si_mock(1000.0, 0.0, origen=self.origen)
 		pe = _make_pe_mock(1000.0, grand_total=1000.0)
 
-		with mock.patch.object(payment_entry_reclasificacion.frappe, "get_doc", return_value=si_mock):
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=_facturas_de(si_mock)):
 			grupos, sin_mapeo = _calcular_grupos_desde_doc(pe)
 
 		self.assertEqual(len(grupos), 0)
@@ -335,3 +347,45 @@ class TestPaymentEntryReclasificacion(unittest.TestCase):
 		# PE no tiene filas de reclasificación — no bloqueó el guardado
 		reclas = [t for t in pe["taxes"] if _RECLAS_MARKER in (t.get("description") or "")]
 		self.assertEqual(len(reclas), 0)
+
+	# -----------------------------------------------------------------------
+	# Carga en bloque y reutilización entre validates
+	# -----------------------------------------------------------------------
+
+	def test_cargar_facturas_una_llamada_para_todas_las_referencias(self):
+		"""Muchas referencias → una sola carga de facturas, montos por referencia."""
+		pe = _make_pe_mock(1160.0 * 3)
+		pe["references"] = [
+			frappe._dict(
+				reference_doctype="Sales Invoice", reference_name=f"MOCK-SI-{i}", allocated_amount=1160.0
+			)
+			for i in range(3)
+		]
+		facturas = {}
+		for i in range(3):
+			facturas.update(_facturas_de(_make_si_mock(1160.0, 160.0, origen=self.origen), f"MOCK-SI-{i}"))
+
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=facturas) as cargar:
+			grupos, sin_mapeo = _calcular_grupos_desde_doc(pe)
+
+		cargar.assert_called_once()
+		self.assertEqual(len(cargar.call_args[0][0]), 3)
+		self.assertAlmostEqual(grupos[(self.origen, self.destino, "Cobro")], 480.0, places=4)
+		self.assertEqual(sin_mapeo, [])
+
+	def test_validate_sin_cambios_no_recalcula(self):
+		"""Mismo PE, mismas referencias y montos → segundo validate no vuelve a cargar facturas."""
+		pe = _make_pe_mock(1160.0)
+		pe["name"] = "MOCK-PE-" + frappe.generate_hash(length=8)
+		facturas = _facturas_de(_make_si_mock(1160.0, 160.0, origen=self.origen))
+
+		with mock.patch(f"{_MODULE}._cargar_facturas", return_value=facturas) as cargar:
+			primero = _calcular_grupos_desde_doc(pe)
+			segundo = _calcular_grupos_desde_doc(pe)
+			self.assertEqual(cargar.call_count, 1)
+			self.assertEqual(primero, segundo)
+
+			# Cambia el monto asignado → se recalcula
+			pe["references"][0].allocated_amount = 580.0
+			_calcular_grupos_desde_doc(pe)
+			self.assertEqual(cargar.call_count, 2)
@@ -0,0 +1,191 @@
+"""Journal append-only del fallback PAC y recuperación en bloque (`recover_all`).
+
+Cubre el formato (longitud + checksum), la resincronización ante un registro truncado, los
+`ack`, la compactación por prefijo y la idempotencia del replay por `request_id`.
+
+El journal usa un directorio temporal; el writer se parchea. Cero llamadas al PAC.
+"""
+
+import os
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import IntegrationTestCase
+
+from facturacion_mexico.facturacion_fiscal.api import PACResponseWriter, recover_all
+from facturacion_mexico.facturacion_fiscal.pac_journal import PACFallbackJournal, encode_record
+
+_API = "facturacion_mexico.facturacion_fiscal.api"
+
+
+def _entry(n: int, request_id: str | None = None) -> dict:
+	return {
+		"sales_invoice": f"SI-JOURNAL-{n}",
+		"factura_fiscal_name": f"FFM-JOURNAL-{n}",
+		"operation_type": "timbrado",
+		"request_data": {"request_id": request_id or f"journal-req-{n}"},
+		"response_data": {"success": True, "status_code": 200, "uuid": f"UUID-{n}"},
+	}
+
+
+class TestPACFallbackJournal(IntegrationTestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp(prefix="pac_journal_test_")
+		self.addCleanup(shutil.rmtree, self.dir, True)
+
+	def test_roundtrip_en_orden(self):
+		journal = PACFallbackJournal(self.dir)
+		ids = journal.append_many([{"n": 1}, {"n": 2}, {"n": 3}])
+		pending = journal.pending()
+		self.assertEqual([r.payload["id"] for r in pending], ids)
+		self.assertEqual([r.payload["data"]["n"] for r in pending], [1, 2, 3])
+
+	def test_registro_truncado_no_oculta_los_siguientes(self):
+		journal = PACFallbackJournal(self.dir)
+		journal.append({"n": 1})
+		segment = os.path.join(self.dir, journal.segments()[-1])
+		with open(segment, "ab") as f:
+			f.write(encode_record({"kind": "entry", "id": "torn", "data": {}})[:20])
+		journal.append({"n": 2})
+
+		self.assertEqual([r.payload["data"]["n"] for r in journal.pending()], [1, 2])
+		self.assertEqual(journal.stats()["corrupt_records"], 1)
+
+	def test_checksum_invalido_se_descarta(self):
+		journal = PACFallbackJournal(self.dir)
+		journal.append({"n": 1})
+		segment = os.path.join(self.dir, journal.segments()[-1])
+		with open(segment, "r+b") as f:
+			f.seek(-2, os.SEEK_END)
+			f.write(b"XX")
+		self.assertEqual(journal.pending(), [])
+
+	def test_ack_y_compactacion_por_prefijo(self):
+		journal = PACFallbackJournal(self.dir, segment_max_bytes=200)
+		ids = [journal.append({"n": i, "pad": "x" * 80}) for i in range(6)]
+		self.assertGreater(len(journal.segments()), 3)
+
+		journal.acknowledge(ids[:3])
+		self.assertEqual([r.payload["data"]["n"] for r in journal.pending()], [3, 4, 5])
+
+		removed = journal.compact()
+		self.assertGreater(removed, 0)
+		# Las entradas sin ack sobreviven a la compactación
+		self.assertEqual([r.payload["data"]["n"] for r in journal.pending()], [3, 4, 5])
+
+	def test_append_located_devuelve_el_segmento_escrito(self):
+		journal = PACFallbackJournal(self.dir, segment_max_bytes=200)
+		located = [journal.append_located({"n": i, "pad": "x" * 80}) for i in range(4)]
+		self.assertGreater(len(journal.segments()), 1)
+		# Cada registro está en el segmento reportado, aunque después haya rotado
+		by_id = {r.payload["id"]: os.path.join(self.dir, r.segment) for r in journal.pending()}
+		for record_id, segment in located:
+			self.assertEqual(by_id[record_id], segment)
+
+	def test_write_to_filesystem_agrega_al_journal(self):
+		with patch(f"{_API}._get_fallback_dir", return_value=self.dir):
+			location = PACResponseWriter()._write_to_filesystem(
+				"SI-1", {"req": 1}, {"success": False}, "timbrado", factura_fiscal_name="FFM-1"
+			)
+		pending = PACFallbackJournal(self.dir).pending()
+		self.assertEqual(len(pending), 1)
+		self.assertTrue(location.endswith("#" + pending[0].payload["id"]))
+		data = pending[0].payload["data"]
+		self.assertEqual(data["factura_fiscal_name"], "FFM-1")
+		# request_id estable para el replay idempotente
+		self.assertTrue(data["request_data"]["request_id"])
+
+
+class TestRecoverAll(IntegrationTestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp(prefix="pac_journal_test_")
+		self.addCleanup(shutil.rmtree, self.dir, True)
+		self.journal = PACFallbackJournal(self.dir)
+		frappe.set_user("Administrator")
+
+	def _recover(self, writer_side_effect, existing_request_ids=()):
+		with (
+			patch(f"{_API}._get_fallback_dir", return_value=self.dir),
+			patch.object(PACResponseWriter, "write_pac_response", side_effect=writer_side_effect) as writer,
+			patch(f"{_API}.frappe.get_all", return_value=list(existing_request_ids)),
+			patch(f"{_API}.frappe.publish_progress"),
+		):
+			summary = recover_all(batch_size=2, include_legacy_files=False)
+		return summary, writer
+
+	def test_recupera_en_lotes_y_marca_ack(self):
+		self.journal.append_many([_entry(i) for i in range(5)])
+		summary, writer = self._recover(lambda *a, **k: {"success": True, "method": "database"})
+
+		self.assertEqual(writer.call_count, 5)
+		self.assertEqual(summary["recovered"], 5)
+		self.assertEqual(summary["pending"], 0)
+		self.assertTrue(summary["success"])
+
+	def test_replay_idempotente_por_request_id(self):
+		self.journal.append_many([_entry(1), _entry(2)])
+		summary, writer = self._recover(
+			lambda *a, **k: {"success": True, "method": "database"},
+			existing_request_ids=["journal-req-1"],
+		)
+		self.assertEqual(writer.call_count, 1)
+		self.assertEqual(summary["duplicates"], 1)
+		self.assertEqual(summary["recovered"], 1)
+
+	def test_bd_caida_detiene_y_conserva_pendientes(self):
+		self.journal.append_many([_entry(i) for i in range(4)])
+		summary, _writer = self._recover(RuntimeError("BD caída"))
+
+		self.assertTrue(summary["stopped"])
+		self.assertFalse(summary["success"])
+		self.assertEqual(summary["pending"], 4)
+
+	def test_fallo_persistencia_bd_se_journaliza_y_recover_all_la_restaura(self):
+		response = {"success": True, "status_code": 200, "uuid": "UUID-REC"}
+		update = MagicMock(side_effect=[RuntimeError("BD caída"), None])
+		log = MagicMock(return_value=frappe._dict(name="LOG-REC"))
+		with (
+			patch(f"{_API}._get_fallback_dir", return_value=self.dir),
+			patch.object(PACResponseWriter, "_update_factura_fiscal", update),
+			patch.object(PACResponseWriter, "_write_to_database", log),
+			patch(f"{_API}.frappe.db.savepoint"),
+			patch(f"{_API}.frappe.db.set_value"),
+			patch(f"{_API}.frappe.get_all", return_value=[]),
+			patch(f"{_API}.frappe.publish_progress"),
+		):
+			with self.assertRaises(RuntimeError) as ctx:
+				PACResponseWriter().write_pac_response(
+					"SI-REC", {"req": 1}, response, "timbrado", factura_fiscal_name="FFM-REC"
+				)
+
+			# La respuesta no se perdió: quedó en el journal
+			pending = self.journal.pending()
+			self.assertEqual(len(pending), 1)
+			self.assertTrue(ctx.exception.pac_fallback_file.endswith("#" + pending[0].payload["id"]))
+			log.assert_not_called()
+
+			summary = recover_all(batch_size=10, include_legacy_files=False)
+
+		self.assertEqual(summary["recovered"], 1)
+		self.assertEqual(summary["pending"], 0)
+		replay = update.call_args_list[1]
+		self.assertEqual(replay.args[:2], ("SI-REC", response))
+		self.assertEqual(replay.kwargs["factura_fiscal_name"], "FFM-REC")
+		# El Response Log recuperado reutiliza el request_id del journal (replay idempotente)
+		request_data = log.call_args.args[1]
+		self.assertEqual(request_data["request_id"], pending[0].payload["data"]["request_data"]["request_id"])
+
+	def test_replay_fallido_no_duplica_la_entrada(self):
+		self.journal.append(_entry(1))
+		with (
+			patch(f"{_API}._get_fallback_dir", return_value=self.dir),
+			patch.object(PACResponseWriter, "_update_factura_fiscal", side_effect=RuntimeError("BD caída")),
+			patch(f"{_API}.frappe.get_all", return_value=[]),
+			patch(f"{_API}.frappe.publish_progress"),
+		):
+			summary = recover_all(batch_size=10, include_legacy_files=False)
+
+		self.assertTrue(summary["stopped"])
+		self.assertEqual(len(self.journal.pending()), 1)
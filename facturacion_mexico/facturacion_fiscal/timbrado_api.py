@@ -9,15 +9,23 @@ import frappe
 from frappe import _
 from frappe.utils import flt, fmt_money, format_date, now_datetime, time_diff_in_seconds, today
 
+from facturacion_mexico.catalogos_sat import catalog_service
 from facturacion_mexico.config.sat_objeto_impuesto import SATObjetoImpuesto
 from facturacion_mexico.config.sat_tax_rates import FacturAPITaxRates
 from facturacion_mexico.config.sat_tipo_factor import SATTipoFactor
+from facturacion_mexico.facturacion_fiscal import ieps_cuota_index
+from facturacion_mexico.utils import metrics
+from facturacion_mexico.utils.item_fiscal_profile import (
+	get_item_profile,
+	get_uom_conversion_factor,
+	load_for_document,
+)
+from facturacion_mexico.utils.tracing import get_tracer
+
+_tracer = get_tracer(__name__)
 
-# Import para conversión UOM (IEPS Cuota en litros)
-try:
-	from erpnext.stock.get_item_details import get_conversion_factor
-except ImportError:
-	get_conversion_factor = None
+# Histograma de latencia por fase del timbrado (etiquetas: phase, company, branch).
+TIMBRADO_PHASE_METRIC = "fm_timbrado_phase_ms"
 
 
 def resolve_cfdi_currency_exchange(sales_invoice):
@@ -102,16 +110,17 @@ def resolve_concepto_description(item, es_nota_descuento: bool) -> str:
 
 
 def _log_text(label, s: str):
+	# El volcado por codepoint solo se calcula con trazas "debug" habilitadas para este módulo.
+	if not _tracer.enabled("debug"):
+		return
 	if s is None:
 		s = ""
-	frappe.logger("facturapi-wire").info(
-		{
-			"label": label,
-			"text": s,
-			"repr": repr(s),
-			"codepoints": [hex(ord(ch)) for ch in s],
-			"is_nfc": s == unicodedata.normalize("NFC", s),
-		}
+	_tracer.event(
+		"facturapi_wire.text",
+		label=label,
+		text=s,
+		codepoints=[hex(ord(ch)) for ch in s],
+		is_nfc=s == unicodedata.normalize("NFC", s),
 	)
 
 
@@ -172,10 +181,11 @@ def _validate_items_clave_sat_for_timbrado(sales_invoice):
 	Se llama en _validate_invoice_for_timbrado antes de construir el payload.
 	Falla rápido reportando todos los ítems faltantes en un solo error.
 	"""
+	profiles = load_for_document(sales_invoice)
 	missing = []
 	for item in sales_invoice.items:
-		clave = frappe.db.get_value("Item", item.item_code, "fm_producto_servicio_sat")
-		if not clave:
+		profile = profiles.get(item.item_code)
+		if not (profile and profile.producto_servicio_sat):
 			missing.append(f"• {item.item_code} ({item.item_name or item.item_code})")
 	if missing:
 		frappe.throw(
@@ -374,6 +384,11 @@ class TimbradoAPI:
 		"""Inicializar API de timbrado."""
 		self.company = company
 		self.client = get_facturapi_client(company=company)
+		self._metric_labels = {"company": company or "", "branch": ""}
+
+	def _phase(self, phase: str):
+		"""Medir una fase del timbrado en TIMBRADO_PHASE_METRIC."""
+		return metrics.timer(TIMBRADO_PHASE_METRIC, phase=phase, **self._metric_labels)
 
 	def timbrar_factura(self, sales_invoice_name: str) -> dict[str, Any]:
 		"""Timbrar factura de Sales Invoice con arquitectura resiliente de 3 fases.
@@ -409,28 +424,39 @@ class TimbradoAPI:
 		factura_fiscal = None
 		self._pending_pdf_custom_section = None
 
+		# Etiquetas de esta factura; no heredar las de un timbrado previo de la misma instancia
+		self._metric_labels = {"company": self.company or "", "branch": ""}
+		started = time.perf_counter()
 		try:
 			# FASE 1: PREPARACIÓN (puede fallar antes de contactar PAC)
-			# Obtener Sales Invoice
-			sales_invoice = frappe.get_doc("Sales Invoice", sales_invoice_name)
+			with self._phase("prepare") as phase_labels:
+				# Obtener Sales Invoice
+				sales_invoice = frappe.get_doc("Sales Invoice", sales_invoice_name)
+				self._metric_labels = {
+					"company": sales_invoice.company or "",
+					"branch": sales_invoice.get("fm_branch") or "",
+				}
+				# La fase resuelve sus propias etiquetas: se registran con compañía y sucursal
+				phase_labels.update(self._metric_labels)
 
-			# Validar que se pueda timbrar
-			self._validate_invoice_for_timbrado(sales_invoice)
+				# Validar que se pueda timbrar
+				self._validate_invoice_for_timbrado(sales_invoice)
 
-			# Obtener Factura Fiscal existente
-			factura_fiscal = self._get_factura_fiscal(sales_invoice)
+				# Obtener Factura Fiscal existente
+				factura_fiscal = self._get_factura_fiscal(sales_invoice)
 
-			# VALIDACIÓN CRÍTICA: Documento fiscal debe estar submitted
-			if factura_fiscal.docstatus != 1:
-				frappe.throw(
-					_(
-						"No se puede timbrar: el documento fiscal debe estar submitted (enviado). Use el botón Submit en Factura Fiscal Mexico primero."
-					),
-					title=_("Documento Fiscal Draft"),
-				)
+				# VALIDACIÓN CRÍTICA: Documento fiscal debe estar submitted
+				if factura_fiscal.docstatus != 1:
+					frappe.throw(
+						_(
+							"No se puede timbrar: el documento fiscal debe estar submitted (enviado). Use el botón Submit en Factura Fiscal Mexico primero."
+						),
+						title=_("Documento Fiscal Draft"),
+					)
 
 			# Preparar datos para FacturAPI
-			invoice_data = self._prepare_facturapi_data(sales_invoice, factura_fiscal)
+			with self._phase("payload"):
+				invoice_data = self._prepare_facturapi_data(sales_invoice, factura_fiscal)
 
 			# FASE 2: COMUNICACIÓN CON PAC - Captura respuesta REAL
 			# Preparar request para auditoría
@@ -445,7 +471,8 @@ class TimbradoAPI:
 
 			try:
 				# CRÍTICO: Capturar respuesta RAW del PAC
-				pac_response = self.client.create_invoice(invoice_data)
+				with self._phase("pac_call"):
+					pac_response = self.client.create_invoice(invoice_data)
 
 				# Crear response_data limpio para éxito
 				response_data = {
@@ -456,13 +483,14 @@ class TimbradoAPI:
 				}
 
 				# Guardar Response Log INMEDIATAMENTE con respuesta REAL del PAC
-				writer_result = write_pac_response(
-					sales_invoice_name,
-					json.dumps(pac_request),
-					json.dumps(response_data),
-					"timbrado",
-					factura_fiscal_name=factura_fiscal.name,
-				)
+				with self._phase("persist"):
+					writer_result = write_pac_response(
+						sales_invoice_name,
+						json.dumps(pac_request),
+						json.dumps(response_data),
+						"timbrado",
+						factura_fiscal_name=factura_fiscal.name,
+					)
 
 			except FiscalCorrelationError:
 				# Corrección 6A: una correlación crítica al persistir la respuesta del PAC NO es
@@ -498,7 +526,8 @@ class TimbradoAPI:
 
 			# FASE 3: ACTUALIZACIÓN FRAPPE (puede fallar DESPUÉS de PAC exitoso)
 			try:
-				self._process_timbrado_success(sales_invoice, factura_fiscal, pac_response)
+				with self._phase("frappe_update"):
+					self._process_timbrado_success(sales_invoice, factura_fiscal, pac_response)
 
 				# Mostrar mensaje de éxito formateado
 				# Asegurarse de desempaquetar el wrapper del PAC response
@@ -700,6 +729,13 @@ class TimbradoAPI:
 
 		finally:
 			self._pending_pdf_custom_section = None
+			metrics.observe(
+				TIMBRADO_PHASE_METRIC,
+				(time.perf_counter() - started) * 1000,
+				phase="total",
+				**self._metric_labels,
+			)
+			metrics.push()
 
 	def _validate_invoice_for_timbrado(self, sales_invoice):
 		"""Validar que la factura se puede timbrar."""
@@ -872,9 +908,10 @@ class TimbradoAPI:
 		es_nota_descuento = is_nota_descuento(factura_fiscal)
 
 		# Items de la factura - E4-RO: Puente SI → Payload PAC
+		item_docs = self._load_payload_items(sales_invoice)
 		items = []
 		for item in sales_invoice.items:
-			item_doc = frappe.get_doc("Item", item.item_code)
+			item_doc = item_docs[item.item_code]
 
 			# Defensa final contra ausencia de clave SAT — no debe llegar aquí
 			# si _validate_invoice_for_timbrado corrió primero. El Item original se conserva
@@ -963,7 +1000,9 @@ class TimbradoAPI:
 					# Ejemplo: Refresco 30 piezas x 0.6L x $1.27/L = $22.86
 					#          Si dividimos: $22.86 / 30 piezas = $0.762/pieza (INCORRECTO)
 					#          Debe ser: $1.27/litro (cuota original de tabla SAT)
-					cuota_por_uom_base = self._get_cuota_from_tabla_sat(item_doc, tax_data["account_head"])
+					cuota_por_uom_base = self._get_cuota_from_tabla_sat(
+						item_doc, tax_data["account_head"], sales_invoice.company
+					)
 
 					if not cuota_por_uom_base:
 						frappe.throw(
@@ -983,7 +1022,9 @@ class TimbradoAPI:
 						)
 
 					# Obtener UOM base desde tabla IEPS Cuota SAT (dinámico: LTR, H87, etc.)
-					uom_base = self._get_uom_base_from_tabla_sat(item_doc, tax_data["account_head"])
+					uom_base = self._get_uom_base_from_tabla_sat(
+						item_doc, tax_data["account_head"], sales_invoice.company
+					)
 					if not uom_base:
 						frappe.throw(
 							_(
@@ -1378,12 +1419,14 @@ class TimbradoAPI:
 				{"company": self.company},
 				"download_files_default",
 			):
-				self._download_fiscal_files(factura_fiscal, response.get("id"))
+				with self._phase("download"):
+					self._download_fiscal_files(factura_fiscal, response.get("id"))
 
 			# Enviar email si está configurado (ESPEJO EXACTO de descarga archivos)
 			email_flag = getattr(factura_fiscal, "fm_enviar_email_timbrado", 0)
 			if email_flag:
-				self._send_fiscal_email(factura_fiscal, response.get("id"))
+				with self._phase("email"):
+					self._send_fiscal_email(factura_fiscal, response.get("id"))
 			else:
 				pass
 
@@ -2380,6 +2423,33 @@ class TimbradoAPI:
 		frappe.logger().warning(f"Tax amount no encontrado para item {item_code} en {account_head}")
 		return 0.0
 
+	def _load_payload_items(self, sales_invoice) -> dict[str, Any]:
+		"""
+		Campos de Item que usa el payload, para todas las líneas en una sola consulta.
+
+		Sale del perfil fiscal precargado (`load_for_document`: un `get_all` de Item con
+		`name in` los códigos de la factura) en lugar de un `get_doc("Item")` por línea.
+
+		Returns:
+			dict: item_code → frappe._dict(name, item_code, item_name, fm_producto_servicio_sat)
+		"""
+		profiles = load_for_document(sales_invoice)
+		item_docs = {}
+		for item in sales_invoice.items:
+			profile = profiles.get(item.item_code)
+			if not profile:
+				frappe.throw(
+					_("Ítem '{0}' no encontrado.").format(item.item_code),
+					frappe.DoesNotExistError,
+				)
+			item_docs[item.item_code] = frappe._dict(
+				name=profile.item_code,
+				item_code=profile.item_code,
+				item_name=profile.item_name,
+				fm_producto_servicio_sat=profile.producto_servicio_sat,
+			)
+		return item_docs
+
 	def _resolve_objeto_impuesto(self, item_doc):
 		"""
 		E4.3: Resolver ObjetoImp desde catálogo SAT Producto Servicio.
@@ -2403,10 +2473,14 @@ class TimbradoAPI:
 				title="ClaveProdServ Faltante",
 			)
 
-		# Lookup en catálogo interno
-		sat_producto = frappe.db.get_value(
-			"SAT Producto Servicio", clave_prod_serv, "incluye_objeto_impuesto"
-		)
+		# Lookup en catálogo interno (precargado en el perfil fiscal del Item)
+		profile = get_item_profile(item_doc.name)
+		if profile and profile.producto_servicio_sat == clave_prod_serv:
+			sat_producto = profile.objeto_impuesto
+		else:
+			sat_producto = catalog_service.get_field(
+				"SAT Producto Servicio", clave_prod_serv, "incluye_objeto_impuesto"
+			)
 
 		if not sat_producto:
 			frappe.throw(
@@ -2508,13 +2582,14 @@ class TimbradoAPI:
 			title="Mapeo SAT Faltante",
 		)
 
-	def _get_uom_base_from_tabla_sat(self, item_doc, account_head):
+	def _get_uom_base_from_tabla_sat(self, item_doc, account_head, company=None):
 		"""
 		Obtener UOM base desde tabla IEPS Cuota SAT.
 
 		Args:
 			item_doc: Item doc
 			account_head: Cuenta IEPS
+			company: Empresa de la factura (por defecto, la de la cuenta IEPS)
 
 		Returns:
 			str: UOM base (ej: "LTR", "H87") o None si no encuentra
@@ -2523,42 +2598,17 @@ class TimbradoAPI:
 			>>> uom_base = self._get_uom_base_from_tabla_sat(item_doc, "2117002 - IEPS Azucar Bebidas")
 			>>> # Retorna "LTR" para bebidas azucaradas
 		"""
-		clave_sat = item_doc.get("fm_producto_servicio_sat")
-		if not clave_sat:
-			return None
-
-		# Buscar en tabla IEPS Cuota SAT
-		result = frappe.db.sql(
-			"""
-			SELECT uom
-			FROM `tabIEPS Cuota SAT`
-			WHERE clave_prod_serv = %(clave_sat)s
-			  AND cuenta_ieps = %(cuenta_ieps)s
-			  AND vigencia_desde <= %(fecha)s
-			  AND IFNULL(vigencia_hasta, '2099-12-31') >= %(fecha)s
-			  AND docstatus < 2
-			LIMIT 1
-			""",
-			{
-				"clave_sat": clave_sat,
-				"cuenta_ieps": account_head,
-				"fecha": today(),
-			},
-			as_dict=True,
-		)
-
-		if result and len(result) > 0:
-			return result[0].get("uom")
-
-		return None
+		cuota = self._find_cuota_ieps(item_doc, account_head, company)
+		return cuota.uom if cuota else None
 
-	def _get_cuota_from_tabla_sat(self, item_doc, account_head):
+	def _get_cuota_from_tabla_sat(self, item_doc, account_head, company=None):
 		"""
 		Obtener cuota IEPS por UOM base desde tabla IEPS Cuota SAT.
 
 		Args:
 			item_doc: Item doc
 			account_head: Cuenta IEPS
+			company: Empresa de la factura (por defecto, la de la cuenta IEPS)
 
 		Returns:
 			float: Cuota por UOM base (ej: $1.27/litro, $5.49/litro) o None si no encuentra
@@ -2567,34 +2617,16 @@ class TimbradoAPI:
 			>>> cuota = self._get_cuota_from_tabla_sat(item_doc, "2117002 - IEPS Azucar Bebidas")
 			>>> # Retorna 1.27 para bebidas azucaradas ($1.27/litro)
 		"""
+		cuota = self._find_cuota_ieps(item_doc, account_head, company)
+		return flt(cuota.cuota) if cuota else None
+
+	def _find_cuota_ieps(self, item_doc, account_head, company=None):
+		"""Cuota vigente hoy desde el índice en memoria (compartido con los hooks IEPS)."""
 		clave_sat = item_doc.get("fm_producto_servicio_sat")
 		if not clave_sat:
 			return None
-
-		# Buscar en tabla IEPS Cuota SAT
-		result = frappe.db.sql(
-			"""
-			SELECT cuota
-			FROM `tabIEPS Cuota SAT`
-			WHERE clave_prod_serv = %(clave_sat)s
-			  AND cuenta_ieps = %(cuenta_ieps)s
-			  AND vigencia_desde <= %(fecha)s
-			  AND IFNULL(vigencia_hasta, '2099-12-31') >= %(fecha)s
-			  AND docstatus < 2
-			LIMIT 1
-			""",
-			{
-				"clave_sat": clave_sat,
-				"cuenta_ieps": account_head,
-				"fecha": today(),
-			},
-			as_dict=True,
-		)
-
-		if result and len(result) > 0:
-			return flt(result[0].get("cuota"))
-
-		return None
+		company = company or frappe.get_cached_value("Account", account_head, "company")
+		return ieps_cuota_index.find(company, clave_sat, today(), cuenta_ieps=account_head)
 
 	def _get_uom_conversion_factor(self, item_doc, item_uom, target_uom):
 		"""
@@ -2622,16 +2654,13 @@ class TimbradoAPI:
 		if item_uom == target_uom:
 			return 1.0
 
-		# Intentar obtener conversión desde ERPNext
-		if get_conversion_factor:
-			try:
-				conversion_data = get_conversion_factor(item_doc.name, target_uom)
-				factor = flt(conversion_data.get("conversion_factor", 0))
-
-				if factor > 0:
-					return factor
-			except Exception:
-				pass
+		# Tabla de conversión del item memorizada (misma semántica que get_conversion_factor de ERPNext)
+		try:
+			factor = get_uom_conversion_factor(item_doc.name, target_uom)
+			if factor > 0:
+				return factor
+		except Exception:
+			pass
 
 		# Si no hay conversión configurada, ERROR
 		frappe.throw(
@@ -5,9 +5,14 @@ Endpoint único para obtener el estado fiscal de cualquier doctype soportado.
 Read-only — no modifica ningún documento.
 """
 
+import json
+
 import frappe
 from frappe import _
 
+# Tope de documentos por llamada a get_fiscal_ui_states (una página de list view)
+MAX_BATCH_SIZE = 500
+
 
 @frappe.whitelist()
 def get_fiscal_ui_state(doctype: str, name: str) -> dict:
@@ -57,3 +62,49 @@ def get_fiscal_ui_state(doctype: str, name: str) -> dict:
 		_("fiscal_state: doctype '{0}' no está soportado aún.").format(doctype),
 		title=_("No implementado"),
 	)
+
+
+@frappe.whitelist()
+def get_fiscal_ui_states(doctype: str, names) -> dict:
+	"""
+	Estado fiscal de varios documentos del mismo doctype (list view, dashboard).
+
+	Args:
+		doctype: DocType de los documentos
+		names: lista de nombres (o JSON), máximo MAX_BATCH_SIZE
+
+	Returns:
+		{name: estado} con la misma forma que get_fiscal_ui_state. Se omiten los
+		documentos inexistentes o que el usuario no puede leer.
+	"""
+	if isinstance(names, str):
+		names = json.loads(names)
+	names = list(dict.fromkeys(names or []))
+	if len(names) > MAX_BATCH_SIZE:
+		frappe.throw(_("Máximo {0} documentos por consulta de estado fiscal").format(MAX_BATCH_SIZE))
+	if not names:
+		return {}
+
+	if not frappe.has_permission(doctype, "read"):
+		frappe.throw(_("Sin permisos para leer {0}").format(doctype), frappe.PermissionError)
+
+	# Permisos por documento (user permissions / match conditions) en una sola consulta
+	readable = frappe.get_list(doctype, filters={"name": ["in", names]}, pluck="name")
+	if not readable:
+		return {}
+
+	if doctype == "Sales Invoice":
+		from facturacion_mexico.fiscal_state.sales_invoice_state import (
+			get_sales_invoice_fiscal_states,
+		)
+
+		return get_sales_invoice_fiscal_states(readable)
+
+	if doctype not in ("Payment Entry", "Factura Fiscal Mexico", "Complemento Pago MX"):
+		frappe.throw(
+			_("fiscal_state: doctype '{0}' no está soportado aún.").format(doctype),
+			title=_("No implementado"),
+		)
+
+	# Resto de doctypes: estado por documento (pantallas con pocos documentos)
+	return {name: get_fiscal_ui_state(doctype, name) for name in readable}
@@ -16,16 +16,22 @@ _TIMBRADO = "TIMBRADO"
 _PENDIENTE_CANCELACION = "PENDIENTE_CANCELACION"
 
 
-def get_sales_invoice_fiscal_state(si_name: str) -> dict:
+def get_sales_invoice_fiscal_state(si_name: str, *, si=None, ffm=None) -> dict:
 	"""
 	Retorna el estado fiscal completo de una Sales Invoice.
 
+	Args:
+		si_name: Nombre de la Sales Invoice
+		si: Sales Invoice ya cargada por el llamador (evita releerla)
+		ffm: FFM vinculada ya cargada por el llamador (evita releerla)
+
 	Returns:
 		dict con facts, actions y messages.
 	"""
-	si = frappe.get_doc("Sales Invoice", si_name)
+	if si is None:
+		si = frappe.get_doc("Sales Invoice", si_name)
 
-	facts = _compute_facts(si)
+	facts = _compute_facts(si, ffm)
 	actions = _compute_actions(facts)
 	messages = _compute_messages(facts)
 
@@ -38,11 +44,186 @@ def get_sales_invoice_fiscal_state(si_name: str) -> dict:
 	}
 
 
+def get_sales_invoice_fiscal_states(si_names: list[str]) -> dict[str, dict]:
+	"""
+	Estado fiscal de varias Sales Invoice con una consulta por doctype vinculado.
+
+	Returns:
+		{si_name: estado} con la misma forma que get_sales_invoice_fiscal_state.
+		Las facturas inexistentes se omiten.
+	"""
+	sis = frappe.get_all(
+		"Sales Invoice",
+		filters={"name": ["in", list(si_names)]},
+		fields=[
+			"name",
+			"docstatus",
+			"is_return",
+			"fm_es_ppd",
+			"fm_fiscal_status",
+			"fm_factura_fiscal_mx",
+			"outstanding_amount",
+			"grand_total",
+		],
+	)
+	if not sis:
+		return {}
+
+	# FFM vinculadas y sus adjuntos
+	ffm_names = list({si.fm_factura_fiscal_mx for si in sis if si.get("fm_factura_fiscal_mx")})
+	ffms = {}
+	if ffm_names:
+		ffms = {
+			ffm.name: ffm
+			for ffm in frappe.get_all(
+				"Factura Fiscal Mexico",
+				filters={"name": ["in", ffm_names]},
+				fields=["name", "status", "fm_uuid", "fm_motivo_cancelacion", "docstatus"],
+			)
+		}
+
+	files_by_ffm = {}
+	stamped = [name for name, ffm in ffms.items() if ffm.get("fm_uuid")]
+	if stamped:
+		for att in frappe.get_all(
+			"File",
+			filters={"attached_to_doctype": "Factura Fiscal Mexico", "attached_to_name": ["in", stamped]},
+			fields=["attached_to_name", "file_name"],
+		):
+			files_by_ffm.setdefault(att.attached_to_name, []).append(att.get("file_name"))
+
+	# Payment Entries y complementos
+	pe_by_si = {}
+	for ref in frappe.get_all(
+		"Payment Entry Reference",
+		filters={"reference_doctype": "Sales Invoice", "reference_name": ["in", [si.name for si in sis]]},
+		fields=["parent", "reference_name"],
+	):
+		if ref.get("parent"):
+			pe_by_si.setdefault(ref.reference_name, set()).add(ref.parent)
+
+	pe_names = list(set().union(*pe_by_si.values())) if pe_by_si else []
+	submitted_pes = set()
+	if pe_names:
+		submitted_pes = set(
+			frappe.get_all("Payment Entry", filters={"name": ["in", pe_names], "docstatus": 1}, pluck="name")
+		)
+
+	comps_by_pe = {}
+	if submitted_pes:
+		for comp in frappe.get_all(
+			"Complemento Pago MX",
+			filters={"payment_entry": ["in", list(submitted_pes)]},
+			fields=["name", "status", "payment_entry"],
+		):
+			comps_by_pe.setdefault(comp.payment_entry, []).append(comp)
+
+	states = {}
+	for si in sis:
+		ffm = ffms.get(si.get("fm_factura_fiscal_mx"))
+		si_pes = pe_by_si.get(si.name, set())
+		si_submitted = si_pes & submitted_pes
+		facts = _build_facts(
+			si,
+			ffm,
+			files_by_ffm.get(ffm.name, []) if ffm else [],
+			has_pe=bool(si_pes),
+			has_submitted_pe=bool(si_submitted),
+			comps=[comp for pe in si_submitted for comp in comps_by_pe.get(pe, [])],
+		)
+		states[si.name] = {
+			"doctype": "Sales Invoice",
+			"name": si.name,
+			"facts": facts,
+			"actions": _compute_actions(facts),
+			"messages": _compute_messages(facts),
+		}
+	return states
+
+
 # ── Facts ──────────────────────────────────────────────────────────────────
 
 
-def _compute_facts(si) -> dict:
-	"""Observa el estado real del documento y sus vínculos. Solo lee."""
+def _compute_facts(si, ffm=None) -> dict:
+	"""Observa el estado real del documento y sus vínculos. Solo lee.
+
+	`ffm` es la FFM vinculada si el llamador ya la cargó; si no, se consulta aquí.
+	"""
+	ffm_name = si.get("fm_factura_fiscal_mx") or ""
+
+	# ── FFM vinculada ─────────────────────────────────────────────────────
+	file_names = []
+	if ffm is not None:
+		if ffm.get("fm_uuid"):
+			file_names = _ffm_file_names(ffm.name)
+	elif ffm_name:
+		ffm_data = frappe.get_all(
+			"Factura Fiscal Mexico",
+			filters={"name": ffm_name},
+			fields=["name", "status", "fm_uuid", "fm_motivo_cancelacion", "docstatus"],
+			limit=1,
+		)
+		if ffm_data:
+			ffm = ffm_data[0]
+
+			if ffm.get("fm_uuid"):
+				file_names = _ffm_file_names(ffm_name)
+
+	# ── Payment Entries ───────────────────────────────────────────────────
+	pe_refs = frappe.get_all(
+		"Payment Entry Reference",
+		filters={"reference_doctype": "Sales Invoice", "reference_name": si.name},
+		fields=["parent"],
+	)
+	pe_names = [r.get("parent") for r in pe_refs if r.get("parent")]
+
+	has_submitted_pe = False
+
+	if pe_names:
+		submitted = frappe.get_all(
+			"Payment Entry",
+			filters={"name": ["in", pe_names], "docstatus": 1},
+			fields=["name"],
+			limit=1,
+		)
+		has_submitted_pe = bool(submitted)
+
+	# ── Complementos ──────────────────────────────────────────────────────
+	comps = []
+
+	if has_submitted_pe:
+		submitted_pe_names = [
+			r["name"]
+			for r in frappe.get_all(
+				"Payment Entry",
+				filters={"name": ["in", pe_names], "docstatus": 1},
+				fields=["name"],
+			)
+		]
+		if submitted_pe_names:
+			comps = frappe.get_all(
+				"Complemento Pago MX",
+				filters={"payment_entry": ["in", submitted_pe_names]},
+				fields=["name", "status"],
+			)
+
+	return _build_facts(
+		si, ffm, file_names, has_pe=bool(pe_names), has_submitted_pe=has_submitted_pe, comps=comps
+	)
+
+
+def _ffm_file_names(ffm_name: str) -> list:
+	"""Archivos adjuntos a la FFM (se verifican extensiones xml/pdf)."""
+	attachments = frappe.get_all(
+		"File",
+		filters={"attached_to_doctype": "Factura Fiscal Mexico", "attached_to_name": ffm_name},
+		fields=["file_name"],
+	)
+	return [att.get("file_name") for att in attachments]
+
+
+def _build_facts(si, ffm, file_names: list, *, has_pe: bool, has_submitted_pe: bool, comps: list) -> dict:
+	"""Deriva facts de la SI y sus vínculos ya cargados. No consulta BD."""
 
 	fiscal_status = (si.get("fm_fiscal_status") or "").upper()
 
@@ -60,8 +241,7 @@ def _compute_facts(si) -> dict:
 	}
 
 	# ── FFM vinculada ─────────────────────────────────────────────────────
-	ffm_name = si.get("fm_factura_fiscal_mx") or ""
-	facts["has_ffm"] = bool(ffm_name)
+	facts["has_ffm"] = bool(si.get("fm_factura_fiscal_mx"))
 
 	has_active_ffm = False
 	has_cancelled_ffm = False
@@ -72,41 +252,27 @@ def _compute_facts(si) -> dict:
 	has_pdf = False
 	ffm_motivo = None
 
-	if ffm_name:
-		ffm_data = frappe.get_all(
-			"Factura Fiscal Mexico",
-			filters={"name": ffm_name},
-			fields=["name", "status", "fm_uuid", "fm_motivo_cancelacion", "docstatus"],
-			limit=1,
-		)
-		if ffm_data:
-			ffm = ffm_data[0]
-			ffm_status = (ffm.get("status") or "").upper()
-			has_uuid = bool(ffm.get("fm_uuid"))
-			ffm_motivo = ffm.get("fm_motivo_cancelacion")
-
-			if ffm_status == _CANCELADO:
-				has_cancelled_ffm = True
-			elif ffm.get("docstatus") == 1:
-				has_active_ffm = True
-			elif ffm.get("docstatus") == 0:
-				has_draft_ffm = True
-
-			has_stamped_ffm = has_uuid
-
-			# Archivos: verificar adjuntos con extensión xml/pdf en la FFM
-			if has_uuid:
-				attachments = frappe.get_all(
-					"File",
-					filters={"attached_to_doctype": "Factura Fiscal Mexico", "attached_to_name": ffm_name},
-					fields=["file_name"],
-				)
-				for att in attachments:
-					name = (att.get("file_name") or "").lower()
-					if name.endswith(".xml"):
-						has_xml = True
-					if name.endswith(".pdf"):
-						has_pdf = True
+	if ffm:
+		ffm_status = (ffm.get("status") or "").upper()
+		has_uuid = bool(ffm.get("fm_uuid"))
+		ffm_motivo = ffm.get("fm_motivo_cancelacion")
+
+		if ffm_status == _CANCELADO:
+			has_cancelled_ffm = True
+		elif ffm.get("docstatus") == 1:
+			has_active_ffm = True
+		elif ffm.get("docstatus") == 0:
+			has_draft_ffm = True
+
+		has_stamped_ffm = has_uuid
+
+		if has_uuid:
+			for file_name in file_names:
+				name = (file_name or "").lower()
+				if name.endswith(".xml"):
+					has_xml = True
+				if name.endswith(".pdf"):
+					has_pdf = True
 
 	facts.update(
 		{
@@ -130,57 +296,13 @@ def _compute_facts(si) -> dict:
 	facts["is_partially_paid"] = si.docstatus == 1 and 0 < outstanding < grand_total
 
 	# ── Payment Entries ───────────────────────────────────────────────────
-	pe_refs = frappe.get_all(
-		"Payment Entry Reference",
-		filters={"reference_doctype": "Sales Invoice", "reference_name": si.name},
-		fields=["parent"],
-	)
-	pe_names = [r.get("parent") for r in pe_refs if r.get("parent")]
-
-	has_pe = bool(pe_names)
-	has_submitted_pe = False
-
-	if pe_names:
-		submitted = frappe.get_all(
-			"Payment Entry",
-			filters={"name": ["in", pe_names], "docstatus": 1},
-			fields=["name"],
-			limit=1,
-		)
-		has_submitted_pe = bool(submitted)
-
 	facts["has_payment_entries"] = has_pe
 	facts["has_submitted_payment_entries"] = has_submitted_pe
 
 	# ── Estado de complemento ─────────────────────────────────────────────
-	requires_complement = facts["is_ppd"] and has_stamped_ffm and has_submitted_pe
-	facts["requires_complement"] = requires_complement
-
-	has_complement = False
-	has_active_complement = False
-
-	if has_submitted_pe:
-		submitted_pe_names = [
-			r["name"]
-			for r in frappe.get_all(
-				"Payment Entry",
-				filters={"name": ["in", pe_names], "docstatus": 1},
-				fields=["name"],
-			)
-		]
-		if submitted_pe_names:
-			comps = frappe.get_all(
-				"Complemento Pago MX",
-				filters={"payment_entry": ["in", submitted_pe_names]},
-				fields=["name", "status"],
-			)
-			if comps:
-				has_complement = True
-				active = [c for c in comps if c.get("status") not in ("Cancelado", "Error")]
-				has_active_complement = bool(active)
-
-	facts["has_complement"] = has_complement
-	facts["has_active_complement"] = has_active_complement
+	facts["requires_complement"] = facts["is_ppd"] and has_stamped_ffm and has_submitted_pe
+	facts["has_complement"] = bool(comps)
+	facts["has_active_complement"] = any(c.get("status") not in ("Cancelado", "Error") for c in comps)
 
 	return facts
 
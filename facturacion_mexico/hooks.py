@@ -45,6 +45,7 @@ required_apps = ["erpnext"]
 # include js in doctype views
 doctype_js = {
 	"Sales Invoice": [
+		"public/js/si_fiscal_panel.js",
 		"public/js/sales_invoice.js",
 		"public/js/ereceipt_handler.js",
 		"public/js/sales_invoice_ffm_summary.js",
@@ -380,6 +381,8 @@ doc_events = {
 		"validate": "facturacion_mexico.validaciones.hooks_handlers.customer_validate.validate_rfc_format",
 		"before_save": "facturacion_mexico.validaciones.hooks_handlers.customer_validate.validate_rfc_format",
 		"after_insert": "facturacion_mexico.validaciones.hooks_handlers.customer_validate.schedule_rfc_validation",
+		"on_update": "facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+		"on_trash": "facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
 	},
 	# =============================================================================
 	# AUTOMATED TAX SYSTEM - SALES INVOICE AUTOMATION
@@ -403,6 +406,9 @@ doc_events = {
 			# E4 DISABLED: Hook corregía redistribución ERPNext post-submit
 			# "facturacion_mexico.hooks_handlers.sales_invoice_ieps.corregir_ieps_cuota_final",
 		],
+		# Tabla de métricas de alertas fiscales (conteos por compañía)
+		"on_submit": "facturacion_mexico.dashboard_fiscal.alert_engine.invalidate_metrics",
+		"on_cancel": "facturacion_mexico.dashboard_fiscal.alert_engine.invalidate_metrics",
 	},
 	# =============================================================================
 	# MULTI-SUCURSAL - CONFIGURACIÓN FISCAL
@@ -411,7 +417,20 @@ doc_events = {
 	"Branch": {
 		"validate": "facturacion_mexico.multi_sucursal.custom_fields.branch_fiscal_fields.validate_branch_fiscal_configuration",
 		"after_insert": "facturacion_mexico.multi_sucursal.custom_fields.branch_fiscal_fields.after_branch_insert",
-		"on_update": "facturacion_mexico.multi_sucursal.custom_fields.branch_fiscal_fields.on_branch_update",
+		"on_update": [
+			"facturacion_mexico.multi_sucursal.custom_fields.branch_fiscal_fields.on_branch_update",
+			"facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+			"facturacion_mexico.multi_sucursal.branch_health.on_branch_change",
+		],
+		"on_trash": [
+			"facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+			"facturacion_mexico.multi_sucursal.branch_health.on_branch_change",
+		],
+	},
+	# Certificados por sucursal - snapshot de salud usado por la auto-selección de sucursal
+	"Configuracion Fiscal Sucursal": {
+		"on_update": "facturacion_mexico.multi_sucursal.branch_health.on_certificate_config_change",
+		"on_trash": "facturacion_mexico.multi_sucursal.branch_health.on_certificate_config_change",
 	},
 	# =============================================================================
 	# COMPLEMENTOS DE PAGO - AUTOMATIZACIÓN SAT
@@ -422,9 +441,16 @@ doc_events = {
 			"facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_validate.check_ppd_requirement",
 			"facturacion_mexico.facturacion_fiscal.services.payment_entry_reclasificacion.cargar_impuestos_en_payment_entry",
 		],
-		"on_submit": "facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_submit.create_complement_if_required",
+		"on_submit": [
+			"facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_submit.create_complement_if_required",
+			"facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_submit.emit_pending_complement_event",
+			"facturacion_mexico.dashboard_fiscal.alert_engine.invalidate_metrics",
+		],
 		"before_cancel": "facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_cancel.block_cancel_if_complemento_activo",
-		"on_cancel": "facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_cancel.cancel_related_complement",
+		"on_cancel": [
+			"facturacion_mexico.complementos_pago.hooks_handlers.payment_entry_cancel.cancel_related_complement",
+			"facturacion_mexico.dashboard_fiscal.alert_engine.invalidate_metrics",
+		],
 	},
 	# =============================================================================
 	# ERECEIPTS - FACTURAPI INTEGRATION
@@ -437,9 +463,67 @@ doc_events = {
 		],
 		"after_insert": "facturacion_mexico.ereceipts.hooks_handlers.ereceipt_insert.generate_facturapi_ereceipt",
 	},
+	# Perfil fiscal de Items/UOMs memorizado por request: se descarta al cambiar el maestro
+	"Item": {
+		"on_update": [
+			"facturacion_mexico.utils.item_fiscal_profile.clear",
+			"facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+		],
+		"on_trash": [
+			"facturacion_mexico.utils.item_fiscal_profile.clear",
+			"facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+		],
+	},
+	"UOM": {
+		"on_update": "facturacion_mexico.utils.item_fiscal_profile.clear",
+		"on_trash": "facturacion_mexico.utils.item_fiscal_profile.clear",
+	},
+	# Resolución cacheada de defaults de Sales Invoice (CC, Branch, Price List, STCT, ITT)
+	**{
+		doctype: {
+			"on_update": "facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+			"on_trash": "facturacion_mexico.utils.sales_invoice_defaults.on_master_change",
+		}
+		for doctype in (
+			"Cost Center",
+			"Company",
+			"Selling Settings",
+			"Sales Taxes and Charges Template",
+			"Item Group",
+			"Item Tax Template",
+		)
+	},
+	# Índice de cuotas IEPS en memoria por empresa: los cambios publican una versión nueva
+	"IEPS Cuota SAT": {
+		"on_update": "facturacion_mexico.facturacion_fiscal.ieps_cuota_index.on_cuota_change",
+		"on_trash": "facturacion_mexico.facturacion_fiscal.ieps_cuota_index.on_cuota_change",
+	},
+	# Catálogos SAT en memoria: cualquier alta/cambio/baja publica una versión nueva a todos los workers
+	**{
+		doctype: {
+			"on_update": "facturacion_mexico.catalogos_sat.catalog_service.on_catalog_change",
+			"on_trash": "facturacion_mexico.catalogos_sat.catalog_service.on_catalog_change",
+		}
+		for doctype in (
+			"SAT Producto Servicio",
+			"Uso CFDI SAT",
+			"Regimen Fiscal SAT",
+			"Forma Pago SAT",
+			"Metodo Pago SAT",
+			"Moneda SAT",
+			"Impuesto SAT",
+		)
+	},
 	# P6.1.4d: Factura Fiscal Mexico hooks eliminados - solo logging legacy sin FiscalEventMX
 }
 
+# Fiscal Events
+# -------------
+# Suscriptores de dashboard_fiscal.fiscal_events por tipo de evento ("*" = todos)
+fm_fiscal_event_handlers = {
+	"*": ["facturacion_mexico.dashboard_fiscal.alert_engine.on_fiscal_event"],
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -459,10 +543,12 @@ scheduler_events = {
 		# bloquear la API del PAC. Durable vía estado en BD; NO reenvía cancelaciones no-sustitución.
 		"* * * * *": [
 			"facturacion_mexico.facturacion_fiscal.timbrado_api.retry_pending_substitution_cancellations",
+			# Write-behind del cache de validaciones SAT (Redis → SAT Validation Cache por lotes)
+			"facturacion_mexico.validaciones.validation_cache.flush_pending",
 		],
 		# Validación RFC automática nocturna a las 2:00 AM todos los días
 		"0 2 * * *": [
-			"facturacion_mexico.validaciones.api.run_nightly_rfc_validation",
+			"facturacion_mexico.validaciones.api.enqueue_nightly_rfc_validation",
 			"facturacion_mexico.facturacion_fiscal.tasks.cleanup_old_logs",
 		],
 	},
@@ -523,13 +609,15 @@ scheduler_events = {
 
 # Request Events
 # ----------------
-# before_request = ["facturacion_mexico.utils.before_request"]
+# Precarga de los XSD de addendas en cada worker web (una vez por proceso y sitio)
+before_request = ["facturacion_mexico.addendas.validators.xsd_schema_cache.warm_up"]
 # after_request = ["facturacion_mexico.utils.after_request"]
 
 # Job Events
 # ----------
 # before_job = ["facturacion_mexico.utils.before_job"]
-# after_job = ["facturacion_mexico.utils.after_job"]
+# El work-horse de RQ termina con el job: exportar trazas pendientes antes de salir.
+after_job = ["facturacion_mexico.utils.tracing.after_job"]
 
 # User Data Protection
 # --------------------
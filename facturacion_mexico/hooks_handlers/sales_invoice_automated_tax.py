@@ -5,71 +5,16 @@
 import json
 
 import frappe
+from frappe.utils import flt
 
+from facturacion_mexico.facturacion_fiscal import ieps_cuota_index
+from facturacion_mexico.utils import sales_invoice_defaults
 from facturacion_mexico.utils.clasificacion_items import clasificar_items_documento
+from facturacion_mexico.utils.item_fiscal_profile import get_uom_conversion_factor, load_for_document
 
 # ---- Utilidades internas -----------------------------------------------
 
 
-def _get_customer_default_cc(customer: str) -> str | None:
-	"""Cost Center por defecto del Customer (campo canónico)."""
-	if not customer:
-		return None
-	return frappe.db.get_value("Customer", customer, "fm_customer_default_cost_center")
-
-
-def _get_branch_from_cost_center(cost_center: str) -> str | None:
-	"""Mapeo 1:1 Cost Center → Branch (campo canónico)."""
-	if not cost_center:
-		return None
-	return frappe.db.get_value("Cost Center", cost_center, "fm_mapped_branch")
-
-
-def _get_customer_default_price_list(customer: str) -> str | None:
-	"""Price List por defecto del Customer (nativo ERPNext)."""
-	if not customer:
-		return None
-	# En ERPNext v15 el campo suele llamarse 'default_price_list' (Selling).
-	return frappe.db.get_value("Customer", customer, "default_price_list")
-
-
-def _get_cc_default_price_list(cost_center: str) -> str | None:
-	"""Price List por defecto del Cost Center (campo custom)."""
-	if not cost_center:
-		return None
-	return frappe.db.get_value("Cost Center", cost_center, "fm_default_selling_price_list")
-
-
-def _get_company_default_selling_price_list() -> str | None:
-	"""Price List default desde Selling Settings."""
-	return frappe.db.get_single_value("Selling Settings", "selling_price_list")
-
-
-def _pick_price_list(customer: str | None, cost_center: str | None) -> tuple[str | None, str]:
-	"""
-	Regresa (price_list, source_label) con prioridad:
-	1) Customer.default_price_list
-	2) Cost Center.fm_default_selling_price_list
-	3) Selling Settings.selling_price_list (Company default)
-	"""
-	# 1) Customer
-	pl = _get_customer_default_price_list(customer)
-	if pl:
-		return pl, "Customer.default_price_list"
-
-	# 2) Cost Center
-	pl = _get_cc_default_price_list(cost_center)
-	if pl:
-		return pl, "Cost Center.fm_default_selling_price_list"
-
-	# 3) Selling Settings
-	pl = _get_company_default_selling_price_list()
-	if pl:
-		return pl, "Selling Settings.selling_price_list"
-
-	return None, "Sin default (ninguna fuente)"
-
-
 def _maybe_set_company_address_from_branch(doc, branch: str | None):
 	"""
 	(Opcional) Si tu Branch ya tiene un Link a Address fiscal del emisor,
@@ -85,13 +30,6 @@ def _maybe_set_company_address_from_branch(doc, branch: str | None):
 	#     # Nota: No seteamos tax_category. Deja a Tax Rules/ERPNext hacer lo suyo.
 
 
-def _get_border_zone_status(branch: str | None) -> bool | None:
-	"""Verificar si la sucursal está en zona fronteriza."""
-	if not branch:
-		return None
-	return frappe.db.get_value("Branch", branch, "fm_is_border_zone")
-
-
 def _determinar_variante_stct(doc) -> str:
 	"""
 	Determinar variante STCT según clasificación items del documento.
@@ -147,26 +85,12 @@ def _find_stct_by_variant(company: str, zona: str, variant: str) -> str | None:
 	if not company:
 		return None
 
-	# Obtener company abbr
-	company_abbr = frappe.db.get_value("Company", company, "abbr")
-	if not company_abbr:
-		return None
-
-	# Patrón exacto según convención E1
-	# name = title - abbr (garantizado por ERPNext autoname en STCT)
-	title_pattern = f"IVA {zona} - {variant} - {company_abbr}"
+	# name = title - abbr (garantizado por ERPNext autoname en STCT); tabla cacheada por zona
+	_abbr, stcts = sales_invoice_defaults.stct_table(company, zona)
+	return stcts.get(variant)
 
-	# Buscar por name (siempre incluye abbr, independiente de cómo se guardó title)
-	stct = frappe.db.get_value(
-		"Sales Taxes and Charges Template",
-		{"name": title_pattern, "disabled": 0},
-		"name",
-	)
 
-	return stct
-
-
-def _set_stct_by_branch(doc, branch: str | None):
+def _set_stct_by_branch(doc, resolved):
 	"""
 	PASO 3: Seleccionar STCT automáticamente según Branch y clasificación items.
 
@@ -183,27 +107,23 @@ def _set_stct_by_branch(doc, branch: str | None):
 	NOTA E1: Fuerza carga de taxes desde STCT incluso si ya estaba asignado,
 	         para garantizar que STCT + ITT se combinen correctamente (fix issue #STCT-enabled).
 	"""
-	if not branch or not getattr(doc, "company", None):
-		return
-
-	# Verificar si es zona fronteriza
-	is_border = _get_border_zone_status(branch)
-	if is_border is None:
+	# Zona (Nacional/Frontera) y STCT disponibles vienen de la resolución cacheada
+	if not resolved.branch or not getattr(doc, "company", None) or resolved.is_border_zone is None:
 		return
 
-	# Determinar zona según Branch
-	zona = "Frontera" if is_border else "Nacional"
+	is_border = resolved.is_border_zone
+	zona = resolved.zona
 
 	# Determinar variante según clasificación items
 	variant = _determinar_variante_stct(doc)
 
 	# Buscar STCT específico
-	stct = _find_stct_by_variant(doc.company, zona, variant)
+	stct = resolved.stcts.get(variant)
 	used_fallback = False
 
 	# FALLBACK: Si no existe variante específica, buscar Básico de la misma zona
 	if not stct and variant != "Básico":
-		stct = _find_stct_by_variant(doc.company, zona, "Básico")
+		stct = resolved.stcts.get("Básico")
 		if stct:
 			used_fallback = True
 
@@ -246,7 +166,7 @@ def _set_stct_by_branch(doc, branch: str | None):
 			)
 	else:
 		# STCT no encontrado (ni específico ni Básico) - bloquear con mensaje accionable
-		company_abbr = frappe.db.get_value("Company", doc.company, "abbr")
+		company_abbr = resolved.company_abbr
 		if variant == "Básico":
 			# Si ya estaba buscando Básico y no existe
 			title_expected = f"IVA {zona} - Básico - {company_abbr}"
@@ -260,36 +180,12 @@ def _set_stct_by_branch(doc, branch: str | None):
 		frappe.throw(errormsg)
 
 
-def _get_item_master_itt(item_code: str, **kwargs) -> str | None:
-	"""
-	Obtener ITT sugerido desde el Item usando función ERPNext nativa.
-	Usa get_item_tax_template() que maneja Tax Category, rangos, etc.
-	"""
-	if not item_code:
-		return None
-
-	try:
-		from erpnext.stock.get_item_details import get_item_tax_template
-
-		args = {
-			"item_code": item_code,
-			"company": kwargs.get("company"),
-			"tax_category": kwargs.get("tax_category"),
-			"base_net_rate": kwargs.get("base_net_rate", 0),
-		}
-
-		return get_item_tax_template(args)
-	except Exception:
-		# Fallback silencioso si no funciona
-		return None
-
-
 # ---- E4: IEPS Cuota Helpers ---------------------------------------------
 
 
 def _obtener_cuotas_vigentes(company: str, clave_sat: str, fecha) -> list[dict]:
 	"""
-	Obtener cuotas IEPS vigentes desde tabla IEPS Cuota SAT.
+	Obtener cuotas IEPS vigentes desde tabla IEPS Cuota SAT (índice en memoria por empresa).
 
 	Args:
 		company: Company name
@@ -302,26 +198,7 @@ def _obtener_cuotas_vigentes(company: str, clave_sat: str, fecha) -> list[dict]:
 			- cuota: Cuota en $/UOM
 			- uom: UOM canónica SAT (LTR, H87, etc)
 	"""
-	if not company or not clave_sat or not fecha:
-		return []
-
-	return frappe.db.sql(
-		"""
-		SELECT
-			cuenta_ieps,
-			cuota,
-			uom
-		FROM `tabIEPS Cuota SAT`
-		WHERE company = %(company)s
-		  AND clave_prod_serv = %(clave_sat)s
-		  AND vigencia_desde <= %(fecha)s
-		  AND (vigencia_hasta IS NULL OR vigencia_hasta >= %(fecha)s)
-		  AND docstatus < 2
-		ORDER BY vigencia_desde DESC
-		""",
-		{"company": company, "clave_sat": clave_sat, "fecha": fecha},
-		as_dict=True,
-	)
+	return [c.as_dict() for c in ieps_cuota_index.vigentes(company, clave_sat, fecha)]
 
 
 def _convertir_cuota_a_uom_item(cuota: float, uom_base: str, item_code: str, item_uom: str) -> float:
@@ -350,12 +227,9 @@ def _convertir_cuota_a_uom_item(cuota: float, uom_base: str, item_code: str, ite
 	if uom_base == item_uom:
 		return cuota
 
-	# Obtener factor conversión usando función ERPNext nativa
+	# Factor de conversión memorizado por item (misma semántica que get_conversion_factor de ERPNext)
 	try:
-		from erpnext.stock.get_item_details import get_conversion_factor
-
-		conversion_data = get_conversion_factor(item_code, uom_base)
-		factor = conversion_data.get("conversion_factor", 0)
+		factor = get_uom_conversion_factor(item_code, uom_base)
 
 		if factor <= 0:
 			frappe.throw(
@@ -388,27 +262,27 @@ def before_validate(doc, method=None):
 	   - (Opcional) setear company_address desde Branch si existe
 	* Sin tax_category. No programamos impuestos por producto.
 	"""
+	# Encabezado + ITT de todas las líneas en una llamada (cache Redis invalidada por los maestros)
+	resolved = sales_invoice_defaults.resolve_document(doc)
+
 	# 1) Asegurar cost_center desde Customer si está vacío
-	if not getattr(doc, "cost_center", None) and getattr(doc, "customer", None):
-		cc = _get_customer_default_cc(doc.customer)
-		if cc:
-			doc.cost_center = cc
-			frappe.msgprint(
-				"Centro de Costos asignado automáticamente.",
-				alert=True,
-				indicator="blue",
-			)
+	if resolved.cost_center_from_customer:
+		doc.cost_center = resolved.cost_center
+		frappe.msgprint(
+			"Centro de Costos asignado automáticamente.",
+			alert=True,
+			indicator="blue",
+		)
 
 	# 2) Con cost_center presente (nuevo o modificado), derivar Branch y Price List
-	cc_now = getattr(doc, "cost_center", None)
-	if cc_now:
+	if getattr(doc, "cost_center", None):
 		# 2.1) Branch 1:1 desde CC
-		branch = _get_branch_from_cost_center(cc_now)
+		branch = resolved.branch
 		if branch and hasattr(doc, "fm_branch"):
 			doc.fm_branch = branch
 
-		# 2.2) Price List por prioridad
-		pl, _source = _pick_price_list(doc.customer, cc_now)
+		# 2.2) Price List por prioridad (Customer -> CC -> Company)
+		pl = resolved.price_list
 		if pl and getattr(doc, "selling_price_list", None) != pl:
 			doc.selling_price_list = pl
 			frappe.msgprint("Lista de precios asignada automáticamente.", alert=True, indicator="green")
@@ -417,17 +291,13 @@ def before_validate(doc, method=None):
 		_maybe_set_company_address_from_branch(doc, branch)
 
 		# 2.4) PASO 3: Seleccionar STCT automáticamente según Branch (fronteriza/no fronteriza)
-		_set_stct_by_branch(doc, branch)
+		_set_stct_by_branch(doc, resolved)
 
 	# 3) Para cada línea: asegurar ITT desde Item (si existe en el maestro) para excepciones 0%/Exento
+	# Líneas repetidas (mismo item y tarifa) resuelven el ITT una sola vez.
 	for row in getattr(doc, "items", []):
 		if not getattr(row, "item_tax_template", None):
-			itt = _get_item_master_itt(
-				row.item_code,
-				company=doc.company,
-				tax_category=getattr(doc, "tax_category", None),
-				base_net_rate=getattr(row, "rate", 0),
-			)
+			itt = resolved.item_tax_templates.get((row.item_code, flt(getattr(row, "rate", 0))))
 			if itt:
 				row.item_tax_template = itt
 
@@ -448,13 +318,16 @@ def validate(doc, method=None):
 	if frappe.flags.in_test:
 		return
 
+	# Perfil fiscal de todos los items en bloque (compartido con los demás validadores del request)
+	profiles = load_for_document(doc)
+
 	for i, row in enumerate(getattr(doc, "items", []) or [], start=1):
 		if not getattr(row, "item_code", None):
 			frappe.throw(f"Línea {i} sin <b>Item Code</b>. No se puede guardar la factura.")
 
 		# Verificar fm_producto_servicio_sat en Item
-		sat_field = frappe.db.get_value("Item", row.item_code, "fm_producto_servicio_sat")
-		if not sat_field:
+		profile = profiles.get(row.item_code)
+		if not (profile and profile.producto_servicio_sat):
 			frappe.throw(
 				f"Línea {i} (Item: {row.item_code}): sin <b>Clave SAT de Producto o Servicio</b> configurada. Asígnela en el artículo para poder facturar."
 			)
@@ -30,11 +30,13 @@ import json
 import frappe
 from frappe.utils import flt, today
 
-# Import para conversión UOM (IEPS Cuota siempre en litros)
-try:
-	from erpnext.stock.get_item_details import get_conversion_factor
-except ImportError:
-	get_conversion_factor = None
+from facturacion_mexico.facturacion_fiscal import ieps_cuota_index
+from facturacion_mexico.utils.item_fiscal_profile import (
+	get_item_profile,
+	get_uom_conversion_factor,
+	get_uom_conversion_factors,
+	load_for_document,
+)
 
 # =============================================================================
 # HELPERS - CONFIGURACIÓN FISCAL
@@ -128,6 +130,12 @@ def _item_contribuye_a_cuenta_ieps(item, account_head: str) -> bool:
 # =============================================================================
 
 
+def _precargar_items(doc) -> None:
+	"""Clave SAT y tablas de conversión UOM de todos los items del documento en bloque."""
+	load_for_document(doc)
+	get_uom_conversion_factors(item.item_code for item in doc.items)
+
+
 def _get_cuota_prioridad(item, account_head: str, doc) -> dict:
 	"""
 	Obtener cuota IEPS con prioridad de fuentes.
@@ -147,33 +155,13 @@ def _get_cuota_prioridad(item, account_head: str, doc) -> dict:
 	Raises:
 		frappe.ValidationError: Si no hay cuota en producción
 	"""
-	# P1: Tabla IEPS Cuota SAT
-	item_sat = frappe.db.get_value("Item", item.item_code, "fm_producto_servicio_sat")
+	# P1: Tabla IEPS Cuota SAT (índice en memoria por empresa)
+	profile = get_item_profile(item.item_code)
+	item_sat = profile.producto_servicio_sat if profile else None
 	if item_sat:
-		# Usar SQL para manejar IFNULL en vigencia_hasta
-		cuota_sat = frappe.db.sql(
-			"""
-			SELECT cuota, uom
-			FROM `tabIEPS Cuota SAT`
-			WHERE company = %(company)s
-			  AND clave_prod_serv = %(clave_prod_serv)s
-			  AND cuenta_ieps = %(cuenta_ieps)s
-			  AND vigencia_desde <= %(fecha)s
-			  AND IFNULL(vigencia_hasta, '2099-12-31') >= %(fecha)s
-			  AND docstatus < 2
-			LIMIT 1
-			""",
-			{
-				"company": doc.company,
-				"clave_prod_serv": item_sat,
-				"cuenta_ieps": account_head,
-				"fecha": today(),
-			},
-			as_dict=True,
-		)
-
-		if cuota_sat and len(cuota_sat) > 0:
-			return {"cuota": flt(cuota_sat[0].cuota), "uom_base": cuota_sat[0].uom}
+		cuota_sat = ieps_cuota_index.find(doc.company, item_sat, today(), cuenta_ieps=account_head)
+		if cuota_sat:
+			return {"cuota": flt(cuota_sat.cuota), "uom_base": cuota_sat.uom}
 
 	# P2: Error en prod, constante en desarrollo
 	if not frappe.conf.get("developer_mode"):
@@ -278,6 +266,8 @@ def calcular_ieps_cuota(doc, method=None):
 	if not doc.taxes or not doc.items:
 		return
 
+	_precargar_items(doc)
+
 	# Identificar tax rows IEPS Cuota
 	for tax_row in doc.taxes:
 		metadata = _obtener_metadata_cuenta(tax_row.account_head, doc.company)
@@ -312,18 +302,16 @@ def calcular_ieps_cuota(doc, method=None):
 			# E4: SOLO validar que conversion_factor existe
 			# ERPNext usará conversion_factor automáticamente en su cálculo
 			if item.uom != uom_base:
-				if get_conversion_factor:
-					try:
-						conversion_data = get_conversion_factor(item.item_code, uom_base)
-						conversion_factor = flt(conversion_data.get("conversion_factor", 0))
-						if conversion_factor <= 0:
-							raise ValueError("Factor de conversión 0 o negativo")
-					except Exception:
-						frappe.throw(
-							f"Item {item.item_code}: Falta conversión de UOM '{item.uom}' a '{uom_base}' para IEPS Cuota. "
-							f"Configure en: Item → UOMs",
-							title="Conversión UOM Faltante",
-						)
+				try:
+					conversion_factor = get_uom_conversion_factor(item.item_code, uom_base)
+					if conversion_factor <= 0:
+						raise ValueError("Factor de conversión 0 o negativo")
+				except Exception:
+					frappe.throw(
+						f"Item {item.item_code}: Falta conversión de UOM '{item.uom}' a '{uom_base}' para IEPS Cuota. "
+						f"Configure en: Item → UOMs",
+						title="Conversión UOM Faltante",
+					)
 
 			# E4: SOLO poner rate en item_wise_detail
 			# Formato: [cuota_por_unidad, 0] - ERPNext calculará el amount
@@ -446,6 +434,7 @@ def corregir_ieps_cuota_final(doc, method=None):
 
 	# Construir mapa cuenta → metadata
 	cuenta_metadata = _construir_mapa_metadata(config_fiscal)
+	_precargar_items(doc)
 
 	# ACCIÓN 1: Corregir IEPS Cuota item_wise_tax_detail
 	_corregir_item_wise_tax_detail_ieps_cuota(doc, cuenta_metadata)
@@ -504,13 +493,9 @@ def _corregir_item_wise_tax_detail_ieps_cuota(doc, cuenta_metadata: dict):
 				if item.uom == uom_base:
 					conversion_factor = 1.0
 				else:
-					if get_conversion_factor:
-						try:
-							conversion_data = get_conversion_factor(item.item_code, uom_base)
-							conversion_factor = flt(conversion_data.get("conversion_factor", 0))
-						except Exception:
-							conversion_factor = 0
-					else:
+					try:
+						conversion_factor = get_uom_conversion_factor(item.item_code, uom_base)
+					except Exception:
 						conversion_factor = 0
 
 					if conversion_factor <= 0:
@@ -8,6 +8,7 @@ import time
 
 import frappe
 from frappe import _
+from frappe.utils import flt, sbool
 
 
 @frappe.whitelist()
@@ -344,126 +345,42 @@ def get_rule_execution_stats(rule_name=None, date_range=None):
 
 
 @frappe.whitelist()
-def bulk_apply_rules(doctype, filters=None, dry_run=True):
-	"""Aplicar reglas masivamente a documentos existentes."""
+def bulk_apply_rules(doctype, filters=None, dry_run=True, run_id=None, max_seconds=None):
+	"""
+	Aplicar reglas masivamente a documentos existentes.
+
+	Recorre el DocType completo en bloques (ver `engine.bulk_executor`): las condiciones de campo
+	se resuelven en SQL y solo el resto se evalúa en Python. Cada llamada corre como máximo
+	`bulk_executor.REQUEST_MAX_SECONDS`; `complete=False` indica que quedan documentos y la
+	siguiente llamada con el `run_id` devuelto continúa donde quedó.
+	"""
 	try:
 		# Validar parámetros
 		if not doctype:
 			return {"success": False, "message": "DocType es requerido"}
 
-		# Parsear filtros
-		if filters and isinstance(filters, str):
-			filters = json.loads(filters)
+		from facturacion_mexico.motor_reglas.engine import bulk_executor
 
-		# Obtener reglas aplicables
-		rules = frappe.get_all(
-			"Fiscal Validation Rule",
-			filters={"apply_to_doctype": doctype, "is_active": 1, "docstatus": ["!=", 2]},
-			fields=["name", "rule_name", "rule_code", "priority"],
-			order_by="priority ASC",
-		)
-
-		if not rules:
+		if not frappe.db.exists(
+			"Fiscal Validation Rule", {"apply_to_doctype": doctype, "is_active": 1, "docstatus": ["!=", 2]}
+		):
 			return {"success": False, "message": f"No hay reglas activas para DocType '{doctype}'"}
 
-		# Obtener documentos a procesar
-		document_filters = filters or {}
-		documents = frappe.get_all(
+		result = bulk_executor.run(
 			doctype,
-			filters=document_filters,
-			fields=["name"],
-			limit=1000 if dry_run else 5000,  # Limitar para evitar timeout
+			filters,
+			dry_run=sbool(dry_run),
+			run_id=run_id or frappe.generate_hash(length=12),
+			max_seconds=min(
+				flt(max_seconds) or bulk_executor.REQUEST_MAX_SECONDS, bulk_executor.REQUEST_MAX_SECONDS
+			),
 		)
-
-		if not documents:
+		if not result["total_documents"]:
 			return {
 				"success": False,
 				"message": f"No hay documentos que coincidan con los filtros para DocType '{doctype}'",
 			}
-
-		# Procesar documentos
-		results = {
-			"processed_documents": 0,
-			"successful_rules": 0,
-			"failed_rules": 0,
-			"total_execution_time": 0,
-			"rule_results": {},
-			"errors": [],
-		}
-
-		for doc_data in documents:
-			try:
-				# Obtener documento completo
-				doc = frappe.get_doc(doctype, doc_data.name)
-
-				# Aplicar cada regla
-				for rule_info in rules:
-					try:
-						rule_doc = frappe.get_doc("Fiscal Validation Rule", rule_info.name)
-
-						start_time = time.time()
-
-						if dry_run:
-							# Solo simular ejecución
-							rule_result = rule_doc.test_rule(doc.name)
-						else:
-							# Ejecutar regla real
-							rule_result = rule_doc.execute_rule(doc)
-
-						execution_time = (time.time() - start_time) * 1000
-						results["total_execution_time"] += execution_time
-
-						# Registrar resultado
-						rule_key = f"{rule_info.rule_code}_{rule_info.name}"
-						if rule_key not in results["rule_results"]:
-							results["rule_results"][rule_key] = {
-								"rule_name": rule_info.rule_name,
-								"successful": 0,
-								"failed": 0,
-								"total_time": 0,
-								"documents": [],
-							}
-
-						rule_stats = results["rule_results"][rule_key]
-						rule_stats["total_time"] += execution_time
-						rule_stats["documents"].append(
-							{
-								"document": doc.name,
-								"success": rule_result.get("success", False),
-								"execution_time": execution_time,
-							}
-						)
-
-						if rule_result.get("success"):
-							rule_stats["successful"] += 1
-							results["successful_rules"] += 1
-						else:
-							rule_stats["failed"] += 1
-							results["failed_rules"] += 1
-
-					except Exception as rule_error:
-						results["failed_rules"] += 1
-						results["errors"].append(
-							f"Error en regla {rule_info.name} para documento {doc.name}: {rule_error}"
-						)
-
-				results["processed_documents"] += 1
-
-			except Exception as doc_error:
-				results["errors"].append(f"Error procesando documento {doc_data.name}: {doc_error}")
-
-		# Calcular estadísticas finales
-		if results["processed_documents"] > 0:
-			results["avg_execution_time"] = results["total_execution_time"] / results["processed_documents"]
-
-		return {
-			"success": True,
-			"dry_run": dry_run,
-			"doctype": doctype,
-			"total_documents": len(documents),
-			"total_rules": len(rules),
-			"results": results,
-		}
+		return result
 
 	except Exception as e:
 		frappe.log_error(f"Error in bulk apply rules: {e}")
@@ -214,6 +214,9 @@ class FiscalValidationRule(Document):
 
 		new_count = current_count + 1
 		new_avg = ((current_avg * current_count) + execution_time_ms) / new_count
+		# La ejecución masiva llama execute_rule muchas veces sobre la misma instancia
+		self.execution_count = new_count
+		self.average_execution_time = new_avg
 
 		# Actualizar campos sin triggerar hooks
 		frappe.db.set_value(
@@ -0,0 +1,409 @@
+"""
+Bulk Executor - ejecución masiva de reglas fiscales sobre documentos existentes.
+
+`bulk_apply_rules` cargaba cada documento completo con `frappe.get_doc` y corría `execute_rule`
+regla por regla (con su `get_doc` de la regla) — inviable para re-auditar un año de facturas. Aquí
+cada regla se compila una vez y se recorre el DocType en bloques:
+
+	- en una conjunción pura (todas las condiciones unidas con AND), equals/in_list/contains de un
+	  valor Static/Dynamic contra una columna de texto (Data, Link, Select) se convierten en filtros
+	  de `frappe.get_all` → predicados `WHERE`. La collation de la BD no distingue mayúsculas, acentos
+	  ni espacios finales, así que esos filtros solo descartan candidatos y la condición se vuelve a
+	  evaluar en Python. not_contains solo se empuja cuando el valor no tiene letras (NOT LIKE da
+	  exactamente lo mismo que `RuleCondition.apply_operator`) y entonces no se reevalúa
+	- el resto (comparaciones numéricas, is_set/is_not_set — un 0 guardado es "vacío" para SQL y no
+	  para la condición —, Formula, Field Reference, regex, OR/grupos) se evalúa solo en Python con
+	  las filas `Rule Condition` de la regla (`evaluate_condition`, igual que `execute_rule`) sobre
+	  filas que traen únicamente las columnas referenciadas; si alguna referencia no es columna se
+	  carga el documento completo
+	- con `dry_run=False` cada documento que cumple pasa por `execute_rule` (acciones y estadísticas
+	  de ejecución de la regla)
+	- paginación por `name` (keyset) en bloques de `CHUNK_SIZE`, con progreso vía `publish_progress`
+	- checkpoint en Redis por `run_id` (regla en curso, último `name` y resultados acumulados): si
+	  se agota `max_seconds` la siguiente ejecución con el mismo `run_id` continúa donde quedó
+
+Uso:
+
+	from facturacion_mexico.motor_reglas.engine import bulk_executor
+
+	result = bulk_executor.run("Sales Invoice", {"posting_date": ["between", ["2024-01-01", "2024-12-31"]]})
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+import frappe
+from frappe import _
+from frappe.model import default_fields, no_value_fields, table_fields
+
+from facturacion_mexico.motor_reglas.engine.rule_evaluator import RuleEvaluator
+
+CHUNK_SIZE = 500
+MAX_DOCUMENTS_PER_RULE = 200
+CHECKPOINT_KEY_PREFIX = "fm_bulk_rules"
+CHECKPOINT_TTL_SECONDS = 3 * 86400
+# Ventana máxima de una llamada web (`bulk_apply_rules`); el resto continúa con el mismo `run_id`
+REQUEST_MAX_SECONDS = 20
+
+# Operadores de RuleCondition.apply_operator con un predicado SQL que no descarta filas que la
+# condición aceptaría; los demás se evalúan solo en Python
+_SQL_OPERATORS = {
+	"equals": "=",
+	"in_list": "in",
+	"contains": "like",
+	"not_contains": "not like",
+}
+
+# Columnas cuyo valor en BD es el mismo texto que compara RuleCondition
+_TEXT_FIELDTYPES = ("Data", "Link", "Select")
+_TEXT_DEFAULT_FIELDS = ("name", "owner", "modified_by")
+
+
+@dataclass
+class CompiledRule:
+	"""Regla lista para ejecución masiva: filtros SQL + condiciones residuales en Python."""
+
+	name: str
+	rule_code: str
+	rule_name: str
+	filters: list = field(default_factory=list)
+	residual: list = field(default_factory=list)
+	fields: list[str] = field(default_factory=lambda: ["name"])
+	needs_document: bool = False
+	rule_doc: object = None
+
+	@property
+	def key(self) -> str:
+		return f"{self.rule_code}_{self.name}"
+
+
+def compile_rule(rule_doc, doctype: str) -> CompiledRule:
+	"""Separar las condiciones de la regla en filtros empujables a SQL y condiciones residuales."""
+	meta = frappe.get_meta(doctype)
+	conditions = list(rule_doc.conditions or [])
+	compiled = CompiledRule(
+		name=rule_doc.name, rule_code=rule_doc.rule_code, rule_name=rule_doc.rule_name, rule_doc=rule_doc
+	)
+
+	# Solo una conjunción pura se puede repartir entre SQL y Python sin cambiar el resultado
+	conjunction = all(c.logical_operator == "AND" for c in conditions[:-1])
+	for condition in conditions:
+		sql_filter = _pushdown_filter(condition, meta) if conjunction else None
+		if sql_filter:
+			compiled.filters.append(sql_filter)
+		if not sql_filter or condition.operator != "not_contains":
+			compiled.residual.append(condition)
+
+	referenced = dict.fromkeys(f for c in compiled.residual for f in _referenced_fields(c))
+	columns = [f for f in referenced if _is_column(meta, f)]
+	compiled.fields.extend(f for f in columns if f != "name")
+	compiled.needs_document = len(columns) < len(referenced)
+	return compiled
+
+
+def iter_chunks(
+	doctype: str, filters: list, fields: list[str], after: str | None = None, chunk_size=CHUNK_SIZE
+):
+	"""Filas de `doctype` ordenadas por `name`, en bloques, empezando después de `after`."""
+	while True:
+		rows = frappe.get_all(
+			doctype,
+			filters=[*filters, ["name", ">", after]] if after else filters,
+			fields=fields,
+			order_by="name asc",
+			limit_page_length=chunk_size,
+		)
+		if not rows:
+			return
+		yield rows
+		if len(rows) < chunk_size:
+			return
+		after = rows[-1].name
+
+
+def run(
+	doctype: str,
+	filters=None,
+	dry_run: bool = True,
+	run_id: str | None = None,
+	max_seconds: float | None = None,
+	chunk_size: int = CHUNK_SIZE,
+) -> dict:
+	"""
+	Evaluar (y con `dry_run=False` ejecutar las acciones de) las reglas activas de `doctype`.
+
+	Args:
+		doctype: DocType de los documentos
+		filters: filtros de los documentos (dict o lista, formato `frappe.get_all`)
+		dry_run: solo evaluar condiciones, sin ejecutar acciones
+		run_id: identificador del checkpoint; None = sin checkpoint
+		max_seconds: ventana máxima; al agotarse se guarda el cursor y se devuelve `complete=False`
+
+	Returns:
+		dict con `total_documents`, `total_rules`, `results`, `cursor` y `complete`
+	"""
+	base_filters = _filter_list(filters)
+	rules = [compile_rule(rule_doc, doctype) for rule_doc in _active_rules(doctype)]
+	checkpoint = load_checkpoint(run_id)
+	cursor = checkpoint.get("cursor") or {"rule": 0, "after": None}
+	results = checkpoint.get("results") or _new_results()
+	total_documents = frappe.db.count(doctype, filters=base_filters) if rules else 0
+	deadline = time.monotonic() + max_seconds if max_seconds else None
+	evaluator = RuleEvaluator()
+
+	while cursor["rule"] < len(rules):
+		rule = rules[cursor["rule"]]
+		stats = results["rule_results"].setdefault(rule.key, _new_rule_stats(rule))
+		filters_sql = [*base_filters, *rule.filters]
+		if cursor["after"] is None:
+			stats["candidates"] = (
+				frappe.db.count(doctype, filters=filters_sql) if rule.filters else total_documents
+			)
+
+		for rows in iter_chunks(doctype, filters_sql, rule.fields, cursor["after"], chunk_size):
+			start_time = time.time()
+			for row in rows:
+				_apply_to_row(rule, row, doctype, dry_run, evaluator, stats, results)
+			elapsed = (time.time() - start_time) * 1000
+			stats["total_time"] += elapsed
+			results["total_execution_time"] += elapsed
+			cursor["after"] = rows[-1].name
+			_publish_progress(rules, cursor["rule"], stats)
+
+			if deadline and time.monotonic() > deadline:
+				save_checkpoint(run_id, {"cursor": cursor, "results": results})
+				return _response(
+					doctype, dry_run, run_id, total_documents, rules, results, cursor, complete=False
+				)
+
+		# Los documentos descartados por SQL también son evaluaciones exitosas (condición no cumplida)
+		results["successful_rules"] += total_documents - stats["failed"]
+		results["failed_rules"] += stats["failed"]
+		cursor = {"rule": cursor["rule"] + 1, "after": None}
+
+	results["processed_documents"] = total_documents
+	if total_documents:
+		results["avg_execution_time"] = results["total_execution_time"] / total_documents
+	save_checkpoint(run_id, None)
+	frappe.logger().info(
+		f"Bulk rules {doctype}: {total_documents} documents, {len(rules)} rules, "
+		f"{sum(s['matched'] for s in results['rule_results'].values())} matches"
+	)
+	return _response(doctype, dry_run, run_id, total_documents, rules, results, cursor, complete=True)
+
+
+def load_checkpoint(run_id: str | None) -> dict:
+	if not run_id:
+		return {}
+	try:
+		return frappe.cache().get_value(f"{CHECKPOINT_KEY_PREFIX}:{run_id}") or {}
+	except Exception:
+		return {}
+
+
+def save_checkpoint(run_id: str | None, state: dict | None) -> None:
+	if not run_id:
+		return
+	key = f"{CHECKPOINT_KEY_PREFIX}:{run_id}"
+	try:
+		if state:
+			frappe.cache().set_value(key, state, expires_in_sec=CHECKPOINT_TTL_SECONDS)
+		else:
+			frappe.cache().delete_value(key)
+	except Exception:
+		frappe.logger().warning(f"No se pudo guardar el checkpoint de reglas masivas {run_id}", exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _active_rules(doctype: str) -> list:
+	"""Reglas activas y vigentes hoy (mismo criterio que `execute_rule`), por prioridad."""
+	today = frappe.utils.today()
+	names = frappe.get_all(
+		"Fiscal Validation Rule",
+		filters={"apply_to_doctype": doctype, "is_active": 1, "docstatus": ["!=", 2]},
+		pluck="name",
+		order_by="priority ASC, creation ASC",
+	)
+	rules = []
+	for name in names:
+		rule_doc = frappe.get_doc("Fiscal Validation Rule", name)
+		if rule_doc.effective_date and today < str(rule_doc.effective_date):
+			continue
+		if rule_doc.expiry_date and today > str(rule_doc.expiry_date):
+			continue
+		rules.append(rule_doc)
+	return rules
+
+
+def _pushdown_filter(condition, meta) -> list | None:
+	"""Filtro `[campo, operador, valor]` que conserva toda fila que acepta la condición, o None."""
+	operator = _SQL_OPERATORS.get(condition.operator)
+	if (
+		condition.condition_type != "Field"
+		or not operator
+		or condition.value_type not in ("Static", "Dynamic")
+		or not _is_text_column(meta, condition.field_name)
+		or not condition.value
+	):
+		# Sin valor la condición compara contra None; no hay predicado SQL equivalente
+		return None
+
+	value = condition.value
+	if condition.value_type == "Dynamic":
+		value = condition.resolve_dynamic_value()
+	if not value or not isinstance(value, str):
+		return None
+
+	if condition.operator == "in_list":
+		value = _parse_list(value)
+		# Un número de una lista JSON nunca es == al texto de la columna; en SQL se convertiría
+		if value is None or not all(isinstance(v, str) for v in value):
+			return None
+	elif condition.operator == "not_contains" and not _collation_neutral(value):
+		# NOT LIKE sin distinguir mayúsculas descartaría filas que la condición acepta
+		return None
+	elif condition.operator in ("contains", "not_contains"):
+		value = f"%{_escape_like(value)}%"
+	return [condition.field_name, operator, value]
+
+
+def _escape_like(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _collation_neutral(value: str) -> bool:
+	"""La collation no cambia la comparación: sin letras (mayúsculas/acentos) y solo ASCII."""
+	return value.isascii() and not any(c.isalpha() for c in value)
+
+
+def _parse_list(value: str) -> list | None:
+	try:
+		if value.startswith("["):
+			parsed = json.loads(value)
+			return parsed if isinstance(parsed, list) else None
+		return [v.strip() for v in value.split(",")]
+	except (json.JSONDecodeError, ValueError, TypeError):
+		return None
+
+
+def _referenced_fields(condition):
+	"""Campos del documento que lee `RuleCondition.evaluate_condition`."""
+	if condition.condition_type != "Field":
+		return
+	yield condition.field_name
+	if condition.value_type == "Field Reference" and condition.value:
+		yield condition.value
+
+
+def _is_text_column(meta, fieldname: str | None) -> bool:
+	if fieldname in _TEXT_DEFAULT_FIELDS:
+		return True
+	df = meta.get_field(fieldname) if fieldname else None
+	return bool(df) and df.fieldtype in _TEXT_FIELDTYPES
+
+
+def _is_column(meta, fieldname: str | None) -> bool:
+	if not fieldname:
+		return False
+	if fieldname in default_fields:
+		return True
+	df = meta.get_field(fieldname)
+	return bool(df) and df.fieldtype not in table_fields and df.fieldtype not in no_value_fields
+
+
+def _filter_list(filters) -> list:
+	if filters and isinstance(filters, str):
+		filters = json.loads(filters)
+	if isinstance(filters, dict):
+		return [
+			[key, *value] if isinstance(value, list | tuple) and len(value) == 2 else [key, "=", value]
+			for key, value in filters.items()
+		]
+	return [list(f) for f in filters or []]
+
+
+def _apply_to_row(rule: CompiledRule, row, doctype: str, dry_run: bool, evaluator, stats, results) -> None:
+	stats["evaluated"] += 1
+	try:
+		document = frappe.get_doc(doctype, row.name) if rule.needs_document else SimpleNamespace(**row)
+		# Igual que FiscalValidationRule.evaluate_conditions: cada fila Rule Condition se evalúa con su
+		# propio evaluate_condition, solo que restringido a las condiciones que no resolvió SQL
+		if rule.residual and not evaluator.evaluate_conditions(rule.residual, document):
+			return
+
+		stats["matched"] += 1
+		if len(stats["documents"]) < MAX_DOCUMENTS_PER_RULE:
+			stats["documents"].append(row.name)
+		if not dry_run:
+			if not rule.needs_document:
+				document = frappe.get_doc(doctype, row.name)
+			# execute_rule vuelve a evaluar sobre el documento completo y registra las estadísticas
+			outcome = rule.rule_doc.execute_rule(document)
+			if not outcome.get("success"):
+				raise frappe.ValidationError(outcome.get("error"))
+			if outcome.get("executed"):
+				stats["executed"] += 1
+	except Exception as e:
+		stats["failed"] += 1
+		results["errors"].append(f"Error en regla {rule.name} para documento {row.name}: {e}")
+
+
+def _publish_progress(rules: list, rule_index: int, stats: dict) -> None:
+	candidates = stats["candidates"] or 1
+	percent = (rule_index + min(stats["evaluated"] / candidates, 1)) / len(rules) * 100
+	try:
+		frappe.publish_progress(
+			percent,
+			title=_("Aplicando reglas fiscales"),
+			description=f"{stats['rule_code']}: {stats['evaluated']}/{stats['candidates']}",
+		)
+	except Exception:
+		pass
+
+
+def _new_results() -> dict:
+	return {
+		"processed_documents": 0,
+		"successful_rules": 0,
+		"failed_rules": 0,
+		"total_execution_time": 0,
+		"rule_results": {},
+		"errors": [],
+	}
+
+
+def _new_rule_stats(rule: CompiledRule) -> dict:
+	return {
+		"rule_name": rule.rule_name,
+		"rule_code": rule.rule_code,
+		"sql_conditions": len(rule.filters),
+		"python_conditions": len(rule.residual),
+		"loads_document": rule.needs_document,
+		"candidates": 0,
+		"evaluated": 0,
+		"matched": 0,
+		"executed": 0,
+		"failed": 0,
+		"total_time": 0,
+		"documents": [],
+	}
+
+
+def _response(doctype, dry_run, run_id, total_documents, rules, results, cursor, complete: bool) -> dict:
+	return {
+		"success": True,
+		"dry_run": dry_run,
+		"doctype": doctype,
+		"total_documents": total_documents,
+		"total_rules": len(rules),
+		"results": results,
+		"cursor": cursor,
+		"complete": complete,
+		"run_id": run_id,
+	}
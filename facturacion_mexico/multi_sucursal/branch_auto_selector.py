@@ -4,6 +4,9 @@
 """
 Branch Auto Selector - Sprint 6 Phase 2 Step 5
 Auto-selección inteligente de sucursal por usuario en Sales Invoice
+
+La puntuación es un paso en memoria sobre el snapshot de salud de la compañía
+(`branch_health`) y los permisos de usuario cacheados por Frappe.
 """
 
 from typing import Any
@@ -11,6 +14,7 @@ from typing import Any
 import frappe
 from frappe import _
 
+from . import branch_health
 from .branch_manager import BranchManager
 
 
@@ -24,14 +28,22 @@ class BranchAutoSelector:
 		self.company = company
 		self.user = user or frappe.session.user
 		self.branch_manager = BranchManager(company)
+		self._health_snapshot = None
+		self._preferred_names = None
+
+	def get_health_snapshot(self) -> dict[str, dict]:
+		"""Snapshot de salud de las sucursales fiscales de la compañía (una lectura por instancia)"""
+		if self._health_snapshot is None:
+			self._health_snapshot = branch_health.get_snapshot(self.company)
+		return self._health_snapshot
 
 	def select_best_branch_for_invoice(self, sales_invoice_doc: Any = None) -> dict[str, Any]:
 		"""
 		Seleccionar la mejor sucursal para una factura
 		"""
 		try:
-			# Obtener sucursales fiscales disponibles
-			available_branches = self.branch_manager.get_fiscal_branches()
+			# Obtener sucursales fiscales disponibles (con su salud precalculada)
+			available_branches = list(self.get_health_snapshot().values())
 
 			if not available_branches:
 				return {
@@ -76,31 +88,29 @@ class BranchAutoSelector:
 		Obtener sucursales preferidas por el usuario
 		"""
 		try:
-			# Buscar en configuraciones del usuario
-			user_preferences = frappe.get_all(
-				"User Permission",
-				filters={"user": self.user, "document_type": "Branch", "allow": "Branch"},
-				fields=["for_value as branch"],
+			names = self._get_user_preferred_names()
+			if not names:
+				return []
+
+			return frappe.get_all(
+				"Branch",
+				filters={"name": ["in", names], "fm_enable_fiscal": 1},
+				fields=["name", "branch", "fm_enable_fiscal", "fm_lugar_expedicion"],
 			)
 
-			preferred_branches = []
-			for pref in user_preferences:
-				branch_data = frappe.get_value(
-					"Branch",
-					pref.branch,
-					["name", "branch", "fm_enable_fiscal", "fm_lugar_expedicion"],
-					as_dict=True,
-				)
-
-				if branch_data and branch_data.get("fm_enable_fiscal"):
-					preferred_branches.append(branch_data)
-
-			return preferred_branches
-
 		except Exception as e:
 			frappe.log_error(f"Error getting user preferred branches: {e!s}", "User Branch Preferences")
 			return []
 
+	def _get_user_preferred_names(self) -> list[str]:
+		"""Sucursales permitidas al usuario (User Permission sobre Branch, cacheadas por Frappe)"""
+		if self._preferred_names is None:
+			from frappe.core.doctype.user_permission.user_permission import get_user_permissions
+
+			permissions = get_user_permissions(self.user).get("Branch", [])
+			self._preferred_names = list(dict.fromkeys(p.get("doc") for p in permissions if p.get("doc")))
+		return self._preferred_names
+
 	def _evaluate_and_select_branch(
 		self, available_branches: list[dict], sales_invoice_doc: Any = None
 	) -> dict | None:
@@ -108,9 +118,8 @@ class BranchAutoSelector:
 		Evaluar sucursales disponibles y seleccionar la mejor
 		"""
 		try:
-			# Obtener sucursales preferidas del usuario
-			user_preferred = self.get_user_preferred_branches()
-			user_preferred_names = [b["name"] for b in user_preferred]
+			# Sucursales preferidas del usuario (solo cuentan las disponibles, ya fiscales)
+			user_preferred_names = self._get_user_preferred_names()
 
 			# Lista de candidatos con puntuación
 			candidates = []
@@ -158,8 +167,8 @@ class BranchAutoSelector:
 			if branch["name"] in user_preferred_names:
 				score += 50
 
-			# Evaluar estado de salud de la sucursal
-			health_status = self._get_branch_health_status(branch["name"])
+			# Evaluar estado de salud de la sucursal (precalculado en el snapshot)
+			health_status = branch.get("health") or self._get_branch_health_status(branch["name"])
 
 			if health_status.get("semaforo") == "verde":
 				score += 30
@@ -197,9 +206,14 @@ class BranchAutoSelector:
 
 	def _get_branch_health_status(self, branch_name: str) -> dict:
 		"""
-		Obtener estado de salud de la sucursal usando BranchFolioManager
+		Obtener estado de salud de la sucursal: snapshot de la compañía o, si la sucursal
+		no está en él, BranchFolioManager
 		"""
 		try:
+			entry = self.get_health_snapshot().get(branch_name)
+			if entry:
+				return entry["health"]
+
 			from .branch_folio_manager import BranchFolioManager
 
 			folio_manager = BranchFolioManager(branch_name)
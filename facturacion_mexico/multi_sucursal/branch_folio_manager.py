@@ -82,13 +82,16 @@ class BranchFolioManager:
 
 			# Limpiar cache
 			self._folio_status_cache = None
+			folio_status = self.get_folio_status()
+			self._refresh_health_snapshot()
+			self._emit_folio_events(sales_invoice_name, serie_folio, folio_status)
 
 			return {
 				"success": True,
 				"message": f"Folio {serie_folio} reservado exitosamente",
 				"folio": next_folio,
 				"serie_folio": serie_folio,
-				"semaforo_status": self.get_folio_status()["semaforo"],
+				"semaforo_status": folio_status["semaforo"],
 			}
 
 		except Exception as e:
@@ -102,6 +105,35 @@ class BranchFolioManager:
 				"serie_folio": None,
 			}
 
+	def _refresh_health_snapshot(self) -> None:
+		"""Actualizar la entrada de la sucursal en el snapshot de salud, al confirmar el folio"""
+		from facturacion_mexico.multi_sucursal import branch_health
+
+		branch_health.refresh_branch_on_commit(self.branch, self._get_branch_doc().get("company"))
+
+	def _emit_folio_events(self, sales_invoice_name: str, serie_folio: str, folio_status: dict) -> None:
+		"""Eventos fiscales de reserva y de folios por agotarse, al confirmar la reserva"""
+		from facturacion_mexico.dashboard_fiscal import fiscal_events
+
+		company = self._get_branch_doc().get("company")
+		fiscal_events.emit_on_commit(
+			fiscal_events.FOLIO_RESERVED,
+			company,
+			branch=self.branch,
+			reference_doctype="Sales Invoice",
+			reference_name=sales_invoice_name,
+			serie_folio=serie_folio,
+		)
+		if folio_status.get("semaforo") == "rojo":
+			fiscal_events.emit_on_commit(
+				fiscal_events.FOLIOS_LOW,
+				company,
+				branch=self.branch,
+				reference_doctype="Sales Invoice",
+				reference_name=sales_invoice_name,
+				remaining_folios=folio_status.get("remaining_folios"),
+			)
+
 	def release_folio(self, sales_invoice_name: str) -> dict[str, Any]:
 		"""
 		Liberar folio reservado (en caso de cancelación de factura)
@@ -130,6 +162,7 @@ class BranchFolioManager:
 
 			if reservation.folio_number == current_folio:
 				frappe.db.set_value("Branch", self.branch, "fm_folio_current", current_folio - 1)
+				self._refresh_health_snapshot()
 
 			# Limpiar cache
 			self._folio_status_cache = None
@@ -239,58 +272,11 @@ class BranchFolioManager:
 		try:
 			branch_doc = self._get_branch_doc()
 
-			current_folio = branch_doc.get("fm_folio_current", 0)
-			end_folio = branch_doc.get("fm_folio_end", 0)
-			warning_threshold = branch_doc.get("fm_folio_warning_threshold", 100)
-
-			if end_folio == 0:
-				# Folios ilimitados
-				return {
-					"semaforo": "verde",
-					"status": "unlimited",
-					"message": "Folios ilimitados",
-					"current_folio": current_folio,
-					"remaining_folios": "∞",
-					"percentage_used": 0,
-					"can_generate": True,
-				}
-
-			remaining_folios = end_folio - current_folio
-			percentage_used = (current_folio / end_folio) * 100
-
-			# Determinar semáforo
-			if remaining_folios <= 0:
-				semaforo = "rojo"
-				status = "agotado"
-				message = "Folios agotados"
-				can_generate = False
-			elif remaining_folios <= warning_threshold:
-				semaforo = "rojo"
-				status = "critico"
-				message = f"Folios críticos: quedan {remaining_folios}"
-				can_generate = True
-			elif percentage_used >= 80:
-				semaforo = "amarillo"
-				status = "advertencia"
-				message = f"Advertencia: {percentage_used:.1f}% de folios utilizados"
-				can_generate = True
-			else:
-				semaforo = "verde"
-				status = "normal"
-				message = f"Estado normal: {remaining_folios} folios disponibles"
-				can_generate = True
-
-			return {
-				"semaforo": semaforo,
-				"status": status,
-				"message": message,
-				"current_folio": current_folio,
-				"end_folio": end_folio,
-				"remaining_folios": remaining_folios,
-				"percentage_used": round(percentage_used, 1),
-				"warning_threshold": warning_threshold,
-				"can_generate": can_generate,
-			}
+			return folio_status(
+				branch_doc.get("fm_folio_current", 0),
+				branch_doc.get("fm_folio_end", 0),
+				branch_doc.get("fm_folio_warning_threshold", 100),
+			)
 
 		except Exception as e:
 			frappe.log_error(
@@ -421,6 +407,63 @@ class BranchFolioManager:
 		}
 
 
+def folio_status(current_folio, end_folio, warning_threshold=100) -> dict[str, Any]:
+	"""Semáforo de folios a partir de los valores de la sucursal. No consulta BD."""
+	current_folio = current_folio or 0
+	end_folio = end_folio or 0
+	if warning_threshold is None:
+		warning_threshold = 100
+
+	if end_folio == 0:
+		# Folios ilimitados
+		return {
+			"semaforo": "verde",
+			"status": "unlimited",
+			"message": "Folios ilimitados",
+			"current_folio": current_folio,
+			"remaining_folios": "∞",
+			"percentage_used": 0,
+			"can_generate": True,
+		}
+
+	remaining_folios = end_folio - current_folio
+	percentage_used = (current_folio / end_folio) * 100
+
+	# Determinar semáforo
+	if remaining_folios <= 0:
+		semaforo = "rojo"
+		status = "agotado"
+		message = "Folios agotados"
+		can_generate = False
+	elif remaining_folios <= warning_threshold:
+		semaforo = "rojo"
+		status = "critico"
+		message = f"Folios críticos: quedan {remaining_folios}"
+		can_generate = True
+	elif percentage_used >= 80:
+		semaforo = "amarillo"
+		status = "advertencia"
+		message = f"Advertencia: {percentage_used:.1f}% de folios utilizados"
+		can_generate = True
+	else:
+		semaforo = "verde"
+		status = "normal"
+		message = f"Estado normal: {remaining_folios} folios disponibles"
+		can_generate = True
+
+	return {
+		"semaforo": semaforo,
+		"status": status,
+		"message": message,
+		"current_folio": current_folio,
+		"end_folio": end_folio,
+		"remaining_folios": remaining_folios,
+		"percentage_used": round(percentage_used, 1),
+		"warning_threshold": warning_threshold,
+		"can_generate": can_generate,
+	}
+
+
 # APIs públicas
 
 
@@ -0,0 +1,184 @@
+# Copyright (c) 2025, Frappe Technologies and contributors
+# For license information, please see license.txt
+
+"""
+Branch Health - snapshot de salud de sucursales por compañía.
+
+La auto-selección de sucursal puntuaba cada sucursal recalculando sus folios desde la BD
+(un `BranchFolioManager` por sucursal). Aquí se mantiene, por compañía, un hash en Redis con
+una entrada por sucursal fiscal: sus campos de Branch, el semáforo de folios (`health`) y el
+estado de certificados. La selección lo lee completo y puntúa en memoria.
+
+	- se construye con dos consultas (Branch y Configuracion Fiscal Sucursal) la primera vez
+	  que se lee, o después de invalidarse
+	- reservar/liberar folio y guardar la Configuracion Fiscal Sucursal actualizan solo la entrada
+	  de esa sucursal al confirmar la transacción (`refresh_branch_on_commit`); guardar o borrar una
+	  Branch invalida el snapshot de su compañía
+	- `SNAPSHOT_TTL` es la red de seguridad para escrituras que no pasan por los hooks
+"""
+
+import json
+import pickle
+from functools import partial
+from typing import Any
+
+import frappe
+
+from .branch_folio_manager import folio_status
+from .branch_manager import FISCAL_BRANCH_FIELDS, BranchManager
+
+SNAPSHOT_PREFIX = "fm_branch_health:"
+SNAPSHOT_TTL = 6 * 60 * 60
+
+# Campo del hash que marca el snapshot como completo (no solo entradas sueltas)
+_BUILT = "__built__"
+
+
+def get_snapshot(company: str) -> dict[str, dict[str, Any]]:
+	"""{branch: entrada} de las sucursales fiscales de la compañía."""
+	try:
+		stored = frappe.cache().hgetall(_key(company))
+	except Exception:
+		stored = {}
+	# RedisWrapper.hgetall devuelve los campos del hash como bytes
+	stored = {(k.decode() if isinstance(k, bytes) else k): v for k, v in stored.items()}
+
+	if stored.pop(_BUILT, None):
+		return stored
+
+	snapshot = build_snapshot(company)
+	_write(company, snapshot, replace=True)
+	return snapshot
+
+
+def build_snapshot(company: str) -> dict[str, dict[str, Any]]:
+	"""Calcular el snapshot completo desde la BD."""
+	branches = BranchManager(company).get_fiscal_branches()
+	certificates = _certificate_ids([b["name"] for b in branches])
+	return {b["name"]: _entry(b, certificates.get(b["name"], [])) for b in branches}
+
+
+def refresh_branch(branch: str, company: str | None = None) -> None:
+	"""Recalcular la entrada de una sucursal si el snapshot de su compañía ya existe."""
+	try:
+		company = company or frappe.db.get_value("Branch", branch, "company")
+		if not company or not frappe.cache().hget(_key(company), _BUILT):
+			return
+
+		rows = frappe.get_all(
+			"Branch",
+			filters={"name": branch, "company": company, "fm_enable_fiscal": 1},
+			fields=FISCAL_BRANCH_FIELDS,
+		)
+		if not rows:
+			frappe.cache().hdel(_key(company), branch)
+			return
+
+		certificates = _certificate_ids([branch])
+		_write(company, {branch: _entry(rows[0], certificates.get(branch, []))})
+	except Exception:
+		frappe.logger().warning(f"No se pudo actualizar la salud de la sucursal {branch}", exc_info=True)
+
+
+def refresh_branch_on_commit(branch: str, company: str | None = None) -> None:
+	"""`refresh_branch` al confirmar la transacción: antes, otro worker leería folios sin confirmar."""
+	try:
+		after_commit = frappe.db.after_commit
+	except AttributeError:
+		# Sin conexión a BD (scripts): no hay transacción que esperar.
+		refresh_branch(branch, company)
+		return
+	after_commit.add(partial(refresh_branch, branch, company))
+
+
+def invalidate(company: str | None) -> None:
+	"""Descartar el snapshot de la compañía; se reconstruye en la siguiente lectura."""
+	if not company:
+		return
+	try:
+		frappe.cache().delete_value(_key(company))
+	except Exception:
+		pass
+
+
+def on_branch_change(doc, method=None) -> None:
+	"""doc_event on_update/on_trash de Branch: altas, bajas o cambios de configuración fiscal."""
+	invalidate(doc.get("company"))
+	previous = doc.get_doc_before_save() if method == "on_update" else None
+	if previous and previous.get("company") != doc.get("company"):
+		invalidate(previous.get("company"))
+
+
+def on_certificate_config_change(doc, method=None) -> None:
+	"""doc_event on_update/on_trash de Configuracion Fiscal Sucursal (certificados de la sucursal)."""
+	if not doc.get("branch"):
+		return
+	if method == "on_trash":
+		# La configuración aún existe durante on_trash: reconstruir en la siguiente lectura
+		invalidate(frappe.db.get_value("Branch", doc.branch, "company"))
+	else:
+		refresh_branch_on_commit(doc.branch)
+
+
+def _entry(branch: dict, certificate_ids: list) -> dict[str, Any]:
+	shared = bool(branch.get("fm_share_certificates", 1))
+	if certificate_ids:
+		certificate_status = "especificos"
+	elif shared:
+		certificate_status = "compartidos"
+	else:
+		certificate_status = "sin_certificados"
+
+	return {
+		**branch,
+		"health": folio_status(
+			branch.get("fm_folio_current"),
+			branch.get("fm_folio_end"),
+			branch.get("fm_folio_warning_threshold"),
+		),
+		"certificates": {
+			"shared": shared,
+			"specific_certificates": len(certificate_ids),
+			"status": certificate_status,
+		},
+	}
+
+
+def _certificate_ids(branches: list[str]) -> dict[str, list]:
+	"""{branch: certificate_ids} de Configuracion Fiscal Sucursal en una consulta."""
+	if not branches:
+		return {}
+
+	result = {}
+	for config in frappe.get_all(
+		"Configuracion Fiscal Sucursal",
+		filters={"branch": ["in", branches]},
+		fields=["branch", "certificate_ids"],
+	):
+		try:
+			result[config.branch] = json.loads(config.certificate_ids) if config.certificate_ids else []
+		except json.JSONDecodeError:
+			result[config.branch] = []
+	return result
+
+
+def _write(company: str, entries: dict[str, dict], replace: bool = False) -> None:
+	"""Escribir entradas en el hash (mismo formato pickle que `RedisWrapper.hset`)."""
+	try:
+		cache = frappe.cache()
+		redis_key = cache.make_key(_key(company))
+		mapping = {name: pickle.dumps(entry) for name, entry in entries.items()}
+		pipe = cache.pipeline()
+		if replace:
+			pipe.delete(redis_key)
+			mapping[_BUILT] = pickle.dumps(True)
+		if mapping:
+			pipe.hset(redis_key, mapping=mapping)
+		pipe.expire(redis_key, SNAPSHOT_TTL)
+		pipe.execute()
+	except Exception:
+		frappe.logger().warning(f"No se pudo guardar la salud de sucursales de {company}", exc_info=True)
+
+
+def _key(company: str) -> str:
+	return f"{SNAPSHOT_PREFIX}{company}"
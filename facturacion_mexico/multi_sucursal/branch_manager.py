@@ -14,6 +14,18 @@ from frappe import _
 
 from .certificate_selector import MultibranchCertificateManager
 
+# Campos de Branch que usan la selección de sucursal y el cálculo de folios
+FISCAL_BRANCH_FIELDS = [
+	"name",
+	"branch",
+	"fm_lugar_expedicion",
+	"fm_serie_pattern",
+	"fm_share_certificates",
+	"fm_folio_current",
+	"fm_folio_end",
+	"fm_folio_warning_threshold",
+]
+
 
 class BranchManager:
 	"""
@@ -40,16 +52,7 @@ class BranchManager:
 					self._fiscal_branches = frappe.get_all(
 						"Branch",
 						filters={"company": self.company, "fm_enable_fiscal": 1},
-						fields=[
-							"name",
-							"branch",
-							"fm_lugar_expedicion",
-							"fm_serie_pattern",
-							"fm_share_certificates",
-							"fm_folio_current",
-							"fm_folio_end",
-							"fm_folio_warning_threshold",
-						],
+						fields=FISCAL_BRANCH_FIELDS,
 					)
 				except Exception as e:
 					frappe.log_error(f"Error querying with fiscal fields: {e}", "Branch Manager")
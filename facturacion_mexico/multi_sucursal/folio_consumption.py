@@ -0,0 +1,81 @@
+# Copyright (c) 2025, Frappe Technologies and contributors
+# For license information, please see license.txt
+
+"""
+Folio Consumption - serie diaria de consumo de folios por (sucursal, serie).
+
+Los reportes de folios consultaban Sales Invoice por cada fila (promedio diario, tendencia
+mensual). Aquí se obtiene, en una sola consulta agrupada por corrida, el número de facturas
+por día para todas las sucursales del reporte; promedios, tendencias y proyecciones de
+agotamiento se calculan en memoria sobre esa serie.
+"""
+
+import math
+from datetime import date, timedelta
+
+import frappe
+from frappe.utils import getdate
+
+# Ventana de cálculo del promedio diario y de cada mitad de la tendencia mensual
+WINDOW_DAYS = 30
+
+# days_remaining cuando no hay consumo o no quedan folios (sin proyección válida)
+NO_PROJECTION_DAYS = 999999
+
+
+def get_daily_folio_consumption(
+	branches: list[str], today: date, window_days: int = WINDOW_DAYS
+) -> dict[tuple[str, str], dict[date, int]]:
+	"""{(branch, serie): {posting_date: facturas}} desde `today - 2 * window_days`."""
+	if not branches:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+		SELECT
+			fm_branch as branch,
+			fm_serie_cfdi as serie,
+			posting_date,
+			COUNT(*) as invoice_count
+		FROM `tabSales Invoice`
+		WHERE docstatus = 1
+		AND fm_branch IN %(branches)s
+		AND posting_date >= %(since)s
+		GROUP BY fm_branch, fm_serie_cfdi, posting_date
+	""",
+		{"branches": tuple(branches), "since": today - timedelta(days=2 * window_days)},
+		as_dict=True,
+	)
+
+	consumption = {}
+	for row in rows:
+		consumption.setdefault((row.branch, row.serie), {})[getdate(row.posting_date)] = row.invoice_count
+	return consumption
+
+
+def window_counts(series: dict[date, int], today: date, window_days: int = WINDOW_DAYS) -> tuple[int, int]:
+	"""(facturas de la ventana actual, facturas de la ventana anterior)."""
+	current_start = today - timedelta(days=window_days)
+	previous_start = today - timedelta(days=2 * window_days)
+
+	current = previous = 0
+	for posting_date, count in series.items():
+		if posting_date >= current_start:
+			current += count
+		elif posting_date >= previous_start:
+			previous += count
+	return current, previous
+
+
+def calculate_depletion_projections(
+	folios_remaining: list[int], daily_averages: list[float], today: date
+) -> list[tuple[date | None, int]]:
+	"""[(fecha de agotamiento, días restantes)] para todas las filas en una pasada."""
+	projections = []
+	for remaining, average in zip(folios_remaining, daily_averages, strict=True):
+		if average <= 0 or remaining <= 0:
+			projections.append((None, NO_PROJECTION_DAYS))
+			continue
+		days = math.ceil(remaining / average)
+		projections.append((today + timedelta(days=days), days))
+	return projections
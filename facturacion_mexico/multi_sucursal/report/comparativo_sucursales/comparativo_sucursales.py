@@ -4,12 +4,20 @@
 """
 Comparativo de Sucursales - Sprint 6 Phase 5
 Reporte comparativo de performance entre sucursales
+
+Las métricas por sucursal (promedio diario, crecimiento, addendas, tiempo de timbrado, errores)
+salen de una sola consulta agrupada por sucursal (`get_branch_metrics`): el número de consultas
+no depende de cuántas sucursales tenga el reporte.
 """
 
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 import frappe
 from frappe import _
+from frappe.utils import getdate
+
+# Métricas que requiere cada tipo de comparación (además de la consulta principal)
+METRIC_COMPARISONS = ("Volumen", "Cumplimiento", "Eficiencia", "Completo")
 
 
 def execute(filters=None):
@@ -209,7 +217,13 @@ def get_data(filters):
 	if benchmark_branch:
 		benchmark_data = next((row for row in branch_data if row["branch"] == benchmark_branch), None)
 
+	metrics = {}
+	if comparison_type in METRIC_COMPARISONS:
+		metrics = get_branch_metrics([row["branch"] for row in branch_data], filters)
+
 	for row in branch_data:
+		branch_metrics = metrics.get(row["branch"], {})
+
 		# Calcular métricas básicas
 		row["total_invoices"] = row["total_invoices"] or 0
 		row["total_amount"] = row["total_amount"] or 0
@@ -223,8 +237,8 @@ def get_data(filters):
 
 		# Métricas de volumen
 		if comparison_type in ["Volumen", "Completo"]:
-			row["daily_average"] = calculate_daily_average(row["branch"], filters)
-			row["growth_rate"] = calculate_growth_rate(row["branch"], filters)
+			row["daily_average"] = calculate_daily_average(branch_metrics, filters)
+			row["growth_rate"] = calculate_growth_rate(branch_metrics)
 			row["market_share"] = (
 				(row["total_amount"] / total_period_amount * 100) if total_period_amount > 0 else 0
 			)
@@ -234,12 +248,12 @@ def get_data(filters):
 			row["stamping_success_rate"] = (
 				(row["stamped_invoices"] / row["total_invoices"] * 100) if row["total_invoices"] > 0 else 0
 			)
-			row["addendas_compliance"] = calculate_addendas_compliance(row["branch"], filters)
+			row["addendas_compliance"] = calculate_addendas_compliance(branch_metrics)
 
 		# Métricas de eficiencia
 		if comparison_type in ["Eficiencia", "Completo"]:
-			row["avg_stamping_time"] = calculate_avg_stamping_time(row["branch"], filters)
-			row["error_rate"] = calculate_error_rate(row["branch"], filters)
+			row["avg_stamping_time"] = calculate_avg_stamping_time(branch_metrics)
+			row["error_rate"] = calculate_error_rate(branch_metrics)
 			row["efficiency_score"] = calculate_efficiency_score(row)
 
 		# Ranking y comparación vs benchmark
@@ -292,193 +306,118 @@ def get_branch_conditions(filters):
 	return " ".join(conditions)
 
 
-def calculate_daily_average(branch, filters):
-	"""Calcular promedio diario de facturas"""
-	try:
-		from_date = filters.get("from_date")
-		to_date = filters.get("to_date")
-
-		if not from_date or not to_date:
-			return 0
-
-		date_diff = (to_date - from_date).days + 1
-
-		invoice_count = frappe.db.count(
-			"Sales Invoice",
-			{"fm_branch": branch, "docstatus": 1, "posting_date": ["between", [from_date, to_date]]},
-		)
+def get_branch_metrics(branches, filters):
+	"""
+	Métricas de todas las sucursales en una consulta agrupada por sucursal.
 
-		return round(invoice_count / date_diff, 1) if date_diff > 0 else 0
+	El rango leído abarca el período anterior (mismo número de días, para el crecimiento) y el
+	período del filtro; cada métrica es un agregado condicional sobre su período.
 
-	except Exception:
-		return 0
+	Returns:
+		{branch: {period_invoices, current_amount, previous_amount, required_addendas,
+		with_addendas, avg_stamping_time, unstamped_invoices}}
+	"""
+	from_date = filters.get("from_date")
+	to_date = filters.get("to_date")
+	if not branches or not from_date or not to_date:
+		return {}
 
+	from_date, to_date = getdate(from_date), getdate(to_date)
+	prev_from = from_date - timedelta(days=(to_date - from_date).days + 1)
+	values = {"branches": tuple(branches), "from_date": from_date, "to_date": to_date, "prev_from": prev_from}
 
-def calculate_growth_rate(branch, filters):
-	"""Calcular tasa de crecimiento vs período anterior"""
 	try:
-		from_date = filters.get("from_date")
-		to_date = filters.get("to_date")
-
-		if not from_date or not to_date:
-			return 0
-
-		# Período actual con manejo defensivo
-		try:
-			current_amount = (
-				frappe.db.sql(
-					"""
-				SELECT SUM(grand_total)
-				FROM `tabSales Invoice`
-				WHERE fm_branch = %s
-				AND docstatus = 1
-				AND posting_date BETWEEN %s AND %s
-			""",
-					(branch, from_date, to_date),
-				)[0][0]
-				or 0
-			)
-		except Exception as e:
-			frappe.log_error(
-				f"Error calculating current amount for branch {branch}: {e}", "Growth Calculation"
-			)
-			current_amount = 0
-
-		# Período anterior (mismo rango de días)
-		date_diff = (to_date - from_date).days
-		prev_from = from_date - timedelta(days=date_diff + 1)
-		prev_to = from_date - timedelta(days=1)
-
-		try:
-			previous_amount = (
-				frappe.db.sql(
-					"""
-				SELECT SUM(grand_total)
-				FROM `tabSales Invoice`
-				WHERE fm_branch = %s
-				AND docstatus = 1
-				AND posting_date BETWEEN %s AND %s
-			""",
-					(branch, prev_from, prev_to),
-				)[0][0]
-				or 0
-			)
-		except Exception as e:
-			frappe.log_error(
-				f"Error calculating previous amount for branch {branch}: {e}", "Growth Calculation"
-			)
-			previous_amount = 0
+		rows = frappe.db.sql(
+			"""
+			SELECT
+				si.fm_branch as branch,
+				COUNT(CASE WHEN si.posting_date >= %(from_date)s THEN 1 END) as period_invoices,
+				SUM(CASE WHEN si.posting_date >= %(from_date)s THEN si.grand_total END) as current_amount,
+				SUM(CASE WHEN si.posting_date < %(from_date)s THEN si.grand_total END) as previous_amount,
+				COUNT(
+					CASE WHEN si.posting_date >= %(from_date)s AND c.fm_requires_addenda = 1 THEN 1 END
+				) as required_addendas,
+				COUNT(
+					CASE WHEN si.posting_date >= %(from_date)s AND c.fm_requires_addenda = 1
+						AND si.fm_addenda_xml IS NOT NULL THEN 1 END
+				) as with_addendas,
+				AVG(
+					CASE WHEN si.posting_date >= %(from_date)s AND si.fm_cfdi_xml IS NOT NULL
+						THEN TIMESTAMPDIFF(SECOND, si.creation, si.modified) END
+				) as avg_stamping_time,
+				COUNT(
+					CASE WHEN si.posting_date >= %(from_date)s
+						AND (si.fm_cfdi_xml IS NULL OR si.fm_cfdi_xml = '') THEN 1 END
+				) as unstamped_invoices
+			FROM `tabSales Invoice` si
+			LEFT JOIN `tabCustomer` c ON c.name = si.customer
+			WHERE si.fm_branch IN %(branches)s
+			AND si.docstatus = 1
+			AND si.posting_date BETWEEN %(prev_from)s AND %(to_date)s
+			GROUP BY si.fm_branch
+		""",
+			values,
+			as_dict=True,
+		)
+	except Exception as e:
+		frappe.log_error(f"Error calculating branch metrics: {e}", "Branch Comparison Report")
+		return {}
 
-		if previous_amount == 0:
-			return 0
+	return {row.branch: row for row in rows}
 
-		growth = ((current_amount - previous_amount) / previous_amount) * 100
-		return round(growth, 2)
 
-	except Exception:
-		return 0
+def calculate_daily_average(metrics, filters):
+	"""Calcular promedio diario de facturas"""
+	from_date = filters.get("from_date")
+	to_date = filters.get("to_date")
 
+	if not from_date or not to_date:
+		return 0
 
-def calculate_addendas_compliance(branch, filters):
-	"""Calcular cumplimiento de addendas"""
-	try:
-		# Facturas que requieren addenda
-		required_addendas = (
-			frappe.db.sql(
-				"""
-			SELECT COUNT(*)
-			FROM `tabSales Invoice` si
-			INNER JOIN `tabCustomer` c ON c.name = si.customer
-			WHERE si.fm_branch = %s
-			AND si.docstatus = 1
-			AND si.posting_date BETWEEN %s AND %s
-			AND c.fm_requires_addenda = 1
-		""",
-				(branch, filters.get("from_date"), filters.get("to_date")),
-			)[0][0]
-			or 0
-		)
+	date_diff = (getdate(to_date) - getdate(from_date)).days + 1
+	invoice_count = metrics.get("period_invoices") or 0
 
-		# Facturas con addenda generada
-		with_addendas = (
-			frappe.db.sql(
-				"""
-			SELECT COUNT(*)
-			FROM `tabSales Invoice` si
-			INNER JOIN `tabCustomer` c ON c.name = si.customer
-			WHERE si.fm_branch = %s
-			AND si.docstatus = 1
-			AND si.posting_date BETWEEN %s AND %s
-			AND c.fm_requires_addenda = 1
-			AND si.fm_addenda_xml IS NOT NULL
-		""",
-				(branch, filters.get("from_date"), filters.get("to_date")),
-			)[0][0]
-			or 0
-		)
+	return round(invoice_count / date_diff, 1) if date_diff > 0 else 0
 
-		if required_addendas == 0:
-			return 100  # Sin requerimientos = 100% cumplimiento
 
-		return round((with_addendas / required_addendas) * 100, 2)
+def calculate_growth_rate(metrics):
+	"""Calcular tasa de crecimiento vs período anterior (mismo rango de días)"""
+	current_amount = metrics.get("current_amount") or 0
+	previous_amount = metrics.get("previous_amount") or 0
 
-	except Exception:
+	if previous_amount == 0:
 		return 0
 
+	growth = ((current_amount - previous_amount) / previous_amount) * 100
+	return round(growth, 2)
 
-def calculate_avg_stamping_time(branch, filters):
-	"""Calcular tiempo promedio de timbrado"""
-	try:
-		# Simulado - en implementación real vendría de logs
-		result = frappe.db.sql(
-			"""
-			SELECT AVG(TIMESTAMPDIFF(SECOND, creation, modified)) as avg_time
-			FROM `tabSales Invoice`
-			WHERE fm_branch = %s
-			AND docstatus = 1
-			AND fm_cfdi_xml IS NOT NULL
-			AND posting_date BETWEEN %s AND %s
-		""",
-			(branch, filters.get("from_date"), filters.get("to_date")),
-		)
 
-		return round(result[0][0] or 30, 2)  # Default 30 segundos
+def calculate_addendas_compliance(metrics):
+	"""Calcular cumplimiento de addendas"""
+	required_addendas = metrics.get("required_addendas") or 0
 
-	except Exception:
-		return 30
+	if required_addendas == 0:
+		return 100  # Sin requerimientos = 100% cumplimiento
 
+	return round(((metrics.get("with_addendas") or 0) / required_addendas) * 100, 2)
 
-def calculate_error_rate(branch, filters):
-	"""Calcular tasa de errores"""
-	try:
-		total_attempts = frappe.db.count(
-			"Sales Invoice",
-			{
-				"fm_branch": branch,
-				"docstatus": 1,
-				"posting_date": ["between", [filters.get("from_date"), filters.get("to_date")]],
-			},
-		)
 
-		# Simular errores basado en facturas sin timbrar
-		errors = frappe.db.count(
-			"Sales Invoice",
-			{
-				"fm_branch": branch,
-				"docstatus": 1,
-				"fm_cfdi_xml": ["is", "not set"],
-				"posting_date": ["between", [filters.get("from_date"), filters.get("to_date")]],
-			},
-		)
+def calculate_avg_stamping_time(metrics):
+	"""Calcular tiempo promedio de timbrado"""
+	# Simulado - en implementación real vendría de logs
+	return round(metrics.get("avg_stamping_time") or 30, 2)  # Default 30 segundos
 
-		if total_attempts == 0:
-			return 0
 
-		return round((errors / total_attempts) * 100, 2)
+def calculate_error_rate(metrics):
+	"""Calcular tasa de errores"""
+	total_attempts = metrics.get("period_invoices") or 0
 
-	except Exception:
+	if total_attempts == 0:
 		return 0
 
+	# Simular errores basado en facturas sin timbrar
+	return round(((metrics.get("unstamped_invoices") or 0) / total_attempts) * 100, 2)
+
 
 def calculate_efficiency_score(row):
 	"""Calcular score de eficiencia (0-100)"""
@@ -143,13 +143,16 @@ def get_data(filters):
 		frappe.log_error(f"Error executing consolidado fiscal query: {e}", "Consolidado Fiscal Report")
 		data = []
 
+	# Configuración fiscal vigente de todas las sucursales en una consulta
+	configs = get_active_fiscal_configs([row["branch"] for row in data if row["branch"]])
+
 	# Enriquecer datos con información adicional
 	for row in data:
 		# Información de folios
-		row["folio_usage"] = get_folio_usage(row["branch"])
+		row["folio_usage"] = get_folio_usage(row["branch"], configs)
 
 		# Estado del certificado
-		row["certificate_status"] = get_certificate_status(row["branch"])
+		row["certificate_status"] = get_certificate_status(row["branch"], configs)
 
 		# Manejar sucursal sin definir
 		if not row["branch"]:
@@ -187,77 +190,76 @@ def get_conditions(filters):
 	return " AND " + " AND ".join(conditions) if conditions else ""
 
 
-def get_folio_usage(branch):
-	"""Obtener información de uso de folios"""
-	if not branch or branch == "Sin Sucursal":
-		return "N/A"
+def get_active_fiscal_configs(branches):
+	"""{branch: configuración fiscal activa más reciente} en una sola consulta"""
+	if not branches:
+		return {}
 
 	try:
-		folio_info = frappe.db.sql(
+		rows = frappe.db.sql(
 			"""
 			SELECT
+				parent as branch,
 				folio_current,
 				folio_end,
-				(folio_end - folio_current) as available
+				(folio_end - folio_current) as available,
+				certificate_expiry_date,
+				DATEDIFF(certificate_expiry_date, CURDATE()) as days_to_expiry
 			FROM `tabConfiguracion Fiscal Sucursal`
-			WHERE parent = %s AND parenttype = 'Branch' AND is_active = 1
+			WHERE parent IN %(branches)s AND parenttype = 'Branch' AND is_active = 1
 			ORDER BY creation DESC
-			LIMIT 1
 		""",
-			branch,
+			{"branches": tuple(branches)},
 			as_dict=True,
 		)
+	except Exception:
+		# Misma señal que antes por sucursal: "Error" en folios y certificado
+		return None
 
-		if folio_info:
-			info = folio_info[0]
-			used_percentage = (
-				((info["folio_current"] / info["folio_end"]) * 100) if info["folio_end"] > 0 else 0
-			)
-			return f"{info['available']} disp. ({used_percentage:.1f}% usado)"
+	configs = {}
+	for row in rows:
+		configs.setdefault(row["branch"], row)
+	return configs
 
-		return "Sin configurar"
 
-	except Exception:
+def get_folio_usage(branch, configs):
+	"""Obtener información de uso de folios"""
+	if not branch or branch == "Sin Sucursal":
+		return "N/A"
+
+	if configs is None:
 		return "Error"
 
+	info = configs.get(branch)
+	if info:
+		used_percentage = ((info["folio_current"] / info["folio_end"]) * 100) if info["folio_end"] > 0 else 0
+		return f"{info['available']} disp. ({used_percentage:.1f}% usado)"
+
+	return "Sin configurar"
+
 
-def get_certificate_status(branch):
+def get_certificate_status(branch, configs):
 	"""Obtener estado del certificado"""
 	if not branch or branch == "Sin Sucursal":
 		return "N/A"
 
-	try:
-		cert_info = frappe.db.sql(
-			"""
-			SELECT
-				certificate_expiry_date,
-				DATEDIFF(certificate_expiry_date, CURDATE()) as days_to_expiry
-			FROM `tabConfiguracion Fiscal Sucursal`
-			WHERE parent = %s AND parenttype = 'Branch' AND is_active = 1
-			ORDER BY creation DESC
-			LIMIT 1
-		""",
-			branch,
-			as_dict=True,
-		)
-
-		if cert_info:
-			info = cert_info[0]
-			days = info["days_to_expiry"]
+	if configs is None:
+		return "Error"
 
-			if days < 0:
-				return "⚠️ Vencido"
-			elif days <= 7:
-				return f"🔴 Vence en {days} días"
-			elif days <= 30:
-				return f"🟡 Vence en {days} días"
-			else:
-				return f"✅ Válido ({days} días)"
+	info = configs.get(branch)
+	if info:
+		days = info["days_to_expiry"]
 
-		return "Sin certificado"
+		if days < 0:
+			return "⚠️ Vencido"
+		elif days <= 7:
+			return f"🔴 Vence en {days} días"
+		elif days <= 30:
+			return f"🟡 Vence en {days} días"
+		else:
+			return f"✅ Válido ({days} días)"
 
-	except Exception:
-		return "Error"
+	return "Sin certificado"
 
 
 def get_summary(data, filters):
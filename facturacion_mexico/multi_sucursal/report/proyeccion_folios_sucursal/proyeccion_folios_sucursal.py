@@ -6,12 +6,18 @@ Proyección de Folios por Sucursal - Sprint 6 Phase 5
 Reporte para proyectar agotamiento de folios por sucursal
 """
 
-import math
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import frappe
 from frappe import _
 
+from facturacion_mexico.multi_sucursal.folio_consumption import (
+	WINDOW_DAYS,
+	calculate_depletion_projections,
+	get_daily_folio_consumption,
+	window_counts,
+)
+
 
 def execute(filters=None):
 	"""Ejecutar reporte de proyección de folios"""
@@ -147,9 +153,10 @@ def get_data(filters):
 
 	fiscal_configs = frappe.db.sql(query, filters, as_dict=True)
 
-	data = []
 	today = datetime.now().date()
+	consumption = get_daily_folio_consumption(list({config["branch"] for config in fiscal_configs}), today)
 
+	rows = []
 	for config in fiscal_configs:
 		# Calcular estadísticas básicas
 		folios_used = config.get("folio_current", 1) - config.get("folio_start", 1)
@@ -157,43 +164,50 @@ def get_data(filters):
 		folios_remaining = total_folios - folios_used
 		usage_percentage = (folios_used / total_folios * 100) if total_folios > 0 else 0
 
-		# Calcular tendencias de uso
-		daily_average = calculate_daily_average(config["branch"], config["serie"])
-		monthly_trend = calculate_monthly_trend(config["branch"], config["serie"])
-
-		# Proyectar fecha de agotamiento
-		projected_date, days_remaining = calculate_depletion_projection(
-			folios_remaining, daily_average, today
+		# Calcular tendencias de uso sobre la serie diaria ya agrupada
+		series = consumption.get((config["branch"], config["serie"] or "DEFAULT"), {})
+
+		rows.append(
+			{
+				"branch": config["branch"],
+				"branch_name": config["branch_name"],
+				"serie": config["serie"] or "DEFAULT",
+				"folio_start": config["folio_start"],
+				"folio_end": config["folio_end"],
+				"folio_current": config["folio_current"],
+				"folios_used": folios_used,
+				"folios_remaining": folios_remaining,
+				"usage_percentage": usage_percentage,
+				"daily_average": calculate_daily_average(series, today),
+				"monthly_trend": calculate_monthly_trend(series, today),
+			}
 		)
 
+	# Proyectar fechas de agotamiento de todas las series a la vez
+	projections = calculate_depletion_projections(
+		[row["folios_remaining"] for row in rows], [row["daily_average"] for row in rows], today
+	)
+
+	data = []
+	for row, (projected_date, days_remaining) in zip(rows, projections, strict=True):
 		# Determinar nivel de riesgo
 		risk_level = determine_risk_level(
-			usage_percentage, days_remaining, alert_threshold, months_ahead * 30
+			row["usage_percentage"], days_remaining, alert_threshold, months_ahead * 30
 		)
 
 		# Recomendaciones
 		recommended_action = get_recommended_action(
-			risk_level, days_remaining, folios_remaining, monthly_trend
+			risk_level, days_remaining, row["folios_remaining"], row["monthly_trend"]
 		)
 
-		row = {
-			"branch": config["branch"],
-			"branch_name": config["branch_name"],
-			"serie": config["serie"] or "DEFAULT",
-			"folio_start": config["folio_start"],
-			"folio_end": config["folio_end"],
-			"folio_current": config["folio_current"],
-			"folios_used": folios_used,
-			"folios_remaining": folios_remaining,
-			"usage_percentage": usage_percentage,
-			"daily_average": daily_average,
-			"monthly_trend": monthly_trend,
-			"projected_depletion_date": projected_date,
-			"days_remaining": days_remaining,
-			"risk_level": risk_level,
-			"recommended_action": recommended_action,
-		}
-
+		row.update(
+			{
+				"projected_depletion_date": projected_date,
+				"days_remaining": days_remaining,
+				"risk_level": risk_level,
+				"recommended_action": recommended_action,
+			}
+		)
 		data.append(row)
 
 	return data
@@ -215,80 +229,22 @@ def get_conditions(filters):
 	return " AND " + " AND ".join(conditions) if conditions else ""
 
 
-def calculate_daily_average(branch, serie):
-	"""Calcular promedio diario de uso de folios"""
-	try:
-		# Obtener facturas de los últimos 30 días
-		result = frappe.db.sql(
-			"""
-			SELECT COUNT(*) as invoice_count
-			FROM `tabSales Invoice`
-			WHERE fm_branch = %s
-			AND fm_serie_cfdi = %s
-			AND docstatus = 1
-			AND posting_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-		""",
-			(branch, serie or "DEFAULT"),
-		)
-
-		invoice_count = result[0][0] if result else 0
-		return round(invoice_count / 30.0, 2)
-
-	except Exception:
-		return 0.0
+def calculate_daily_average(series, today):
+	"""Calcular promedio diario de uso de folios (últimos 30 días)"""
+	current, _previous = window_counts(series, today)
+	return round(current / float(WINDOW_DAYS), 2)
 
 
-def calculate_monthly_trend(branch, serie):
+def calculate_monthly_trend(series, today):
 	"""Calcular tendencia mensual de uso"""
-	try:
-		# Comparar últimos 30 días vs 30 días anteriores
-		current_month = frappe.db.sql(
-			"""
-			SELECT COUNT(*) as count
-			FROM `tabSales Invoice`
-			WHERE fm_branch = %s
-			AND fm_serie_cfdi = %s
-			AND docstatus = 1
-			AND posting_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-		""",
-			(branch, serie or "DEFAULT"),
-		)
-
-		previous_month = frappe.db.sql(
-			"""
-			SELECT COUNT(*) as count
-			FROM `tabSales Invoice`
-			WHERE fm_branch = %s
-			AND fm_serie_cfdi = %s
-			AND docstatus = 1
-			AND posting_date >= DATE_SUB(CURDATE(), INTERVAL 60 DAY)
-			AND posting_date < DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-		""",
-			(branch, serie or "DEFAULT"),
-		)
-
-		current = current_month[0][0] if current_month else 0
-		previous = previous_month[0][0] if previous_month else 1
+	# Comparar últimos 30 días vs 30 días anteriores
+	current, previous = window_counts(series, today)
 
-		if previous == 0:
-			return 0.0
-
-		trend = ((current - previous) / previous) * 100
-		return round(trend, 2)
-
-	except Exception:
+	if previous == 0:
 		return 0.0
 
-
-def calculate_depletion_projection(folios_remaining, daily_average, today):
-	"""Calcular proyección de agotamiento"""
-	if daily_average <= 0 or folios_remaining <= 0:
-		return None, 999999  # Sin proyección válida
-
-	days_to_depletion = math.ceil(folios_remaining / daily_average)
-	projected_date = today + timedelta(days=days_to_depletion)
-
-	return projected_date, days_to_depletion
+	trend = ((current - previous) / previous) * 100
+	return round(trend, 2)
 
 
 def determine_risk_level(usage_percentage, days_remaining, alert_threshold, projection_period):
@@ -1,3 +1,4 @@
+/* global fm_si_panel */
 // Sales Invoice customizations for Facturacion Mexico - ARQUITECTURA MIGRADA
 // Funcionalidad fiscal centralizada en Factura Fiscal Mexico
 
@@ -6,7 +7,7 @@ function norm(x) {
 	return (x || "").toString().trim().toUpperCase();
 }
 
-// Cargar configuración de estados fiscales al inicio
+// Configuración de estados fiscales: llega con el panel fiscal; load_fiscal_states es el respaldo
 let FISCAL_STATES = null;
 
 // Función para obtener estados fiscales desde el servidor
@@ -28,32 +29,27 @@ function load_fiscal_states(callback) {
 	});
 }
 
-// Cargar estados al inicio
-load_fiscal_states();
-
 frappe.ui.form.on("Sales Invoice", {
 	refresh: function (frm) {
 		frm.remove_custom_button(__("Crear Factura Fiscal"));
 		frm.remove_custom_button(__("Abrir Factura Fiscal"));
 
-		if (frm.doc.docstatus !== 1) return;
-
-		// Estado fiscal centralizado — decide Timbrar y Ver Factura Fiscal
-		frappe.call({
-			method: "facturacion_mexico.fiscal_state.api.get_fiscal_ui_state",
-			args: { doctype: "Sales Invoice", name: frm.doc.name },
-			callback(r) {
-				if (!r.message) return;
-				const { actions } = r.message;
-				// Estado autoritativo del servidor: guardarlo en el frm para que cualquier vía
-				// (incluidas las asíncronas) respete can_stamp al decidir dibujar el botón.
-				frm.__fm_can_stamp = actions.can_stamp === true;
-				// Limpiar SIEMPRE la acción primaria antes de decidir.
-				frm.page.clear_primary_action();
-				if (actions.can_view_ffm) add_view_fiscal_button(frm);
-				// can_stamp: condiciones técnicas OK — RFC check decide si mostrar o avisar
-				if (actions.can_stamp) _check_rfc_and_show_timbrar(frm);
-			},
+		// Panel fiscal compartido (si_fiscal_panel.js) — trae también los estados fiscales
+		fm_si_panel.get(frm).then((panel) => {
+			if (!panel) return;
+			FISCAL_STATES = FISCAL_STATES || panel.fiscal_states;
+			if (frm.doc.docstatus !== 1 || !panel.fiscal_state) return;
+
+			// Estado fiscal centralizado — decide Timbrar y Ver Factura Fiscal
+			const { actions } = panel.fiscal_state;
+			// Estado autoritativo del servidor: guardarlo en el frm para que cualquier vía
+			// (incluidas las asíncronas) respete can_stamp al decidir dibujar el botón.
+			frm.__fm_can_stamp = actions.can_stamp === true;
+			// Limpiar SIEMPRE la acción primaria antes de decidir.
+			frm.page.clear_primary_action();
+			if (actions.can_view_ffm) add_view_fiscal_button(frm);
+			// can_stamp: condiciones técnicas OK — RFC check decide si mostrar o avisar
+			if (actions.can_stamp) _check_rfc_and_show_timbrar(frm);
 		});
 	},
 });
@@ -1,4 +1,4 @@
-/* global _check_rfc_and_show_timbrar */
+/* global _check_rfc_and_show_timbrar, fm_si_panel */
 frappe.ui.form.on("Sales Invoice", {
 	refresh(frm) {
 		// Solo interesa cuando está submitida
@@ -7,14 +7,12 @@ frappe.ui.form.on("Sales Invoice", {
 		// Bloquear Create y mostrar aviso si FFM está cancelada fiscalmente
 		_block_si_if_ffm_cancelada(frm);
 
-		// Consulta si se puede cancelar
-		frappe
-			.call({
-				method: "facturacion_mexico.validaciones.sales_invoice_cancel_guard.can_cancel_sales_invoice",
-				args: { si_name: frm.doc.name },
-			})
-			.then((r) => {
-				const res = r.message || {};
+		// Consulta si se puede cancelar (panel fiscal compartido)
+		fm_si_panel
+			.get(frm)
+			.then((panel) => {
+				if (!panel || !panel.cancel) return;
+				const res = panel.cancel;
 				if (!res.allowed) {
 					hide_cancel_button(frm);
 					// indicador opcional
@@ -1,3 +1,4 @@
+/* global fm_si_panel */
 frappe.ui.form.on("Sales Invoice", {
 	refresh(frm) {
 		inject_ffm_summary(frm);
@@ -25,13 +26,14 @@ function inject_ffm_summary(frm) {
 		<i class="fa fa-spinner fa-spin"></i> Cargando información fiscal...
 	</div>`);
 
-	frappe
-		.call({
-			method: "facturacion_mexico.api.ffm_summary.get_ffm_summary",
-			args: { ffm_name: ffm },
-		})
-		.then((r) => {
-			const d = r.message || {};
+	fm_si_panel
+		.get(frm)
+		.then((panel) => {
+			if (fm_si_panel.failed(panel, "ffm_summary")) {
+				render_ffm_summary_error(wrapper);
+				return;
+			}
+			const d = (panel && panel.ffm_summary) || {};
 			// Renderizamos en HTML sin tocar el doc → no aparece "Not Saved"
 			const estado_color = get_estado_color(d.estado);
 
@@ -68,11 +70,13 @@ function inject_ffm_summary(frm) {
 				</div>
 			`);
 		})
-		.catch(() => {
-			wrapper.html(`<div class="text-danger" style="padding: 8px;">
-				<i class="fa fa-exclamation-triangle"></i> No fue posible cargar el resumen fiscal.
-			</div>`);
-		});
+		.catch(() => render_ffm_summary_error(wrapper));
+}
+
+function render_ffm_summary_error(wrapper) {
+	wrapper.html(`<div class="text-danger" style="padding: 8px;">
+		<i class="fa fa-exclamation-triangle"></i> No fue posible cargar el resumen fiscal.
+	</div>`);
 }
 
 function get_estado_color(estado) {
@@ -1,3 +1,4 @@
+/* global fm_si_panel */
 /**
  * Widget E-Receipt para Sales Invoice.
  * Muestra estado, self_invoice_url y datos del CFDI generado
@@ -29,13 +30,10 @@ function inject_ereceipt_summary(frm) {
 		</div>`
 	);
 
-	frappe
-		.call({
-			method: "facturacion_mexico.api.ereceipt_summary.get_ereceipt_summary",
-			args: { ereceipt_name },
-		})
-		.then((r) => {
-			const d = r.message || {};
+	fm_si_panel
+		.get(frm)
+		.then((panel) => {
+			const d = (panel && panel.ereceipt_summary) || {};
 			if (!d.name) {
 				wrapper.html("");
 				return;
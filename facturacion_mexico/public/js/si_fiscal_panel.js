@@ -0,0 +1,71 @@
+/* global fm_si_panel */
+// Panel fiscal compartido del formulario de Sales Invoice.
+// Una sola llamada a get_sales_invoice_panel por refresh: los demás scripts del formulario
+// (timbrar, acciones post-fiscales, resúmenes FFM / E-Receipt, nota de crédito, bloqueo de
+// cancelación) leen su parte con fm_si_panel.get(frm). Debe cargarse antes que ellos (hooks.py).
+// Una sección que falló en el servidor llega en null y con su mensaje en panel.errors;
+// fm_si_panel.failed(panel, "<sección>") permite distinguirla de "no aplica".
+window.fm_si_panel = (function () {
+	function fetch_panel(frm) {
+		// Mismo documento → reenviar el etag; si nada cambió se reutiliza el panel anterior
+		const previous =
+			frm.__fm_panel && frm.__fm_panel.name === frm.doc.name ? frm.__fm_panel : null;
+		return frappe
+			.call({
+				method: "facturacion_mexico.api.si_form_panel.get_sales_invoice_panel",
+				args: { name: frm.doc.name, etag: previous ? previous.panel.etag : null },
+			})
+			.then((r) => {
+				const out = (r && r.message) || null;
+				if (out && out.not_modified && previous) return previous.panel;
+				frm.__fm_panel = out ? { name: frm.doc.name, panel: out } : null;
+				if (out) warn_failed_sections(out);
+				return out;
+			});
+	}
+
+	function warn_failed_sections(panel) {
+		const failed = Object.keys(panel.errors || {});
+		if (!failed.length) return;
+		frappe.show_alert(
+			{
+				message: __("No se pudo cargar parte del panel fiscal: {0}", [failed.join(", ")]),
+				indicator: "orange",
+			},
+			7
+		);
+	}
+
+	return {
+		get(frm) {
+			if (frm.is_new()) return Promise.resolve(null);
+			if (!frm.__fm_panel_promise || frm.__fm_panel_for !== frm.doc.name) {
+				frm.__fm_panel_for = frm.doc.name;
+				frm.__fm_panel_promise = fetch_panel(frm);
+			}
+			return frm.__fm_panel_promise;
+		},
+		invalidate(frm) {
+			frm.__fm_panel_promise = null;
+		},
+		failed(panel, section) {
+			return Boolean(panel && panel.errors && panel.errors[section]);
+		},
+	};
+})();
+
+frappe.ui.form.on("Sales Invoice", {
+	// Primer handler de refresh: los scripts siguientes comparten la misma petición
+	refresh(frm) {
+		fm_si_panel.invalidate(frm);
+	},
+	fm_factura_fiscal_mx(frm) {
+		fm_si_panel.invalidate(frm);
+	},
+	fm_ereceipt_mx(frm) {
+		fm_si_panel.invalidate(frm);
+	},
+	fm_fiscal_status(frm) {
+		fm_si_panel.invalidate(frm);
+	},
+});
@@ -1,3 +1,4 @@
+/* global fm_si_panel */
 // Acciones de negocio sobre una Nota de Crédito (Sales Invoice Return) en borrador:
 //   - "Aplicar como Descuento / Bonificación": asigna la cuenta de descuentos por empresa como
 //     income_account de las líneas (el operador NO selecciona cuentas ni códigos SAT).
@@ -10,23 +11,18 @@ frappe.ui.form.on("Sales Invoice", {
 		if (frm.is_new()) return;
 		if (!(frm.doc.is_return && frm.doc.docstatus === 0 && frm.doc.return_against)) return;
 
-		frappe.call({
-			method: "facturacion_mexico.facturacion_fiscal.api.nota_credito.estado_nota_descuento",
-			args: { sales_invoice: frm.doc.name },
-			callback: function (r) {
-				if (r.exc || !r.message) return;
-				// Evitar botones duplicados tras reload_doc: quitar ambos antes de agregar el actual.
-				frm.remove_custom_button(
-					__("Aplicar como Descuento / Bonificación"),
-					__("Acciones")
-				);
-				frm.remove_custom_button(__("Revertir a Devolución de mercancía"), __("Acciones"));
-				if (r.message.es_descuento) {
-					agregar_boton_revertir(frm);
-				} else {
-					agregar_boton_descuento(frm);
-				}
-			},
+		// Estado de la nota desde el panel fiscal compartido (si_fiscal_panel.js)
+		fm_si_panel.get(frm).then((panel) => {
+			const estado = panel && panel.nota_descuento;
+			if (!estado) return;
+			// Evitar botones duplicados tras reload_doc: quitar ambos antes de agregar el actual.
+			frm.remove_custom_button(__("Aplicar como Descuento / Bonificación"), __("Acciones"));
+			frm.remove_custom_button(__("Revertir a Devolución de mercancía"), __("Acciones"));
+			if (estado.es_descuento) {
+				agregar_boton_revertir(frm);
+			} else {
+				agregar_boton_descuento(frm);
+			}
 		});
 	},
 });
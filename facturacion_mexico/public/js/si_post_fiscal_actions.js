@@ -1,3 +1,4 @@
+/* global fm_si_panel */
 // si_post_fiscal_actions.js - Acciones post-cancelación fiscal para Sales Invoice
 (function () {
 	const E = window.FM_ENUMS || {};
@@ -45,18 +46,15 @@
 	function add_post_fiscal_actions(frm) {
 		if (frm.doc.docstatus !== 1) return;
 
-		// Estado fiscal centralizado — reemplaza chequeo de fm_fiscal_status + get_active_pe_for_si
-		frappe.call({
-			method: "facturacion_mexico.fiscal_state.api.get_fiscal_ui_state",
-			args: { doctype: "Sales Invoice", name: frm.doc.name },
-			callback: function (r) {
-				if (!r.message) return;
-				const { actions, facts } = r.message;
-				// Opciones Fiscales solo cuando hay FFM cancelada y sin PE activo
-				if (facts.has_cancelled_ffm && !facts.has_submitted_payment_entries) {
-					_add_post_fiscal_action_buttons(frm);
-				}
-			},
+		// Estado fiscal centralizado (panel compartido) — reemplaza chequeo de fm_fiscal_status +
+		// get_active_pe_for_si
+		fm_si_panel.get(frm).then((panel) => {
+			if (!panel || !panel.fiscal_state) return;
+			const { facts } = panel.fiscal_state;
+			// Opciones Fiscales solo cuando hay FFM cancelada y sin PE activo
+			if (facts.has_cancelled_ffm && !facts.has_submitted_payment_entries) {
+				_add_post_fiscal_action_buttons(frm);
+			}
 		});
 	}
 
@@ -179,45 +177,42 @@
 	function add_substitute_button_mx(frm) {
 		if (frm.doc.docstatus !== 1) return;
 
-		// Estado fiscal centralizado — reemplaza chequeo local fm_fiscal_status=TIMBRADO
-		frappe.call({
-			method: "facturacion_mexico.fiscal_state.api.get_fiscal_ui_state",
-			args: { doctype: "Sales Invoice", name: frm.doc.name },
-			callback: function (r) {
-				if (!r.message?.actions?.can_substitute) return;
-				frm.add_custom_button(
-					__("🔄 Sustituir CFDI (01)"),
-					() => {
-						frappe.confirm(
-							__(
-								"Se creará un Sales Invoice de reemplazo (borrador) para emitir el CFDI sustituto (TipoRelación 04). ¿Continuar?"
-							),
-							() => {
-								frappe
-									.call({
-										method: "facturacion_mexico.facturacion_fiscal.timbrado_api.create_substitution_si",
-										args: { si_name: frm.doc.name },
-										freeze: true,
-										freeze_message: __(
-											"Creando Sales Invoice de reemplazo..."
-										),
-									})
-									.then((r) => {
-										const out = (r && r.message) || {};
-										if (!out || !out.new_si) return;
-										frappe.show_alert({
-											message:
-												__("SI de reemplazo creado:") + " " + out.new_si,
-											indicator: "green",
-										});
-										frappe.set_route("Form", "Sales Invoice", out.new_si);
+		// Estado fiscal centralizado (panel compartido) — reemplaza chequeo local
+		// fm_fiscal_status=TIMBRADO
+		fm_si_panel.get(frm).then((panel) => {
+			if (!panel?.fiscal_state?.actions?.can_substitute) return;
+			frm.add_custom_button(
+				__("🔄 Sustituir CFDI (01)"),
+				() => {
+					frappe.confirm(
+						__(
+							"Se creará un Sales Invoice de reemplazo (borrador) para emitir el CFDI sustituto (TipoRelación 04). ¿Continuar?"
+						),
+						() => {
+							frappe
+								.call({
+									method: "facturacion_mexico.facturacion_fiscal.timbrado_api.create_substitution_si",
+									args: { si_name: frm.doc.name },
+									freeze: true,
+									freeze_message: __(
+										"Creando Sales Invoice de reemplazo..."
+									),
+								})
+								.then((r) => {
+									const out = (r && r.message) || {};
+									if (!out || !out.new_si) return;
+									frappe.show_alert({
+										message:
+											__("SI de reemplazo creado:") + " " + out.new_si,
+										indicator: "green",
 									});
-							}
-						);
-					},
-					__("Opciones Fiscales")
-				);
-			},
+									frappe.set_route("Form", "Sales Invoice", out.new_si);
+								});
+						}
+					);
+				},
+				__("Opciones Fiscales")
+			);
 		});
 	}
 
@@ -0,0 +1,118 @@
+"""Benchmark: comparación de nombres por par vs. `name_matcher` por lotes.
+
+Genera pares sintéticos (Customer vs SAT) con variaciones reales: acentos, puntuación, régimen
+societario, mayúsculas y errores tipográficos. Compara la normalización carácter por carácter que
+hacía `_compare_customer_names` en cada llamada contra `name_matcher.score_pairs` (caché fría y
+caliente). No toca la BD.
+
+Uso:
+    bench --site <site> execute facturacion_mexico.scripts.benchmark_name_matcher.run
+    bench --site <site> execute facturacion_mexico.scripts.benchmark_name_matcher.run --kwargs "{'pairs': 100000}"
+"""
+
+import random
+import re
+import time
+import unicodedata
+
+from facturacion_mexico.validaciones import name_matcher
+
+_WORDS = [
+	"COMERCIALIZADORA",
+	"DISTRIBUIDORA",
+	"SERVICIOS",
+	"INTEGRALES",
+	"GRUPO",
+	"CONSTRUCCIÓN",
+	"LOGÍSTICA",
+	"ALIMENTOS",
+	"TECNOLOGÍA",
+	"PEÑA",
+	"MUÑOZ",
+	"GARCÍA",
+	"HERNÁNDEZ",
+	"DEL",
+	"NORTE",
+	"PACÍFICO",
+	"INDUSTRIAL",
+	"FARMACÉUTICA",
+	"TRANSPORTES",
+	"ASOCIADOS",
+]
+_REGIMENES = ["", ", S.A. DE C.V.", " SA DE CV", " S. DE R.L. DE C.V.", ", S.C.", " A.C.", " SAPI DE CV"]
+
+
+def _legacy_compare(sat_name, customer_name):
+	"""Copia de la implementación anterior de `_compare_customer_names` (referencia)."""
+	if not sat_name or not customer_name:
+		return False
+
+	def normalize_name(name):
+		name = unicodedata.normalize("NFD", name).encode("ascii", "ignore").decode("ascii")
+		name = re.sub(r"[^a-zA-Z\s]", "", name)
+		name = re.sub(r"\s+", " ", name)
+		return name.upper().strip()
+
+	sat_normalized = normalize_name(sat_name)
+	customer_normalized = normalize_name(customer_name)
+	if sat_normalized == customer_normalized:
+		return True
+	sat_words = set(sat_normalized.split())
+	customer_words = set(customer_normalized.split())
+	if not sat_words or not customer_words:
+		return False
+	return len(sat_words & customer_words) / max(len(sat_words), len(customer_words)) >= 0.75
+
+
+def _variant(rng, name):
+	choice = rng.random()
+	if choice < 0.3:
+		return name
+	if choice < 0.5:
+		return name.title()
+	if choice < 0.7:
+		return unicodedata.normalize("NFD", name).encode("ascii", "ignore").decode("ascii")
+	if choice < 0.85:
+		i = rng.randrange(len(name))
+		return name[:i] + name[i + 1 :]
+	return " ".join(rng.sample(_WORDS, 3))
+
+
+def generate_pairs(pairs=100000, distinct=20000, seed=42):
+	"""Pares (Customer, SAT): `distinct` razones sociales base repetidas con variaciones."""
+	rng = random.Random(seed)
+	bases = [" ".join(rng.sample(_WORDS, rng.randint(2, 4))) for _ in range(int(distinct))]
+	result = []
+	for _ in range(int(pairs)):
+		base = rng.choice(bases)
+		result.append((_variant(rng, base) + rng.choice(_REGIMENES), base + rng.choice(_REGIMENES)))
+	return result
+
+
+def _us_per_pair(fn, pairs) -> float:
+	start = time.perf_counter()
+	fn(pairs)
+	return (time.perf_counter() - start) * 1_000_000 / max(len(pairs), 1)
+
+
+def run(pairs=100000, distinct=20000):
+	"""Ejecutar el benchmark e imprimir µs por par para cada variante."""
+	data = generate_pairs(pairs, distinct)
+	name_matcher.clear_cache()
+
+	results = {
+		"pairs": len(data),
+		"legacy_us": _us_per_pair(lambda ps: [_legacy_compare(b, a) for a, b in ps], data),
+		"batch_cold_us": _us_per_pair(name_matcher.score_pairs, data),
+		"batch_warm_us": _us_per_pair(name_matcher.score_pairs, data),
+	}
+	matches = sum(r.matches for r in name_matcher.match_pairs(data))
+	results["matches"] = matches
+
+	print(f"📊 {results['pairs']:,} pares, {int(distinct):,} nombres base, {matches:,} coincidencias")
+	for key in ("batch_cold_us", "batch_warm_us"):
+		speedup = results["legacy_us"] / results[key] if results[key] else float("inf")
+		print(
+			f"   {key:<14} {results[key]:8.2f} µs/par   por par {results['legacy_us']:8.2f} µs   x{speedup:,.1f}"
+		)
+	return {k: round(v, 2) if isinstance(v, float) else v for k, v in results.items()}
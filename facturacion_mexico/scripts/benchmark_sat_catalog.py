@@ -0,0 +1,66 @@
+"""Benchmark: catálogo SAT en memoria vs. consultas a BD por fila.
+
+Compara `frappe.db.exists` / `frappe.db.get_value` / `LIKE` contra `catalog_service` sobre claves
+reales del sitio. Solo lectura.
+
+Uso:
+    bench --site <site> execute facturacion_mexico.scripts.benchmark_sat_catalog.run
+    bench --site <site> execute facturacion_mexico.scripts.benchmark_sat_catalog.run --kwargs "{'iterations': 20000}"
+"""
+
+import random
+import time
+
+import frappe
+
+from facturacion_mexico.catalogos_sat import catalog_service
+
+DOCTYPE = "SAT Producto Servicio"
+
+
+def _us_per_op(fn, keys) -> float:
+	start = time.perf_counter()
+	for key in keys:
+		fn(key)
+	return (time.perf_counter() - start) * 1_000_000 / max(len(keys), 1)
+
+
+def run(iterations=5000, doctype=DOCTYPE):
+	"""Ejecutar el benchmark e imprimir µs por operación para cada variante."""
+	iterations = int(iterations)
+	spec = catalog_service.CATALOGOS[doctype]
+
+	start = time.perf_counter()
+	catalog_service.invalidate(doctype)
+	catalog = catalog_service.get_catalog(doctype)
+	load_ms = (time.perf_counter() - start) * 1000
+	if not len(catalog):
+		print(f"⚠️ {doctype} está vacío; importe el catálogo antes de medir.")
+		return {"rows": 0}
+
+	rng = random.Random(42)
+	keys = [rng.choice(catalog.codes) for _ in range(iterations)]
+	words = [w for w in (catalog_service.tokenize(catalog.descriptions[i]) for i in range(len(catalog))) if w]
+	queries = [rng.choice(words)[0] for _ in range(min(iterations, 500))]
+
+	field = spec.description_field
+	results = {
+		"rows": len(catalog),
+		"load_ms": round(load_ms, 1),
+		"exists_db_us": _us_per_op(lambda k: frappe.db.exists(doctype, k), keys),
+		"exists_mem_us": _us_per_op(lambda k: catalog_service.exists(doctype, k), keys),
+		"get_value_db_us": _us_per_op(lambda k: frappe.db.get_value(doctype, k, field), keys),
+		"get_value_mem_us": _us_per_op(lambda k: catalog_service.get_field(doctype, k, field), keys),
+		"search_db_us": _us_per_op(
+			lambda q: frappe.get_all(doctype, filters={field: ["like", f"%{q}%"]}, pluck="name", limit=20),
+			queries,
+		),
+		"search_mem_us": _us_per_op(lambda q: catalog_service.search(doctype, q), queries),
+	}
+
+	print(f"📊 {doctype}: {results['rows']} claves, carga inicial {results['load_ms']} ms")
+	for op in ("exists", "get_value", "search"):
+		db, mem = results[f"{op}_db_us"], results[f"{op}_mem_us"]
+		speedup = db / mem if mem else float("inf")
+		print(f"   {op:<10} BD {db:10.1f} µs   memoria {mem:8.2f} µs   x{speedup:,.0f}")
+	return {k: round(v, 2) if isinstance(v, float) else v for k, v in results.items()}
@@ -16,6 +16,8 @@ ensure_cfdi_received_expense_items()
 
 import frappe
 
+from facturacion_mexico.catalogos_sat import catalog_service
+
 # fmt: off
 _ITEMS = [
     # ── Nómina y prestaciones (31) ─────────────────────────────────────────
@@ -190,7 +192,7 @@ def ensure_cfdi_received_expense_items() -> dict:
 		item.is_sales_item = 0
 
 		clave = item_def.get("clave_prod_serv")
-		if clave and frappe.db.exists("SAT Producto Servicio", clave):
+		if clave and catalog_service.exists("SAT Producto Servicio", clave):
 			item.fm_producto_servicio_sat = clave
 		else:
 			sin_clave_prod_serv += 1
@@ -0,0 +1,95 @@
+"""
+Tests para la evaluación de reglas de alerta contra la tabla de métricas (dashboard_fiscal/alert_engine).
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.dashboard_fiscal.alert_engine import AlertEngine, invalidate_metrics
+
+_MOD = "facturacion_mexico.dashboard_fiscal.alert_engine"
+
+
+class _FakeCache:
+	def __init__(self):
+		self.values = {}
+
+	def get_value(self, key):
+		return self.values.get(key)
+
+	def set_value(self, key, value, expires_in_sec=None):
+		self.values[key] = dict(value)
+
+	def delete_value(self, key):
+		self.values.pop(key, None)
+
+
+def _rule(name, module, operator=">", value=0, condition_type="Count"):
+	return frappe._dict(
+		name=name,
+		alert_name=name,
+		module=module,
+		condition_type=condition_type,
+		condition_field="name",
+		condition_operator=operator,
+		condition_value=value,
+		custom_condition=None,
+		priority=5,
+	)
+
+
+class TestAlertEngineMetrics(FrappeTestCase):
+	"""Una consulta por métrica distinta y una escritura de estadísticas por evaluación."""
+
+	def setUp(self):
+		self.cache = _FakeCache()
+		self.rules = [
+			_rule("TIMB-1", "Timbrado", ">", 2),
+			_rule("TIMB-2", "Timbrado", ">=", 10),
+			_rule("TIMB-3", "Timbrado Masivo", "!=", 0),
+			_rule("PPD-1", "PPD", ">", 0),
+		]
+		self.count = MagicMock(
+			side_effect=lambda doctype, filters=None: 5 if doctype == "Sales Invoice" else 1
+		)
+		self.sql = MagicMock()
+		for target, value in (
+			(f"{_MOD}.frappe.cache", MagicMock(return_value=self.cache)),
+			(f"{_MOD}.frappe.get_all", MagicMock(return_value=self.rules)),
+			(f"{_MOD}.frappe.db.count", self.count),
+			(f"{_MOD}.frappe.db.sql", self.sql),
+		):
+			patch(target, value, create=True).start()
+		self.addCleanup(patch.stopall)
+		self.engine = AlertEngine(company="Empresa")
+
+	def test_metrica_compartida_se_calcula_una_vez(self):
+		alerts = self.engine.evaluate_rule_alerts()
+
+		self.assertEqual(self.count.call_count, 2)
+		self.assertEqual({a["rule_id"] for a in alerts}, {"TIMB-1", "TIMB-3", "PPD-1"})
+
+		self.sql.assert_called_once()
+		self.assertEqual(set(self.sql.call_args.args[1][1]), {"TIMB-1", "TIMB-3", "PPD-1"})
+
+	def test_tabla_de_metricas_reutilizada_hasta_invalidar(self):
+		self.engine.evaluate_rule_alerts()
+		self.engine.evaluate_rule_alerts()
+		self.assertEqual(self.count.call_count, 2)
+
+		invalidate_metrics(frappe._dict(company="Empresa"))
+		self.engine.evaluate_rule_alerts()
+		self.assertEqual(self.count.call_count, 4)
+
+		# Evaluación programada: sin cache, siempre recalcula
+		self.engine.evaluate_rule_alerts(use_cache=False)
+		self.assertEqual(self.count.call_count, 6)
+
+	def test_sin_reglas_activadas_no_escribe(self):
+		self.count.side_effect = lambda doctype, filters=None: 0
+		self.rules[2].condition_operator = ">"
+
+		self.assertEqual(self.engine.evaluate_rule_alerts(), [])
+		self.sql.assert_not_called()
@@ -0,0 +1,145 @@
+"""
+Tests para el snapshot de salud de sucursales (multi_sucursal.branch_health) y la
+auto-selección de sucursal en memoria (BranchAutoSelector).
+"""
+
+import pickle
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.multi_sucursal import branch_health
+from facturacion_mexico.multi_sucursal.branch_auto_selector import BranchAutoSelector
+
+_MOD = "facturacion_mexico.multi_sucursal.branch_health"
+_SELECTOR = "facturacion_mexico.multi_sucursal.branch_auto_selector"
+
+
+def _branch(name, current, end, threshold=10, **values):
+	return frappe._dict(
+		name=name,
+		branch=name,
+		fm_lugar_expedicion="06000",
+		fm_serie_pattern="A{####}",
+		fm_share_certificates=1,
+		fm_folio_current=current,
+		fm_folio_end=end,
+		fm_folio_warning_threshold=threshold,
+		**values,
+	)
+
+
+class TestBranchHealthSnapshot(FrappeTestCase):
+	"""Construcción en dos consultas, lectura desde cache y actualización por sucursal."""
+
+	def setUp(self):
+		self.cache = MagicMock()
+		self.cache.make_key.side_effect = lambda key: f"site|{key}"
+		patch("frappe.cache", return_value=self.cache, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_build_snapshot_folios_y_certificados(self):
+		branches = [_branch("SUC-1", 10, 1000), _branch("SUC-2", 995, 1000), _branch("SUC-3", 5, 0)]
+		configs = [frappe._dict(branch="SUC-2", certificate_ids='["CSD-1", "CSD-2"]')]
+		with (
+			patch(f"{_MOD}.BranchManager.get_fiscal_branches", return_value=branches),
+			patch("frappe.get_all", return_value=configs, create=True) as get_all,
+		):
+			snapshot = branch_health.build_snapshot("Empresa")
+
+		get_all.assert_called_once()
+		self.assertEqual(snapshot["SUC-1"]["health"]["semaforo"], "verde")
+		self.assertEqual(snapshot["SUC-2"]["health"]["semaforo"], "rojo")
+		self.assertEqual(snapshot["SUC-3"]["health"]["status"], "unlimited")
+		self.assertEqual(snapshot["SUC-1"]["certificates"]["status"], "compartidos")
+		self.assertEqual(snapshot["SUC-2"]["certificates"]["specific_certificates"], 2)
+		self.assertEqual(snapshot["SUC-2"]["fm_serie_pattern"], "A{####}")
+
+	def test_get_snapshot_lee_cache(self):
+		entry = branch_health._entry(_branch("SUC-1", 10, 1000), [])
+		# Como RedisWrapper.hgetall: campos en bytes, valores ya deserializados
+		self.cache.hgetall.return_value = {branch_health._BUILT.encode(): True, b"SUC-1": entry}
+		with patch(f"{_MOD}.build_snapshot") as build:
+			self.assertEqual(branch_health.get_snapshot("Empresa"), {"SUC-1": entry})
+		build.assert_not_called()
+
+	def test_get_snapshot_construye_y_guarda(self):
+		self.cache.hgetall.return_value = {}
+		entry = branch_health._entry(_branch("SUC-1", 10, 1000), [])
+		with patch(f"{_MOD}.build_snapshot", return_value={"SUC-1": entry}):
+			self.assertEqual(branch_health.get_snapshot("Empresa"), {"SUC-1": entry})
+
+		pipe = self.cache.pipeline.return_value
+		pipe.delete.assert_called_once_with("site|fm_branch_health:Empresa")
+		mapping = pipe.hset.call_args.kwargs["mapping"]
+		self.assertEqual(pickle.loads(mapping["SUC-1"]), entry)
+		self.assertTrue(pickle.loads(mapping[branch_health._BUILT]))
+
+	def test_refresh_branch_sin_snapshot_no_consulta(self):
+		self.cache.hget.return_value = None
+		with patch("frappe.get_all", create=True) as get_all:
+			branch_health.refresh_branch("SUC-1", "Empresa")
+		get_all.assert_not_called()
+
+	def test_refresh_branch_actualiza_solo_su_entrada(self):
+		self.cache.hget.return_value = True
+		rows = {"Branch": [_branch("SUC-1", 999, 1000)], "Configuracion Fiscal Sucursal": []}
+		with patch("frappe.get_all", side_effect=lambda doctype, **kw: rows[doctype], create=True):
+			branch_health.refresh_branch("SUC-1", "Empresa")
+
+		pipe = self.cache.pipeline.return_value
+		pipe.delete.assert_not_called()
+		mapping = pipe.hset.call_args.kwargs["mapping"]
+		self.assertEqual(list(mapping), ["SUC-1"])
+		self.assertEqual(pickle.loads(mapping["SUC-1"])["health"]["status"], "critico")
+
+	def test_refresh_branch_on_commit_espera_al_commit(self):
+		after_commit = MagicMock()
+		with (
+			patch("frappe.db.after_commit", after_commit, create=True),
+			patch(f"{_MOD}.refresh_branch") as refresh,
+		):
+			branch_health.refresh_branch_on_commit("SUC-1", "Empresa")
+			refresh.assert_not_called()
+
+			callback = after_commit.add.call_args.args[0]
+			callback()
+
+		refresh.assert_called_once_with("SUC-1", "Empresa")
+
+
+class TestBranchAutoSelectorSnapshot(FrappeTestCase):
+	"""La puntuación es un paso en memoria sobre el snapshot de la compañía."""
+
+	def setUp(self):
+		self.snapshot = {
+			name: branch_health._entry(row, [])
+			for name, row in {
+				"SUC-VERDE": _branch("SUC-VERDE", 10, 1000),
+				"SUC-AGOTADA": _branch("SUC-AGOTADA", 1000, 1000),
+				"SUC-PREFERIDA": _branch("SUC-PREFERIDA", 850, 1000),
+			}.items()
+		}
+		patch(f"{_SELECTOR}.branch_health.get_snapshot", return_value=self.snapshot).start()
+		patch(
+			"frappe.core.doctype.user_permission.user_permission.get_user_permissions",
+			return_value={"Branch": [{"doc": "SUC-PREFERIDA"}]},
+		).start()
+		# Ninguna consulta ni recálculo de folios durante la selección
+		for target in ("frappe.get_all", "frappe.get_value", "frappe.get_cached_doc"):
+			patch(target, side_effect=AssertionError(target), create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_selecciona_sin_consultas(self):
+		with patch(f"{_SELECTOR}.BranchManager"):
+			result = BranchAutoSelector("Empresa", user="cajero@example.com").select_best_branch_for_invoice()
+
+		self.assertTrue(result["success"])
+		# Preferida (+50) en amarillo supera a la verde sin preferencia
+		self.assertEqual(result["branch"], "SUC-PREFERIDA")
+
+	def test_health_status_desde_snapshot(self):
+		with patch(f"{_SELECTOR}.BranchManager"):
+			selector = BranchAutoSelector("Empresa")
+		self.assertFalse(selector._get_branch_health_status("SUC-AGOTADA")["can_generate"])
@@ -0,0 +1,288 @@
+"""
+Tests unitarios para la ejecución masiva de reglas fiscales (motor_reglas/engine/bulk_executor).
+"""
+
+import re
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.motor_reglas import api
+from facturacion_mexico.motor_reglas.doctype.fiscal_validation_rule.fiscal_validation_rule import (
+	FiscalValidationRule,
+)
+from facturacion_mexico.motor_reglas.doctype.rule_condition.rule_condition import RuleCondition
+from facturacion_mexico.motor_reglas.engine import bulk_executor
+
+_MOD = "facturacion_mexico.motor_reglas.engine.bulk_executor"
+
+_FIELDTYPES = {
+	"customer": "Link",
+	"status": "Select",
+	"remarks": "Data",
+	"fm_uso_cfdi": "Data",
+	"grand_total": "Currency",
+}
+
+_STATUSES = ["Paid", "paid", "Paid ", "Unpaid", "UNPAID", "Overdue", None]
+_REMARKS = ["Descuento 10%", "descuento 100", "folio 5_A", "folio 5A", "", None]
+
+_INVOICES = [
+	frappe._dict(
+		name=f"SINV-{i:05d}",
+		customer=f"CUST-{i % 9}",
+		status=_STATUSES[i % len(_STATUSES)],
+		remarks=_REMARKS[i % len(_REMARKS)],
+		grand_total=float(i * 10) if i % 11 else 0.0,
+		fm_uso_cfdi="G03" if i % 5 else ("g03" if i % 2 else ""),
+		net_total=float(i * 8),
+	)
+	for i in range(1, 1301)
+]
+
+
+def _ci(value) -> str:
+	# Collation *_ci de MariaDB: sin mayúsculas y, en "=" / "in", sin espacios finales
+	return str(value).rstrip(" ").casefold()
+
+
+def _like(value, pattern) -> bool:
+	parts, chars = [], iter(pattern)
+	for ch in chars:
+		if ch == "\\":
+			parts.append(re.escape(next(chars)))
+		else:
+			parts.append({"%": ".*", "_": "."}.get(ch) or re.escape(ch))
+	return re.fullmatch("".join(parts), value, re.IGNORECASE | re.DOTALL) is not None
+
+
+def _matches(row, field, operator, value):
+	"""Predicado de Frappe/MariaDB: `ifnull(campo, '')` salvo en "=" y "like" con valor."""
+	current = row.get(field)
+	if operator == ">" and field == "name":
+		return current > value
+	if operator == "=":
+		return current is not None and _ci(current) == _ci(value)
+	if operator == "in":
+		return _ci(current or "") in {_ci(v) for v in value}
+	if operator == "like":
+		return current is not None and _like(current, value)
+	if operator == "not like":
+		return not _like(current or "", value)
+	raise AssertionError(f"operador no esperado en el test: {operator}")
+
+
+def _get_all(doctype, filters=None, fields=None, order_by=None, limit_page_length=None):
+	rows = [r for r in _INVOICES if all(_matches(r, *f) for f in filters or [])]
+	rows = rows[:limit_page_length] if limit_page_length else rows
+	return [frappe._dict({f: r[f] for f in fields}) for r in rows]
+
+
+def _count(doctype, filters=None):
+	return len(_get_all(doctype, filters, ["name"]))
+
+
+def _condition(field_name, operator, value=None, value_type="Static", logical_operator="AND"):
+	return RuleCondition(
+		{
+			"doctype": "Rule Condition",
+			"condition_type": "Field",
+			"field_name": field_name,
+			"operator": operator,
+			"value": value,
+			"value_type": value_type,
+			"logical_operator": logical_operator,
+			"group_start": 0,
+			"group_end": 0,
+		}
+	)
+
+
+def _rule(code, conditions):
+	return SimpleNamespace(name=code, rule_code=code, rule_name=code, conditions=conditions)
+
+
+_RULES = [
+	# Total alto, pagada, con uso CFDI: solo `status` va al WHERE
+	_rule(
+		"ALTO",
+		[
+			_condition("grand_total", "greater_than", "10000"),
+			_condition("status", "equals", "Paid"),
+			_condition("fm_uso_cfdi", "is_set"),
+		],
+	),
+	# Lista en SQL + regex en Python sobre `customer`
+	_rule(
+		"CLIENTE",
+		[
+			_condition("status", "in_list", "Unpaid,Overdue"),
+			_condition("customer", "regex_match", "CUST-[12]$"),
+		],
+	),
+	# OR: todo en Python
+	_rule(
+		"OR",
+		[
+			_condition("fm_uso_cfdi", "is_not_set", logical_operator="OR"),
+			_condition("grand_total", "less_than", "50"),
+		],
+	),
+	# LIKE con comodines escapados; not_contains con letras se queda en Python
+	_rule(
+		"TEXTO",
+		[
+			_condition("remarks", "contains", "10%"),
+			_condition("fm_uso_cfdi", "not_contains", "g"),
+		],
+	),
+	_rule("FOLIO", [_condition("remarks", "not_contains", "5_")]),
+	# Formula: Rule Condition compara contra el texto literal, no contra net_total
+	_rule(
+		"FORMULA",
+		[
+			_condition("status", "equals", "Paid"),
+			_condition("grand_total", "less_than", "NET_TOTAL", value_type="Formula"),
+		],
+	),
+]
+
+_CODES = [r.rule_code for r in _RULES]
+
+
+def _expected(code):
+	"""Coincidencias de `FiscalValidationRule.evaluate_conditions` (lo que usa execute_rule)."""
+	rule = next(r for r in _RULES if r.rule_code == code)
+	return sum(1 for r in _INVOICES if FiscalValidationRule.evaluate_conditions(rule, SimpleNamespace(**r)))
+
+
+class _Meta:
+	def get_field(self, fieldname):
+		return SimpleNamespace(fieldtype=_FIELDTYPES[fieldname]) if fieldname in _FIELDTYPES else None
+
+
+class TestBulkRules(FrappeTestCase):
+	"""Compilación SQL/Python, recorrido por bloques y reanudación por checkpoint."""
+
+	def setUp(self):
+		self.checkpoints = {}
+		cache = SimpleNamespace(
+			get_value=self.checkpoints.get,
+			set_value=lambda key, value, expires_in_sec=None: self.checkpoints.__setitem__(key, value),
+			delete_value=lambda key: self.checkpoints.pop(key, None),
+		)
+		patches = [
+			patch(f"{_MOD}.frappe.get_meta", return_value=_Meta()),
+			patch(f"{_MOD}.frappe.get_all", side_effect=_get_all),
+			patch(f"{_MOD}.frappe.db.count", side_effect=_count, create=True),
+			patch(f"{_MOD}.frappe.cache", return_value=cache),
+			patch(f"{_MOD}._active_rules", return_value=_RULES),
+			patch(f"{_MOD}.frappe.get_doc", side_effect=AssertionError("no debe cargar documentos")),
+		]
+		started = [p.start() for p in patches]
+		for p in patches:
+			self.addCleanup(p.stop)
+		self.get_all = started[1]
+
+	def test_compilacion_separa_sql_y_python(self):
+		alto, cliente, or_rule, texto, folio, formula = (
+			bulk_executor.compile_rule(r, "Sales Invoice") for r in _RULES
+		)
+
+		# Numéricos e is_set no se empujan; equals/in_list filtran y RuleEvaluator confirma
+		self.assertEqual(alto.filters, [["status", "=", "Paid"]])
+		self.assertEqual(len(alto.residual), 3)
+		self.assertEqual(alto.fields, ["name", "grand_total", "status", "fm_uso_cfdi"])
+		self.assertEqual(cliente.filters, [["status", "in", ["Unpaid", "Overdue"]]])
+		self.assertEqual(cliente.fields, ["name", "status", "customer"])
+		self.assertEqual(or_rule.filters, [])
+		self.assertEqual(or_rule.fields, ["name", "fm_uso_cfdi", "grand_total"])
+		self.assertEqual(texto.filters, [["remarks", "like", "%10\\%%"]])
+		self.assertEqual([c.operator for c in texto.residual], ["contains", "not_contains"])
+		# Sin letras NOT LIKE es exacto: no se reevalúa
+		self.assertEqual((folio.filters, folio.residual), ([["remarks", "not like", "%5\\_%"]], []))
+		self.assertEqual(formula.fields, ["name", "status", "grand_total"])
+		self.assertFalse(any(r.needs_document for r in (alto, cliente, or_rule, texto, folio, formula)))
+
+	def test_no_empuja_valores_sin_equivalente_sql(self):
+		rule = _rule(
+			"X",
+			[
+				_condition("grand_total", "equals", "0"),
+				_condition("status", "in_list", '["Paid", 1]'),
+				_condition("status", "not_equals", "Paid"),
+				_condition("status", "is_not_set"),
+			],
+		)
+		compiled = bulk_executor.compile_rule(rule, "Sales Invoice")
+
+		self.assertEqual(compiled.filters, [])
+		self.assertEqual(len(compiled.residual), 4)
+
+	def test_resultados_iguales_a_evaluacion_documento_por_documento(self):
+		result = bulk_executor.run("Sales Invoice", chunk_size=500)
+
+		self.assertTrue(result["complete"])
+		self.assertEqual(result["total_documents"], len(_INVOICES))
+		rule_results = result["results"]["rule_results"]
+		for code in _CODES:
+			self.assertEqual(rule_results[f"{code}_{code}"]["matched"], _expected(code), code)
+		# Las reglas con filtros solo leen los candidatos que pasan el WHERE
+		self.assertTrue(_expected("FORMULA"))
+		for code in ("ALTO", "CLIENTE", "TEXTO", "FOLIO", "FORMULA"):
+			self.assertLess(rule_results[f"{code}_{code}"]["evaluated"], len(_INVOICES), code)
+		self.assertEqual(result["results"]["failed_rules"], 0)
+
+	def test_reanuda_desde_checkpoint(self):
+		clock = iter(range(0, 10_000, 100))
+		with patch(f"{_MOD}.time.monotonic", side_effect=lambda: next(clock)):
+			partial = bulk_executor.run("Sales Invoice", run_id="audit-2024", max_seconds=50, chunk_size=200)
+
+		self.assertFalse(partial["complete"])
+		after = partial["cursor"]["after"]
+		self.assertEqual(partial["cursor"]["rule"], 0)
+		self.assertIn(f"{bulk_executor.CHECKPOINT_KEY_PREFIX}:audit-2024", self.checkpoints)
+
+		calls_before = self.get_all.call_count
+		final = bulk_executor.run("Sales Invoice", run_id="audit-2024", chunk_size=200)
+		self.assertTrue(final["complete"])
+		self.assertEqual(self.checkpoints, {})
+		# El primer bloque no se vuelve a leer
+		self.assertEqual(
+			self.get_all.call_args_list[calls_before].kwargs["filters"][-1], ["name", ">", after]
+		)
+		for code in _CODES:
+			self.assertEqual(final["results"]["rule_results"][f"{code}_{code}"]["matched"], _expected(code))
+
+	def test_ejecucion_pasa_por_execute_rule(self):
+		rule = _RULES[0]
+		rule.execute_rule = MagicMock(return_value={"success": True, "executed": True})
+		rule.execute_actions = MagicMock()
+		self.addCleanup(vars(rule).pop, "execute_rule")
+		self.addCleanup(vars(rule).pop, "execute_actions")
+		invoices = {r.name: r for r in _INVOICES}
+		with (
+			patch(f"{_MOD}._active_rules", return_value=[rule]),
+			patch(f"{_MOD}.frappe.get_doc", side_effect=lambda doctype, name: invoices[name]),
+		):
+			result = bulk_executor.run("Sales Invoice", dry_run=False)
+
+		stats = result["results"]["rule_results"]["ALTO_ALTO"]
+		# Acciones y estadísticas de la regla por el mismo camino que una ejecución individual
+		self.assertEqual(rule.execute_rule.call_count, _expected("ALTO"))
+		self.assertEqual(stats["executed"], _expected("ALTO"))
+		rule.execute_actions.assert_not_called()
+
+	def test_api_limita_la_ventana_de_la_peticion(self):
+		with (
+			patch("frappe.db.exists", return_value=True, create=True),
+			patch(f"{_MOD}.run", return_value={"total_documents": 1}) as run,
+		):
+			api.bulk_apply_rules("Sales Invoice", dry_run=0, max_seconds=3600)
+
+		kwargs = run.call_args.kwargs
+		self.assertEqual(kwargs["max_seconds"], bulk_executor.REQUEST_MAX_SECONDS)
+		# Sin run_id se genera uno para poder continuar
+		self.assertTrue(kwargs["run_id"])
@@ -0,0 +1,70 @@
+"""
+Tests unitarios para las versiones de cache publicadas al confirmar (utils/cache_version).
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.utils import cache_version
+
+
+class _Callbacks(list):
+	"""Subconjunto de `frappe.db.after_commit` / `after_rollback`."""
+
+	def add(self, fn):
+		self.append(fn)
+
+	def run(self):
+		callbacks = list(self)
+		self.clear()
+		for fn in callbacks:
+			fn()
+
+
+class TestCacheVersion(FrappeTestCase):
+	"""La versión nueva solo es visible después del commit."""
+
+	def setUp(self):
+		cache_version.discard()
+		self.addCleanup(cache_version.discard)
+		self.values = {}
+		cache = MagicMock()
+		cache.get_value.side_effect = self.values.get
+		cache.set_value.side_effect = self.values.__setitem__
+		self.commit, self.rollback = _Callbacks(), _Callbacks()
+		for target, value in (
+			("frappe.cache", MagicMock(return_value=cache)),
+			("frappe.db.after_commit", self.commit),
+			("frappe.db.after_rollback", self.rollback),
+		):
+			patch(target, value, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_publica_al_confirmar(self):
+		on_publish = MagicMock()
+		for _ in range(3):
+			cache_version.publish_on_commit("fm_test_version", on_publish, ("a",))
+
+		self.assertEqual(cache_version.get("fm_test_version", default="0"), "0")
+		on_publish.assert_not_called()
+
+		self.commit.run()
+		self.assertNotEqual(cache_version.get("fm_test_version", default="0"), "0")
+		on_publish.assert_called_once_with("a")
+
+	def test_rollback_descarta(self):
+		cache_version.publish_on_commit("fm_test_version")
+		self.rollback.run()
+		self.commit.run()
+		self.assertIsNone(cache_version.get("fm_test_version"))
+
+		# La siguiente transacción vuelve a registrar sus callbacks
+		cache_version.publish_on_commit("fm_test_version")
+		self.commit.run()
+		self.assertIsNotNone(cache_version.get("fm_test_version"))
+
+	def test_sin_redis_devuelve_none(self):
+		with patch("frappe.cache", side_effect=RuntimeError("sin redis")):
+			self.assertIsNone(cache_version.get("fm_test_version", default="0"))
@@ -0,0 +1,84 @@
+"""
+Tests para el reporte Comparativo de Sucursales: métricas en una consulta agrupada.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.multi_sucursal.report.comparativo_sucursales import comparativo_sucursales as report
+
+_FILTERS = frappe._dict(from_date="2025-07-01", to_date="2025-07-10", comparison_type="Completo")
+
+
+def _main_rows(count):
+	return [
+		frappe._dict(
+			branch=f"SUC-{i}",
+			branch_name=f"Sucursal {i}",
+			total_invoices=20,
+			total_amount=1000,
+			stamped_invoices=19,
+		)
+		for i in range(count)
+	]
+
+
+class TestComparativoSucursalesMetrics(FrappeTestCase):
+	"""Número de consultas constante y métricas derivadas del agregado por sucursal."""
+
+	def setUp(self):
+		self.metrics = [
+			frappe._dict(
+				branch="SUC-0",
+				period_invoices=20,
+				current_amount=1000,
+				previous_amount=800,
+				required_addendas=4,
+				with_addendas=3,
+				avg_stamping_time=12.345,
+				unstamped_invoices=1,
+			)
+		]
+
+		def sql(query, values=None, as_dict=False):
+			if "GROUP BY si.fm_branch" in query:
+				return self.metrics
+			return _main_rows(150)
+
+		self.sql = MagicMock(side_effect=sql)
+		patch("frappe.db.sql", self.sql, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_consultas_constantes(self):
+		data = report.get_data(_FILTERS)
+
+		self.assertEqual(len(data), 150)
+		self.assertEqual(self.sql.call_count, 2)
+		values = self.sql.call_args_list[1].args[1]
+		self.assertEqual(len(values["branches"]), 150)
+		# Período anterior del mismo número de días (10)
+		self.assertEqual(str(values["prev_from"]), "2025-06-21")
+
+	def test_metricas_por_sucursal(self):
+		row = next(r for r in report.get_data(_FILTERS) if r["branch"] == "SUC-0")
+
+		self.assertEqual(row["daily_average"], 2.0)
+		self.assertEqual(row["growth_rate"], 25.0)
+		self.assertEqual(row["addendas_compliance"], 75.0)
+		self.assertEqual(row["avg_stamping_time"], 12.35)
+		self.assertEqual(row["error_rate"], 5.0)
+
+	def test_sucursal_sin_facturas_usa_defaults(self):
+		row = next(r for r in report.get_data(_FILTERS) if r["branch"] == "SUC-1")
+
+		self.assertEqual(row["daily_average"], 0)
+		self.assertEqual(row["growth_rate"], 0)
+		self.assertEqual(row["addendas_compliance"], 100)
+		self.assertEqual(row["avg_stamping_time"], 30)
+		self.assertEqual(row["error_rate"], 0)
+
+	def test_facturacion_no_consulta_metricas(self):
+		report.get_data(frappe._dict(_FILTERS, comparison_type="Facturación"))
+		self.assertEqual(self.sql.call_count, 1)
@@ -0,0 +1,203 @@
+"""
+Tests para el bus de eventos fiscales y las reglas de alerta de tipo Event
+(dashboard_fiscal/fiscal_events, dashboard_fiscal/alert_engine).
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.dashboard_fiscal import fiscal_events
+from facturacion_mexico.dashboard_fiscal.alert_engine import on_fiscal_event
+from facturacion_mexico.dashboard_fiscal.doctype.fiscal_alert_rule.fiscal_alert_rule import FiscalAlertRule
+
+_MOD = "facturacion_mexico.dashboard_fiscal.fiscal_events"
+_ENGINE = "facturacion_mexico.dashboard_fiscal.alert_engine"
+
+
+class _FakeRedis:
+	def __init__(self):
+		self.values = {}
+
+	def make_key(self, key):
+		return f"site|{key}"
+
+	def pipeline(self):
+		return self
+
+	def incr(self, key):
+		self.values[key] = self.values.get(key, 0) + 1
+
+	def expire(self, key, ttl):
+		pass
+
+	def execute(self):
+		pass
+
+	def mget(self, keys):
+		return [self.values.get(k) for k in keys]
+
+	def set(self, key, value, nx=False, ex=None):
+		if nx and key in self.values:
+			return False
+		self.values[key] = value
+		return True
+
+	def get_value(self, key, generator=None):
+		if key not in self.values and generator:
+			self.values[key] = generator()
+		return self.values.get(key)
+
+	def delete_value(self, key):
+		self.values.pop(key, None)
+
+
+class _Callbacks(list):
+	"""Subconjunto de `frappe.db.after_commit`."""
+
+	def add(self, fn):
+		self.append(fn)
+
+	def run(self):
+		callbacks = list(self)
+		self.clear()
+		for fn in callbacks:
+			fn()
+
+
+class TestFiscalEvents(FrappeTestCase):
+	"""Contadores por ventana y reglas evaluadas al emitirse el evento."""
+
+	def setUp(self):
+		self.redis = _FakeRedis()
+		self.now = 1_700_000_000
+		self.hooks = {}
+		for target, value in (
+			(f"{_MOD}.frappe.cache", MagicMock(return_value=self.redis)),
+			(f"{_MOD}.time.time", MagicMock(side_effect=lambda: self.now)),
+			(f"{_MOD}.frappe.get_hooks", MagicMock(side_effect=lambda name: self.hooks)),
+		):
+			patch(target, value, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_contador_por_ventana_y_sucursal(self):
+		for _ in range(3):
+			fiscal_events.emit(fiscal_events.TIMBRADO_ERROR, "Empresa", branch="Centro")
+		fiscal_events.emit(fiscal_events.TIMBRADO_ERROR, "Empresa", branch="Norte")
+
+		self.assertEqual(fiscal_events.window_count(fiscal_events.TIMBRADO_ERROR, "Empresa", "Centro"), 3)
+		self.assertEqual(fiscal_events.window_count(fiscal_events.TIMBRADO_ERROR, "Empresa"), 4)
+
+		# 15 minutos después los eventos salen de una ventana de 10 pero no de una de 30
+		self.now += 15 * 60
+		self.assertEqual(fiscal_events.window_count(fiscal_events.TIMBRADO_ERROR, "Empresa", "Centro"), 0)
+		self.assertEqual(
+			fiscal_events.window_count(fiscal_events.TIMBRADO_ERROR, "Empresa", "Centro", window_minutes=30),
+			3,
+		)
+
+	def test_suscriptor_con_error_no_interrumpe(self):
+		received = []
+		self.hooks = {"*": ["tests.failing"], fiscal_events.FOLIOS_LOW: ["tests.collect"]}
+		handlers = {
+			"tests.failing": MagicMock(side_effect=RuntimeError("boom")),
+			"tests.collect": received.append,
+		}
+
+		with (
+			patch(f"{_MOD}.frappe.get_attr", side_effect=handlers.get),
+			patch(f"{_MOD}.frappe.log_error") as log,
+		):
+			event = fiscal_events.emit(
+				fiscal_events.FOLIOS_LOW, "Empresa", branch="Centro", remaining_folios=3
+			)
+
+		self.assertEqual(received, [event])
+		self.assertEqual(event.data, {"remaining_folios": 3})
+		log.assert_called_once()
+
+	def test_regla_event_se_activa_una_vez_por_ventana_y_sucursal(self):
+		rule = frappe._dict(
+			name="TIMB_ERR_5",
+			alert_name="Errores de timbrado",
+			module="Timbrado",
+			condition_field=fiscal_events.TIMBRADO_ERROR,
+			condition_operator=">=",
+			condition_value=5,
+			window_minutes=10,
+			message_template="{current_value} errores en {branch}",
+			priority=8,
+		)
+		rule_doc = MagicMock()
+		publish = MagicMock()
+		for target, value in (
+			(f"{_ENGINE}.frappe.cache", MagicMock(return_value=self.redis)),
+			(f"{_ENGINE}.frappe.get_all", MagicMock(return_value=[rule])),
+			(f"{_ENGINE}.frappe.get_doc", MagicMock(return_value=rule_doc)),
+			(f"{_ENGINE}.frappe.publish_realtime", publish),
+			(f"{_ENGINE}.DashboardCache.invalidate_pattern", MagicMock()),
+		):
+			patch(target, value, create=True).start()
+
+		self.hooks = {"*": ["alert_engine.on_fiscal_event"]}
+		with patch(f"{_MOD}.frappe.get_attr", return_value=on_fiscal_event):
+			for _ in range(7):
+				fiscal_events.emit(fiscal_events.TIMBRADO_ERROR, "Empresa", branch="Centro")
+			for _ in range(4):
+				fiscal_events.emit(fiscal_events.TIMBRADO_ERROR, "Empresa", branch="Norte")
+
+		publish.assert_called_once()
+		alert = publish.call_args.args[1]
+		self.assertEqual(alert["rule_id"], "TIMB_ERR_5")
+		self.assertEqual(alert["message"], "5 errores en Centro")
+		rule_doc.trigger_alert.assert_called_once()
+
+	def test_emit_on_commit_espera_al_commit(self):
+		received = []
+		self.hooks = {fiscal_events.FOLIO_RESERVED: ["tests.collect"]}
+		after_commit = _Callbacks()
+		with (
+			patch(f"{_MOD}.frappe.get_attr", return_value=received.append),
+			patch(f"{_MOD}.frappe.db.after_commit", after_commit, create=True),
+			patch(f"{_MOD}.frappe.db.commit", create=True) as commit,
+		):
+			fiscal_events.emit_on_commit(fiscal_events.FOLIO_RESERVED, "Empresa", branch="Centro", folio=7)
+			self.assertEqual(received, [])
+			self.assertEqual(fiscal_events.window_count(fiscal_events.FOLIO_RESERVED, "Empresa"), 0)
+
+			after_commit.run()
+
+		self.assertEqual([e.data for e in received], [{"folio": 7}])
+		self.assertEqual(fiscal_events.window_count(fiscal_events.FOLIO_RESERVED, "Empresa", "Centro"), 1)
+		# Lo escrito por los suscriptores se confirma
+		commit.assert_called_once()
+
+	def test_trigger_alert_no_vacia_cache_de_reglas(self):
+		rule = FiscalAlertRule.__new__(FiscalAlertRule)
+		rule.__dict__.update(
+			alert_code="TIMB_ERR_5",
+			alert_name="Errores de timbrado",
+			alert_type="Event",
+			module="Timbrado",
+			message_template="Errores en {branch}",
+			priority=8,
+			send_email=0,
+			trigger_count=2,
+		)
+
+		def db_set(values, update_modified=True):
+			rule.__dict__.update(values)
+
+		with (
+			patch.object(FiscalAlertRule, "db_set", side_effect=db_set, create=True) as set_values,
+			patch.object(FiscalAlertRule, "save", create=True) as save,
+			patch(f"{_ENGINE}.AlertEngine.clear_event_rules") as clear_event_rules,
+		):
+			alert = rule.trigger_alert({"branch": "Centro"})
+
+		save.assert_not_called()
+		clear_event_rules.assert_not_called()
+		self.assertEqual(set_values.call_args.kwargs, {"update_modified": False})
+		self.assertEqual(alert["trigger_count"], 3)
+		self.assertEqual(alert["message"], "Errores en Centro")
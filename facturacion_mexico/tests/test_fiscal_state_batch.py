@@ -0,0 +1,112 @@
+"""
+Tests para el estado fiscal por lote (fiscal_state.api.get_fiscal_ui_states).
+
+El lote debe producir exactamente los mismos facts/actions/messages que el cálculo por documento,
+con una consulta por doctype vinculado sin importar el número de facturas.
+"""
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.fiscal_state import api
+from facturacion_mexico.fiscal_state.sales_invoice_state import _compute_facts
+
+_SI = {
+	"SINV-1": {
+		"docstatus": 1,
+		"fm_fiscal_status": "TIMBRADO",
+		"fm_factura_fiscal_mx": "FFM-1",
+		"fm_es_ppd": 1,
+	},
+	"SINV-2": {"docstatus": 1, "fm_fiscal_status": "CANCELADO", "fm_factura_fiscal_mx": "FFM-2"},
+	"SINV-3": {"docstatus": 1, "fm_fiscal_status": "", "fm_factura_fiscal_mx": ""},
+	"SINV-4": {"docstatus": 0, "fm_fiscal_status": "", "fm_factura_fiscal_mx": ""},
+}
+_TABLES = {
+	"Sales Invoice": [
+		{"name": n, "is_return": 0, "outstanding_amount": 500, "grand_total": 1000, "fm_es_ppd": 0, **v}
+		for n, v in _SI.items()
+	],
+	"Factura Fiscal Mexico": [
+		{
+			"name": "FFM-1",
+			"status": "TIMBRADO",
+			"fm_uuid": "U-1",
+			"fm_motivo_cancelacion": None,
+			"docstatus": 1,
+		},
+		{
+			"name": "FFM-2",
+			"status": "CANCELADO",
+			"fm_uuid": "U-2",
+			"fm_motivo_cancelacion": "02",
+			"docstatus": 1,
+		},
+	],
+	"File": [
+		{"attached_to_doctype": "Factura Fiscal Mexico", "attached_to_name": "FFM-1", "file_name": "u1.xml"},
+		{"attached_to_doctype": "Factura Fiscal Mexico", "attached_to_name": "FFM-2", "file_name": "u2.pdf"},
+	],
+	"Payment Entry Reference": [
+		{"parent": "PE-1", "reference_doctype": "Sales Invoice", "reference_name": "SINV-1"},
+		{"parent": "PE-2", "reference_doctype": "Sales Invoice", "reference_name": "SINV-1"},
+		{"parent": "PE-3", "reference_doctype": "Sales Invoice", "reference_name": "SINV-3"},
+	],
+	"Payment Entry": [
+		{"name": "PE-1", "docstatus": 1},
+		{"name": "PE-2", "docstatus": 2},
+		{"name": "PE-3", "docstatus": 0},
+	],
+	"Complemento Pago MX": [{"name": "CP-1", "status": "Error", "payment_entry": "PE-1"}],
+}
+
+
+def _matches(row, filters):
+	for field, cond in (filters or {}).items():
+		if isinstance(cond, list):
+			if row.get(field) not in cond[1]:
+				return False
+		elif row.get(field) != cond:
+			return False
+	return True
+
+
+def _get_all(doctype, filters=None, fields=None, pluck=None, limit=None, **kwargs):
+	rows = [frappe._dict(r) for r in _TABLES[doctype] if _matches(r, filters)]
+	if pluck:
+		return [r[pluck] for r in rows]
+	return rows[:limit] if limit else rows
+
+
+class TestFiscalStateBatch(FrappeTestCase):
+	def setUp(self):
+		self.get_all = patch("frappe.get_all", side_effect=_get_all).start()
+		patch("frappe.get_list", side_effect=_get_all, create=True).start()
+		patch("frappe.has_permission", return_value=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_lote_equivale_al_calculo_por_documento(self):
+		states = api.get_fiscal_ui_states("Sales Invoice", [*_SI, "SINV-NO-EXISTE"])
+
+		self.assertEqual(set(states), set(_SI))
+		for row in _TABLES["Sales Invoice"]:
+			expected = _compute_facts(frappe._dict(row))
+			self.assertEqual(states[row["name"]]["facts"], expected, row["name"])
+
+		self.assertTrue(states["SINV-1"]["facts"]["requires_complement"])
+		self.assertFalse(states["SINV-1"]["facts"]["has_active_complement"])
+		self.assertTrue(states["SINV-2"]["actions"]["can_refacturar"])
+
+	def test_una_consulta_por_doctype(self):
+		self.get_all.reset_mock()
+		api.get_fiscal_ui_states("Sales Invoice", '["SINV-1", "SINV-2", "SINV-3", "SINV-4"]')
+
+		doctypes = [c.args[0] for c in self.get_all.call_args_list]
+		self.assertEqual(len(doctypes), len(set(doctypes)))
+		self.assertEqual(len(doctypes), 6)
+
+	def test_limite_de_lote(self):
+		with self.assertRaises(frappe.ValidationError):
+			api.get_fiscal_ui_states("Sales Invoice", [f"SINV-{i}" for i in range(api.MAX_BATCH_SIZE + 1)])
@@ -0,0 +1,138 @@
+"""
+Tests unitarios para el índice de cuotas IEPS en memoria (facturacion_fiscal/ieps_cuota_index).
+"""
+
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.facturacion_fiscal import ieps_cuota_index
+
+_MOD = "facturacion_mexico.facturacion_fiscal.ieps_cuota_index"
+
+_GASOLINA = "15101514"
+_REFRESCO = "50202301"
+
+
+def _rows(company):
+	rows = [
+		# Combustibles: una cuota por semana
+		*(
+			frappe._dict(
+				name=f"GAS-{week}",
+				clave_prod_serv=_GASOLINA,
+				uom="LTR",
+				cuota=5.0 + week / 100,
+				cuenta_ieps="IEPS Combustibles - E",
+				vigencia_desde=date(2025, 1, 1 + 7 * week),
+				vigencia_hasta=date(2025, 1, 7 + 7 * week),
+			)
+			for week in range(4)
+		),
+		# Bebidas: vigencia abierta y una anterior cerrada
+		frappe._dict(
+			name="BEB-2024",
+			clave_prod_serv=_REFRESCO,
+			uom="LTR",
+			cuota=1.5,
+			cuenta_ieps="IEPS Bebidas - E",
+			vigencia_desde=date(2024, 1, 1),
+			vigencia_hasta=date(2024, 12, 31),
+		),
+		frappe._dict(
+			name="BEB-2025",
+			clave_prod_serv=_REFRESCO,
+			uom="LTR",
+			cuota=1.64,
+			cuenta_ieps="IEPS Bebidas - E",
+			vigencia_desde=date(2025, 1, 1),
+			vigencia_hasta=None,
+		),
+		frappe._dict(
+			name="BEB-H87",
+			clave_prod_serv=_REFRESCO,
+			uom="H87",
+			cuota=0.9,
+			cuenta_ieps="IEPS Otros - E",
+			vigencia_desde=date(2023, 1, 1),
+			vigencia_hasta=None,
+		),
+	]
+	return rows if company == "Empresa" else []
+
+
+class TestIEPSCuotaIndex(FrappeTestCase):
+	"""Búsqueda por vigencia, carga única por empresa e invalidación por versión."""
+
+	def setUp(self):
+		ieps_cuota_index._indexes.clear()
+		self.addCleanup(ieps_cuota_index._indexes.clear)
+		self.version = "v1"
+		patches = [
+			patch(f"{_MOD}._load_rows", side_effect=_rows),
+			patch(f"{_MOD}._current_version", side_effect=lambda company: self.version),
+		]
+		self.load_rows = patches[0].start()
+		patches[1].start()
+		for p in patches:
+			self.addCleanup(p.stop)
+
+	def test_cuota_semanal_por_fecha(self):
+		for _ in range(100):
+			cuota = ieps_cuota_index.find("Empresa", _GASOLINA, "2025-01-16")
+		self.assertEqual(cuota.name, "GAS-2")
+		self.assertEqual(ieps_cuota_index.find("Empresa", _GASOLINA, "2025-01-08").name, "GAS-1")
+		self.assertIsNone(ieps_cuota_index.find("Empresa", _GASOLINA, "2025-02-01"))
+		self.assertIsNone(ieps_cuota_index.find("Empresa", _GASOLINA, "2024-12-31"))
+		self.assertEqual(self.load_rows.call_count, 1)
+
+	def test_vigencias_abiertas_mas_reciente_primero(self):
+		names = [c.name for c in ieps_cuota_index.vigentes("Empresa", _REFRESCO, date(2025, 6, 1))]
+		self.assertEqual(names, ["BEB-2025", "BEB-H87"])
+		names = [c.name for c in ieps_cuota_index.vigentes("Empresa", _REFRESCO, date(2024, 6, 1))]
+		self.assertEqual(names, ["BEB-2024", "BEB-H87"])
+
+	def test_filtro_por_cuenta_y_empresa(self):
+		cuota = ieps_cuota_index.find("Empresa", _REFRESCO, "2025-06-01", cuenta_ieps="IEPS Otros - E")
+		self.assertEqual((cuota.cuota, cuota.uom), (0.9, "H87"))
+		self.assertIsNone(ieps_cuota_index.find("Otra Empresa", _REFRESCO, "2025-06-01"))
+		self.assertEqual(ieps_cuota_index.vigentes("", _REFRESCO, "2025-06-01"), [])
+
+	def test_cambio_de_version_recarga(self):
+		with patch(f"{_MOD}.VERSION_CHECK_SECONDS", -1):
+			ieps_cuota_index.get_index("Empresa")
+			ieps_cuota_index.get_index("Empresa")
+			self.version = "v2"
+			ieps_cuota_index.get_index("Empresa")
+		self.assertEqual(self.load_rows.call_count, 2)
+
+	def test_obtener_cuotas_vigentes_usa_el_indice(self):
+		from facturacion_mexico.hooks_handlers.sales_invoice_automated_tax import _obtener_cuotas_vigentes
+
+		self.assertEqual(
+			_obtener_cuotas_vigentes("Empresa", _GASOLINA, "2025-01-02"),
+			[{"cuenta_ieps": "IEPS Combustibles - E", "cuota": 5.0, "uom": "LTR"}],
+		)
+
+	def test_cambio_de_cuota_publica_al_confirmar(self):
+		ieps_cuota_index.get_index("Empresa")
+		doc = frappe._dict(company="Empresa", get_doc_before_save=lambda: frappe._dict(company="Otra"))
+		with patch(f"{_MOD}.cache_version.publish_on_commit") as publish:
+			ieps_cuota_index.on_cuota_change(doc)
+
+		keys = [c.args[0] for c in publish.call_args_list]
+		self.assertEqual(keys, ["fm_ieps_cuota_version:Empresa", "fm_ieps_cuota_version:Otra"])
+		# El índice local se descarta en el callback (después del commit), no antes
+		_key, on_publish, args = publish.call_args_list[0].args
+		self.assertIn(args[0], ieps_cuota_index._indexes)
+		on_publish(*args)
+		self.assertNotIn(args[0], ieps_cuota_index._indexes)
+
+	def test_sin_redis_recarga_al_expirar(self):
+		self.version = None
+		with patch(f"{_MOD}.VERSION_CHECK_SECONDS", -1):
+			ieps_cuota_index.get_index("Empresa")
+			ieps_cuota_index.get_index("Empresa")
+		self.assertEqual(self.load_rows.call_count, 2)
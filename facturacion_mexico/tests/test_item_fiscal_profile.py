@@ -0,0 +1,127 @@
+"""
+Tests unitarios para el perfil fiscal de Items/UOMs (utils/item_fiscal_profile).
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.utils import item_fiscal_profile
+
+_MOD = "facturacion_mexico.utils.item_fiscal_profile"
+
+
+def _fake_get_all(doctype, filters=None, fields=None, as_list=False, **kwargs):
+	if doctype == "Item":
+		return [
+			frappe._dict(
+				name=name,
+				item_name=name,
+				item_group="Productos",
+				fm_producto_servicio_sat=None if name.endswith("SIN") else "84111506",
+			)
+			for name in filters["name"][1]
+			if not name.startswith("NOEXISTE")
+		]
+	if doctype == "Item Tax":
+		return [frappe._dict(parent=filters["parent"][1][0], item_tax_template="IVA 0% - T")]
+	if doctype == "UOM":
+		return [frappe._dict(name=name, enabled=name != "LTR - Litro") for name in filters["name"][1]]
+	return []
+
+
+class TestItemFiscalProfile(FrappeTestCase):
+	"""Carga en bloque y memoria por request."""
+
+	def setUp(self):
+		item_fiscal_profile.clear()
+		self.addCleanup(item_fiscal_profile.clear)
+		patcher = patch(f"{_MOD}.catalog_service.get_field", return_value="02")
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def _doc(self, n):
+		rows = [frappe._dict(item_code=f"ITEM-{i % 3}", uom="H87 - Pieza") for i in range(n)]
+		rows.append(frappe._dict(item_code="ITEM-SIN", uom="LTR - Litro"))
+		return SimpleNamespace(items=rows)
+
+	def test_documento_grande_usa_consultas_fijas(self):
+		with patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all) as get_all:
+			profiles = item_fiscal_profile.load_for_document(self._doc(300))
+
+		# UOM + Item + Item Tax (ObjetoImp sale del catálogo SAT en memoria)
+		self.assertEqual(get_all.call_count, 3)
+		self.assertEqual(len(profiles), 4)
+		self.assertEqual(profiles["ITEM-0"].producto_servicio_sat, "84111506")
+		self.assertEqual(profiles["ITEM-0"].objeto_impuesto, "02")
+		self.assertIsNone(profiles["ITEM-SIN"].producto_servicio_sat)
+
+	def test_memoria_evita_reconsultar(self):
+		with patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all) as get_all:
+			item_fiscal_profile.load_for_document(self._doc(10))
+			calls = get_all.call_count
+			self.assertEqual(item_fiscal_profile.get_item_profile("ITEM-1").item_code, "ITEM-1")
+			uoms = item_fiscal_profile.get_uom_profiles(["H87 - Pieza", "LTR - Litro"])
+			self.assertEqual(get_all.call_count, calls)
+
+		self.assertEqual(uoms["H87 - Pieza"].clave_unidad_sat, "H87")
+		self.assertFalse(uoms["LTR - Litro"].enabled)
+
+	def test_clear_descarta_perfiles(self):
+		with patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all) as get_all:
+			item_fiscal_profile.get_item_profile("ITEM-1")
+			item_fiscal_profile.clear()
+			item_fiscal_profile.get_item_profile("ITEM-1")
+
+		item_calls = [c for c in get_all.call_args_list if c.args[0] == "Item"]
+		self.assertEqual(len(item_calls), 2)
+
+	def test_item_inexistente_no_aparece(self):
+		with patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all):
+			self.assertIsNone(item_fiscal_profile.get_item_profile("NOEXISTE-1"))
+
+	def test_tablas_de_conversion_uom_en_una_consulta(self):
+		rows = [frappe._dict(parent="ITEM-0", uom="LTR", conversion_factor=0.6)]
+		with patch(f"{_MOD}.frappe.get_all", return_value=rows) as get_all:
+			item_fiscal_profile.get_uom_conversion_factors(["ITEM-0", "ITEM-1", "ITEM-0"])
+			for _ in range(50):
+				self.assertEqual(item_fiscal_profile.get_uom_conversion_factor("ITEM-0", "LTR"), 0.6)
+		self.assertEqual(get_all.call_count, 1)
+		self.assertEqual(item_fiscal_profile.get_uom_conversion_factors(["ITEM-1"]), {"ITEM-1": {}})
+
+
+class TestTimbradoPayloadItems(FrappeTestCase):
+	"""El payload de timbrado lee los Items de la factura en una consulta, sin get_doc por línea."""
+
+	def setUp(self):
+		item_fiscal_profile.clear()
+		self.addCleanup(item_fiscal_profile.clear)
+		patcher = patch(f"{_MOD}.catalog_service.get_field", return_value="02")
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_items_del_payload_en_una_consulta(self):
+		from facturacion_mexico.facturacion_fiscal.timbrado_api import TimbradoAPI
+
+		rows = [frappe._dict(item_code=f"ITEM-{i % 5}", uom="H87 - Pieza") for i in range(200)]
+		with (
+			patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all) as get_all,
+			patch("frappe.get_doc", side_effect=AssertionError("get_doc por línea"), create=True),
+		):
+			item_docs = TimbradoAPI.__new__(TimbradoAPI)._load_payload_items(SimpleNamespace(items=rows))
+
+		item_calls = [c for c in get_all.call_args_list if c.args[0] == "Item"]
+		self.assertEqual(len(item_calls), 1)
+		self.assertEqual(sorted(item_calls[0].kwargs["filters"]["name"][1]), [f"ITEM-{i}" for i in range(5)])
+		self.assertEqual(item_docs["ITEM-3"].fm_producto_servicio_sat, "84111506")
+		self.assertEqual(item_docs["ITEM-3"].get("item_name"), "ITEM-3")
+
+	def test_item_inexistente_lanza(self):
+		from facturacion_mexico.facturacion_fiscal.timbrado_api import TimbradoAPI
+
+		rows = [frappe._dict(item_code="NOEXISTE-1", uom="H87 - Pieza")]
+		with patch(f"{_MOD}.frappe.get_all", side_effect=_fake_get_all):
+			with self.assertRaises(frappe.ValidationError):
+				TimbradoAPI.__new__(TimbradoAPI)._load_payload_items(SimpleNamespace(items=rows))
@@ -0,0 +1,129 @@
+"""
+Tests unitarios para el índice local de la Lista 69-B (validaciones/lista_69b_index).
+"""
+
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.validaciones import lista_69b_index
+
+_MOD = "facturacion_mexico.validaciones.lista_69b_index"
+
+# Formato de la publicación del SAT: renglones de título antes del encabezado, Latin-1
+_CSV = """Información actualizada al 15 de octubre de 2026
+Listado completo de contribuyentes (artículo 69-B)
+No,RFC,Nombre del Contribuyente,Situación del contribuyente,Número y fecha de oficio
+1,AAA010101AAA,EMPRESA FANTASMA SA,Presunto,500-39-00-00
+2,BBB020202BBB,OTRA SA DE CV,Desvirtuado,500-39-00-01
+3,ÑCC030303CC1,CONSTRUCTORA ÑU,Definitivo,500-39-00-02
+4,AAA010101AAA,EMPRESA FANTASMA SA,Definitivo,500-39-00-03
+5,NO-ES-RFC,FILA INVÁLIDA,Presunto,
+6,DDDD040404DD4,PERSONA FISICA,Sentencia Favorable,500-39-00-04
+"""
+
+
+class TestLista69BIndex(FrappeTestCase):
+	"""Ingesta del CSV, búsqueda binaria + Bloom y versionado por publicación."""
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.addCleanup(self.tmp.cleanup)
+		lista_69b_index._indexes.clear()
+		self.addCleanup(lista_69b_index._indexes.clear)
+
+		self.version = None
+		self.cache = MagicMock()
+		self.cache.set_value.side_effect = lambda key, value: setattr(self, "version", value)
+		patches = [
+			patch(f"{_MOD}._index_dir", return_value=self.tmp.name),
+			patch(f"{_MOD}._published_version", side_effect=lambda: self.version),
+			patch(f"{_MOD}.frappe.cache", return_value=self.cache),
+		]
+		for p in patches:
+			p.start()
+			self.addCleanup(p.stop)
+
+	def _csv(self, content=_CSV, name="Listado_Completo_69-B.csv"):
+		path = os.path.join(self.tmp.name, name)
+		with open(path, "w", encoding="latin-1") as f:
+			f.write(content)
+		return path
+
+	def test_ingesta_y_busqueda(self):
+		result = lista_69b_index.ingest_file(self._csv(), "2026-10-15")
+
+		self.assertEqual(result["total"], 4)
+		self.assertEqual(result["invalidos"], 1)
+		self.assertEqual(self.version["file"], "lista_69b_2026-10-15.idx")
+
+		# La última situación publicada gana
+		entry = lista_69b_index.lookup(" aaa010101aaa ")
+		self.assertEqual(entry.situacion, "Definitivo")
+		self.assertEqual(entry.fecha_publicacion, "2026-10-15")
+		self.assertTrue(lista_69b_index.contains("ÑCC030303CC1"))
+		self.assertFalse(lista_69b_index.contains("DDDD040404DD4"))
+		self.assertFalse(lista_69b_index.contains("BBB020202BBB"))
+		self.assertIsNone(lista_69b_index.lookup("XAXX010101000"))
+		self.assertIsNone(lista_69b_index.lookup(None))
+
+	def test_lookup_many_sin_bloom(self):
+		lista_69b_index.ingest_file(self._csv(), "2026-10-15")
+		index = lista_69b_index.get_index()
+		sin_bloom = lista_69b_index.Lista69BIndex(
+			index.rfcs, index.situaciones, index.fecha_publicacion, with_bloom=False
+		)
+		for rfc in ("AAA010101AAA", "BBB020202BBB", "ÑCC030303CC1", "DDDD040404DD4", "ZZZ999999ZZZ"):
+			self.assertEqual(sin_bloom.lookup(rfc), index.lookup(rfc))
+
+		found = lista_69b_index.lookup_many(["AAA010101AAA", "ZZZ999999ZZZ", "BBB020202BBB"])
+		self.assertEqual(set(found), {"AAA010101AAA", "BBB020202BBB"})
+
+	def test_worker_nuevo_carga_desde_disco_sin_redis(self):
+		lista_69b_index.ingest_file(self._csv(), "2026-10-15")
+		lista_69b_index._indexes.clear()
+		self.version = None
+
+		self.assertTrue(lista_69b_index.contains("AAA010101AAA"))
+		self.assertEqual(lista_69b_index.stats()["total"], 4)
+
+	def test_reingesta_misma_fecha_recarga_otros_workers(self):
+		lista_69b_index.ingest_file(self._csv(), "2026-10-15")
+		stale = lista_69b_index.get_index()
+		first = self.version
+
+		corregido = self._csv(
+			_CSV.replace("1,AAA010101AAA,EMPRESA FANTASMA SA,Presunto", "1,ZZZ010101ZZ1,X,Presunto")
+		)
+		lista_69b_index.ingest_file(corregido, "2026-10-15")
+		self.assertEqual(self.version["file"], first["file"])
+		self.assertNotEqual(self.version["version"], first["version"])
+
+		# Otro worker con el índice anterior en memoria, al vencer su intervalo de revisión
+		site = getattr(frappe.local, "site", None)
+		lista_69b_index._indexes[site] = (0, stale, first["version"])
+		self.assertIsNotNone(lista_69b_index.lookup("ZZZ010101ZZ1"))
+
+		# Re-ingerir el mismo contenido no cambia la versión
+		current = self.version
+		lista_69b_index.ingest_file(corregido, "2026-10-15")
+		self.assertEqual(self.version, current)
+
+	def test_publicacion_anterior_requiere_force(self):
+		lista_69b_index.ingest_file(self._csv(), "2026-10-15")
+		anterior = self._csv("RFC,Situación\nEEE050505EE5,Presunto\n", "anterior.csv")
+
+		with self.assertRaises(frappe.ValidationError):
+			lista_69b_index.ingest_file(anterior, "2026-09-01")
+
+		lista_69b_index.ingest_file(anterior, "2026-09-01", force=1)
+		self.assertTrue(lista_69b_index.contains("EEE050505EE5"))
+		self.assertIsNone(lista_69b_index.lookup("AAA010101AAA"))
+
+	def test_sin_indice_no_encuentra(self):
+		self.assertIsNone(lista_69b_index.get_index())
+		self.assertFalse(lista_69b_index.contains("AAA010101AAA"))
+		self.assertEqual(lista_69b_index.lookup_many(["AAA010101AAA"]), {})
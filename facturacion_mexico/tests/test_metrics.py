@@ -0,0 +1,68 @@
+"""
+Tests unitarios para los histogramas de latencia (utils/metrics).
+"""
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.utils import metrics
+
+_METRIC = "fm_test_latency_ms"
+
+
+class TestMetrics(FrappeTestCase):
+	"""Agregación en Redis, percentiles y exportador Prometheus."""
+
+	def setUp(self):
+		metrics._pending.clear()
+		metrics.reset(_METRIC)
+		self.addCleanup(metrics.reset, _METRIC)
+
+	def test_quantile_interpola_dentro_del_bucket(self):
+		buckets = [0] * (len(metrics.LATENCY_BUCKETS_MS) + 1)
+		buckets[metrics._bucket_index(80)] = 100  # bucket (50, 100]
+		self.assertEqual(metrics.quantile(buckets, 0.5), 75.0)
+		self.assertEqual(metrics.quantile(buckets, 1.0), 100.0)
+		self.assertIsNone(metrics.quantile([0] * len(buckets), 0.5))
+
+	def test_push_agrega_y_snapshot_filtra_por_etiqueta(self):
+		for value in (3, 40, 40, 900):
+			metrics.observe(_METRIC, value, phase="pac_call", company="A", branch="")
+		metrics.observe(_METRIC, 12, phase="pac_call", company="B", branch="")
+		self.assertEqual(metrics.push(), 2)
+		# Un segundo push sin observaciones no envía nada
+		self.assertEqual(metrics.push(), 0)
+
+		series = metrics.snapshot(_METRIC, company="A")
+		self.assertEqual(len(series), 1)
+		self.assertEqual(series[0]["count"], 4)
+		self.assertEqual(series[0]["sum_ms"], 983)
+		self.assertEqual(series[0]["labels"], {"branch": "", "company": "A", "phase": "pac_call"})
+		self.assertLessEqual(series[0]["p95_ms"], 1000)
+
+	def test_timer_registra_aunque_el_bloque_falle(self):
+		with self.assertRaises(ValueError):
+			with metrics.timer(_METRIC, phase="prepare"):
+				raise ValueError("x")
+		metrics.push()
+		self.assertEqual(metrics.snapshot(_METRIC)[0]["count"], 1)
+
+	def test_timer_usa_etiquetas_resueltas_dentro_del_bloque(self):
+		with metrics.timer(_METRIC, phase="prepare", company="", branch="") as labels:
+			labels.update(company="A", branch="SUC-1")
+		metrics.push()
+
+		series = metrics.snapshot(_METRIC)
+		self.assertEqual(len(series), 1)
+		self.assertEqual(series[0]["labels"], {"branch": "SUC-1", "company": "A", "phase": "prepare"})
+
+	def test_prometheus_text_buckets_acumulados(self):
+		metrics.observe(_METRIC, 7, phase="email")
+		metrics.observe(_METRIC, 70000, phase="email")
+		metrics.push()
+
+		text = metrics.prometheus_text([_METRIC])
+		self.assertIn("# TYPE fm_test_latency_seconds histogram", text)
+		self.assertIn('fm_test_latency_seconds_bucket{phase="email",le="0.01"} 1', text)
+		self.assertIn('fm_test_latency_seconds_bucket{phase="email",le="+Inf"} 2', text)
+		self.assertIn('fm_test_latency_seconds_count{phase="email"} 2', text)
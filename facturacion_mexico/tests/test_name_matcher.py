@@ -0,0 +1,109 @@
+"""
+Tests unitarios para la comparación de nombres contra el SAT (validaciones/name_matcher).
+"""
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.validaciones import name_matcher
+
+_MOD = "facturacion_mexico.validaciones.name_matcher"
+
+
+class TestNameMatcher(FrappeTestCase):
+	"""Formas normalizadas, similitud y conciliación por lotes."""
+
+	def setUp(self):
+		name_matcher.clear_cache()
+
+	def test_exact_key_preserva_enie(self):
+		self.assertEqual(name_matcher.exact_key("  Peña   y Muñoz "), "PEÑA Y MUÑOZ")
+		self.assertNotEqual(name_matcher.exact_key("PEÑA"), name_matcher.exact_key("PENA"))
+
+	def test_canonical_quita_acentos_puntuacion_y_regimen(self):
+		self.assertEqual(
+			name_matcher.canonical_many(
+				[
+					"Comercializadora Ñandú, S.A. de C.V.",
+					"GRUPO LÓPEZ S. DE R.L. DE C.V.",
+					"Servicios\tIntegrales SAPI de CV",
+					", S.A.",
+					None,
+				]
+			),
+			["COMERCIALIZADORA NANDU", "GRUPO LOPEZ", "SERVICIOS INTEGRALES", "S A", ""],
+		)
+		# Mismo resultado por nombre y por lote
+		self.assertEqual(name_matcher.canonical("Grupo López, S.A. de C.V."), "GRUPO LOPEZ")
+
+	def test_separador_dentro_del_nombre(self):
+		self.assertEqual(name_matcher.canonical_many(["A\x00B SA", "C"]), ["A B", "C"])
+
+	def test_facturapi_name(self):
+		self.assertEqual(name_matcher.facturapi_name("Peña Hermanos, S.A. de C.V."), "PENA HERMANOS")
+		self.assertEqual(name_matcher.facturapi_name("Asociación Civil A.C."), "ASOCIACION CIVIL")
+		self.assertEqual(name_matcher.facturapi_name(""), "")
+
+	def test_score_pairs(self):
+		scores = name_matcher.score_pairs(
+			[
+				("Distribuidora del Norte SA de CV", "DISTRIBUIDORA DEL NORTE"),
+				("Distribuidora del Nrte", "DISTRIBUIDORA DEL NORTE"),
+				("Farmacéutica Pacífico", "TRANSPORTES INDUSTRIALES"),
+				("", "TRANSPORTES"),
+			]
+		)
+		self.assertEqual(scores[0], 1.0)
+		self.assertGreater(scores[1], 0.85)
+		self.assertLess(scores[2], 0.3)
+		self.assertEqual(scores[3], 0.0)
+		self.assertEqual(
+			scores,
+			[
+				name_matcher.similarity(a, b)
+				for a, b in [
+					("Distribuidora del Norte SA de CV", "DISTRIBUIDORA DEL NORTE"),
+					("Distribuidora del Nrte", "DISTRIBUIDORA DEL NORTE"),
+					("Farmacéutica Pacífico", "TRANSPORTES INDUSTRIALES"),
+					("", "TRANSPORTES"),
+				]
+			],
+		)
+
+	def test_estados_de_match(self):
+		results = name_matcher.match_pairs(
+			[
+				("peña  hermanos", "PEÑA HERMANOS"),
+				("Peña Hermanos, S.A. de C.V.", "PEÑA HERMANOS"),
+				("Pena Hermans", "PEÑA HERMANOS"),
+				("Alimentos García", "PEÑA HERMANOS"),
+			]
+		)
+		self.assertEqual(
+			[r.status for r in results],
+			[
+				name_matcher.STATUS_EXACTO,
+				name_matcher.STATUS_EQUIVALENTE,
+				name_matcher.STATUS_SIMILAR,
+				name_matcher.STATUS_DISTINTO,
+			],
+		)
+
+	def test_reconcile_customers_una_consulta(self):
+		customers = [
+			frappe._dict(name="C1", customer_name="PEÑA HERMANOS", tax_id="PHE010101AAA"),
+			frappe._dict(name="C2", customer_name="Alimentos García", tax_id="agc020202bbb"),
+		]
+		with (
+			patch(f"{_MOD}.frappe.has_permission", return_value=True),
+			patch(f"{_MOD}.frappe.get_all", return_value=customers) as get_all,
+		):
+			rows = name_matcher.reconcile_customers(
+				'{"PHE010101AAA": "PEÑA HERMANOS", "AGC020202BBB": "TRANSPORTES DEL PACIFICO"}'
+			)
+
+		get_all.assert_called_once()
+		self.assertEqual([r["customer"] for r in rows], ["C2"])
+		self.assertEqual(rows[0]["status"], name_matcher.STATUS_DISTINTO)
@@ -0,0 +1,130 @@
+"""
+Tests para la proyección de folios por sucursal y el consolidado fiscal: serie diaria de
+consumo en una consulta agrupada y configuración fiscal por lote.
+"""
+
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.multi_sucursal import folio_consumption
+from facturacion_mexico.multi_sucursal.report.consolidado_fiscal_multisucursal import (
+	consolidado_fiscal_multisucursal as consolidado,
+)
+from facturacion_mexico.multi_sucursal.report.proyeccion_folios_sucursal import (
+	proyeccion_folios_sucursal as proyeccion,
+)
+
+_MOD = "facturacion_mexico.multi_sucursal.report.proyeccion_folios_sucursal.proyeccion_folios_sucursal"
+_TODAY = date(2025, 7, 31)
+
+
+def _config(branch, serie="A", current=1, end=1000):
+	return frappe._dict(
+		branch=branch,
+		branch_name=f"Sucursal {branch}",
+		serie=serie,
+		folio_start=1,
+		folio_end=end,
+		folio_current=current,
+		is_active=1,
+		date_activated=None,
+	)
+
+
+class _Now:
+	@staticmethod
+	def now():
+		return MagicMock(date=MagicMock(return_value=_TODAY))
+
+
+class TestProyeccionFolios(FrappeTestCase):
+	"""Una consulta de configuraciones más una de consumo, sin importar el número de series."""
+
+	def setUp(self):
+		self.configs = [_config(f"SUC-{i}") for i in range(100)] + [_config("SUC-0", serie=None)]
+		self.consumption = [
+			# Ventana actual: 60 facturas (2/día); ventana anterior: 40
+			frappe._dict(
+				branch="SUC-0", serie="A", posting_date=_TODAY - timedelta(days=1), invoice_count=60
+			),
+			frappe._dict(
+				branch="SUC-0", serie="A", posting_date=_TODAY - timedelta(days=45), invoice_count=40
+			),
+			frappe._dict(branch="SUC-0", serie="DEFAULT", posting_date=_TODAY, invoice_count=3),
+		]
+
+		def sql(query, values=None, as_dict=False):
+			if "GROUP BY fm_branch, fm_serie_cfdi, posting_date" in query:
+				return self.consumption
+			return self.configs
+
+		self.sql = MagicMock(side_effect=sql)
+		patch("frappe.db.sql", self.sql, create=True).start()
+		patch(f"{_MOD}.datetime", _Now).start()
+		self.addCleanup(patch.stopall)
+
+	def test_consultas_constantes(self):
+		data = proyeccion.get_data(frappe._dict())
+
+		self.assertEqual(len(data), 101)
+		self.assertEqual(self.sql.call_count, 2)
+		values = self.sql.call_args_list[1].args[1]
+		self.assertEqual(len(values["branches"]), 100)
+		self.assertEqual(values["since"], _TODAY - timedelta(days=60))
+
+	def test_promedio_tendencia_y_proyeccion(self):
+		data = proyeccion.get_data(frappe._dict())
+		row = data[0]
+
+		self.assertEqual(row["daily_average"], 2.0)
+		self.assertEqual(row["monthly_trend"], 50.0)
+		self.assertEqual(row["days_remaining"], 500)
+		self.assertEqual(row["projected_depletion_date"], _TODAY + timedelta(days=500))
+		# Serie vacía se agrupa como DEFAULT
+		self.assertEqual(data[-1]["daily_average"], 0.1)
+
+	def test_sin_consumo_sin_proyeccion(self):
+		row = proyeccion.get_data(frappe._dict())[1]
+
+		self.assertEqual(row["daily_average"], 0.0)
+		self.assertEqual(row["monthly_trend"], 0.0)
+		self.assertIsNone(row["projected_depletion_date"])
+		self.assertEqual(row["days_remaining"], folio_consumption.NO_PROJECTION_DAYS)
+
+
+class TestConsolidadoFiscal(FrappeTestCase):
+	"""Folios y certificado de todas las sucursales en una sola consulta."""
+
+	def setUp(self):
+		invoice_rows = [
+			frappe._dict(branch=f"SUC-{i}", branch_name=f"Sucursal {i}", total_invoices=1) for i in range(50)
+		]
+		invoice_rows.append(frappe._dict(branch=None, branch_name=None, total_invoices=1))
+		config_rows = [
+			frappe._dict(branch="SUC-0", folio_current=250, folio_end=1000, available=750, days_to_expiry=5),
+			frappe._dict(branch="SUC-0", folio_current=1, folio_end=10, available=9, days_to_expiry=90),
+		]
+
+		def sql(query, values=None, as_dict=False):
+			if "tabConfiguracion Fiscal Sucursal" in query:
+				return config_rows
+			return invoice_rows
+
+		self.sql = MagicMock(side_effect=sql)
+		patch("frappe.db.sql", self.sql, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_configuracion_por_lote(self):
+		data = consolidado.get_data(frappe._dict())
+
+		self.assertEqual(self.sql.call_count, 2)
+		self.assertEqual(len(self.sql.call_args_list[1].args[1]["branches"]), 50)
+		# La configuración más reciente (primera por creation DESC) gana
+		self.assertEqual(data[0]["folio_usage"], "750 disp. (25.0% usado)")
+		self.assertEqual(data[0]["certificate_status"], "🔴 Vence en 5 días")
+		self.assertEqual(data[1]["folio_usage"], "Sin configurar")
+		self.assertEqual(data[1]["certificate_status"], "Sin certificado")
+		self.assertEqual(data[-1]["folio_usage"], "N/A")
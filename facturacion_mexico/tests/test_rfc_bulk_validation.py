@@ -0,0 +1,146 @@
+"""
+Tests unitarios para la validación masiva de RFC (validaciones/rfc_bulk_validation).
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.validaciones import rfc_bulk_validation
+
+_MOD = "facturacion_mexico.validaciones.rfc_bulk_validation"
+
+
+def _customers(n):
+	return [
+		frappe._dict(
+			name=f"CUST-{i}",
+			customer_name=f"Cliente {i}",
+			tax_id=None if i == 0 else f"AAA01010{i % 10}AA{i % 10}",
+			fm_tax_regime="601",
+			email_id=None,
+		)
+		for i in range(n)
+	]
+
+
+def _fake_validate(customer, address, client=None, persist=True):
+	data = {"rfc": customer.tax_id, "validation_successful": bool(address)}
+	if not persist:
+		data["customer_updates"] = {"fm_rfc_validated": 1 if address else 0}
+	return {"success": True, "data": data}
+
+
+class TestTokenBucket(FrappeTestCase):
+	def test_espera_cuando_se_agota_la_rafaga(self):
+		clock = [100.0]
+		with (
+			patch(f"{_MOD}.time.monotonic", side_effect=lambda: clock[0]),
+			patch(f"{_MOD}.time.sleep", side_effect=lambda s: clock.__setitem__(0, clock[0] + s)),
+		):
+			bucket = rfc_bulk_validation.TokenBucket(rate=2, capacity=2)
+			waits = [bucket.acquire() for _ in range(4)]
+
+		self.assertEqual(waits[:2], [0.0, 0.0])
+		self.assertAlmostEqual(waits[2], 0.5)
+		self.assertAlmostEqual(waits[3], 0.5)
+		self.assertAlmostEqual(clock[0], 101.0)
+
+	def test_cliente_limitado_pasa_por_el_bucket(self):
+		bucket = MagicMock()
+		client = MagicMock()
+		request = client._make_request
+		limited = rfc_bulk_validation.rate_limited_client(bucket, client)
+		limited._make_request("GET", "/customers/1")
+		bucket.acquire.assert_called_once()
+		request.assert_called_once_with("GET", "/customers/1")
+
+
+class TestRFCBulkValidation(FrappeTestCase):
+	"""Prefetch en bloque, escritura por lotes, concurrencia y checkpoints."""
+
+	def setUp(self):
+		self.checkpoints = {}
+		self.customers = _customers(6)
+		self.address_rows = [
+			frappe._dict(customer=f"CUST-{i}", name=f"ADDR-{i}-{p}", pincode="06600", is_primary_address=p)
+			for i in (1, 2, 3)
+			for p in (1, 0)
+		]
+		patches = [
+			patch(f"{_MOD}.frappe.get_all", return_value=self.customers),
+			patch(f"{_MOD}.frappe.db"),
+			patch(f"{_MOD}.get_settings", return_value=(1, 1000.0)),
+			patch(f"{_MOD}.rate_limited_client", return_value=object()),
+			patch(f"{_MOD}.load_checkpoint", side_effect=lambda run_id: self.checkpoints.get(run_id, [])),
+			patch(
+				f"{_MOD}.save_checkpoint",
+				side_effect=lambda run_id, pending: self.checkpoints.__setitem__(run_id, pending),
+			),
+			patch(
+				"facturacion_mexico.validaciones.api._validate_customer_rfc",
+				side_effect=_fake_validate,
+			),
+		]
+		started = [p.start() for p in patches]
+		for p in patches:
+			self.addCleanup(p.stop)
+		self.db = started[1]
+		self.db.sql.side_effect = lambda *args, **kwargs: [frappe._dict(r) for r in self.address_rows]
+
+	def test_lote_secuencial_con_prefetch_y_escritura_en_bloque(self):
+		result = rfc_bulk_validation.run([c.name for c in self.customers], run_id="test")
+
+		self.assertEqual(self.db.sql.call_count, 1)
+		self.assertEqual(result["summary"]["successful_validations"], 5)
+		self.assertEqual(result["summary"]["failed_validations"], 1)
+		self.assertEqual(result["summary"]["customers_now_validated"], 3)
+		updates = self.db.bulk_update.call_args.args[1]
+		self.assertEqual(set(updates), {f"CUST-{i}" for i in range(1, 6)})
+		self.assertEqual(updates["CUST-1"], {"fm_rfc_validated": 1})
+		self.assertEqual(updates["CUST-4"], {"fm_rfc_validated": 0})
+		self.assertEqual(self.checkpoints["test"], [])
+		self.assertEqual(result["pending"], 0)
+
+	def test_direccion_primaria_tiene_precedencia(self):
+		# Orden de la consulta (creation): las no primarias llegan antes que la primaria
+		self.address_rows = [
+			frappe._dict(customer="CUST-1", name="SECUNDARIA", is_primary_address=0),
+			frappe._dict(customer="CUST-1", name="PRIMARIA", is_primary_address=1),
+			frappe._dict(customer="CUST-1", name="OTRA", is_primary_address=0),
+			frappe._dict(customer="CUST-2", name="ANTIGUA", is_primary_address=0),
+			frappe._dict(customer="CUST-2", name="NUEVA", is_primary_address=0),
+		]
+		addresses = rfc_bulk_validation.prefetch_primary_addresses(["CUST-1", "CUST-2"])
+		self.assertEqual(addresses["CUST-1"].name, "PRIMARIA")
+		# Sin primaria, la primera activa
+		self.assertEqual(addresses["CUST-2"].name, "ANTIGUA")
+
+	def test_ventana_agotada_deja_pendientes_en_checkpoint(self):
+		# bucket + deadline + dos clientes dentro de la ventana; después se agota
+		with patch(f"{_MOD}.time.monotonic", side_effect=[0.0] * 4 + [99.0] * 10):
+			result = rfc_bulk_validation.run(
+				[c.name for c in self.customers], run_id="nightly", max_seconds=10
+			)
+
+		self.assertEqual(len(result["results"]), 3)
+		self.assertEqual(self.checkpoints["nightly"], ["CUST-3", "CUST-4", "CUST-5"])
+
+		# La siguiente ejecución continúa con los pendientes
+		result = rfc_bulk_validation.run([], run_id="nightly")
+		self.assertEqual([r["customer"] for r in result["results"]], ["CUST-3", "CUST-4", "CUST-5"])
+		self.assertEqual(self.checkpoints["nightly"], [])
+
+	def test_concurrente_procesa_todos(self):
+		frappe.local.sites_path = getattr(frappe.local, "sites_path", ".")
+		with (
+			patch(f"{_MOD}.frappe.init", create=True),
+			patch(f"{_MOD}.frappe.connect", create=True),
+			patch(f"{_MOD}.frappe.set_user", create=True),
+			patch(f"{_MOD}.frappe.destroy", create=True),
+		):
+			result = rfc_bulk_validation.run([c.name for c in self.customers], concurrency=3)
+
+		self.assertEqual(sorted(r["customer"] for r in result["results"]), [c.name for c in self.customers])
+		self.assertEqual(len(self.db.bulk_update.call_args.args[1]), 5)
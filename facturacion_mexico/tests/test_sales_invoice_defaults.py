@@ -0,0 +1,165 @@
+"""
+Tests unitarios para la resolución cacheada de defaults de Sales Invoice (utils/sales_invoice_defaults).
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.utils import cache_version, sales_invoice_defaults
+
+_MOD = "facturacion_mexico.utils.sales_invoice_defaults"
+
+
+class _FakeRedis:
+	"""Subconjunto de RedisWrapper usado por el módulo: valores y hashes."""
+
+	def __init__(self):
+		self.values = {}
+		self.hashes = {}
+
+	def get_value(self, key):
+		return self.values.get(key)
+
+	def set_value(self, key, value, expires_in_sec=None):
+		self.values[key] = value
+
+	def make_key(self, key):
+		return f"site|{key}"
+
+	def pipeline(self):
+		ops = []
+		pipe = MagicMock()
+		pipe.hmget.side_effect = lambda k, fields: ops.append(
+			lambda: [self.hashes.get(k, {}).get(f) for f in fields]
+		)
+		pipe.hset.side_effect = lambda k, f, v: ops.append(
+			lambda: self.hashes.setdefault(k, {}).__setitem__(f, v.encode())
+		)
+		pipe.expire.side_effect = lambda k, ttl: ops.append(lambda: True)
+		pipe.execute.side_effect = lambda: [op() for op in ops]
+		return pipe
+
+
+def _get_value(doctype, name, fields, as_dict=False):
+	if doctype == "Customer":
+		return frappe._dict(fm_customer_default_cost_center="CC Tijuana - E", default_price_list=None)
+	if doctype == "Cost Center":
+		return frappe._dict(fm_mapped_branch="Tijuana", fm_default_selling_price_list="Frontera")
+	if doctype == "Branch":
+		return 1
+	return None
+
+
+class _Callbacks(list):
+	"""Subconjunto de `frappe.db.after_commit` / `after_rollback`."""
+
+	def add(self, fn):
+		self.append(fn)
+
+	def run(self):
+		callbacks = list(self)
+		self.clear()
+		for fn in callbacks:
+			fn()
+
+
+class TestSalesInvoiceDefaults(FrappeTestCase):
+	"""Encabezado e ITT cacheados, invalidación por versión."""
+
+	def setUp(self):
+		self.redis = _FakeRedis()
+		self.commit, self.rollback = _Callbacks(), _Callbacks()
+		patches = [
+			patch(f"{_MOD}.frappe.cache", return_value=self.redis),
+			patch(f"{_MOD}.frappe.db.after_commit", self.commit, create=True),
+			patch(f"{_MOD}.frappe.db.after_rollback", self.rollback, create=True),
+			patch(f"{_MOD}.frappe.db.get_value", side_effect=_get_value),
+			patch(f"{_MOD}.frappe.get_cached_value", return_value="E"),
+			patch(
+				f"{_MOD}.frappe.get_all",
+				return_value=["IVA Frontera - Básico - E", "IVA Frontera - IEPS - E"],
+			),
+		]
+		started = [p.start() for p in patches]
+		for p in patches:
+			self.addCleanup(p.stop)
+		self.get_value, self.get_all = started[3], started[5]
+		self.addCleanup(cache_version.discard)
+
+	def test_encabezado_una_vez_por_combinacion(self):
+		for _ in range(20):
+			resolved = sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+
+		self.assertEqual(self.get_value.call_count, 3)
+		self.assertEqual(self.get_all.call_count, 1)
+		self.assertTrue(resolved.cost_center_from_customer)
+		self.assertEqual(resolved.cost_center, "CC Tijuana - E")
+		self.assertEqual((resolved.branch, resolved.zona), ("Tijuana", "Frontera"))
+		self.assertEqual(resolved.price_list, "Frontera")
+		self.assertEqual(
+			resolved.stcts, {"Básico": "IVA Frontera - Básico - E", "IEPS": "IVA Frontera - IEPS - E"}
+		)
+
+	def test_cambio_de_maestro_invalida(self):
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		sales_invoice_defaults.on_master_change(SimpleNamespace(doctype="Item"))
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		self.assertEqual(self.get_value.call_count, 3)
+
+		sales_invoice_defaults.on_master_change(SimpleNamespace(doctype="Cost Center"))
+		# Hasta el commit, la versión vieja sigue vigente
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		self.assertEqual(self.get_value.call_count, 3)
+
+		self.commit.run()
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		self.assertEqual(self.get_value.call_count, 6)
+
+	def test_rollback_no_publica_version(self):
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		sales_invoice_defaults.on_master_change(SimpleNamespace(doctype="Customer"))
+		self.rollback.run()
+		self.commit.run()
+		sales_invoice_defaults.resolve("CUST-1", None, "Empresa")
+		self.assertEqual(self.get_value.call_count, 3)
+
+	def test_itt_por_linea_con_una_lectura(self):
+		doc = SimpleNamespace(
+			customer="CUST-1",
+			cost_center="CC Tijuana - E",
+			company="Empresa",
+			tax_category=None,
+			items=[
+				*(SimpleNamespace(item_code="AGUA", rate=10, item_tax_template=None) for _ in range(30)),
+				SimpleNamespace(item_code="LIBRO", rate=200, item_tax_template=None),
+				SimpleNamespace(item_code="OTRO", rate=5, item_tax_template="IVA 16% - E"),
+			],
+		)
+		with patch(
+			f"{_MOD}._item_master_itt",
+			side_effect=lambda code, **kw: "IVA 0% - E" if code == "LIBRO" else None,
+		) as itt:
+			first = sales_invoice_defaults.resolve_document(doc).item_tax_templates
+			second = sales_invoice_defaults.resolve_document(doc).item_tax_templates
+
+		self.assertEqual(itt.call_count, 2)
+		self.assertEqual(first, {("AGUA", 10.0): None, ("LIBRO", 200.0): "IVA 0% - E"})
+		self.assertEqual(second, first)
+
+	def test_itt_por_fecha_de_la_factura(self):
+		lines = [("AGUA", 10.0)]
+		vigente = {"2026-01-15": "IVA 8% - E", "2026-10-15": "IVA 16% - E"}
+		with patch(
+			f"{_MOD}._item_master_itt", side_effect=lambda code, **kw: vigente[kw["posting_date"]]
+		) as itt:
+			actual = sales_invoice_defaults.resolve_item_tax_templates("Empresa", None, lines, "2026-10-15")
+			atrasada = sales_invoice_defaults.resolve_item_tax_templates("Empresa", None, lines, "2026-01-15")
+			sales_invoice_defaults.resolve_item_tax_templates("Empresa", None, lines, "2026-10-15")
+
+		# Una consulta por fecha; la factura atrasada no hereda el ITT cacheado de otra fecha
+		self.assertEqual(itt.call_count, 2)
+		self.assertEqual(actual, {("AGUA", 10.0): "IVA 16% - E"})
+		self.assertEqual(atrasada, {("AGUA", 10.0): "IVA 8% - E"})
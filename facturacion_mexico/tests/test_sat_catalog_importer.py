@@ -0,0 +1,114 @@
+"""
+Tests unitarios para el importador en bloque de catálogos SAT (catalogos_sat/importer).
+
+Archivo CSV temporal con el formato oficial (filas de título antes del encabezado); la BD se
+sustituye en la frontera (`frappe.db.sql`, `bulk_insert`, `bulk_update`).
+"""
+
+import csv
+import os
+import shutil
+import tempfile
+from datetime import date
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.catalogos_sat import importer
+
+_MOD = "facturacion_mexico.catalogos_sat.importer"
+_DOCTYPE = "SAT Producto Servicio"
+
+_ROWS = [
+	["Catálogo de productos/servicios."],
+	[],
+	[
+		"c_ClaveProdServ",
+		"Descripción",
+		"Incluir IVA trasladado",
+		"Complemento que debe incluir",
+		"FechaInicioVigencia",
+		"FechaFinVigencia",
+		"Palabras similares",
+	],
+	["1010101", "No existe en el catálogo", "Opcional", "", "01/01/2017", "", ""],
+	["84111506", "Servicios de facturación", "Sí", "", "01/01/2017", "", "facturas"],
+	["50202301", "Agua potable", "Sí", "", "01/01/2017", "", "agua"],
+]
+
+
+class TestSATCatalogImporter(FrappeTestCase):
+	"""Lectura en streaming, diferencia por clave/vigencia y escritura en bloque."""
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp(prefix="sat_import_test_")
+		self.addCleanup(shutil.rmtree, self.dir, True)
+		self.path = os.path.join(self.dir, "c_ClaveProdServ.csv")
+		with open(self.path, "w", encoding="utf-8", newline="") as f:
+			csv.writer(f).writerows(_ROWS)
+
+	def _run(self, existing, vigentes=(), **kwargs):
+		def fake_sql(query, values=None, **kw):
+			if query.lstrip().startswith("SELECT `name`,"):
+				return [row for row in existing if row[0] in values["names"]]
+			if query.lstrip().startswith("SELECT `name` FROM"):
+				return list(vigentes)
+			return []
+
+		with (
+			patch(f"{_MOD}.frappe.db.sql", side_effect=fake_sql) as sql,
+			patch(f"{_MOD}.frappe.db.bulk_insert") as bulk_insert,
+			patch(f"{_MOD}.frappe.db.bulk_update") as bulk_update,
+			patch(f"{_MOD}.frappe.db.commit"),
+			patch(f"{_MOD}.catalog_service.invalidate") as invalidate,
+		):
+			summary = importer.import_file(_DOCTYPE, self.path, **kwargs)
+		return summary, sql, bulk_insert, bulk_update, invalidate
+
+	def test_lee_encabezado_oficial_y_normaliza(self):
+		records = list(importer.iter_records(_DOCTYPE, self.path))
+		self.assertEqual([r["codigo"] for r in records], ["01010101", "84111506", "50202301"])
+		self.assertEqual(records[1]["descripcion"], "Servicios de facturación")
+		self.assertEqual(records[1]["fecha_inicio_vigencia"], date(2017, 1, 1))
+		self.assertEqual(records[1]["palabras_similares"], "facturas")
+
+	def test_tabla_vacia_inserta_todo_en_un_lote(self):
+		summary, _sql, bulk_insert, bulk_update, invalidate = self._run(existing=[])
+		self.assertEqual(summary["inserted"], 3)
+		bulk_insert.assert_called_once()
+		columns, values = bulk_insert.call_args.args[1], bulk_insert.call_args.args[2]
+		self.assertEqual(len(values), 3)
+		# ObjetoImp por defecto: el catálogo oficial no trae la columna
+		self.assertEqual(values[0][columns.index("incluye_objeto_impuesto")], "02")
+		bulk_update.assert_not_called()
+		invalidate.assert_called_once_with(_DOCTYPE)
+
+	def test_resincronizacion_solo_toca_filas_cambiadas(self):
+		# columnas ordenadas: complemento, descripcion, fin, inicio, palabras
+		existing = [
+			["01010101", None, "No existe en el catálogo", None, date(2017, 1, 1), None],
+			["84111506", None, "Servicios de facturacion (viejo)", None, date(2017, 1, 1), "facturas"],
+			["50202301", None, "Agua potable", None, date(2017, 1, 1), "agua"],
+		]
+		summary, _sql, bulk_insert, bulk_update, _inv = self._run(existing=existing)
+		self.assertEqual((summary["inserted"], summary["updated"], summary["unchanged"]), (0, 1, 2))
+		bulk_insert.assert_not_called()
+		self.assertEqual(
+			bulk_update.call_args.args[1], {"84111506": {"descripcion": "Servicios de facturación"}}
+		)
+
+	def test_full_marca_fin_de_vigencia_a_claves_ausentes(self):
+		summary, sql, *_ = self._run(
+			existing=[], vigentes=["84111506", "99999999"], full=1, fecha_corte="2026-01-31"
+		)
+		self.assertEqual(summary["expired"], 1)
+		update = [c for c in sql.call_args_list if c.args[0].startswith("UPDATE")]
+		self.assertEqual(update[0].args[1]["names"], ["99999999"])
+		self.assertEqual(update[0].args[1]["corte"], date(2026, 1, 31))
+
+	def test_dry_run_no_escribe(self):
+		summary, _sql, bulk_insert, _upd, invalidate = self._run(existing=[], dry_run=1)
+		self.assertEqual(summary["inserted"], 3)
+		self.assertTrue(summary["dry_run"])
+		bulk_insert.assert_not_called()
+		invalidate.assert_not_called()
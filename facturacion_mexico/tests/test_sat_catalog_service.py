@@ -0,0 +1,95 @@
+"""
+Tests unitarios para el catálogo SAT en memoria (catalogos_sat/catalog_service).
+"""
+
+from datetime import date
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.catalogos_sat import catalog_service
+
+_MOD = "facturacion_mexico.catalogos_sat.catalog_service"
+
+# codigo, descripcion, incluye_objeto_impuesto, complemento, inicio, fin, palabras_similares
+_ROWS = [
+	["84111506", "Servicios de facturación", "02", None, date(2017, 1, 1), None, "contabilidad cobranza"],
+	["84111501", "Servicios de contabilidad de costos", "02", None, date(2017, 1, 1), None, None],
+	["50202301", "Agua potable", "02", None, date(2017, 1, 1), date(2020, 12, 31), "bebidas"],
+	["01010101", "No existe en el catálogo", "01", None, None, None, None],
+]
+
+
+class TestSATCatalogService(FrappeTestCase):
+	"""Índices hash, prefijo y tokens; versión compartida entre workers."""
+
+	def setUp(self):
+		catalog_service._catalogs.clear()
+		self.addCleanup(catalog_service._catalogs.clear)
+		self.version = "v1"
+		patches = [
+			patch(f"{_MOD}._load_rows", side_effect=lambda dt, spec: [list(r) for r in _ROWS]),
+			patch(f"{_MOD}._current_version", side_effect=lambda dt: self.version),
+		]
+		self.load_rows = patches[0].start()
+		patches[1].start()
+		for p in patches:
+			self.addCleanup(p.stop)
+
+	def test_exists_y_get_field_sin_consultas_repetidas(self):
+		for _ in range(100):
+			self.assertTrue(catalog_service.exists("SAT Producto Servicio", "84111506"))
+		self.assertFalse(catalog_service.exists("SAT Producto Servicio", "99999999"))
+		self.assertEqual(
+			catalog_service.get_field("SAT Producto Servicio", "01010101", "incluye_objeto_impuesto"), "01"
+		)
+		self.assertEqual(self.load_rows.call_count, 1)
+
+	def test_busqueda_por_prefijo_de_clave(self):
+		codes = [r.codigo for r in catalog_service.search("SAT Producto Servicio", "841115")]
+		self.assertEqual(codes, ["84111501", "84111506"])
+
+	def test_busqueda_por_texto_sin_acentos_y_sinonimos(self):
+		codes = [r.codigo for r in catalog_service.search("SAT Producto Servicio", "facturacion")]
+		self.assertEqual(codes, ["84111506"])
+		# palabras_similares + prefijo en la última palabra
+		codes = [r.codigo for r in catalog_service.search("SAT Producto Servicio", "servicios contab")]
+		self.assertEqual(set(codes), {"84111501", "84111506"})
+
+	def test_vigencia(self):
+		self.assertFalse(catalog_service.is_vigente("SAT Producto Servicio", "50202301", "2024-01-01"))
+		self.assertTrue(catalog_service.is_vigente("SAT Producto Servicio", "50202301", "2019-06-01"))
+		self.assertNotIn("50202301", catalog_service.codes("SAT Producto Servicio", vigentes_al="2024-01-01"))
+
+	def test_cambio_de_version_recarga(self):
+		with patch(f"{_MOD}.VERSION_CHECK_SECONDS", -1):
+			catalog_service.get_catalog("SAT Producto Servicio")
+			self.version = "v2"
+			catalog_service.get_catalog("SAT Producto Servicio")
+		self.assertEqual(self.load_rows.call_count, 2)
+
+	def test_misma_version_no_recarga_al_expirar(self):
+		with patch(f"{_MOD}.VERSION_CHECK_SECONDS", -1):
+			catalog_service.get_catalog("SAT Producto Servicio")
+			catalog_service.get_catalog("SAT Producto Servicio")
+		self.assertEqual(self.load_rows.call_count, 1)
+
+	def test_sin_redis_recarga_al_expirar(self):
+		self.version = None
+		with patch(f"{_MOD}.VERSION_CHECK_SECONDS", -1):
+			catalog_service.get_catalog("SAT Producto Servicio")
+			catalog_service.get_catalog("SAT Producto Servicio")
+		self.assertEqual(self.load_rows.call_count, 2)
+
+	def test_invalidate_publica_al_confirmar(self):
+		catalog_service.get_catalog("SAT Producto Servicio")
+		with patch(f"{_MOD}.cache_version.publish_on_commit") as publish:
+			catalog_service.on_catalog_change(frappe._dict(doctype="SAT Producto Servicio"))
+
+		key, on_publish, args = publish.call_args.args
+		self.assertEqual(key, "fm_sat_catalog_version:SAT Producto Servicio")
+		# La copia local sigue hasta el commit; el callback la descarta
+		self.assertIn(args[0], catalog_service._catalogs)
+		on_publish(*args)
+		self.assertNotIn(args[0], catalog_service._catalogs)
@@ -0,0 +1,149 @@
+"""
+Tests para el panel fiscal del formulario de Sales Invoice (api.si_form_panel).
+
+El panel carga la SI y la FFM una sola vez, las comparte entre secciones y responde
+`not_modified` cuando el etag del cliente coincide. Una sección que falla va en None con su
+error en `errors`, sin tumbar el resto.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.api import si_form_panel
+from facturacion_mexico.api.ffm_summary import FFM_DOCTYPE
+
+_MOD = "facturacion_mexico.api.si_form_panel"
+
+
+class _Doc(frappe._dict):
+	def as_dict(self):
+		return dict(self)
+
+	def check_permission(self, ptype):
+		pass
+
+
+def _si(**values):
+	return _Doc(
+		{
+			"doctype": "Sales Invoice",
+			"name": "SINV-1",
+			"docstatus": 1,
+			"is_return": 0,
+			"fm_es_ppd": 0,
+			"fm_fiscal_status": "TIMBRADO",
+			"fm_factura_fiscal_mx": "FFM-1",
+			"fm_ereceipt_mx": None,
+			"outstanding_amount": 0,
+			"grand_total": 1160,
+			**values,
+		}
+	)
+
+
+_FFM = _Doc(
+	doctype="Factura Fiscal Mexico",
+	name="FFM-1",
+	docstatus=1,
+	status="TIMBRADO",
+	fm_fiscal_status="TIMBRADO",
+	fm_uuid="UUID-1",
+	fm_serie_folio="F-1",
+	fm_motivo_cancelacion=None,
+	fm_payment_method_sat="PUE",
+)
+
+
+class TestSalesInvoicePanel(FrappeTestCase):
+	"""Una carga por documento, secciones según el estado y etag condicional."""
+
+	def setUp(self):
+		self.docs = {("Sales Invoice", "SINV-1"): _si(), ("Factura Fiscal Mexico", "FFM-1"): _FFM}
+		self.get_doc = MagicMock(side_effect=lambda doctype, name: self.docs[(doctype, name)])
+		self.get_value = MagicMock(return_value=None)
+		for target, value in (
+			("frappe.get_doc", self.get_doc),
+			("frappe.get_all", MagicMock(return_value=[])),
+			("frappe.db.get_value", self.get_value),
+		):
+			patch(target, value, create=True).start()
+		self.addCleanup(patch.stopall)
+
+	def test_carga_si_y_ffm_una_vez(self):
+		panel = si_form_panel.get_sales_invoice_panel("SINV-1")
+
+		loaded = [c.args for c in self.get_doc.call_args_list]
+		self.assertEqual(loaded, [("Sales Invoice", "SINV-1"), ("Factura Fiscal Mexico", "FFM-1")])
+		self.assertTrue(panel["fiscal_state"]["facts"]["has_active_ffm"])
+		self.assertEqual(panel["ffm_summary"]["folio"], "F-1")
+		self.assertEqual(
+			panel["cancel"], {"allowed": False, "reason": panel["cancel"]["reason"], "ffm": "FFM-1"}
+		)
+		self.assertIsNone(panel["ereceipt_summary"])
+		self.assertIsNone(panel["nota_descuento"])
+		# Solo la búsqueda por `sales_invoice` de la guarda: la SI y la FFM ya venían cargadas
+		self.assertEqual(self.get_value.call_count, 1)
+
+	def test_etag_igual_responde_not_modified(self):
+		panel = si_form_panel.get_sales_invoice_panel("SINV-1")
+
+		self.assertEqual(
+			si_form_panel.get_sales_invoice_panel("SINV-1", etag=panel["etag"]),
+			{"not_modified": True, "etag": panel["etag"]},
+		)
+
+		self.docs[("Sales Invoice", "SINV-1")] = _si(outstanding_amount=100)
+		changed = si_form_panel.get_sales_invoice_panel("SINV-1", etag=panel["etag"])
+		self.assertNotEqual(changed["etag"], panel["etag"])
+		self.assertNotIn("not_modified", changed)
+
+	def test_nota_credito_en_borrador(self):
+		self.docs[("Sales Invoice", "SINV-1")] = _si(
+			docstatus=0, is_return=1, return_against="SINV-0", fm_factura_fiscal_mx=None
+		)
+		with patch(f"{_MOD}.estado_descuento", return_value={"es_descuento": True}) as estado:
+			panel = si_form_panel.get_sales_invoice_panel("SINV-1")
+
+		estado.assert_called_once_with(self.docs[("Sales Invoice", "SINV-1")])
+		self.assertEqual(panel["nota_descuento"], {"es_descuento": True})
+		self.assertIsNone(panel["fiscal_state"])
+		self.assertIsNone(panel["cancel"])
+		self.assertIsNone(panel["ffm_summary"])
+
+	def test_seccion_fallida_no_tumba_el_panel(self):
+		self.docs[("Sales Invoice", "SINV-1")] = _si(fm_ereceipt_mx="ER-1")
+		with patch(f"{_MOD}.get_ereceipt_summary", return_value={"name": "ER-1"}):
+			full = si_form_panel.get_sales_invoice_panel("SINV-1")
+		with (
+			patch(f"{_MOD}.get_ereceipt_summary", side_effect=RuntimeError("boom")),
+			patch("frappe.log_error", create=True) as log_error,
+		):
+			panel = si_form_panel.get_sales_invoice_panel("SINV-1", etag=full["etag"])
+
+		self.assertIsNone(panel["ereceipt_summary"])
+		self.assertEqual(panel["errors"], {"ereceipt_summary": "boom"})
+		log_error.assert_called_once()
+		# El resto del panel llega completo
+		self.assertEqual(panel["ffm_summary"]["folio"], "F-1")
+		self.assertTrue(panel["fiscal_state"]["facts"]["has_active_ffm"])
+		# Un panel parcial no responde not_modified ni deja etag para reutilizarlo
+		self.assertNotIn("not_modified", panel)
+		self.assertIsNone(panel["etag"])
+
+	def test_ffm_ilegible_marca_sus_secciones(self):
+		def get_doc(doctype, name):
+			if doctype == FFM_DOCTYPE:
+				raise RuntimeError("Lock wait timeout")
+			return self.docs[(doctype, name)]
+
+		self.get_doc.side_effect = get_doc
+		with patch("frappe.log_error", create=True):
+			panel = si_form_panel.get_sales_invoice_panel("SINV-1")
+
+		self.assertEqual(set(panel["errors"]), {"fiscal_state", "cancel", "ffm_summary"})
+		self.assertIsNone(panel["fiscal_state"])
+		self.assertIsNone(panel["cancel"])
+		self.assertIsNone(panel["ffm_summary"])
+		self.assertIsNotNone(panel["fiscal_states"])
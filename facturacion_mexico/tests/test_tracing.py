@@ -0,0 +1,92 @@
+"""
+Tests unitarios para la capa de trazas (utils/tracing).
+"""
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.utils import tracing
+
+
+class TestTracing(FrappeTestCase):
+	"""Spans/eventos en buffer, niveles y muestreo por módulo."""
+
+	def setUp(self):
+		tracing.flush()
+		tracing.reset_config()
+		patcher = patch.object(tracing, "_ensure_exporter")
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.addCleanup(tracing.reset_config)
+
+	def _config(self, config):
+		tracing.reset_config()
+		return patch.dict(frappe.conf, {"fm_tracing": config})
+
+	def test_span_registra_duracion_doc_y_resultado(self):
+		tracer = tracing.get_tracer("facturacion_mexico.test_tracing")
+		with tracer.span("paso", doc="SINV-0001") as span:
+			span.set(outcome="created", extra=1)
+
+		records = tracing.get_buffered_records()
+		self.assertEqual(len(records), 1)
+		self.assertEqual(records[0]["name"], "paso")
+		self.assertEqual(records[0]["doc"], "SINV-0001")
+		self.assertEqual(records[0]["outcome"], "created")
+		self.assertGreaterEqual(records[0]["duration_ms"], 0)
+		self.assertEqual(records[0]["attrs"], {"extra": 1})
+
+	def test_span_con_excepcion_registra_error(self):
+		tracer = tracing.get_tracer("facturacion_mexico.test_tracing")
+		with self.assertRaises(ValueError):
+			with tracer.span("falla"):
+				raise ValueError("x")
+		self.assertEqual(tracing.get_buffered_records()[0]["outcome"], "error")
+
+	def test_eventos_debug_deshabilitados_por_defecto(self):
+		tracer = tracing.get_tracer("facturacion_mexico.test_tracing")
+		tracer.event("breadcrumb")
+		self.assertEqual(tracing.get_buffered_records(), [])
+		self.assertFalse(tracer.enabled("debug"))
+
+	def test_nivel_por_modulo_prefijo_mas_largo(self):
+		config = {
+			"level": "info",
+			"modules": {
+				"facturacion_mexico": {"level": "off"},
+				"facturacion_mexico.test_tracing": {"level": "debug"},
+			},
+		}
+		with self._config(config):
+			tracing.get_tracer("facturacion_mexico.test_tracing").event("visible")
+			tracing.get_tracer("facturacion_mexico.otro").event("oculto", level="error")
+			with tracing.get_tracer("facturacion_mexico.otro").span("oculto"):
+				pass
+
+		names = [r["name"] for r in tracing.get_buffered_records()]
+		self.assertEqual(names, ["visible"])
+
+	def test_muestreo_cero_solo_registra_errores(self):
+		with self._config({"sample_rate": 0}):
+			tracer = tracing.get_tracer("facturacion_mexico.test_tracing")
+			with tracer.span("ok"):
+				pass
+			with self.assertRaises(RuntimeError):
+				with tracer.span("error"):
+					raise RuntimeError("boom")
+
+		names = [r["name"] for r in tracing.get_buffered_records()]
+		self.assertEqual(names, ["error"])
+
+	def test_flush_entrega_a_sinks(self):
+		received = []
+		tracing.register_sink(received.extend)
+		self.addCleanup(tracing._sinks.remove, received.extend)
+
+		with tracing.get_tracer("facturacion_mexico.test_tracing").span("exportado"):
+			pass
+		self.assertEqual(tracing.flush(), 1)
+		self.assertEqual([r["name"] for r in received], ["exportado"])
+		self.assertEqual(tracing.get_buffered_records(), [])
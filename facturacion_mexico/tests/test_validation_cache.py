@@ -0,0 +1,168 @@
+"""
+Tests unitarios para el cache de validaciones SAT en dos niveles (validaciones/validation_cache).
+"""
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from facturacion_mexico.validaciones import validation_cache
+
+_MOD = "facturacion_mexico.validaciones.validation_cache"
+
+
+class _FakeRedis:
+	"""Subconjunto de RedisWrapper usado por el módulo: valores con TTL y hash pendiente."""
+
+	def __init__(self):
+		self.values = {}
+		self.ttls = {}
+		self.hashes = {}
+
+	def get_value(self, key):
+		return self.values.get(key)
+
+	def set_value(self, key, value, expires_in_sec=None):
+		self.values[key] = value
+		self.ttls[key] = expires_in_sec
+
+	def delete_value(self, key):
+		self.values.pop(key, None)
+
+	def make_key(self, key):
+		return f"site|{key}"
+
+	def pipeline(self):
+		ops = []
+		pipe = MagicMock()
+		# Redis devuelve campos y valores de hash como bytes
+		pipe.hset.side_effect = lambda k, f, v: ops.append(
+			lambda: self.hashes.setdefault(k, {}).__setitem__(f.encode(), v.encode())
+		)
+		pipe.hgetall.side_effect = lambda k: ops.append(lambda: dict(self.hashes.get(k, {})))
+		pipe.delete.side_effect = lambda k: ops.append(lambda: self.hashes.pop(k, None))
+		pipe.execute.side_effect = lambda: [op() for op in ops]
+		return pipe
+
+	def eval(self, script, numkeys, key, *args):
+		# Mismo efecto que _DELETE_IF_UNCHANGED: HDEL solo si el valor no cambió
+		fields = self.hashes.get(key, {})
+		removed = 0
+		for field, value in zip(args[::2], args[1::2], strict=True):
+			if fields.get(field) == value:
+				del fields[field]
+				removed += 1
+		return removed
+
+
+class TestValidationCache(FrappeTestCase):
+	"""Lectura Redis → BD, cache negativo y persistencia por lotes."""
+
+	def setUp(self):
+		self.redis = _FakeRedis()
+		patches = [
+			patch(f"{_MOD}.frappe.cache", return_value=self.redis),
+			patch(f"{_MOD}.today", return_value="2026-10-18"),
+			patch(f"{_MOD}.now", return_value="2026-10-18 10:00:00"),
+		]
+		for p in patches:
+			p.start()
+			self.addCleanup(p.stop)
+
+	def test_hit_en_redis_no_consulta_bd(self):
+		validation_cache.put("RFC", "aaa010101aaa", True, {"valid": True})
+		with patch(f"{_MOD}.frappe.db.get_value") as get_value:
+			for _ in range(50):
+				entry = validation_cache.get("rfc_validation", "RFC_AAA010101AAA")
+		get_value.assert_not_called()
+		self.assertTrue(entry.is_valid)
+		self.assertEqual(entry.expiry_date, "2026-11-17")
+
+	def test_ttl_por_tipo(self):
+		validation_cache.put("lista_69b", "AAA010101AAA", False, {"in_lista_69b": True})
+		self.assertEqual(self.redis.ttls[f"{validation_cache.KEY_PREFIX}:Lista69B:AAA010101AAA"], 7 * 86400)
+
+	def test_cache_negativo(self):
+		with patch(f"{_MOD}.frappe.db.get_value", return_value=None) as get_value:
+			self.assertIsNone(validation_cache.get("RFC", "BBB020202BBB"))
+			self.assertIsNone(validation_cache.get("RFC", "BBB020202BBB"))
+		self.assertEqual(get_value.call_count, 1)
+
+	def test_miss_en_redis_lee_bd_y_rellena(self):
+		row = frappe._dict(
+			is_valid=1,
+			validation_data='{"valid": true}',
+			validation_date="2026-10-10 09:00:00",
+			expiry_date="2026-11-09",
+		)
+		with patch(f"{_MOD}.frappe.db.get_value", return_value=row) as get_value:
+			first = validation_cache.get("RFC", "CCC030303CCC")
+			second = validation_cache.get("RFC", "CCC030303CCC")
+		self.assertEqual(get_value.call_count, 1)
+		self.assertEqual(first.data, {"valid": True})
+		self.assertEqual(second, first)
+
+	def test_flush_inserta_y_actualiza_por_lotes(self):
+		validation_cache.put("RFC", "AAA010101AAA", True, {"valid": True})
+		validation_cache.put("RFC", "BBB020202BBB", False, {"valid": False})
+		validation_cache.put("RFC", "AAA010101AAA", True, {"valid": True, "status": "Activo"})
+
+		existing = [
+			frappe._dict(name="x1", validation_type="RFC", lookup_value="BBB020202BBB", validation_count=4)
+		]
+		with (
+			patch(f"{_MOD}.frappe.get_all", return_value=existing) as get_all,
+			patch(f"{_MOD}.frappe.db") as db,
+			patch(f"{_MOD}.frappe.generate_hash", return_value="h1"),
+		):
+			written = validation_cache.flush_pending()
+			self.assertEqual(validation_cache.flush_pending(), 0)
+
+		self.assertEqual(written, 2)
+		self.assertEqual(get_all.call_count, 1)
+		inserted = db.bulk_insert.call_args.args[2]
+		self.assertEqual(len(inserted), 1)
+		self.assertEqual(inserted[0][6], "AAA010101AAA")
+		self.assertIn("Activo", inserted[0][8])
+		updates = db.bulk_update.call_args.args[1]
+		self.assertEqual(updates["x1"]["validation_count"], 5)
+		self.assertEqual(updates["x1"]["is_valid"], 0)
+		db.commit.assert_called_once()
+
+	def test_flush_fallido_conserva_pendientes(self):
+		for i in range(5):
+			validation_cache.put("RFC", f"AAA01010{i}AAA", True, {"valid": True})
+
+		persisted = []
+
+		def persist(entries):
+			if persisted:
+				raise RuntimeError("BD caída")
+			persisted.append(entries)
+
+		with (
+			patch(f"{_MOD}.FLUSH_BATCH_SIZE", 2),
+			patch(f"{_MOD}._persist", side_effect=persist),
+			patch(f"{_MOD}.frappe.db"),
+		):
+			with self.assertRaises(RuntimeError):
+				validation_cache.flush_pending()
+
+		pending = self.redis.hashes[f"site|{validation_cache.PENDING_KEY}"]
+		# Solo el lote confirmado salió de la cola
+		self.assertEqual(len(pending), 3)
+		self.assertFalse({f"RFC\x1f{value}".encode() for _t, value in persisted[0]} & set(pending))
+
+	def test_put_durante_flush_sigue_encolado(self):
+		validation_cache.put("RFC", "AAA010101AAA", True, {"valid": True})
+
+		def persist(entries):
+			# Otro worker vuelve a validar el mismo RFC mientras se persiste el lote
+			validation_cache.put("RFC", "AAA010101AAA", False, {"valid": False})
+
+		with patch(f"{_MOD}._persist", side_effect=persist), patch(f"{_MOD}.frappe.db"):
+			self.assertEqual(validation_cache.flush_pending(), 1)
+
+		pending = self.redis.hashes[f"site|{validation_cache.PENDING_KEY}"]
+		self.assertIn(b'"is_valid": 0', pending[b"RFC\x1fAAA010101AAA"])
@@ -0,0 +1,73 @@
+"""
+Versiones de cache compartidas entre workers, publicadas al confirmar la transacción.
+
+Los índices en memoria de proceso (catálogos SAT, cuotas IEPS) y la resolución cacheada de
+defaults de Sales Invoice guardan una versión en Redis; cambiarla hace que todos los workers
+recarguen. Si la versión nueva se publica antes del commit, otro worker puede recargar las filas
+viejas y guardarlas bajo la versión nueva hasta el siguiente cambio. Aquí la publicación se difiere
+a `frappe.db.after_commit` y un rollback la descarta:
+
+	cache_version.publish_on_commit("fm_sat_catalog_version:Forma Pago SAT", on_publish, args)
+	cache_version.get("fm_sat_catalog_version:Forma Pago SAT", default="0")
+
+`on_publish(*args)` corre después de publicar, para descartar la copia local del proceso que hizo
+el cambio. Varias llamadas con la misma clave en una transacción publican una sola versión.
+"""
+
+import uuid
+from collections.abc import Callable
+
+import frappe
+
+_LOCAL_KEY = "fm_pending_cache_versions"
+
+
+def get(key: str, default: str | None = None) -> str | None:
+	"""Versión publicada; `default` si nunca se publicó y None si Redis no responde."""
+	try:
+		version = frappe.cache().get_value(key)
+	except Exception:
+		return None
+	return version if version is not None else default
+
+
+def publish_on_commit(key: str, on_publish: Callable | None = None, args: tuple = ()) -> None:
+	"""Publicar una versión nueva de `key` cuando la transacción actual confirme."""
+	pending = getattr(frappe.local, _LOCAL_KEY, None)
+	if pending is None:
+		try:
+			after_commit, after_rollback = frappe.db.after_commit, frappe.db.after_rollback
+		except AttributeError:
+			# Sin conexión a BD (scripts): no hay transacción que esperar.
+			_publish(key, [(on_publish, args)] if on_publish else [])
+			return
+		pending = {}
+		setattr(frappe.local, _LOCAL_KEY, pending)
+		after_commit.add(flush)
+		after_rollback.add(discard)
+
+	callbacks = pending.setdefault(key, [])
+	if on_publish and (on_publish, args) not in callbacks:
+		callbacks.append((on_publish, args))
+
+
+def flush() -> None:
+	"""Publicar las versiones pendientes (callback de after_commit)."""
+	pending = getattr(frappe.local, _LOCAL_KEY, None)
+	setattr(frappe.local, _LOCAL_KEY, None)
+	for key, callbacks in (pending or {}).items():
+		_publish(key, callbacks)
+
+
+def discard() -> None:
+	"""Descartar las versiones pendientes (callback de after_rollback)."""
+	setattr(frappe.local, _LOCAL_KEY, None)
+
+
+def _publish(key: str, callbacks: list) -> None:
+	try:
+		frappe.cache().set_value(key, uuid.uuid4().hex)
+	except Exception:
+		frappe.logger().warning(f"No se pudo publicar la versión de cache {key}", exc_info=True)
+	for on_publish, args in callbacks:
+		on_publish(*args)
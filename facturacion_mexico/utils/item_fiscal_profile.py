@@ -0,0 +1,193 @@
+"""
+Perfil fiscal de Items y UOMs con carga en bloque por request.
+
+Los validadores de Sales Invoice (automated_tax, sales_invoice_validate, timbrado y FFM) leían la
+clave SAT del Item línea por línea. Este módulo carga, para todos los items y UOMs distintos de un
+documento, la información fiscal en pocas consultas fijas y la memoriza en `frappe.local`:
+
+	profiles = load_for_document(doc)
+	for row in doc.items:
+		profile = get_item_profile(row.item_code)
+
+Las tablas de conversión de UOM de los items (`get_uom_conversion_factor`) usan el mismo almacén.
+
+La memoria vive lo que dura la transacción: se descarta en commit/rollback y cuando se guarda o
+elimina un Item o una UOM (doc_events), de modo que nunca sobrevive a un cambio del maestro.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import frappe
+from frappe.utils import flt
+
+from facturacion_mexico.catalogos_sat import catalog_service
+
+_LOCAL_KEY = "fm_item_fiscal_profiles"
+
+
+@dataclass(frozen=True)
+class ItemFiscalProfile:
+	"""Datos fiscales de un Item relevantes para validar y timbrar."""
+
+	item_code: str
+	item_name: str | None
+	item_group: str | None
+	producto_servicio_sat: str | None
+	# SAT Producto Servicio.incluye_objeto_impuesto de la clave (catálogo en memoria; None si no existe)
+	objeto_impuesto: str | None
+	# Item Tax Templates declarados en el Item (sin filtrar por categoría ni vigencia)
+	item_tax_templates: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class UOMFiscalProfile:
+	"""Estado de una UOM y su código SAT (c_ClaveUnidad) derivado del nombre."""
+
+	uom: str
+	enabled: bool
+	clave_unidad_sat: str | None
+
+
+def _store() -> dict:
+	store = getattr(frappe.local, _LOCAL_KEY, None)
+	if store is None:
+		store = {"items": {}, "uoms": {}, "uom_conversions": {}}
+		setattr(frappe.local, _LOCAL_KEY, store)
+		# Alcance de transacción: en commit/rollback se descarta (en tests frappe.local persiste).
+		try:
+			frappe.db.after_commit.add(clear)
+			frappe.db.after_rollback.add(clear)
+		except AttributeError:
+			pass
+	return store
+
+
+def clear(*args, **kwargs) -> None:
+	"""Descartar perfiles memorizados. También se usa como doc_event de Item y UOM."""
+	if getattr(frappe.local, _LOCAL_KEY, None) is not None:
+		setattr(frappe.local, _LOCAL_KEY, None)
+
+
+def get_item_profiles(item_codes: Iterable[str]) -> dict[str, ItemFiscalProfile]:
+	"""Perfiles de los items indicados; los que no existen no aparecen en el resultado."""
+	codes = {code for code in item_codes if code}
+	store = _store()["items"]
+	missing = sorted(codes - store.keys())
+	if missing:
+		store.update(_fetch_items(missing))
+	return {code: store[code] for code in codes if code in store}
+
+
+def get_item_profile(item_code: str) -> ItemFiscalProfile | None:
+	"""Perfil de un item (usa la precarga si existe)."""
+	if not item_code:
+		return None
+	return get_item_profiles([item_code]).get(item_code)
+
+
+def get_uom_profiles(uoms: Iterable[str]) -> dict[str, UOMFiscalProfile]:
+	"""Perfiles de las UOMs indicadas; las que no existen no aparecen en el resultado."""
+	names = {uom for uom in uoms if uom}
+	store = _store()["uoms"]
+	missing = sorted(names - store.keys())
+	if missing:
+		store.update(_fetch_uoms(missing))
+	return {uom: store[uom] for uom in names if uom in store}
+
+
+def get_uom_conversion_factors(item_codes: Iterable[str]) -> dict[str, dict[str, float]]:
+	"""Tabla UOM → conversion_factor (`UOM Conversion Detail`) de cada item, en una consulta."""
+	codes = {code for code in item_codes if code}
+	store = _store()["uom_conversions"]
+	missing = sorted(codes - store.keys())
+	if missing:
+		tables: dict[str, dict[str, float]] = {code: {} for code in missing}
+		for row in frappe.get_all(
+			"UOM Conversion Detail",
+			filters={"parenttype": "Item", "parent": ["in", missing]},
+			fields=["parent", "uom", "conversion_factor"],
+		):
+			tables[row.parent][row.uom] = flt(row.conversion_factor)
+		store.update(tables)
+	return {code: store[code] for code in codes}
+
+
+def get_uom_conversion_factor(item_code: str, uom: str) -> float:
+	"""
+	Factor de conversión de `uom` para el item, como `get_conversion_factor` de ERPNext.
+
+	Usa la tabla precargada del item; si el item no declara la UOM (variantes, `UOM Conversion
+	Factor` global) delega en ERPNext y memoriza el resultado. 0.0 si ERPNext no está disponible.
+	"""
+	table = get_uom_conversion_factors([item_code]).get(item_code)
+	if table is None:
+		return 0.0
+	if uom not in table:
+		try:
+			from erpnext.stock.get_item_details import get_conversion_factor
+		except ImportError:
+			return 0.0
+		table[uom] = flt(get_conversion_factor(item_code, uom).get("conversion_factor"))
+	return table[uom]
+
+
+def load_for_document(doc) -> dict[str, ItemFiscalProfile]:
+	"""Precargar items y UOMs de todas las líneas de `doc`. Devuelve los perfiles de items."""
+	rows = getattr(doc, "items", None) or []
+	get_uom_profiles(getattr(row, "uom", None) for row in rows)
+	return get_item_profiles(getattr(row, "item_code", None) for row in rows)
+
+
+# ---------------------------------------------------------------------------
+# Consultas en bloque
+# ---------------------------------------------------------------------------
+
+
+def _fetch_items(item_codes: list[str]) -> dict[str, ItemFiscalProfile]:
+	items = frappe.get_all(
+		"Item",
+		filters={"name": ["in", item_codes]},
+		fields=["name", "item_name", "item_group", "fm_producto_servicio_sat"],
+	)
+	if not items:
+		return {}
+
+	templates: dict[str, list[str]] = {}
+	for row in frappe.get_all(
+		"Item Tax",
+		filters={"parenttype": "Item", "parent": ["in", [i.name for i in items]]},
+		fields=["parent", "item_tax_template"],
+		order_by="idx asc",
+	):
+		if row.item_tax_template:
+			templates.setdefault(row.parent, []).append(row.item_tax_template)
+
+	return {
+		i.name: ItemFiscalProfile(
+			item_code=i.name,
+			item_name=i.item_name,
+			item_group=i.item_group,
+			producto_servicio_sat=i.fm_producto_servicio_sat,
+			objeto_impuesto=catalog_service.get_field(
+				"SAT Producto Servicio", i.fm_producto_servicio_sat, "incluye_objeto_impuesto"
+			)
+			if i.fm_producto_servicio_sat
+			else None,
+			item_tax_templates=tuple(templates.get(i.name, ())),
+		)
+		for i in items
+	}
+
+
+def _fetch_uoms(uoms: list[str]) -> dict[str, UOMFiscalProfile]:
+	from facturacion_mexico.cfdi_recibidos.services.uom_policy import try_normalize_uom_to_sat_code
+
+	return {
+		row.name: UOMFiscalProfile(
+			uom=row.name,
+			enabled=bool(row.enabled),
+			clave_unidad_sat=try_normalize_uom_to_sat_code(row.name),
+		)
+		for row in frappe.get_all("UOM", filters={"name": ["in", uoms]}, fields=["name", "enabled"])
+	}
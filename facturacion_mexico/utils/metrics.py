@@ -0,0 +1,189 @@
+"""
+Histogramas de latencia con agregación entre workers.
+
+Cada proceso acumula observaciones en memoria (`observe` / `timer`) y `push` las envía a Redis
+en un único pipeline (HINCRBY por bucket), de modo que todos los workers de gunicorn y RQ
+contribuyen al mismo histograma. La lectura (`snapshot`, `prometheus_text`) reconstruye los
+buckets desde Redis y estima percentiles por interpolación lineal dentro del bucket, igual que
+`histogram_quantile` de Prometheus.
+
+Etiquetas usadas por el timbrado: `phase`, `company`, `branch`.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import frappe
+
+# Límites superiores (ms) de los buckets; el último bucket implícito es +Inf.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+KEY_PREFIX = "fm_metrics"
+_FIELD_SEP = "\x1f"
+
+_pending: dict[tuple[str, str], list] = {}
+_lock = threading.Lock()
+
+
+def _labels_key(labels: dict) -> str:
+	return json.dumps(
+		{k: str(labels[k] or "") for k in sorted(labels)}, ensure_ascii=False, separators=(",", ":")
+	)
+
+
+def _bucket_index(value: float) -> int:
+	for i, bound in enumerate(LATENCY_BUCKETS_MS):
+		if value <= bound:
+			return i
+	return len(LATENCY_BUCKETS_MS)
+
+
+def observe(metric: str, value_ms: float, **labels) -> None:
+	"""Registrar una observación local (sin E/S). Se publica con `push`."""
+	key = (metric, _labels_key(labels))
+	with _lock:
+		entry = _pending.get(key)
+		if entry is None:
+			# [conteos por bucket..., suma, total]
+			entry = _pending[key] = [0] * (len(LATENCY_BUCKETS_MS) + 1) + [0.0, 0]
+		entry[_bucket_index(value_ms)] += 1
+		entry[-2] += value_ms
+		entry[-1] += 1
+
+
+@contextmanager
+def timer(metric: str, **labels):
+	"""Medir la duración del bloque (también si lanza) y registrarla en `metric`.
+
+	Produce el dict de etiquetas: el bloque puede completarlo con valores que resuelve él mismo
+	(se leen al salir).
+	"""
+	labels = dict(labels)
+	start = time.perf_counter()
+	try:
+		yield labels
+	finally:
+		observe(metric, (time.perf_counter() - start) * 1000, **labels)
+
+
+def push() -> int:
+	"""Enviar a Redis las observaciones acumuladas en un solo pipeline. Devuelve series enviadas."""
+	with _lock:
+		if not _pending:
+			return 0
+		pending = dict(_pending)
+		_pending.clear()
+
+	try:
+		cache = frappe.cache()
+		pipe = cache.pipeline()
+		for (metric, labels_key), entry in pending.items():
+			redis_key = cache.make_key(f"{KEY_PREFIX}:{metric}")
+			for i, count in enumerate(entry[:-2]):
+				if count:
+					pipe.hincrby(redis_key, f"{labels_key}{_FIELD_SEP}{i}", count)
+			pipe.hincrbyfloat(redis_key, f"{labels_key}{_FIELD_SEP}sum", entry[-2])
+			pipe.hincrby(redis_key, f"{labels_key}{_FIELD_SEP}count", entry[-1])
+		pipe.execute()
+	except Exception:
+		# Las métricas nunca deben interrumpir el flujo fiscal; se descartan si Redis no responde.
+		frappe.logger("facturacion_mexico.metrics").warning("No se pudieron publicar métricas", exc_info=True)
+		return 0
+	return len(pending)
+
+
+def reset(metric: str) -> None:
+	"""Eliminar el histograma agregado de `metric`."""
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.delete(cache.make_key(f"{KEY_PREFIX}:{metric}"))
+	pipe.execute()
+
+
+def snapshot(metric: str, **filters) -> list[dict]:
+	"""Series agregadas de `metric` con conteo, suma y percentiles p50/p95/p99.
+
+	`filters` restringe por valor de etiqueta (p. ej. company="ACME").
+	"""
+	cache = frappe.cache()
+	pipe = cache.pipeline()
+	pipe.hgetall(cache.make_key(f"{KEY_PREFIX}:{metric}"))
+	(raw,) = pipe.execute()
+
+	series: dict[str, dict] = {}
+	for field, value in (raw or {}).items():
+		field = field.decode() if isinstance(field, bytes) else field
+		value = value.decode() if isinstance(value, bytes) else value
+		labels_key, _sep, slot = field.rpartition(_FIELD_SEP)
+		s = series.setdefault(
+			labels_key, {"buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "sum": 0.0, "count": 0}
+		)
+		if slot == "sum":
+			s["sum"] = float(value)
+		elif slot == "count":
+			s["count"] = int(value)
+		else:
+			s["buckets"][int(slot)] = int(value)
+
+	result = []
+	for labels_key, s in sorted(series.items()):
+		labels = json.loads(labels_key)
+		if any(v and labels.get(k) != v for k, v in filters.items()):
+			continue
+		result.append(
+			{
+				"labels": labels,
+				"count": s["count"],
+				"sum_ms": round(s["sum"], 3),
+				"avg_ms": round(s["sum"] / s["count"], 3) if s["count"] else 0,
+				"p50_ms": quantile(s["buckets"], 0.50),
+				"p95_ms": quantile(s["buckets"], 0.95),
+				"p99_ms": quantile(s["buckets"], 0.99),
+				"buckets": s["buckets"],
+			}
+		)
+	return result
+
+
+def quantile(buckets: list[int], q: float) -> float | None:
+	"""Estimar el cuantil `q` a partir de conteos por bucket (no acumulados)."""
+	total = sum(buckets)
+	if not total:
+		return None
+	rank = q * total
+	cumulative = 0
+	for i, count in enumerate(buckets):
+		if cumulative + count >= rank and count:
+			if i >= len(LATENCY_BUCKETS_MS):
+				# Bucket +Inf: el mejor estimado es su límite inferior.
+				return float(LATENCY_BUCKETS_MS[-1])
+			lower = LATENCY_BUCKETS_MS[i - 1] if i else 0
+			upper = LATENCY_BUCKETS_MS[i]
+			return round(lower + (upper - lower) * (rank - cumulative) / count, 3)
+		cumulative += count
+	return float(LATENCY_BUCKETS_MS[-1])
+
+
+def prometheus_text(metrics: list[str]) -> str:
+	"""Exposición en formato de texto de Prometheus (histogramas en segundos)."""
+	lines = []
+	for metric in metrics:
+		name = metric if metric.endswith("_seconds") else f"{metric.removesuffix('_ms')}_seconds"
+		lines.append(f"# TYPE {name} histogram")
+		for s in snapshot(metric):
+			base = ",".join(f'{k}="{_escape(v)}"' for k, v in s["labels"].items())
+			cumulative = 0
+			for i, count in enumerate(s["buckets"]):
+				cumulative += count
+				le = f"{LATENCY_BUCKETS_MS[i] / 1000:g}" if i < len(LATENCY_BUCKETS_MS) else "+Inf"
+				sep = "," if base else ""
+				lines.append(f'{name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+			label_block = f"{{{base}}}" if base else ""
+			lines.append(f"{name}_sum{label_block} {s['sum_ms'] / 1000:g}")
+			lines.append(f"{name}_count{label_block} {s['count']}")
+	return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+	return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
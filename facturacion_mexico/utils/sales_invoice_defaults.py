@@ -0,0 +1,281 @@
+"""
+Valores por defecto de Sales Invoice resueltos con cache (before_validate).
+
+Cada guardado resolvía con consultas sueltas: Cost Center default del Customer, Branch del Cost
+Center, cadena de Price List (Customer → Cost Center → Selling Settings), zona fronteriza del
+Branch, `abbr` de la Company, existencia de los 8 STCT y el ITT de cada línea vía ERPNext. Aquí se
+resuelven en una llamada:
+
+	- encabezado por (company, customer, cost_center): cost center efectivo, branch, zona, price list
+	  y STCT disponibles por variante → un `get_value` de Redis
+	- ITT por (company, tax_category, fecha, item, tarifa) → un hash de Redis por (company,
+	  tax_category, fecha), leído con un solo `HMGET` para todas las líneas; solo las que faltan llaman
+	  a ERPNext. La fecha (posting_date, o hoy) forma parte de la clave porque ERPNext elige el ITT por
+	  su `valid_from`: una factura con fecha atrasada no toma el ITT vigente hoy
+
+Invalidación: cada grupo tiene una versión en Redis que forma parte de la clave. Guardar o eliminar
+un maestro que alimenta el encabezado (Customer, Cost Center, Branch, Company, Selling Settings,
+STCT) o el ITT (Item, Item Group, Item Tax Template) publica una versión nueva al confirmar la
+transacción (doc_events, `utils.cache_version`); las entradas viejas expiran por TTL. Sin Redis se
+resuelve directo contra la BD.
+
+Uso:
+
+	from facturacion_mexico.utils import sales_invoice_defaults
+
+	resolved = sales_invoice_defaults.resolve_document(doc)
+	resolved.branch, resolved.price_list, resolved.stcts["IEPS"], resolved.item_tax_templates
+"""
+
+import frappe
+from frappe.utils import flt, getdate, today
+
+from facturacion_mexico.utils import cache_version
+
+KEY_PREFIX = "fm_si_defaults"
+HEADER_VERSION_KEY = "fm_si_defaults_version:header"
+ITT_VERSION_KEY = "fm_si_defaults_version:itt"
+TTL_SECONDS = 6 * 3600
+
+STCT_VARIANTS = ("Básico", "IEPS", "Retenciones", "Total")
+HEADER_DOCTYPES = (
+	"Customer",
+	"Cost Center",
+	"Branch",
+	"Company",
+	"Selling Settings",
+	"Sales Taxes and Charges Template",
+)
+ITT_DOCTYPES = ("Item", "Item Group", "Item Tax Template")
+
+# Sin ITT en el maestro (se cachea para no volver a preguntar a ERPNext)
+_NO_ITT = ""
+
+
+def resolve_document(doc) -> frappe._dict:
+	"""Encabezado (`resolve`) + `item_tax_templates` {(item_code, tarifa): ITT} de las líneas sin ITT."""
+	resolved = resolve(
+		getattr(doc, "customer", None), getattr(doc, "cost_center", None), getattr(doc, "company", None)
+	)
+	lines = [
+		(row.item_code, flt(getattr(row, "rate", 0)))
+		for row in getattr(doc, "items", None) or []
+		if row.item_code and not getattr(row, "item_tax_template", None)
+	]
+	resolved.item_tax_templates = resolve_item_tax_templates(
+		getattr(doc, "company", None),
+		getattr(doc, "tax_category", None),
+		lines,
+		posting_date=getattr(doc, "posting_date", None),
+	)
+	return resolved
+
+
+def resolve(customer: str | None, cost_center: str | None, company: str | None) -> frappe._dict:
+	"""
+	Encabezado de la factura.
+
+	Returns:
+		frappe._dict: cost_center (el recibido o el default del Customer), cost_center_from_customer,
+		branch, is_border_zone (None sin Branch), zona, price_list, price_list_source, company_abbr,
+		stcts {variante: STCT habilitado de la zona}
+	"""
+	key = f"{KEY_PREFIX}:header:{_version(HEADER_VERSION_KEY)}:{company}:{customer}:{cost_center}"
+	cached = _cache_get(key)
+	if cached is None:
+		cached = _build_header(customer, cost_center, company)
+		_cache_set(key, cached)
+	return frappe._dict(cached, stcts=dict(cached["stcts"]))
+
+
+def resolve_item_tax_templates(
+	company: str | None, tax_category: str | None, lines, posting_date=None
+) -> dict:
+	"""ITT del maestro por (item_code, tarifa) vigente en `posting_date` (hoy por defecto); None si el
+	item no define uno."""
+	lines = list(dict.fromkeys(lines))
+	if not lines:
+		return {}
+	effective_date = str(getdate(posting_date or today()))
+	fields = [_itt_field(item_code, rate) for item_code, rate in lines]
+	hash_key = f"{KEY_PREFIX}:itt:{_version(ITT_VERSION_KEY)}:{company}:{tax_category or ''}:{effective_date}"
+	cached = _hmget(hash_key, fields)
+
+	result, missing = {}, {}
+	for line, field, value in zip(lines, fields, cached, strict=True):
+		if value is None:
+			itt = _item_master_itt(
+				line[0],
+				company=company,
+				tax_category=tax_category,
+				base_net_rate=line[1],
+				posting_date=effective_date,
+			)
+			missing[field] = itt or _NO_ITT
+		else:
+			itt = value.decode() if isinstance(value, bytes) else value
+		result[line] = itt or None
+	if missing:
+		_hset(hash_key, missing)
+	return result
+
+
+def stct_table(company: str, zona: str) -> tuple[str | None, dict[str, str]]:
+	"""(abbr de la Company, {variante: STCT habilitado}) para la zona "Nacional" o "Frontera"."""
+	abbr = frappe.get_cached_value("Company", company, "abbr") if company else None
+	if not abbr:
+		return None, {}
+	names = {f"IVA {zona} - {variant} - {abbr}": variant for variant in STCT_VARIANTS}
+	found = frappe.get_all(
+		"Sales Taxes and Charges Template",
+		filters={"name": ["in", list(names)], "disabled": 0},
+		pluck="name",
+	)
+	return abbr, {names[name]: name for name in found}
+
+
+def invalidate(scope: str | None = None) -> None:
+	"""Publicar, al confirmar la transacción, una versión nueva del encabezado ("header"), del ITT
+	("itt") o de ambos."""
+	keys = {"header": [HEADER_VERSION_KEY], "itt": [ITT_VERSION_KEY]}.get(
+		scope, [HEADER_VERSION_KEY, ITT_VERSION_KEY]
+	)
+	for key in keys:
+		cache_version.publish_on_commit(key)
+
+
+def on_master_change(doc, method=None) -> None:
+	"""doc_event on_update/on_trash de los maestros que alimentan la resolución."""
+	if doc.doctype in HEADER_DOCTYPES:
+		invalidate("header")
+	if doc.doctype in ITT_DOCTYPES:
+		invalidate("itt")
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _build_header(customer: str | None, cost_center: str | None, company: str | None) -> dict:
+	customer_row = (
+		frappe.db.get_value(
+			"Customer", customer, ["fm_customer_default_cost_center", "default_price_list"], as_dict=True
+		)
+		if customer
+		else None
+	) or frappe._dict()
+
+	cost_center_from_customer = False
+	if not cost_center and customer_row.fm_customer_default_cost_center:
+		cost_center = customer_row.fm_customer_default_cost_center
+		cost_center_from_customer = True
+
+	header = {
+		"cost_center": cost_center,
+		"cost_center_from_customer": cost_center_from_customer,
+		"branch": None,
+		"is_border_zone": None,
+		"zona": None,
+		"price_list": None,
+		"price_list_source": None,
+		"company_abbr": None,
+		"stcts": {},
+	}
+	if not cost_center:
+		return header
+
+	cc_row = (
+		frappe.db.get_value(
+			"Cost Center", cost_center, ["fm_mapped_branch", "fm_default_selling_price_list"], as_dict=True
+		)
+		or frappe._dict()
+	)
+	header["branch"] = cc_row.fm_mapped_branch
+
+	# Price List por prioridad: Customer → Cost Center → Selling Settings
+	if customer_row.default_price_list:
+		header.update(
+			price_list=customer_row.default_price_list, price_list_source="Customer.default_price_list"
+		)
+	elif cc_row.fm_default_selling_price_list:
+		header.update(
+			price_list=cc_row.fm_default_selling_price_list,
+			price_list_source="Cost Center.fm_default_selling_price_list",
+		)
+	else:
+		selling = frappe.db.get_single_value("Selling Settings", "selling_price_list")
+		if selling:
+			header.update(price_list=selling, price_list_source="Selling Settings.selling_price_list")
+
+	if header["branch"]:
+		is_border = frappe.db.get_value("Branch", header["branch"], "fm_is_border_zone")
+		if is_border is not None:
+			header["is_border_zone"] = bool(is_border)
+			header["zona"] = "Frontera" if is_border else "Nacional"
+			header["company_abbr"], header["stcts"] = stct_table(company, header["zona"])
+	return header
+
+
+def _item_master_itt(item_code: str, **kwargs) -> str | None:
+	"""ITT sugerido por ERPNext (`get_item_tax_template`: Item, Item Group, Tax Category, rangos)."""
+	try:
+		from erpnext.stock.get_item_details import get_item_tax_template
+
+		args = {
+			"item_code": item_code,
+			"company": kwargs.get("company"),
+			"tax_category": kwargs.get("tax_category"),
+			"base_net_rate": kwargs.get("base_net_rate", 0),
+			# Fecha contra la que ERPNext compara el valid_from de cada ITT
+			"transaction_date": kwargs.get("posting_date"),
+		}
+		return get_item_tax_template(args)
+	except Exception:
+		# Fallback silencioso si no funciona
+		return None
+
+
+def _itt_field(item_code: str, rate: float) -> str:
+	return f"{item_code}\x1f{flt(rate, 6)}"
+
+
+def _version(key: str) -> str:
+	return cache_version.get(key) or "0"
+
+
+def _cache_get(key: str):
+	try:
+		return frappe.cache().get_value(key)
+	except Exception:
+		return None
+
+
+def _cache_set(key: str, value) -> None:
+	try:
+		frappe.cache().set_value(key, value, expires_in_sec=TTL_SECONDS)
+	except Exception:
+		pass
+
+
+def _hmget(hash_key: str, fields: list[str]) -> list:
+	try:
+		cache = frappe.cache()
+		pipe = cache.pipeline()
+		pipe.hmget(cache.make_key(hash_key), fields)
+		return pipe.execute()[0]
+	except Exception:
+		return [None] * len(fields)
+
+
+def _hset(hash_key: str, values: dict[str, str]) -> None:
+	try:
+		cache = frappe.cache()
+		redis_key = cache.make_key(hash_key)
+		pipe = cache.pipeline()
+		for field, value in values.items():
+			pipe.hset(redis_key, field, value)
+		pipe.expire(redis_key, TTL_SECONDS)
+		pipe.execute()
+	except Exception:
+		pass
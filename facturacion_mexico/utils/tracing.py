@@ -0,0 +1,286 @@
+"""
+Trazas estructuradas de bajo costo para rutas calientes.
+
+Reemplaza los breadcrumbs con `frappe.log_error` (que insertan un `Error Log` dentro de la
+transacción del submit) por spans y eventos que solo se agregan a un buffer en memoria. Un hilo
+exportador los vacía de forma asíncrona hacia el logger de archivo
+`facturacion_mexico.trace` (una línea JSON por registro) y hacia los sinks registrados
+(`register_sink`). Ningún registro toca la BD.
+
+Uso:
+
+	_tracer = get_tracer(__name__)
+
+	with _tracer.span("create_fiscal_event", doc=doc.name) as span:
+		...
+		span.set(outcome="skipped", reason="sin_rfc")
+
+	_tracer.event("auto_timbrado.ereceipt", doc=doc.name)
+
+Nivel y muestreo por módulo en `site_config.json` (el prefijo más largo gana):
+
+	"fm_tracing": {
+		"level": "info",
+		"sample_rate": 1.0,
+		"modules": {
+			"facturacion_mexico.facturacion_fiscal.timbrado_api": {"level": "debug"},
+			"facturacion_mexico.hooks_handlers": {"sample_rate": 0.1}
+		}
+	}
+
+Los spans que terminan en error se registran siempre, aunque no hayan sido muestreados.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+import frappe
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+DEFAULT_LEVEL = "info"
+DEFAULT_SAMPLE_RATE = 1.0
+CONFIG_TTL_SECONDS = 60
+BUFFER_MAX_RECORDS = 10000
+EXPORT_INTERVAL_SECONDS = 2.0
+LOGGER_NAME = "facturacion_mexico.trace"
+
+_buffer: deque = deque(maxlen=BUFFER_MAX_RECORDS)
+_sinks: list[Callable[[list[dict]], None]] = []
+_settings_cache: dict[tuple, tuple[float, int, float]] = {}
+_tracers: dict[str, "Tracer"] = {}
+_exporter_lock = threading.Lock()
+_exporter_pid: int | None = None
+_wakeup = threading.Event()
+
+
+class Span:
+	"""Span activo: mide duración con `perf_counter` y se registra al salir del bloque."""
+
+	__slots__ = ("_start", "attrs", "doc", "level", "name", "outcome", "sampled", "tracer")
+
+	def __init__(self, tracer: "Tracer", name: str, doc: str | None, level: str, sampled: bool, attrs: dict):
+		self.tracer = tracer
+		self.name = name
+		self.doc = doc
+		self.level = level
+		self.sampled = sampled
+		self.attrs = attrs
+		self.outcome = None
+		self._start = 0.0
+
+	def set(self, outcome: str | None = None, **attrs) -> None:
+		"""Fijar el resultado del span (`ok` por defecto) y atributos adicionales."""
+		if outcome:
+			self.outcome = outcome
+		if attrs:
+			self.attrs.update(attrs)
+
+	def __enter__(self):
+		self._start = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		duration_ms = (time.perf_counter() - self._start) * 1000
+		if exc_type is not None:
+			self.outcome = "error"
+			self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+		elif not self.sampled:
+			return False
+		_record(
+			{
+				"kind": "span",
+				"tracer": self.tracer.name,
+				"name": self.name,
+				"doc": self.doc,
+				"level": self.level,
+				"duration_ms": round(duration_ms, 3),
+				"outcome": self.outcome or "ok",
+				"attrs": self.attrs,
+			}
+		)
+		return False
+
+
+class _NoopSpan:
+	"""Span deshabilitado por nivel: costo de una llamada."""
+
+	__slots__ = ()
+
+	def set(self, outcome: str | None = None, **attrs) -> None:
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+	"""Productor de spans/eventos para un módulo (nivel y muestreo según `fm_tracing`)."""
+
+	def __init__(self, name: str):
+		self.name = name
+
+	def enabled(self, level: str = DEFAULT_LEVEL) -> bool:
+		"""True si el nivel está habilitado para este módulo (útil para evitar trabajo costoso)."""
+		min_level, _rate = _settings_for(self.name)
+		return LEVELS.get(level, 20) >= min_level
+
+	def span(self, name: str, doc: str | None = None, level: str = DEFAULT_LEVEL, **attrs):
+		"""Context manager que registra nombre, duración, documento y resultado."""
+		min_level, rate = _settings_for(self.name)
+		if LEVELS.get(level, 20) < min_level:
+			return _NOOP_SPAN
+		sampled = rate >= 1.0 or random.random() < rate
+		return Span(self, name, doc, level, sampled, attrs)
+
+	def event(self, name: str, doc: str | None = None, level: str = "debug", **attrs) -> None:
+		"""Registrar un breadcrumb puntual (sin duración)."""
+		min_level, rate = _settings_for(self.name)
+		if LEVELS.get(level, 10) < min_level:
+			return
+		if rate < 1.0 and random.random() >= rate and level not in ("warning", "error"):
+			return
+		_record(
+			{
+				"kind": "event",
+				"tracer": self.name,
+				"name": name,
+				"doc": doc,
+				"level": level,
+				"attrs": attrs,
+			}
+		)
+
+
+def get_tracer(name: str) -> Tracer:
+	"""Tracer compartido por nombre de módulo."""
+	tracer = _tracers.get(name)
+	if tracer is None:
+		tracer = _tracers[name] = Tracer(name)
+	return tracer
+
+
+def register_sink(sink: Callable[[list[dict]], None]) -> None:
+	"""Registrar un consumidor adicional de registros exportados (se invoca en el hilo exportador)."""
+	if sink not in _sinks:
+		_sinks.append(sink)
+
+
+def reset_config() -> None:
+	"""Descartar la configuración resuelta (se vuelve a leer de `fm_tracing`)."""
+	_settings_cache.clear()
+
+
+def flush() -> int:
+	"""Exportar de inmediato lo que haya en el buffer. Devuelve registros exportados."""
+	batch = []
+	while True:
+		try:
+			batch.append(_buffer.popleft())
+		except IndexError:
+			break
+	if batch:
+		_export(batch)
+	return len(batch)
+
+
+def after_job() -> None:
+	"""Hook `after_job`: el work-horse de RQ termina al acabar el job y el hilo no alcanzaría a exportar."""
+	flush()
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _site() -> str | None:
+	return getattr(frappe.local, "site", None)
+
+
+def _settings_for(tracer_name: str) -> tuple[int, float]:
+	key = (_site(), tracer_name)
+	cached = _settings_cache.get(key)
+	now = time.monotonic()
+	if cached and cached[0] > now:
+		return cached[1], cached[2]
+
+	level, rate = DEFAULT_LEVEL, DEFAULT_SAMPLE_RATE
+	try:
+		config = frappe.conf.get("fm_tracing") or {}
+	except Exception:
+		config = {}
+	if isinstance(config, dict):
+		level = config.get("level", level)
+		rate = config.get("sample_rate", rate)
+		best = ""
+		for prefix, overrides in (config.get("modules") or {}).items():
+			if (tracer_name == prefix or tracer_name.startswith(prefix + ".")) and len(prefix) > len(best):
+				best = prefix
+				level = overrides.get("level", config.get("level", DEFAULT_LEVEL))
+				rate = overrides.get("sample_rate", config.get("sample_rate", DEFAULT_SAMPLE_RATE))
+
+	resolved = (LEVELS.get(level, LEVELS[DEFAULT_LEVEL]), max(0.0, min(float(rate), 1.0)))
+	_settings_cache[key] = (now + CONFIG_TTL_SECONDS, *resolved)
+	return resolved
+
+
+def _record(record: dict) -> None:
+	record["ts"] = time.time()
+	record["site"] = _site()
+	_buffer.append(record)
+	_ensure_exporter()
+	if len(_buffer) >= BUFFER_MAX_RECORDS // 2:
+		_wakeup.set()
+
+
+def _ensure_exporter() -> None:
+	global _exporter_pid
+	pid = os.getpid()
+	if _exporter_pid == pid:
+		return
+	with _exporter_lock:
+		if _exporter_pid == pid:
+			return
+		# Un proceso hijo (fork de gunicorn/RQ) no hereda el hilo: se inicia uno propio.
+		thread = threading.Thread(target=_export_loop, name="fm-trace-exporter", daemon=True)
+		thread.start()
+		_exporter_pid = pid
+
+
+def _export_loop() -> None:
+	while True:
+		_wakeup.wait(EXPORT_INTERVAL_SECONDS)
+		_wakeup.clear()
+		try:
+			flush()
+		except Exception:
+			# El exportador nunca debe caerse por un registro no serializable o un sink roto.
+			pass
+
+
+def _export(batch: list[dict]) -> None:
+	logger = frappe.logger(LOGGER_NAME, allow_site=False)
+	for record in batch:
+		logger.info(json.dumps(record, ensure_ascii=False, default=str))
+	for sink in list(_sinks):
+		try:
+			sink(batch)
+		except Exception:
+			pass
+
+
+def get_buffered_records() -> list[dict[str, Any]]:
+	"""Copia de los registros aún no exportados (diagnóstico y pruebas)."""
+	return list(_buffer)
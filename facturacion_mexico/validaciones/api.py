@@ -4,12 +4,18 @@ Sistema de validación con cache inteligente
 """
 
 import re
-import unicodedata
 from datetime import datetime
 
 import frappe
 from frappe import _
 
+from facturacion_mexico.validaciones import lista_69b_index, name_matcher, validation_cache
+
+# Validación RFC nocturna (sobrescribibles en site_config: fm_rfc_nightly_limit / _window_minutes)
+NIGHTLY_VALIDATION_LIMIT = 5000
+NIGHTLY_WINDOW_MINUTES = 180
+NIGHTLY_RUN_ID = "nightly"
+
 
 def bulk_validate_customers():
 	"""Validar clientes en lote - scheduled task."""
@@ -88,204 +94,227 @@ def validate_customer_rfc_with_facturapi(customer_name: str):
 		if not rfc:
 			return {"success": False, "error": "Customer no tiene RFC configurado en Tax ID", "data": None}
 
-		# Resultado de validación
-		validation_result = {
-			"customer": customer_name,
-			"customer_name": customer_doc.customer_name,
-			"rfc": rfc,
-			"rfc_format_valid": False,
-			"address_configured": False,
-			"address_valid_for_facturapi": False,
-			"postal_code_format_valid": False,
-			"rfc_exists_in_sat": False,
-			"rfc_active_in_sat": False,
-			"sat_name": None,
-			"name_matches": False,
-			"validation_successful": False,
-			"warnings": [],
-			"recommendations": [],
-		}
+		return _validate_customer_rfc(customer_doc, _get_customer_primary_address(customer_doc))
 
-		# 1. VALIDAR FORMATO RFC
-		if not _is_valid_rfc_format(rfc):
-			validation_result["recommendations"].append(
-				f"RFC '{rfc}' tiene formato inválido. Debe ser formato RFC mexicano válido."
-			)
-			return {"success": True, "data": validation_result}
+	except frappe.DoesNotExistError:
+		return {"success": False, "error": f"Customer '{customer_name}' not found", "data": None}
+	except Exception as e:
+		frappe.log_error(
+			f"Error validating Customer RFC for {customer_name}: {e!s}", "Customer RFC Validation Error"
+		)
+		return {"success": False, "error": f"Error validating Customer RFC: {e!s}", "data": None}
 
-		validation_result["rfc_format_valid"] = True
 
-		# 2. VALIDAR DIRECCIÓN REQUERIDA PARA FACTURAPI
-		primary_address = _get_customer_primary_address(customer_doc)
+def _validate_customer_rfc(customer_doc, primary_address, client=None, persist=True):
+	"""
+	Validar RFC de un Customer con datos ya cargados (dirección incluida).
 
-		if not primary_address:
-			validation_result["recommendations"].append(
-				"Customer necesita dirección primaria configurada. "
-				"Ir a Customer → Addresses → Agregar dirección marcada como 'Primary Address'."
-			)
-			return {"success": True, "data": validation_result}
+	Args:
+		customer_doc: Customer (Document o dict con name, customer_name, tax_id, fm_tax_regime, email_id)
+		primary_address (dict): Dirección primaria o None
+		client: FacturAPIClient reutilizable (por defecto uno nuevo)
+		persist (bool): Escribir fm_rfc_validated en el Customer; si es False los cambios se devuelven
+			en `customer_updates` para aplicarlos por lotes
 
-		validation_result["address_configured"] = True
+	Returns:
+		dict: Resultado completo de la validación
+	"""
+	rfc = customer_doc.get("tax_id") or ""
+
+	# Resultado de validación
+	validation_result = {
+		"customer": customer_doc.name,
+		"customer_name": customer_doc.customer_name,
+		"rfc": rfc,
+		"rfc_format_valid": False,
+		"address_configured": False,
+		"address_valid_for_facturapi": False,
+		"postal_code_format_valid": False,
+		"rfc_exists_in_sat": False,
+		"rfc_active_in_sat": False,
+		"sat_name": None,
+		"name_matches": False,
+		"validation_successful": False,
+		"warnings": [],
+		"recommendations": [],
+	}
 
-		# Validar que la dirección tenga campos requeridos para FacturAPI
-		# Solo Código Postal es obligatorio por SAT (CFDI 4.0)
-		required_address_fields = {
-			"pincode": "Código Postal",
-		}
-		missing_fields = []
+	# 1. VALIDAR FORMATO RFC
+	if not _is_valid_rfc_format(rfc):
+		validation_result["recommendations"].append(
+			f"RFC '{rfc}' tiene formato inválido. Debe ser formato RFC mexicano válido."
+		)
+		return {"success": True, "data": validation_result}
 
-		for field, label in required_address_fields.items():
-			if not primary_address.get(field) or str(primary_address.get(field)).strip() == "":
-				missing_fields.append(label)
+	validation_result["rfc_format_valid"] = True
 
-		if missing_fields:
-			validation_result["warnings"].append(
-				f"Dirección incompleta. Campos faltantes: {', '.join(missing_fields)}"
-			)
-			validation_result["recommendations"].append(
-				f"Para validar RFC con SAT/FacturAPI necesita completar la dirección primaria del Customer: {', '.join(missing_fields)}. "
-				"Ir a Customer → Addresses → Editar dirección principal."
-			)
-			return {"success": True, "data": validation_result}
+	# 2. VALIDAR DIRECCIÓN REQUERIDA PARA FACTURAPI
+	if not primary_address:
+		validation_result["recommendations"].append(
+			"Customer necesita dirección primaria configurada. "
+			"Ir a Customer → Addresses → Agregar dirección marcada como 'Primary Address'."
+		)
+		return {"success": True, "data": validation_result}
 
-		validation_result["address_valid_for_facturapi"] = True
+	validation_result["address_configured"] = True
 
-		# Validar formato de código postal mexicano
-		postal_code = primary_address.get("pincode", "").strip()
-		if _is_valid_postal_code_format(postal_code):
-			validation_result["postal_code_format_valid"] = True
-		else:
-			validation_result["warnings"].append(
-				f"Código postal '{postal_code}' no tiene formato válido (debe ser 5 dígitos)"
-			)
-			validation_result["recommendations"].append(
-				"Corregir el código postal en la dirección principal: debe tener exactamente 5 dígitos numéricos."
-			)
+	# Validar que la dirección tenga campos requeridos para FacturAPI
+	# Solo Código Postal es obligatorio por SAT (CFDI 4.0)
+	required_address_fields = {
+		"pincode": "Código Postal",
+	}
+	missing_fields = []
 
-		# 3. VALIDAR RFC CON FACTURAPI
-		facturapi_result = _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address)
-
-		if not facturapi_result["success"]:
-			# Verificar diferentes tipos de errores de FacturAPI
-			error_msg = facturapi_result.get("error", "")
-
-			if "nombre o razón social del receptor no coincide" in error_msg.lower():
-				# RFC existe y está activo, solo el nombre no coincide
-				validation_result["validation_error"] = error_msg
-				validation_result["rfc_exists_in_sat"] = True
-				validation_result["rfc_active_in_sat"] = True
-				validation_result["sat_name"] = "Consultar constancia SAT"
-				validation_result["name_matches"] = False
-			elif "domiciliofiscalreceptor" in error_msg.lower():
-				# RFC existe y está activo, nombre SÍ coincide, pero código postal no coincide con SAT
-				validation_result["validation_error"] = error_msg
-				validation_result["rfc_exists_in_sat"] = True
-				validation_result["rfc_active_in_sat"] = True
-				validation_result["sat_name"] = "Verificado en SAT"
-				validation_result["name_matches"] = True  # Nombre sí coincide en este caso
-				validation_result["address_matches"] = False  # NUEVO: dirección no coincide
-			else:
-				# Error real - RFC no existe o está inactivo
-				validation_result["validation_error"] = error_msg
-				validation_result["rfc_exists_in_sat"] = False
-				validation_result["rfc_active_in_sat"] = False
-				validation_result["sat_name"] = None
-				validation_result["name_matches"] = False
-		else:
-			# Procesar resultado exitoso de FacturAPI
-			facturapi_data = facturapi_result["data"]
-			validation_result.update(
-				{
-					"rfc_exists_in_sat": facturapi_data.get("rfc_exists", False),
-					"rfc_active_in_sat": facturapi_data.get("rfc_active", False),
-					"sat_name": facturapi_data.get("sat_name"),
-					"name_matches": facturapi_data.get("name_matches", False),
-				}
-			)
+	for field, label in required_address_fields.items():
+		if not primary_address.get(field) or str(primary_address.get(field)).strip() == "":
+			missing_fields.append(label)
 
-		# 4. DETERMINAR SI VALIDACIÓN ES EXITOSA
-		# La validación es exitosa si completamos el proceso, independientemente del resultado SAT
-		validation_successful = (
-			validation_result["rfc_format_valid"] and validation_result["address_valid_for_facturapi"]
+	if missing_fields:
+		validation_result["warnings"].append(
+			f"Dirección incompleta. Campos faltantes: {', '.join(missing_fields)}"
 		)
+		validation_result["recommendations"].append(
+			f"Para validar RFC con SAT/FacturAPI necesita completar la dirección primaria del Customer: {', '.join(missing_fields)}. "
+			"Ir a Customer → Addresses → Editar dirección principal."
+		)
+		return {"success": True, "data": validation_result}
 
-		# Si no existe en SAT, es información válida, no un error
-		if not validation_result["rfc_exists_in_sat"]:
-			validation_result["warnings"].append(
-				"Este RFC no está registrado en el SAT o no está activo. "
-				"Esto puede ser normal para RFCs nuevos o inactivos."
-			)
-
-		validation_result["validation_successful"] = validation_successful
+	validation_result["address_valid_for_facturapi"] = True
 
-		# 5. ACTUALIZAR CUSTOMER CON RESULTADOS
-		# Solo marcar como validado si el RFC existe, está activo, el nombre coincide Y la dirección coincide
-		rfc_is_valid_in_sat = (
-			validation_result["rfc_exists_in_sat"]
-			and validation_result["rfc_active_in_sat"]
-			and validation_result["name_matches"]
-			and validation_result.get("address_matches")
-			is not False  # Solo es válido si address_matches no es False
+	# Validar formato de código postal mexicano
+	postal_code = primary_address.get("pincode", "").strip()
+	if _is_valid_postal_code_format(postal_code):
+		validation_result["postal_code_format_valid"] = True
+	else:
+		validation_result["warnings"].append(
+			f"Código postal '{postal_code}' no tiene formato válido (debe ser 5 dígitos)"
+		)
+		validation_result["recommendations"].append(
+			"Corregir el código postal en la dirección principal: debe tener exactamente 5 dígitos numéricos."
 		)
 
-		try:
-			customer_updates = {}
+	# 3. VALIDAR RFC CON FACTURAPI
+	facturapi_result = _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address, client)
+
+	if not facturapi_result["success"]:
+		# Verificar diferentes tipos de errores de FacturAPI
+		error_msg = facturapi_result.get("error", "")
+
+		if "nombre o razón social del receptor no coincide" in error_msg.lower():
+			# RFC existe y está activo, solo el nombre no coincide
+			validation_result["validation_error"] = error_msg
+			validation_result["rfc_exists_in_sat"] = True
+			validation_result["rfc_active_in_sat"] = True
+			validation_result["sat_name"] = "Consultar constancia SAT"
+			validation_result["name_matches"] = False
+		elif "domiciliofiscalreceptor" in error_msg.lower():
+			# RFC existe y está activo, nombre SÍ coincide, pero código postal no coincide con SAT
+			validation_result["validation_error"] = error_msg
+			validation_result["rfc_exists_in_sat"] = True
+			validation_result["rfc_active_in_sat"] = True
+			validation_result["sat_name"] = "Verificado en SAT"
+			validation_result["name_matches"] = True  # Nombre sí coincide en este caso
+			validation_result["address_matches"] = False  # NUEVO: dirección no coincide
+		else:
+			# Error real - RFC no existe o está inactivo
+			validation_result["validation_error"] = error_msg
+			validation_result["rfc_exists_in_sat"] = False
+			validation_result["rfc_active_in_sat"] = False
+			validation_result["sat_name"] = None
+			validation_result["name_matches"] = False
+	else:
+		# Procesar resultado exitoso de FacturAPI
+		facturapi_data = facturapi_result["data"]
+		validation_result.update(
+			{
+				"rfc_exists_in_sat": facturapi_data.get("rfc_exists", False),
+				"rfc_active_in_sat": facturapi_data.get("rfc_active", False),
+				"sat_name": facturapi_data.get("sat_name"),
+				"name_matches": facturapi_data.get("name_matches", False),
+			}
+		)
 
-			if rfc_is_valid_in_sat:
-				# RFC válido en SAT - marcar como validado
-				customer_updates["fm_rfc_validated"] = 1
-				customer_updates["fm_rfc_validation_date"] = frappe.utils.today()
-			else:
-				# RFC no válido en SAT - limpiar validación anterior si existe
-				customer_updates["fm_rfc_validated"] = 0
-				customer_updates["fm_rfc_validation_date"] = None
+	# 4. DETERMINAR SI VALIDACIÓN ES EXITOSA
+	# La validación es exitosa si completamos el proceso, independientemente del resultado SAT
+	validation_successful = (
+		validation_result["rfc_format_valid"] and validation_result["address_valid_for_facturapi"]
+	)
+
+	# Si no existe en SAT, es información válida, no un error
+	if not validation_result["rfc_exists_in_sat"]:
+		validation_result["warnings"].append(
+			"Este RFC no está registrado en el SAT o no está activo. "
+			"Esto puede ser normal para RFCs nuevos o inactivos."
+		)
 
-			frappe.db.set_value("Customer", customer_name, customer_updates)
+	validation_result["validation_successful"] = validation_successful
+
+	# 5. ACTUALIZAR CUSTOMER CON RESULTADOS
+	# Solo marcar como validado si el RFC existe, está activo, el nombre coincide Y la dirección coincide
+	rfc_is_valid_in_sat = (
+		validation_result["rfc_exists_in_sat"]
+		and validation_result["rfc_active_in_sat"]
+		and validation_result["name_matches"]
+		and validation_result.get("address_matches")
+		is not False  # Solo es válido si address_matches no es False
+	)
+
+	customer_updates = {}
+
+	if rfc_is_valid_in_sat:
+		# RFC válido en SAT - marcar como validado
+		customer_updates["fm_rfc_validated"] = 1
+		customer_updates["fm_rfc_validation_date"] = frappe.utils.today()
+	else:
+		# RFC no válido en SAT - limpiar validación anterior si existe
+		customer_updates["fm_rfc_validated"] = 0
+		customer_updates["fm_rfc_validation_date"] = None
+
+	if persist:
+		try:
+			frappe.db.set_value("Customer", customer_doc.name, customer_updates)
 			frappe.db.commit()
 
 			validation_result["customer_updated"] = True
 
 		except Exception as e:
-			frappe.log_error(f"Error updating Customer {customer_name}: {e!s}", "Customer RFC Update Error")
-			validation_result["warnings"].append(f"Error actualizando Customer: {e!s}")
-
-		# 6. GENERAR RECOMENDACIONES FINALES
-		if not validation_result["name_matches"] and validation_result["sat_name"]:
-			validation_result["recommendations"].append(
-				f"Nombre en SAT ('{validation_result['sat_name']}') no coincide exactamente "
-				f"con nombre del Customer ('{customer_doc.customer_name}'). "
-				"Verificar que coincidan para evitar problemas de timbrado."
+			frappe.log_error(
+				f"Error updating Customer {customer_doc.name}: {e!s}", "Customer RFC Update Error"
 			)
+			validation_result["warnings"].append(f"Error actualizando Customer: {e!s}")
+	else:
+		# El llamador (validación masiva) escribe los cambios por lotes
+		validation_result["customer_updates"] = customer_updates
+
+	# 6. GENERAR RECOMENDACIONES FINALES
+	if not validation_result["name_matches"] and validation_result["sat_name"]:
+		validation_result["recommendations"].append(
+			f"Nombre en SAT ('{validation_result['sat_name']}') no coincide exactamente "
+			f"con nombre del Customer ('{customer_doc.customer_name}'). "
+			"Verificar que coincidan para evitar problemas de timbrado."
+		)
 
-		if rfc_is_valid_in_sat:
+	if rfc_is_valid_in_sat:
+		validation_result["recommendations"].append(
+			"✅ RFC completamente válido: existe en SAT, está activo, nombre y dirección coinciden. Customer listo para facturación."
+		)
+	elif validation_result["rfc_exists_in_sat"] and validation_result["rfc_active_in_sat"]:
+		if not validation_result["name_matches"]:
 			validation_result["recommendations"].append(
-				"✅ RFC completamente válido: existe en SAT, está activo, nombre y dirección coinciden. Customer listo para facturación."
+				"⚠️ RFC existe en SAT pero el nombre no coincide exactamente. "
+				"Actualizar nombre del Customer para que coincida con el registro SAT."
 			)
-		elif validation_result["rfc_exists_in_sat"] and validation_result["rfc_active_in_sat"]:
-			if not validation_result["name_matches"]:
-				validation_result["recommendations"].append(
-					"⚠️ RFC existe en SAT pero el nombre no coincide exactamente. "
-					"Actualizar nombre del Customer para que coincida con el registro SAT."
-				)
-			elif not validation_result.get("address_matches"):
-				validation_result["recommendations"].append(
-					"⚠️ RFC y nombre válidos en SAT pero el código postal no coincide con el registro fiscal. "
-					"Verificar y corregir el código postal en la dirección del Customer."
-				)
-		else:
+		elif not validation_result.get("address_matches"):
 			validation_result["recommendations"].append(
-				"❌ RFC no está registrado o activo en SAT. Verificar que el RFC sea correcto."
+				"⚠️ RFC y nombre válidos en SAT pero el código postal no coincide con el registro fiscal. "
+				"Verificar y corregir el código postal en la dirección del Customer."
 			)
-
-		return {"success": True, "data": validation_result}
-
-	except frappe.DoesNotExistError:
-		return {"success": False, "error": f"Customer '{customer_name}' not found", "data": None}
-	except Exception as e:
-		frappe.log_error(
-			f"Error validating Customer RFC for {customer_name}: {e!s}", "Customer RFC Validation Error"
+	else:
+		validation_result["recommendations"].append(
+			"❌ RFC no está registrado o activo en SAT. Verificar que el RFC sea correcto."
 		)
-		return {"success": False, "error": f"Error validating Customer RFC: {e!s}", "data": None}
+
+	return {"success": True, "data": validation_result}
 
 
 @frappe.whitelist()
@@ -307,6 +336,11 @@ def validate_lista_69b(rfc: str | None = None, use_cache: bool = True):
 		# Normalizar RFC
 		fm_rfc = rfc.upper().strip()
 
+		# Índice local de la publicación del SAT: sin llamada externa ni fila de cache por RFC
+		index = lista_69b_index.get_index()
+		if index is not None:
+			return lista_69b_index.to_validation_result(fm_rfc, index.lookup(fm_rfc), index.fecha_publicacion)
+
 		# Buscar en cache si está habilitado
 		if use_cache:
 			cached_result = _get_cached_lista_69b_validation(fm_rfc)
@@ -560,15 +594,10 @@ def _get_cached_rfc_validation(rfc):
 		dict: Resultado del cache o None
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
-
-		cache_key = f"RFC_{rfc}"
-		cached_result = SATValidationCache.get_valid_cache(cache_key, "rfc_validation")
+		cached_result = validation_cache.get("RFC", rfc)
 
 		if cached_result:
-			result_data = frappe.parse_json(cached_result.get("result_data", "{}"))
+			result_data = cached_result.data
 			return {
 				"success": True,
 				"valid": result_data.get("valid", False),
@@ -576,8 +605,8 @@ def _get_cached_rfc_validation(rfc):
 				"message": result_data.get("message", ""),
 				"fm_rfc": rfc,
 				"cached": True,
-				"cache_date": cached_result.get("validated_at"),
-				"expires_at": cached_result.get("expires_at"),
+				"cache_date": cached_result.validation_date,
+				"expires_at": cached_result.expiry_date,
 			}
 
 		return None
@@ -598,15 +627,10 @@ def _get_cached_lista_69b_validation(rfc):
 		dict: Resultado del cache o None
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
-
-		cache_key = f"L69B_{rfc}"
-		cached_result = SATValidationCache.get_valid_cache(cache_key, "lista_69b")
+		cached_result = validation_cache.get("Lista69B", rfc)
 
 		if cached_result:
-			result_data = frappe.parse_json(cached_result.get("result_data", "{}"))
+			result_data = cached_result.data
 			return {
 				"success": True,
 				"in_lista_69b": result_data.get("in_lista_69b", False),
@@ -614,8 +638,8 @@ def _get_cached_lista_69b_validation(rfc):
 				"message": result_data.get("message", ""),
 				"fm_rfc": rfc,
 				"cached": True,
-				"cache_date": cached_result.get("validated_at"),
-				"expires_at": cached_result.get("expires_at"),
+				"cache_date": cached_result.validation_date,
+				"expires_at": cached_result.expiry_date,
 			}
 
 		return None
@@ -716,18 +740,7 @@ def _cache_rfc_validation(rfc, validation_result):
 		validation_result (dict): Resultado a cachear
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
-
-		cache_key = f"RFC_{rfc}"
-
-		SATValidationCache.create_cache_record(
-			validation_key=cache_key,
-			validation_type="rfc_validation",
-			result_data=validation_result,
-			source_system="SAT_API",
-		)
+		validation_cache.put("RFC", rfc, validation_result.get("valid", False), validation_result)
 
 	except Exception as e:
 		frappe.log_error(message=str(e), title="Cache RFC Validation Error")
@@ -742,18 +755,7 @@ def _cache_lista_69b_validation(rfc, validation_result):
 		validation_result (dict): Resultado a cachear
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
-
-		cache_key = f"L69B_{rfc}"
-
-		SATValidationCache.create_cache_record(
-			validation_key=cache_key,
-			validation_type="lista_69b",
-			result_data=validation_result,
-			source_system="SAT_LISTA_69B_API",
-		)
+		validation_cache.put("Lista69B", rfc, not validation_result.get("in_lista_69b"), validation_result)
 
 	except Exception as e:
 		frappe.log_error(message=str(e), title="Cache Lista 69B Validation Error")
@@ -826,7 +828,7 @@ def _get_customer_primary_address(customer_doc):
 		return None
 
 
-def _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address):
+def _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address, client=None):
 	"""
 	Validar RFC con FacturAPI usando datos reales del Customer.
 	Versión simplificada y robusta que crea customer temporal, valida y borra.
@@ -835,6 +837,7 @@ def _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address):
 		rfc (str): RFC a validar
 		customer_doc: Document de Customer
 		primary_address (dict): Dirección primaria del Customer
+		client: FacturAPIClient reutilizable (por defecto uno nuevo)
 
 	Returns:
 		dict: Resultado de validación FacturAPI
@@ -843,7 +846,7 @@ def _validate_rfc_with_facturapi_full(rfc, customer_doc, primary_address):
 		from facturacion_mexico.facturacion_fiscal.api_client import get_facturapi_client
 
 		# Obtener cliente FacturAPI
-		client = get_facturapi_client()
+		client = client or get_facturapi_client()
 
 		# Obtener tax_system del customer — requerido, no hay default
 		fm_tax_regime = customer_doc.get("fm_tax_regime") or ""
@@ -987,38 +990,8 @@ def _compare_customer_names(sat_name, customer_name):
 	"""
 	if not sat_name or not customer_name:
 		return False
-
-	# Normalizar strings
-	import re
-	import unicodedata
-
-	def normalize_name(name):
-		# Remover acentos
-		name = unicodedata.normalize("NFD", name).encode("ascii", "ignore").decode("ascii")
-		# Solo letras y espacios
-		name = re.sub(r"[^a-zA-Z\s]", "", name)
-		# Espacios múltiples a uno solo
-		name = re.sub(r"\s+", " ", name)
-		return name.upper().strip()
-
-	sat_normalized = normalize_name(sat_name)
-	customer_normalized = normalize_name(customer_name)
-
-	# Comparación exacta
-	if sat_normalized == customer_normalized:
-		return True
-
-	# Comparación por palabras clave (75% coincidencia)
-	sat_words = set(sat_normalized.split())
-	customer_words = set(customer_normalized.split())
-
-	if len(sat_words) == 0 or len(customer_words) == 0:
-		return False
-
-	intersection = sat_words.intersection(customer_words)
-	similarity = len(intersection) / max(len(sat_words), len(customer_words))
-
-	return similarity >= 0.75  # 75% de palabras coinciden
+	# Forma canónica cacheada; 75% de similitud (palabras o trigramas)
+	return name_matcher.similarity(sat_name, customer_name) >= 0.75
 
 
 def _normalize_company_name_for_facturapi(company_name):
@@ -1034,60 +1007,7 @@ def _normalize_company_name_for_facturapi(company_name):
 	Returns:
 		str: Nombre normalizado para FacturAPI
 	"""
-	if not company_name:
-		return ""
-
-	# Normalizar a mayúsculas
-	normalized = company_name.upper()
-
-	# Remover acentos y caracteres especiales
-	accent_map = {
-		"Á": "A",
-		"É": "E",
-		"Í": "I",
-		"Ó": "O",
-		"Ú": "U",
-		"Ñ": "N",
-		"á": "A",
-		"é": "E",
-		"í": "I",
-		"ó": "O",
-		"ú": "U",
-		"ñ": "N",
-	}
-
-	for accented, plain in accent_map.items():
-		normalized = normalized.replace(accented, plain)
-
-	# Remover regímenes societarios comunes
-	regimes_to_remove = [
-		", S.A. DE C.V.",
-		", S.A.B. DE C.V.",
-		", S. DE R.L. DE C.V.",
-		", S.C.",
-		", A.C.",
-		" S.A. DE C.V.",
-		" S.A.B. DE C.V.",
-		" S. DE R.L. DE C.V.",
-		" S.C.",
-		" A.C.",
-		", SA DE CV",
-		", SAB DE CV",
-		", S DE RL DE CV",
-		" SA DE CV",
-		" SAB DE CV",
-		" S DE RL DE CV",
-	]
-
-	for regime in regimes_to_remove:
-		if normalized.endswith(regime):
-			normalized = normalized[: -len(regime)]
-			break
-
-	# Limpiar espacios extra
-	normalized = " ".join(normalized.split())
-
-	return normalized
+	return name_matcher.facturapi_name(company_name)
 
 
 def _normalize_country_code(country):
@@ -1266,11 +1186,12 @@ def get_customers_needing_rfc_validation(limit=30):
 		"""
 
 		customers = frappe.db.sql(query, (limit,), as_dict=True)
+		with_primary = _get_customers_with_primary_address([c["name"] for c in customers])
 
 		# Enriquecer datos con información adicional
 		for customer in customers:
 			# Verificar si tiene dirección primaria
-			customer["has_primary_address"] = bool(_get_customer_primary_address_exists(customer["name"]))
+			customer["has_primary_address"] = customer["name"] in with_primary
 
 			# Determinar razón de validación
 			if customer["priority_level"] == 1:
@@ -1290,41 +1211,29 @@ def get_customers_needing_rfc_validation(limit=30):
 		return []
 
 
-def _get_customer_primary_address_exists(customer_name):
-	"""
-	Verificar si Customer tiene dirección primaria (versión optimizada).
-
-	Args:
-		customer_name (str): Nombre del Customer
-
-	Returns:
-		bool: True si tiene dirección primaria
-	"""
-	try:
-		result = frappe.db.sql(
-			"""
-			SELECT 1
-			FROM `tabAddress` addr
-			INNER JOIN `tabDynamic Link` dl ON dl.parent = addr.name
-			WHERE dl.link_doctype = 'Customer'
-			AND dl.link_name = %s
-			AND addr.is_primary_address = 1
-			AND addr.disabled = 0
-			LIMIT 1
-		""",
-			(customer_name,),
-		)
-
-		return bool(result)
-
-	except Exception:
-		return False
+def _get_customers_with_primary_address(customer_names):
+	"""Subconjunto de `customer_names` con dirección primaria activa (una consulta)."""
+	if not customer_names:
+		return set()
+	rows = frappe.db.sql(
+		"""
+		SELECT DISTINCT dl.link_name
+		FROM `tabAddress` addr
+		INNER JOIN `tabDynamic Link` dl ON dl.parent = addr.name
+		WHERE dl.link_doctype = 'Customer'
+		AND dl.link_name IN %(customers)s
+		AND addr.is_primary_address = 1
+		AND addr.disabled = 0
+	""",
+		{"customers": tuple(customer_names)},
+	)
+	return {row[0] for row in rows}
 
 
 @frappe.whitelist()
 def validate_customers_bulk(customer_names: str | None = None, max_validations_per_run: int = 30):
 	"""
-	Validar múltiples customers en lote (para scheduled job).
+	Validar múltiples customers en lote (concurrente y con límite de tasa hacia FacturAPI).
 
 	Args:
 		customer_names (list): Lista de nombres de Customer a validar
@@ -1334,6 +1243,8 @@ def validate_customers_bulk(customer_names: str | None = None, max_validations_p
 		dict: Resumen de resultados de validación masiva
 	"""
 	try:
+		from facturacion_mexico.validaciones import rfc_bulk_validation
+
 		if isinstance(customer_names, str):
 			customer_names = frappe.parse_json(customer_names)
 
@@ -1341,117 +1252,60 @@ def validate_customers_bulk(customer_names: str | None = None, max_validations_p
 			return {"success": False, "error": "customer_names debe ser una lista"}
 
 		# Limitar número de validaciones
-		customer_names = customer_names[:max_validations_per_run]
-
-		results = {
-			"success": True,
-			"total_requested": len(customer_names),
-			"results": [],
-			"summary": {
-				"successful_validations": 0,
-				"failed_validations": 0,
-				"skipped_validations": 0,
-				"customers_now_validated": 0,
-				"errors": [],
-			},
-		}
-
-		for customer_name in customer_names:
-			try:
-				# Validar customer individual
-				validation_result = validate_customer_rfc_with_facturapi(customer_name)
-
-				customer_result = {
-					"customer": customer_name,
-					"success": validation_result.get("success", False),
-					"validation_successful": False,
-					"error": None,
-				}
-
-				if validation_result.get("success") and validation_result.get("data"):
-					data = validation_result["data"]
-					customer_result.update(
-						{
-							"validation_successful": data.get("validation_successful", False),
-							"rfc": data.get("rfc"),
-							"sat_name": data.get("sat_name"),
-							"warnings": data.get("warnings", []),
-							"recommendations": data.get("recommendations", []),
-						}
-					)
+		customer_names = customer_names[: int(max_validations_per_run)]
 
-					if data.get("validation_successful"):
-						results["summary"]["customers_now_validated"] += 1
-
-					results["summary"]["successful_validations"] += 1
-
-				else:
-					customer_result["error"] = validation_result.get("error", "Error desconocido")
-					results["summary"]["failed_validations"] += 1
-					results["summary"]["errors"].append(f"{customer_name}: {customer_result['error']}")
-
-				results["results"].append(customer_result)
-
-				# Pausa pequeña entre validaciones para no saturar FacturAPI
-				import time
-
-				time.sleep(1)
-
-			except Exception as e:
-				error_msg = f"Error validating {customer_name}: {e!s}"
-				frappe.log_error(error_msg, "Bulk RFC Validation Error")
-
-				results["results"].append(
-					{
-						"customer": customer_name,
-						"success": False,
-						"validation_successful": False,
-						"error": str(e),
-					}
-				)
-
-				results["summary"]["failed_validations"] += 1
-				results["summary"]["errors"].append(error_msg)
-
-		# Log resumen de la ejecución masiva
-		frappe.logger().info(
-			f"Bulk RFC Validation completed: {results['summary']['successful_validations']} successful, "
-			f"{results['summary']['failed_validations']} failed, "
-			f"{results['summary']['customers_now_validated']} now validated"
-		)
-
-		return results
+		return rfc_bulk_validation.run(customer_names)
 
 	except Exception as e:
 		frappe.log_error(f"Error in bulk RFC validation: {e!s}", "Bulk RFC Validation Critical Error")
 		return {"success": False, "error": f"Error crítico en validación masiva: {e!s}", "results": []}
 
 
+def enqueue_nightly_rfc_validation():
+	"""Scheduler: la validación nocturna excede el timeout de un job programado, se encola en `long`."""
+	window_minutes = int(frappe.conf.get("fm_rfc_nightly_window_minutes") or NIGHTLY_WINDOW_MINUTES)
+	frappe.enqueue(
+		"facturacion_mexico.validaciones.api.run_nightly_rfc_validation",
+		queue="long",
+		timeout=(window_minutes + 30) * 60,
+		job_id="fm_nightly_rfc_validation",
+		deduplicate=True,
+	)
+
+
 def run_nightly_rfc_validation():
 	"""
 	SCHEDULED JOB PRINCIPAL: Validación automática nocturna de RFCs.
-	Se ejecuta cada noche a las 2:00 AM.
-	Valida máximo 30 customers por día priorizados inteligentemente.
+	Se encola cada noche a las 2:00 AM (`enqueue_nightly_rfc_validation`).
+	Valida hasta `fm_rfc_nightly_limit` customers priorizados dentro de la ventana
+	`fm_rfc_nightly_window_minutes`; lo que no alcance queda en el checkpoint para la siguiente noche.
 	"""
 	try:
+		from facturacion_mexico.validaciones import rfc_bulk_validation
+
 		frappe.logger().info("🌙 Iniciando validación RFC nocturna automática...")
 
-		daily_validation_limit = 30  # Límite diario de validaciones RFC
+		daily_validation_limit = int(frappe.conf.get("fm_rfc_nightly_limit") or NIGHTLY_VALIDATION_LIMIT)
+		window_minutes = int(frappe.conf.get("fm_rfc_nightly_window_minutes") or NIGHTLY_WINDOW_MINUTES)
 
 		# Obtener customers candidatos priorizados
 		candidates = get_customers_needing_rfc_validation(limit=daily_validation_limit)
+		pending = rfc_bulk_validation.load_checkpoint(NIGHTLY_RUN_ID)
 
-		if not candidates:
+		if not candidates and not pending:
 			frappe.logger().info("✅ No hay customers pendientes de validación RFC")
 			return {"success": True, "message": "No customers needing validation", "total_processed": 0}
 
-		frappe.logger().info(f"🎯 Encontrados {len(candidates)} customers candidatos para validación")
+		frappe.logger().info(
+			f"🎯 Encontrados {len(candidates)} customers candidatos y {len(pending)} pendientes del checkpoint"
+		)
 
-		# Extraer solo los nombres para la validación masiva
-		customer_names = [c["name"] for c in candidates]
+		# Pendientes de la noche anterior primero, luego candidatos nuevos, hasta el límite diario
+		customer_names = list(dict.fromkeys([*pending, *(c["name"] for c in candidates)]))
+		rfc_bulk_validation.save_checkpoint(NIGHTLY_RUN_ID, customer_names[:daily_validation_limit])
 
 		# Ejecutar validación masiva
-		bulk_result = validate_customers_bulk(customer_names, daily_validation_limit)
+		bulk_result = rfc_bulk_validation.run([], run_id=NIGHTLY_RUN_ID, max_seconds=window_minutes * 60)
 
 		# Crear log de auditoría de la ejecución
 		create_nightly_validation_log(candidates, bulk_result)
@@ -1461,13 +1315,13 @@ def run_nightly_rfc_validation():
 		frappe.logger().info(
 			f"🌙 Validación RFC nocturna completada: "
 			f"{summary.get('customers_now_validated', 0)} customers validados exitosamente, "
-			f"{summary.get('failed_validations', 0)} fallos"
+			f"{summary.get('failed_validations', 0)} fallos, {bulk_result.get('pending', 0)} pendientes"
 		)
 
 		return {
 			"success": True,
 			"message": "Nightly RFC validation completed",
-			"total_processed": len(candidates),
+			"total_processed": len(bulk_result.get("results", [])),
 			"results": bulk_result,
 		}
 
@@ -1695,14 +1549,9 @@ def get_customers_validation_summary():
 
 def _nfc_upper_collapse(s: str) -> str:
 	"""Normaliza a NFC, quita espacios extremos y colapsa espacios; preserva Ñ y comillas."""
-	if not s:
-		return ""
-	s = unicodedata.normalize("NFC", s)  # preserva acentos y Ñ
-	s = s.strip()
-	s = re.sub(r"\s+", " ", s)
-	return s.upper()
+	return name_matcher.exact_key(s)
 
 
 def names_match_sat(customer_name: str, sat_name: str) -> bool:
 	"""Comparación tolerante a espacios/caso, pero **sin** destruir Ñ/comillas."""
-	return _nfc_upper_collapse(customer_name) == _nfc_upper_collapse(sat_name)
+	return name_matcher.exact_key(customer_name) == name_matcher.exact_key(sat_name)
@@ -9,6 +9,23 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 
+_RFC_CACHE_DAYS = 30  # Días de retención del caché de validaciones SAT
+
+# Días de vigencia por tipo de validación (también definen el TTL en Redis, ver validation_cache)
+CACHE_DAYS_BY_TYPE = {
+	"RFC": _RFC_CACHE_DAYS,
+	"fm_rfc": _RFC_CACHE_DAYS,
+	"Lista69B": 7,  # Lista 69B cambia semanalmente
+	"Obligaciones": _RFC_CACHE_DAYS,
+	"Regimen_Fiscal": _RFC_CACHE_DAYS,
+	"fm_regimen_fiscal": _RFC_CACHE_DAYS,
+	"Domicilio_Fiscal": _RFC_CACHE_DAYS,
+}
+
+
+def get_cache_days(validation_type: str | None) -> int:
+	return CACHE_DAYS_BY_TYPE.get(validation_type, 30)
+
 
 class SATValidationCache(Document):
 	def before_save(self):
@@ -17,30 +34,12 @@ class SATValidationCache(Document):
 		self.set_last_updated_by()
 		self.increment_validation_count()
 
-	_RFC_CACHE_DAYS = 30  # Días de retención del caché de validaciones SAT
-
 	def set_expiry_date(self):
 		"""Establecer fecha de expiración según tipo de validación."""
 		if not self.expiry_date:
-			cache_days = self._RFC_CACHE_DAYS
-
-			# Diferentes duraciones según tipo de validación
-			if self.validation_type == "fm_rfc":
-				days = cache_days
-			elif self.validation_type == "Lista69B":
-				days = 7  # Lista 69B cambia semanalmente
-			elif self.validation_type == "Obligaciones":
-				days = cache_days
-			elif (
-				self.validation_type == "fm_regimen_fiscal"
-			):  # TODO: Cache type identifier, not field reference
-				days = cache_days
-			elif self.validation_type == "Domicilio_Fiscal":
-				days = cache_days
-			else:
-				days = 30  # Default
-
-			self.expiry_date = frappe.utils.add_days(self.validation_date, days)
+			self.expiry_date = frappe.utils.add_days(
+				self.validation_date, get_cache_days(self.validation_type)
+			)
 
 	def set_last_updated_by(self):
 		"""Establecer usuario que actualiza."""
@@ -217,6 +216,20 @@ class SATValidationCache(Document):
 	def get_cached_validation(validation_type, lookup_value, auto_refresh=True):
 		"""Obtener validación desde cache o crear nueva."""
 		try:
+			from facturacion_mexico.validaciones import validation_cache
+
+			# Nivel Redis/BD sin guardar el documento en cada lectura
+			entry = validation_cache.get(validation_type, lookup_value)
+			if entry:
+				return {
+					"success": True,
+					"from_cache": True,
+					"is_valid": entry.is_valid,
+					"data": entry.data,
+					"cache_date": entry.validation_date,
+					"expiry_date": entry.expiry_date,
+				}
+
 			# Buscar en cache existente
 			cache_name = frappe.db.get_value(
 				"SAT Validation Cache",
@@ -393,10 +406,12 @@ class SATValidationCache(SATValidationCache):
 
 	@staticmethod
 	def get_valid_cache(lookup_value, validation_type):
-		"""Método estático para obtener cache válido."""
-		result = SATValidationCache.get_cached_validation(validation_type, lookup_value)
-		if result.get("success") and result.get("is_valid", False):
-			return result.get("data", {})
+		"""Método estático para obtener cache válido (solo lectura, sin validar de nuevo)."""
+		from facturacion_mexico.validaciones import validation_cache
+
+		entry = validation_cache.get(validation_type, lookup_value)
+		if entry and entry.is_valid:
+			return entry.data
 		return None
 
 	@staticmethod
@@ -119,17 +119,14 @@ def _validate_rfc_with_sat_cache(rfc, customer_name):
 		customer_name: Nombre del cliente
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
+		from facturacion_mexico.validaciones import validation_cache
 
-		# Buscar en cache primero
-		cache_key = f"RFC_{rfc.upper()}"
-		cached_result = SATValidationCache.get_valid_cache(cache_key, "rfc_validation")
+		# Buscar en cache primero (Redis; BD solo si Redis no lo tiene)
+		cached_result = validation_cache.get("RFC", rfc)
 
 		if cached_result:
 			# Usar resultado del cache
-			result_data = frappe.parse_json(cached_result.get("result_data", "{}"))
+			result_data = cached_result.data
 			if not result_data.get("valid", False):
 				frappe.throw(
 					_("RFC '{0}' no es válido según SAT (cache): {1}").format(
@@ -138,7 +135,7 @@ def _validate_rfc_with_sat_cache(rfc, customer_name):
 				)
 		else:
 			# Validar con SAT y guardar en cache
-			_validate_and_cache_rfc(rfc, cache_key)
+			_validate_and_cache_rfc(rfc)
 
 	except frappe.ValidationError:
 		raise
@@ -151,13 +148,12 @@ def _validate_rfc_with_sat_cache(rfc, customer_name):
 		)
 
 
-def _validate_and_cache_rfc(rfc, cache_key):
+def _validate_and_cache_rfc(rfc):
 	"""
 	Validar RFC con SAT API y guardar resultado en cache.
 
 	Args:
 		rfc: RFC a validar
-		cache_key: Key para el cache
 	"""
 	try:
 		# TODO: Implementar llamada real a API SAT
@@ -169,17 +165,10 @@ def _validate_and_cache_rfc(rfc, cache_key):
 			"validation_date": frappe.utils.now(),
 		}
 
-		# Guardar en cache
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
+		# Guardar en cache (Redis inmediato, BD por lotes)
+		from facturacion_mexico.validaciones import validation_cache
 
-		SATValidationCache.create_cache_record(
-			validation_key=cache_key,
-			validation_type="rfc_validation",
-			result_data=result_data,
-			source_system="SAT_API_SIMULATION",
-		)
+		validation_cache.put("RFC", rfc, result_data["valid"], result_data)
 
 	except Exception as e:
 		frappe.log_error(
@@ -229,12 +218,18 @@ def _validate_uso_cfdi(sales_invoice):
 
 def _get_valid_uso_cfdi_codes():
 	"""
-	Obtener códigos válidos de Uso CFDI desde configuración.
+	Obtener códigos válidos de Uso CFDI desde el catálogo SAT (en memoria, vigentes a hoy).
 
 	Returns:
 		list: Lista de códigos válidos
 	"""
-	# En una implementación real, esto vendría de una tabla o configuración
+	from facturacion_mexico.catalogos_sat import catalog_service
+
+	codes = catalog_service.codes("Uso CFDI SAT", vigentes_al=frappe.utils.today())
+	if codes:
+		return codes
+
+	# Sitio sin catálogo instalado: lista de respaldo del Anexo 20
 	return [
 		"G01",
 		"G02",
@@ -547,16 +542,26 @@ def _validate_lista_69b_with_cache(rfc, customer_name):
 		customer_name: Nombre del cliente
 	"""
 	try:
-		from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import (
-			SATValidationCache,
-		)
+		from facturacion_mexico.validaciones import lista_69b_index, validation_cache
+
+		# Índice local de la Lista 69-B: búsqueda en memoria, sin fila de cache por RFC
+		if lista_69b_index.is_available():
+			entry = lista_69b_index.lookup(rfc)
+			if entry and entry.in_lista_69b:
+				frappe.msgprint(
+					_("ADVERTENCIA: El cliente {0} (RFC: {1}) está en Lista 69B del SAT ({2})").format(
+						customer_name, rfc, entry.situacion
+					),
+					alert=True,
+					indicator="red",
+				)
+			return
 
 		# Buscar en cache
-		cache_key = f"L69B_{rfc.upper()}"
-		cached_result = SATValidationCache.get_valid_cache(cache_key, "lista_69b")
+		cached_result = validation_cache.get("Lista69B", rfc)
 
 		if cached_result:
-			result_data = frappe.parse_json(cached_result.get("result_data", "{}"))
+			result_data = cached_result.data
 			if result_data.get("in_lista_69b", False):
 				frappe.msgprint(
 					_("ADVERTENCIA: El cliente {0} (RFC: {1}) está en Lista 69B del SAT").format(
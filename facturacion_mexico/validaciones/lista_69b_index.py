@@ -0,0 +1,447 @@
+"""
+Índice local de la Lista 69-B del SAT (EFOS: operaciones inexistentes).
+
+El SAT publica el listado completo del artículo 69-B como CSV. En lugar de consultar cada RFC contra un
+servicio externo y guardar una fila de `SAT Validation Cache` por RFC, se ingiere una copia local del
+archivo en un índice compacto:
+
+	- RFCs normalizados, ordenados y de ancho fijo (13 bytes) en un solo bloque `bytes`; la búsqueda es
+	  binaria sobre ese bloque, sin un objeto Python por RFC
+	- un byte de situación por RFC (Presunto, Desvirtuado, Definitivo, Sentencia Favorable)
+	- un filtro de Bloom opcional que descarta en O(1) la inmensa mayoría de los RFCs que no están en la
+	  lista (el caso normal)
+
+Cada ingesta escribe `lista_69b_<fecha_publicacion>.idx` en los archivos privados del sitio y publica
+en Redis (`fm_lista_69b_version`) el archivo y su versión: un hash de la fecha y del contenido, así
+que re-ingerir la misma fecha con un listado corregido también cambia la versión. Los demás workers la
+comparan como máximo cada `VERSION_CHECK_SECONDS` y recargan. Si Redis no tiene versión se usa el
+archivo más reciente.
+
+Uso:
+
+	from facturacion_mexico.validaciones import lista_69b_index
+
+	entry = lista_69b_index.lookup("AAA010101AAA")   # None si no aparece
+	if entry and entry.in_lista_69b: ...
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+import frappe
+from frappe import _
+from frappe.utils import cint, getdate, today
+
+VERSION_CHECK_SECONDS = 30
+VERSION_KEY = "fm_lista_69b_version"
+INDEX_DIR = "lista_69b"
+INDEX_MAGIC = b"FM69B1\n"
+RFC_WIDTH = 13
+HEADER_SCAN_ROWS = 20
+BLOOM_BITS_PER_RFC = 10
+BLOOM_HASHES = 7
+INGEST_ROLES = ("System Manager", "Facturacion Mexico System Manager")
+
+# Orden fijo: el índice guarda la posición (1 byte) en esta tupla
+SITUACIONES = ("Presunto", "Desvirtuado", "Definitivo", "Sentencia Favorable")
+# Situaciones que impiden deducir/acreditar los comprobantes del contribuyente
+SITUACIONES_BLOQUEANTES = frozenset({"Presunto", "Definitivo"})
+
+_RFC_PATTERN = re.compile(r"^[A-ZÑ&]{3,4}\d{6}[A-Z0-9]{3}$")
+
+
+@dataclass(frozen=True)
+class Lista69BEntry:
+	"""Resultado de búsqueda de un RFC en el índice."""
+
+	rfc: str
+	situacion: str
+	fecha_publicacion: str
+
+	@property
+	def in_lista_69b(self) -> bool:
+		return self.situacion in SITUACIONES_BLOQUEANTES
+
+
+class Lista69BIndex:
+	"""Snapshot inmutable del listado: RFCs ordenados de ancho fijo + situación + Bloom."""
+
+	__slots__ = ("bloom", "count", "fecha_publicacion", "rfcs", "situaciones", "version")
+
+	def __init__(
+		self,
+		rfcs: bytes,
+		situaciones: bytes,
+		fecha_publicacion: str,
+		version: str | None = None,
+		with_bloom: bool = True,
+	):
+		self.rfcs = rfcs
+		self.situaciones = situaciones
+		self.count = len(situaciones)
+		self.fecha_publicacion = fecha_publicacion
+		self.version = version
+		self.bloom = _build_bloom(rfcs, self.count) if with_bloom and self.count else None
+
+	def __len__(self) -> int:
+		return self.count
+
+	def _rfc_at(self, position: int) -> bytes:
+		start = position * RFC_WIDTH
+		return self.rfcs[start : start + RFC_WIDTH]
+
+	def position(self, rfc: str | None) -> int | None:
+		key = _encode_rfc(rfc)
+		if key is None or not self.count:
+			return None
+		if self.bloom is not None and not _bloom_contains(self.bloom, key):
+			return None
+		lo, hi = 0, self.count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self._rfc_at(mid) < key:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo if lo < self.count and self._rfc_at(lo) == key else None
+
+	def lookup(self, rfc: str | None) -> Lista69BEntry | None:
+		position = self.position(rfc)
+		if position is None:
+			return None
+		return Lista69BEntry(
+			self._rfc_at(position).decode("latin-1").rstrip(),
+			SITUACIONES[self.situaciones[position]],
+			self.fecha_publicacion,
+		)
+
+
+_indexes: dict[str | None, tuple[float, Lista69BIndex | None, str | None]] = {}
+_lock = threading.Lock()
+
+
+def normalize_rfc(rfc: str | None) -> str:
+	"""RFC en mayúsculas, sin espacios ni guiones."""
+	return re.sub(r"[\s\-]", "", str(rfc or "")).upper()
+
+
+def get_index() -> Lista69BIndex | None:
+	"""Índice cargado para el sitio actual, o None si nunca se ha ingerido el listado."""
+	site = getattr(frappe.local, "site", None)
+	now = time.monotonic()
+	cached = _indexes.get(site)
+	if cached and cached[0] > now:
+		return cached[1]
+
+	published = _published_version()
+	version = published["version"] if published else None
+	if cached and cached[2] == version:
+		_indexes[site] = (now + VERSION_CHECK_SECONDS, cached[1], version)
+		return cached[1]
+
+	with _lock:
+		cached = _indexes.get(site)
+		if cached and cached[2] == version and cached[0] > now:
+			return cached[1]
+		index = _load_index(published)
+		_indexes[site] = (now + VERSION_CHECK_SECONDS, index, version)
+		return index
+
+
+def is_available() -> bool:
+	return get_index() is not None
+
+
+def lookup(rfc: str | None) -> Lista69BEntry | None:
+	"""Situación del RFC en la Lista 69-B local (None si no aparece o no hay índice)."""
+	index = get_index()
+	return index.lookup(rfc) if index is not None else None
+
+
+def contains(rfc: str | None) -> bool:
+	"""True si el RFC aparece en la lista con situación bloqueante (Presunto/Definitivo)."""
+	entry = lookup(rfc)
+	return bool(entry and entry.in_lista_69b)
+
+
+def lookup_many(rfcs: Iterable[str | None]) -> dict[str, Lista69BEntry]:
+	"""Solo los RFCs que aparecen en la lista, indexados por RFC normalizado."""
+	index = get_index()
+	if index is None:
+		return {}
+	found = {}
+	for rfc in rfcs:
+		entry = index.lookup(rfc)
+		if entry:
+			found[entry.rfc] = entry
+	return found
+
+
+def to_validation_result(rfc: str, entry: Lista69BEntry | None, fecha_publicacion: str) -> dict:
+	"""Resultado con la forma de `validaciones.api.validate_lista_69b`."""
+	in_lista = bool(entry and entry.in_lista_69b)
+	if entry:
+		message = _("RFC en Lista 69B con situación {0} (publicación {1})").format(
+			entry.situacion, fecha_publicacion
+		)
+	else:
+		message = _("RFC no encontrado en Lista 69B (publicación {0})").format(fecha_publicacion)
+	return {
+		"success": True,
+		"in_lista_69b": in_lista,
+		"status": "En Lista" if in_lista else "No encontrado",
+		"situacion": entry.situacion if entry else None,
+		"message": message,
+		"fm_rfc": normalize_rfc(rfc),
+		"fecha_publicacion": fecha_publicacion,
+		"source": "indice_local",
+	}
+
+
+def stats() -> dict:
+	index = get_index()
+	if index is None:
+		return {"available": False}
+	por_situacion = dict.fromkeys(SITUACIONES, 0)
+	for code in index.situaciones:
+		por_situacion[SITUACIONES[code]] += 1
+	return {
+		"available": True,
+		"fecha_publicacion": index.fecha_publicacion,
+		"total": len(index),
+		"por_situacion": por_situacion,
+		"bloom_bytes": len(index.bloom) if index.bloom is not None else 0,
+		"index_bytes": len(index.rfcs) + len(index.situaciones),
+	}
+
+
+# ---------------------------------------------------------------------------
+# Ingesta
+# ---------------------------------------------------------------------------
+
+
+def ingest_file(path: str, fecha_publicacion=None, force: int = 0) -> dict:
+	"""
+	Construir el índice desde el CSV del SAT y publicarlo como versión vigente.
+
+	Args:
+		path: ruta del `Listado_Completo_69-B.csv` (UTF-8 o Latin-1)
+		fecha_publicacion: fecha de la publicación del SAT (por defecto hoy)
+		force: permitir reemplazar una publicación más reciente por una anterior
+	"""
+	fecha = str(getdate(fecha_publicacion or today()))
+	current = get_index()
+	if current is not None and fecha < current.fecha_publicacion and not cint(force):
+		frappe.throw(
+			_("La publicación {0} es anterior a la vigente ({1})").format(fecha, current.fecha_publicacion)
+		)
+
+	start = time.monotonic()
+	entries: dict[bytes, int] = {}
+	invalid = 0
+	for rfc, situacion in iter_records(path):
+		key = _encode_rfc(rfc)
+		if key is None or not _RFC_PATTERN.match(normalize_rfc(rfc)):
+			invalid += 1
+			continue
+		# Un RFC puede repetirse (p. ej. Presunto y después Definitivo); gana la última fila
+		entries[key] = situacion
+	if not entries:
+		frappe.throw(_("El archivo no contiene RFCs de la Lista 69-B"))
+
+	keys = sorted(entries)
+	rfcs = b"".join(keys)
+	situaciones = bytes(entries[k] for k in keys)
+	filename = _write_index(fecha, rfcs, situaciones)
+	version = hashlib.blake2b(fecha.encode() + rfcs + situaciones, digest_size=16).hexdigest()
+	frappe.cache().set_value(VERSION_KEY, {"file": filename, "version": version})
+	_indexes.pop(getattr(frappe.local, "site", None), None)
+
+	result = {
+		"fecha_publicacion": fecha,
+		"total": len(keys),
+		"invalidos": invalid,
+		"seconds": round(time.monotonic() - start, 2),
+	}
+	frappe.logger("facturacion_mexico").info(f"Lista 69-B ingerida: {result}")
+	return result
+
+
+@frappe.whitelist()
+def ingest_lista_69b(file_url: str, fecha_publicacion: str | None = None, force: int = 0) -> dict:
+	"""Encolar la ingesta del listado 69-B desde un archivo adjunto (File)."""
+	frappe.only_for(INGEST_ROLES)
+	path = frappe.get_doc("File", {"file_url": file_url}).get_full_path()
+	job = frappe.enqueue(
+		"facturacion_mexico.validaciones.lista_69b_index.ingest_file",
+		queue="long",
+		timeout=1800,
+		path=path,
+		fecha_publicacion=fecha_publicacion,
+		force=cint(force),
+	)
+	return {"job_id": getattr(job, "id", None)}
+
+
+@frappe.whitelist()
+def get_lista_69b_stats() -> dict:
+	frappe.only_for(INGEST_ROLES)
+	return stats()
+
+
+def iter_records(path: str) -> Iterator[tuple[str, int]]:
+	"""(RFC, código de situación) por fila del CSV; omite el título previo al encabezado."""
+	rfc_col = situacion_col = None
+	for scanned, row in enumerate(_iter_csv(path)):
+		if rfc_col is None:
+			headers = [_normalize_text(cell) for cell in row]
+			if "rfc" in headers:
+				rfc_col = headers.index("rfc")
+				situacion_col = next((i for i, h in enumerate(headers) if h.startswith("situacion")), None)
+			elif scanned >= HEADER_SCAN_ROWS:
+				frappe.throw(_("No se encontró el encabezado RFC en el archivo de la Lista 69-B"))
+			continue
+
+		if len(row) <= rfc_col or not row[rfc_col].strip():
+			continue
+		situacion = row[situacion_col] if situacion_col is not None and len(row) > situacion_col else ""
+		yield row[rfc_col], _situacion_code(situacion)
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _encode_rfc(rfc: str | None) -> bytes | None:
+	normalized = normalize_rfc(rfc)
+	if not 12 <= len(normalized) <= RFC_WIDTH:
+		return None
+	try:
+		return normalized.ljust(RFC_WIDTH).encode("latin-1")
+	except UnicodeEncodeError:
+		return None
+
+
+def _normalize_text(text) -> str:
+	text = unicodedata.normalize("NFKD", str(text or "").lower())
+	return re.sub(r"[^0-9a-z]", "", "".join(c for c in text if not unicodedata.combining(c)))
+
+
+def _situacion_code(text: str) -> int:
+	normalized = _normalize_text(text)
+	for code, situacion in enumerate(SITUACIONES):
+		if normalized.startswith(_normalize_text(situacion)[:6]):
+			return code
+	# Sin columna de situación reconocible: tratar como presunto (conservador)
+	return 0
+
+
+def _iter_csv(path: str) -> Iterator[list]:
+	with open(path, "rb") as f:
+		raw = f.read()
+	try:
+		text = raw.decode("utf-8-sig")
+	except UnicodeDecodeError:
+		# Las publicaciones del SAT suelen venir en Latin-1
+		text = raw.decode("latin-1")
+	yield from csv.reader(io.StringIO(text, newline=""))
+
+
+def _bloom_hashes(key: bytes, bits: int) -> Iterator[int]:
+	digest = hashlib.blake2b(key, digest_size=16).digest()
+	h1 = int.from_bytes(digest[:8], "little")
+	h2 = int.from_bytes(digest[8:], "little") | 1
+	for i in range(BLOOM_HASHES):
+		yield (h1 + i * h2) % bits
+
+
+def _build_bloom(rfcs: bytes, count: int) -> bytearray:
+	bits = max(count * BLOOM_BITS_PER_RFC, 64)
+	bloom = bytearray((bits + 7) // 8)
+	for position in range(count):
+		for bit in _bloom_hashes(rfcs[position * RFC_WIDTH : (position + 1) * RFC_WIDTH], bits):
+			bloom[bit >> 3] |= 1 << (bit & 7)
+	return bloom
+
+
+def _bloom_contains(bloom: bytearray, key: bytes) -> bool:
+	bits = len(bloom) * 8
+	return all(bloom[bit >> 3] & (1 << (bit & 7)) for bit in _bloom_hashes(key, bits))
+
+
+def _index_dir() -> str:
+	return frappe.get_site_path("private", "files", INDEX_DIR)
+
+
+def _write_index(fecha: str, rfcs: bytes, situaciones: bytes) -> str:
+	directory = _index_dir()
+	os.makedirs(directory, exist_ok=True)
+	filename = f"lista_69b_{fecha}.idx"
+	header = json.dumps(
+		{
+			"fecha_publicacion": fecha,
+			"count": len(situaciones),
+			"width": RFC_WIDTH,
+			"situaciones": SITUACIONES,
+		}
+	).encode()
+	tmp_path = os.path.join(directory, f".{filename}.tmp")
+	with open(tmp_path, "wb") as f:
+		f.write(INDEX_MAGIC + header + b"\n" + rfcs + situaciones)
+	os.replace(tmp_path, os.path.join(directory, filename))
+	return filename
+
+
+def _read_index(filename: str, version: str | None) -> Lista69BIndex | None:
+	path = os.path.join(_index_dir(), filename)
+	try:
+		with open(path, "rb") as f:
+			data = f.read()
+	except FileNotFoundError:
+		return None
+	if not data.startswith(INDEX_MAGIC):
+		frappe.log_error(f"Índice Lista 69-B inválido: {path}", "Lista 69B Index Error")
+		return None
+	body = data[len(INDEX_MAGIC) :]
+	header_line, _sep, payload = body.partition(b"\n")
+	header = json.loads(header_line)
+	count = header["count"]
+	rfcs = payload[: count * RFC_WIDTH]
+	situaciones = payload[count * RFC_WIDTH : count * RFC_WIDTH + count]
+	return Lista69BIndex(rfcs, situaciones, header["fecha_publicacion"], version)
+
+
+def _load_index(published: dict | None) -> Lista69BIndex | None:
+	version = published["version"] if published else None
+	if published:
+		index = _read_index(published["file"], version)
+		if index is not None:
+			return index
+	# Sin versión en Redis (reinicio/flush): usar la publicación más reciente en disco
+	try:
+		files = sorted(f for f in os.listdir(_index_dir()) if f.endswith(".idx"))
+	except FileNotFoundError:
+		return None
+	return _read_index(files[-1], version) if files else None
+
+
+def _published_version() -> dict | None:
+	"""{"file", "version"} publicado por la última ingesta, o None."""
+	try:
+		published = frappe.cache().get_value(VERSION_KEY)
+	except Exception:
+		return None
+	if isinstance(published, str):
+		# Formato anterior: solo el nombre del archivo
+		return {"file": published, "version": published}
+	return published or None
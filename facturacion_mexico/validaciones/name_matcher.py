@@ -0,0 +1,254 @@
+"""
+Comparación de nombres / razones sociales contra el SAT por lotes.
+
+Cada nombre se normaliza una sola vez (tablas `str.translate` precompiladas + regex de régimen
+societario) y su perfil canónico queda en caché de proceso; comparar N pares cuesta N búsquedas en
+caché más operaciones de conjuntos en C, en lugar de reprocesar carácter por carácter cada par.
+
+Formas de un nombre:
+
+	- `exact_key`: NFC + mayúsculas + espacios colapsados. Preserva Ñ, acentos y comillas; es la
+	  comparación que aplica el SAT al timbrar (CFDI 4.0).
+	- `canonical`: sin acentos ni puntuación y sin régimen societario (S.A. DE C.V., S. DE R.L., ...).
+	- perfil: tokens + trigramas de la forma canónica para `similarity` (0..1).
+
+Uso:
+
+	from facturacion_mexico.validaciones import name_matcher
+
+	name_matcher.match_pairs([("Comercializadora Ñandú, S.A. de C.V.", "COMERCIALIZADORA ÑANDU")])
+"""
+
+import re
+import string
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+
+import frappe
+from frappe import _
+
+CACHE_SIZE = 262_144
+DEFAULT_THRESHOLD = 0.8
+
+STATUS_EXACTO = "Exacto"
+STATUS_EQUIVALENTE = "Equivalente"
+STATUS_SIMILAR = "Similar"
+STATUS_DISTINTO = "Distinto"
+
+_ACCENTED = "ÁÀÂÄÃÉÈÊËÍÌÎÏÓÒÔÖÕÚÙÛÜÑÇáàâäãéèêëíìîïóòôöõúùûüñç"
+_PLAIN = "AAAAAEEEEIIIIOOOOOUUUUNCaaaaaeeeeiiiiooooouuuunc"
+# Acentos → letra base (FacturAPI)
+_ACCENT_TABLE = str.maketrans(_ACCENTED, _PLAIN)
+# Forma canónica sobre ASCII (acentos ya separados por NFD): minúsculas → mayúsculas y
+# puntuación / espacios → " "
+_CANONICAL_TABLE = bytes.maketrans(
+	string.ascii_lowercase.encode() + (string.punctuation + "\t\n\r\v\f").encode(),
+	string.ascii_uppercase.encode() + b" " * (len(string.punctuation) + 5),
+)
+
+# Régimen societario al final, ya sin puntuación: "S A DE C V", "SA DE CV", "S DE R L DE C V", ...
+_REGIMEN_CANONICAL = re.compile(
+	rb"(?: (?:S ?A ?P ?I|S ?A ?B|S ?A ?S|S ?A|S ?C ?P|S ?C ?L|S ?C|A ?C|I ?A ?P|A ?B ?P"
+	rb"|S ?DE ?R ?L|S ?EN ?N ?C|S ?EN ?C)(?: DE (?:C ?V|R ?L|I ?P|R ?L ?DE ?C ?V))?)+(?=\x00|$)"
+)
+# Mismo catálogo con puntuación, para el nombre que se envía a FacturAPI
+_REGIMEN_FACTURAPI = re.compile(
+	r",?\s+(?:S\.?\s?A\.?\s?B\.?\s+DE\s+C\.?\s?V\.?|S\.?\s?A\.?\s+DE\s+C\.?\s?V\.?"
+	r"|S\.?\s+DE\s+R\.?\s?L\.?\s+DE\s+C\.?\s?V\.?|S\.?\s?C\.?|A\.?\s?C\.?)$"
+)
+_SPACES = re.compile(r"\s+")
+_BLANKS = re.compile(rb" {2,}")
+_SEPARATOR = "\x00"
+
+_canonical_cache: dict[str, str] = {}
+
+
+@dataclass(frozen=True)
+class NameProfile:
+	canonical: str
+	tokens: frozenset
+	trigrams: frozenset
+
+
+@dataclass(frozen=True)
+class MatchResult:
+	left: str
+	right: str
+	score: float
+	status: str
+
+	@property
+	def matches(self) -> bool:
+		return self.status != STATUS_DISTINTO
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def exact_key(name: str | None) -> str:
+	"""NFC, mayúsculas y espacios colapsados; preserva Ñ y comillas."""
+	if not name:
+		return ""
+	return _SPACES.sub(" ", unicodedata.normalize("NFC", name).strip()).upper()
+
+
+def canonical(name: str | None) -> str:
+	"""Sin acentos, puntuación ni régimen societario, en mayúsculas."""
+	if not name:
+		return ""
+	try:
+		return _canonical_cache[name]
+	except KeyError:
+		return canonical_many([name])[0]
+
+
+def canonical_many(names) -> list[str]:
+	"""
+	Forma canónica de muchos nombres. Los que no están en caché se normalizan juntos: una sola
+	pasada de NFD / translate / regex sobre el texto unido en lugar de una por nombre.
+	"""
+	names = ["" if name is None else str(name) for name in names]
+	missing = [name for name in dict.fromkeys(names) if name and name not in _canonical_cache]
+	if missing:
+		if len(_canonical_cache) + len(missing) > CACHE_SIZE:
+			_canonical_cache.clear()
+		blob = _SEPARATOR.join(missing)
+		if blob.count(_SEPARATOR) != len(missing) - 1:
+			# Nombre con el separador dentro: normalizar uno por uno
+			_canonical_cache.update(
+				(name, _canonicalize_blob(name.replace(_SEPARATOR, " "))[0]) for name in missing
+			)
+		else:
+			_canonical_cache.update(zip(missing, _canonicalize_blob(blob), strict=True))
+	return [_canonical_cache[name] if name else "" for name in names]
+
+
+def _canonicalize_blob(blob: str) -> list[str]:
+	# NFD + ASCII descarta las marcas diacríticas (Ñ → N, É → E); el resto son operaciones de bytes
+	text = unicodedata.normalize("NFD", blob).encode("ascii", "ignore").translate(_CANONICAL_TABLE)
+	text = _BLANKS.sub(b" ", text).replace(b" \x00", b"\x00").replace(b"\x00 ", b"\x00").strip(b" ")
+	stripped = _REGIMEN_CANONICAL.sub(b"", text).decode("ascii").split(_SEPARATOR)
+	# Un nombre que solo era el régimen se conserva tal cual
+	return [s or t for s, t in zip(stripped, text.decode("ascii").split(_SEPARATOR), strict=True)]
+
+
+def profile(name: str | None) -> NameProfile:
+	"""Tokens y trigramas de la forma canónica; variantes del mismo nombre comparten perfil."""
+	return _profile(canonical(name))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _profile(text: str) -> NameProfile:
+	tokens = text.split()
+	return NameProfile(text, frozenset(tokens), frozenset().union(*map(_token_trigrams, tokens)))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _token_trigrams(token: str) -> frozenset:
+	"""Trigramas por palabra con relleno (como pg_trgm); el vocabulario se repite mucho entre nombres."""
+	padded = f"  {token} "
+	return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def facturapi_name(name: str | None) -> str:
+	"""Nombre para FacturAPI (CFDI 4.0): mayúsculas, sin acentos y sin régimen societario."""
+	if not name:
+		return ""
+	text = name.upper().translate(_ACCENT_TABLE)
+	text = _REGIMEN_FACTURAPI.sub("", text, count=1)
+	return " ".join(text.split())
+
+
+def clear_cache() -> None:
+	_canonical_cache.clear()
+	for fn in (exact_key, _profile, _token_trigrams, facturapi_name):
+		fn.cache_clear()
+
+
+def similarity(left: str | None, right: str | None) -> float:
+	"""Similitud 0..1: máximo entre Dice de trigramas y proporción de palabras en común."""
+	return _score(canonical(left), canonical(right))
+
+
+def score_pairs(pairs) -> list[float]:
+	"""Similitud de muchos pares; cada nombre distinto se normaliza una sola vez."""
+	keys = canonical_many([name for pair in pairs for name in pair])
+	return [_score(a, b) for a, b in zip(keys[0::2], keys[1::2], strict=True)]
+
+
+def _score(a: str, b: str) -> float:
+	if not a or not b:
+		return 0.0
+	if a == b:
+		return 1.0
+	a, b = _profile(a), _profile(b)
+	dice = 2 * len(a.trigrams & b.trigrams) / (len(a.trigrams) + len(b.trigrams))
+	words = len(a.tokens & b.tokens) / max(len(a.tokens), len(b.tokens))
+	return max(dice, words)
+
+
+def match(left: str | None, right: str | None, threshold: float = DEFAULT_THRESHOLD) -> MatchResult:
+	if left and exact_key(left) == exact_key(right):
+		return MatchResult(left, right, 1.0, STATUS_EXACTO)
+	score = similarity(left, right)
+	if score == 1.0:
+		status = STATUS_EQUIVALENTE
+	elif score >= threshold:
+		status = STATUS_SIMILAR
+	else:
+		status = STATUS_DISTINTO
+	return MatchResult(left, right, round(score, 4), status)
+
+
+def match_pairs(pairs, threshold: float = DEFAULT_THRESHOLD) -> list[MatchResult]:
+	pairs = list(pairs)
+	canonical_many([name for pair in pairs for name in pair])
+	return [match(left, right, threshold) for left, right in pairs]
+
+
+@frappe.whitelist()
+def reconcile_customers(sat_names: str | dict, threshold: float = DEFAULT_THRESHOLD) -> list[dict]:
+	"""
+	Comparar el maestro de Customers contra nombres del SAT.
+
+	Args:
+		sat_names: {RFC: nombre o razón social según SAT} (JSON o dict)
+		threshold: similitud mínima para considerar "Similar"
+
+	Returns:
+		list: Customers cuyo nombre no coincide exactamente, del menos al más parecido
+	"""
+	if not frappe.has_permission("Customer", "read"):
+		frappe.throw(_("Sin permisos para leer Customer"), frappe.PermissionError)
+	if isinstance(sat_names, str):
+		sat_names = frappe.parse_json(sat_names)
+	sat_names = {str(rfc).strip().upper(): name for rfc, name in (sat_names or {}).items()}
+	if not sat_names:
+		return []
+
+	customers = frappe.get_all(
+		"Customer",
+		filters={"tax_id": ["in", list(sat_names)], "disabled": 0},
+		fields=["name", "customer_name", "tax_id"],
+		limit_page_length=0,
+	)
+	rows = []
+	for customer, result in zip(
+		customers,
+		match_pairs(
+			((c.customer_name, sat_names[c.tax_id.strip().upper()]) for c in customers), float(threshold)
+		),
+		strict=True,
+	):
+		if result.status != STATUS_EXACTO:
+			rows.append(
+				{
+					"customer": customer.name,
+					"rfc": customer.tax_id,
+					"customer_name": customer.customer_name,
+					"sat_name": result.right,
+					"score": result.score,
+					"status": result.status,
+				}
+			)
+	return sorted(rows, key=lambda r: r["score"])
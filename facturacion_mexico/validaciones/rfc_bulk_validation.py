@@ -0,0 +1,321 @@
+"""
+Validación masiva de RFC de Customers contra FacturAPI.
+
+	- Concurrencia configurable (`fm_rfc_validation_concurrency` en site_config): cada hilo tiene su
+	  propio contexto Frappe (conexión a BD) y su propio cliente FacturAPI.
+	- Limitador token bucket compartido (`fm_facturapi_requests_per_second`) aplicado a cada petición
+	  HTTP a FacturAPI, en lugar de pausas fijas entre clientes.
+	- Customers y direcciones se cargan en dos consultas para todo el lote; los cambios
+	  `fm_rfc_validated` / `fm_rfc_validation_date` se escriben por lotes desde el hilo principal.
+	- Checkpoints en Redis por `run_id`: si el job se interrumpe o agota su ventana, la siguiente
+	  ejecución con el mismo `run_id` continúa con los pendientes.
+"""
+
+import queue
+import threading
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+CHECKPOINT_KEY_PREFIX = "fm_rfc_bulk_validation"
+CHECKPOINT_EVERY = 50
+CHECKPOINT_TTL_SECONDS = 3 * 86400
+
+_CUSTOMER_FIELDS = ["name", "customer_name", "tax_id", "fm_tax_regime", "email_id"]
+
+
+class TokenBucket:
+	"""Limitador de tasa compartido entre hilos: `rate` tokens/s con ráfagas de hasta `capacity`."""
+
+	def __init__(self, rate: float, capacity: float | None = None):
+		self.rate = float(rate)
+		self.capacity = float(capacity or max(rate, 1))
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self, tokens: float = 1) -> float:
+		"""Bloquear hasta disponer de `tokens`. Devuelve los segundos esperados."""
+		waited = 0.0
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= tokens:
+					self.tokens -= tokens
+					return waited
+				wait = (tokens - self.tokens) / self.rate
+			time.sleep(wait)
+			waited += wait
+
+
+def get_settings() -> tuple[int, float]:
+	"""(concurrencia, peticiones/segundo a FacturAPI) desde site_config."""
+	concurrency = cint(frappe.conf.get("fm_rfc_validation_concurrency")) or DEFAULT_CONCURRENCY
+	rate = flt(frappe.conf.get("fm_facturapi_requests_per_second")) or DEFAULT_REQUESTS_PER_SECOND
+	return max(concurrency, 1), rate
+
+
+def rate_limited_client(bucket: TokenBucket, client=None):
+	"""Cliente FacturAPI cuyas peticiones HTTP pasan por `bucket`."""
+	if client is None:
+		from facturacion_mexico.facturacion_fiscal.api_client import get_facturapi_client
+
+		client = get_facturapi_client()
+	for method_name in ("_make_request", "_make_request_silent"):
+		method = getattr(client, method_name)
+
+		def limited(*args, _method=method, **kwargs):
+			bucket.acquire()
+			return _method(*args, **kwargs)
+
+		# Atributo de instancia: también lo usan delete_customer / validate_customer_tax_info
+		setattr(client, method_name, limited)
+	return client
+
+
+def prefetch_customers(customer_names: list[str]) -> dict[str, frappe._dict]:
+	rows = frappe.get_all(
+		"Customer", filters={"name": ["in", customer_names]}, fields=_CUSTOMER_FIELDS, limit_page_length=0
+	)
+	return {row.name: row for row in rows}
+
+
+def prefetch_primary_addresses(customer_names: list[str]) -> dict[str, frappe._dict]:
+	"""Dirección primaria activa por Customer (o la primera activa si no hay primaria), en una consulta."""
+	if not customer_names:
+		return {}
+	rows = frappe.db.sql(
+		"""
+		SELECT dl.link_name AS customer, addr.name, addr.address_line1, addr.address_line2, addr.city,
+		       addr.state, addr.country, addr.pincode, addr.email_id, addr.is_primary_address
+		FROM `tabAddress` addr
+		INNER JOIN `tabDynamic Link` dl ON dl.parent = addr.name AND dl.parenttype = 'Address'
+		WHERE dl.link_doctype = 'Customer'
+		AND dl.link_name IN %(customers)s
+		AND addr.disabled = 0
+		ORDER BY dl.link_name, addr.creation
+		""",
+		{"customers": tuple(customer_names)},
+		as_dict=True,
+	)
+	addresses = {}
+	for row in rows:
+		customer = row.pop("customer")
+		current = addresses.get(customer)
+		# La primaria gana sobre cualquier otra; sin primaria, la más antigua
+		if current is None or (row.is_primary_address and not current.is_primary_address):
+			addresses[customer] = row
+	return addresses
+
+
+def run(
+	customer_names: list[str],
+	run_id: str | None = None,
+	concurrency: int | None = None,
+	requests_per_second: float | None = None,
+	max_seconds: float | None = None,
+) -> dict:
+	"""
+	Validar `customer_names` con concurrencia acotada y límite de tasa.
+
+	Args:
+		customer_names: Customers a validar (se agregan los pendientes del checkpoint de `run_id`)
+		run_id: identificador del checkpoint; None = sin checkpoint
+		concurrency / requests_per_second: por defecto `get_settings()`
+		max_seconds: ventana máxima; al agotarse se deja de despachar y el resto queda en el checkpoint
+
+	Returns:
+		dict con `results` por Customer y `summary` (mismo formato que `validate_customers_bulk`)
+	"""
+	default_concurrency, default_rate = get_settings()
+	concurrency = max(cint(concurrency) or default_concurrency, 1)
+	bucket = TokenBucket(flt(requests_per_second) or default_rate)
+
+	pending = list(dict.fromkeys([*load_checkpoint(run_id), *customer_names]))
+	customers = prefetch_customers(pending)
+	addresses = prefetch_primary_addresses(list(customers))
+	deadline = time.monotonic() + max_seconds if max_seconds else None
+
+	results = _new_results(len(pending))
+	remaining = set(pending)
+	updates: dict[str, dict] = {}
+
+	def collect(customer_name, validation_result):
+		_add_result(results, customer_name, validation_result)
+		customer_updates = (validation_result.get("data") or {}).pop("customer_updates", None)
+		if customer_updates is not None:
+			updates[customer_name] = customer_updates
+		remaining.discard(customer_name)
+		if len(updates) >= CHECKPOINT_EVERY:
+			_apply_updates(updates)
+			save_checkpoint(run_id, [n for n in pending if n in remaining])
+
+	tasks = []
+	for customer_name in pending:
+		customer = customers.get(customer_name)
+		if not customer:
+			collect(customer_name, {"success": False, "error": f"Customer '{customer_name}' not found"})
+		elif not customer.tax_id:
+			collect(customer_name, {"success": False, "error": "Customer no tiene RFC configurado en Tax ID"})
+		else:
+			tasks.append((customer, addresses.get(customer_name)))
+
+	if concurrency == 1 or len(tasks) <= 1:
+		client = rate_limited_client(bucket) if tasks else None
+		for customer, address in tasks:
+			if deadline and time.monotonic() > deadline:
+				break
+			collect(customer.name, _validate_one(customer, address, client))
+	else:
+		_run_threads(tasks, concurrency, bucket, deadline, collect)
+
+	_apply_updates(updates)
+	save_checkpoint(run_id, [n for n in pending if n in remaining])
+	results["pending"] = len(remaining)
+	frappe.logger().info(
+		f"Bulk RFC Validation completed: {results['summary']['successful_validations']} successful, "
+		f"{results['summary']['failed_validations']} failed, "
+		f"{results['summary']['customers_now_validated']} now validated, {len(remaining)} pending"
+	)
+	return results
+
+
+def load_checkpoint(run_id: str | None) -> list[str]:
+	if not run_id:
+		return []
+	try:
+		return frappe.cache().get_value(f"{CHECKPOINT_KEY_PREFIX}:{run_id}") or []
+	except Exception:
+		return []
+
+
+def save_checkpoint(run_id: str | None, pending: list[str]) -> None:
+	if not run_id:
+		return
+	key = f"{CHECKPOINT_KEY_PREFIX}:{run_id}"
+	try:
+		if pending:
+			frappe.cache().set_value(key, pending, expires_in_sec=CHECKPOINT_TTL_SECONDS)
+		else:
+			frappe.cache().delete_value(key)
+	except Exception:
+		frappe.logger().warning(f"No se pudo guardar el checkpoint de validación RFC {run_id}", exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _validate_one(customer, address, client) -> dict:
+	from facturacion_mexico.validaciones.api import _validate_customer_rfc
+
+	try:
+		return _validate_customer_rfc(customer, address, client=client, persist=False)
+	except Exception as e:
+		frappe.log_error(f"Error validating {customer.name}: {e!s}", "Bulk RFC Validation Error")
+		return {"success": False, "error": str(e)}
+
+
+def _run_threads(tasks, concurrency, bucket, deadline, collect) -> None:
+	"""Hilos con contexto Frappe propio; el hilo principal consume resultados y escribe."""
+	site, sites_path, user = frappe.local.site, frappe.local.sites_path, frappe.session.user
+	task_queue: queue.Queue = queue.Queue()
+	result_queue: queue.Queue = queue.Queue()
+	for task in tasks:
+		task_queue.put(task)
+
+	def worker():
+		client = init_error = None
+		try:
+			frappe.init(site=site, sites_path=sites_path)
+			frappe.connect()
+			frappe.set_user(user)
+			client = rate_limited_client(bucket)
+		except Exception as e:
+			init_error = str(e)
+		try:
+			while not (deadline and time.monotonic() > deadline):
+				try:
+					customer, address = task_queue.get_nowait()
+				except queue.Empty:
+					break
+				if client is None:
+					result_queue.put((customer.name, {"success": False, "error": init_error}))
+				else:
+					result_queue.put((customer.name, _validate_one(customer, address, client)))
+		finally:
+			result_queue.put(None)
+			if getattr(frappe.local, "db", None):
+				frappe.db.commit()  # nosemgrep: frappe-manual-commit - Error Logs del hilo
+			frappe.destroy()
+
+	threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(concurrency, len(tasks)))]
+	for thread in threads:
+		thread.start()
+	finished = 0
+	while finished < len(threads):
+		item = result_queue.get()
+		if item is None:
+			finished += 1
+		else:
+			collect(*item)
+	for thread in threads:
+		thread.join()
+
+
+def _apply_updates(updates: dict[str, dict]) -> None:
+	if not updates:
+		return
+	frappe.db.bulk_update("Customer", dict(updates))
+	frappe.db.commit()  # nosemgrep: frappe-manual-commit - Checkpoint de validación masiva
+	updates.clear()
+
+
+def _new_results(total: int) -> dict:
+	return {
+		"success": True,
+		"total_requested": total,
+		"results": [],
+		"summary": {
+			"successful_validations": 0,
+			"failed_validations": 0,
+			"skipped_validations": 0,
+			"customers_now_validated": 0,
+			"errors": [],
+		},
+	}
+
+
+def _add_result(results: dict, customer_name: str, validation_result: dict) -> None:
+	summary = results["summary"]
+	customer_result = {
+		"customer": customer_name,
+		"success": validation_result.get("success", False),
+		"validation_successful": False,
+		"error": None,
+	}
+	data = validation_result.get("data")
+	if validation_result.get("success") and data:
+		customer_result.update(
+			{
+				"validation_successful": data.get("validation_successful", False),
+				"rfc": data.get("rfc"),
+				"sat_name": data.get("sat_name"),
+				"warnings": data.get("warnings", []),
+				"recommendations": data.get("recommendations", []),
+			}
+		)
+		if data.get("validation_successful"):
+			summary["customers_now_validated"] += 1
+		summary["successful_validations"] += 1
+	else:
+		customer_result["error"] = validation_result.get("error", "Error desconocido")
+		summary["failed_validations"] += 1
+		summary["errors"].append(f"{customer_name}: {customer_result['error']}")
+	results["results"].append(customer_result)
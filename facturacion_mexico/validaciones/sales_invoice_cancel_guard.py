@@ -12,27 +12,40 @@ FFM_STATUS_FIELD = "status"
 ALLOWED_FFM_CANCELLED_STATES = {"CANCELADO", "CANCELADA", "CANCELLED", "CANCELLED_OK", "CANCELED"}
 
 
-def _get_linked_ffm(si_name: str):
-	"""Devuelve (name, status) de la FFM vinculada a la SI."""
+def _get_linked_ffm(si_name: str, si=None, si_ffm=None):
+	"""Devuelve (name, status, docstatus) de la FFM vinculada a la SI.
+
+	`si` y `si_ffm` (la SI y la FFM de su campo link) se usan si el llamador ya los cargó.
+	"""
+	fields = ["name", FFM_STATUS_FIELD, "docstatus"]
 	# 1) por campo link directo
 	ffm = frappe.db.get_value(
 		FFM_DOCTYPE,
 		{"sales_invoice": si_name, "docstatus": 1},  # ← SOLO SUBMITTED
-		["name", FFM_STATUS_FIELD],
+		fields,
 		as_dict=True,
 	)
 	if ffm:
 		return ffm
 
 	# 2) por campo link en la propia SI (más común)
-	ffm_name = frappe.db.get_value("Sales Invoice", si_name, FFM_LINK_FIELD)
+	if si_ffm is not None:
+		if si_ffm.docstatus != 1:  # ← SOLO SUBMITTED
+			return None
+		return frappe._dict({field: si_ffm.get(field) for field in fields})
+
+	ffm_name = (
+		si.get(FFM_LINK_FIELD)
+		if si is not None
+		else frappe.db.get_value("Sales Invoice", si_name, FFM_LINK_FIELD)
+	)
 	if not ffm_name:
 		return None
 
 	return frappe.db.get_value(
 		FFM_DOCTYPE,
 		{"name": ffm_name, "docstatus": 1},  # ← SOLO SUBMITTED
-		["name", FFM_STATUS_FIELD],
+		fields,
 		as_dict=True,
 	)
 
@@ -42,7 +55,9 @@ def _ffm_allows_cancellation(ffm: dict) -> (bool, str):
 	if not ffm:
 		return True, ""
 
-	docstatus = frappe.db.get_value("Factura Fiscal Mexico", ffm["name"], "docstatus")
+	docstatus = ffm.get("docstatus")
+	if docstatus is None:
+		docstatus = frappe.db.get_value("Factura Fiscal Mexico", ffm["name"], "docstatus")
 	if docstatus == 2:
 		return True, ""
 	if docstatus != 1:  # draft (0) u otros → no bloquean
@@ -57,9 +72,16 @@ def _ffm_allows_cancellation(ffm: dict) -> (bool, str):
 	return False, _("Existe una Factura Fiscal vinculada y no está cancelada.")
 
 
+def get_cancel_status(si_name: str, si=None, si_ffm=None) -> dict:
+	"""Si se puede cancelar la SI y por qué (ver `_get_linked_ffm` para `si`/`si_ffm`)."""
+	ffm = _get_linked_ffm(si_name, si=si, si_ffm=si_ffm)
+	allowed, reason = _ffm_allows_cancellation(ffm)
+	return {"allowed": bool(allowed), "reason": reason, "ffm": (ffm or {}).get("name")}
+
+
 def before_cancel(doc, method=None):
 	"""Hook de Sales Invoice: bloquear cancelación si la FFM no está 100% cancelada."""
-	ffm = _get_linked_ffm(doc.name)
+	ffm = _get_linked_ffm(doc.name, si=doc)
 	allowed, reason = _ffm_allows_cancellation(ffm)
 	if not allowed:
 		raise frappe.ValidationError(_("No se puede cancelar esta Sales Invoice: {0}").format(reason))
@@ -68,6 +90,4 @@ def before_cancel(doc, method=None):
 @frappe.whitelist()
 def can_cancel_sales_invoice(si_name: str) -> dict:
 	"""Para el cliente: responde si se puede cancelar y por qué."""
-	ffm = _get_linked_ffm(si_name)
-	allowed, reason = _ffm_allows_cancellation(ffm)
-	return {"allowed": bool(allowed), "reason": reason, "ffm": (ffm or {}).get("name")}
+	return get_cancel_status(si_name)
@@ -0,0 +1,266 @@
+"""
+Cache de validaciones SAT en dos niveles delante de `SAT Validation Cache`.
+
+	- Redis (`fm_sat_validation:<tipo>:<valor>`): lectura sub-milisegundo. El TTL es el tiempo que le
+	  queda a la validación según las reglas de vigencia del DocType (`get_cache_days`). Las ausencias
+	  también se cachean (`NEGATIVE_TTL_SECONDS`) para que un RFC sin validar no consulte la BD en cada
+	  factura.
+	- BD (`SAT Validation Cache`): persistencia. Las escrituras no pasan por `insert()`/`before_save`;
+	  se encolan en un hash de Redis y `flush_pending` (scheduler, cada minuto) las guarda por lotes
+	  con `bulk_insert` / `bulk_update`.
+
+Uso:
+
+	from facturacion_mexico.validaciones import validation_cache
+
+	entry = validation_cache.get("RFC", "AAA010101AAA")
+	if entry is None:
+		result = consultar_sat(...)
+		validation_cache.put("RFC", "AAA010101AAA", result["valid"], result)
+"""
+
+import json
+
+import frappe
+from frappe.utils import add_days, cint, getdate, now, now_datetime, today
+
+from facturacion_mexico.validaciones.doctype.sat_validation_cache.sat_validation_cache import get_cache_days
+
+DOCTYPE = "SAT Validation Cache"
+KEY_PREFIX = "fm_sat_validation"
+PENDING_KEY = "fm_sat_validation_pending"
+NEGATIVE_TTL_SECONDS = 10 * 60
+FLUSH_BATCH_SIZE = 500
+
+# HDEL de cada campo solo si conserva el valor leído: un `put` posterior del mismo RFC sigue encolado
+_DELETE_IF_UNCHANGED = """
+local removed = 0
+for i = 1, #ARGV, 2 do
+	if redis.call("HGET", KEYS[1], ARGV[i]) == ARGV[i + 1] then
+		removed = removed + redis.call("HDEL", KEYS[1], ARGV[i])
+	end
+end
+return removed
+"""
+
+# Tipos históricos usados por api/hooks → opción del Select del DocType
+_TYPE_ALIASES = {
+	"rfc_validation": "RFC",
+	"fm_rfc": "RFC",
+	"lista_69b": "Lista69B",
+	"fm_regimen_fiscal": "Regimen_Fiscal",
+}
+# Prefijos históricos de la clave de cache (`RFC_<rfc>`, `L69B_<rfc>`)
+_KEY_PREFIXES = ("RFC_", "L69B_")
+_MISS = {"miss": 1}
+
+
+def normalize(validation_type: str, lookup_value: str) -> tuple[str, str]:
+	"""Tipo del Select y valor sin prefijos históricos, en mayúsculas."""
+	value = str(lookup_value or "").upper().strip()
+	for prefix in _KEY_PREFIXES:
+		if value.startswith(prefix):
+			value = value[len(prefix) :]
+			break
+	return _TYPE_ALIASES.get(validation_type, validation_type), value
+
+
+def get(validation_type: str, lookup_value: str) -> frappe._dict | None:
+	"""Validación vigente (`is_valid`, `data`, `validation_date`, `expiry_date`) o None."""
+	validation_type, value = normalize(validation_type, lookup_value)
+	if not value:
+		return None
+	key = _key(validation_type, value)
+
+	cached = _cache_get(key)
+	if cached == _MISS:
+		return None
+	if cached and str(cached["expiry_date"]) > today():
+		return frappe._dict(cached)
+
+	row = frappe.db.get_value(
+		DOCTYPE,
+		{"validation_type": validation_type, "lookup_value": value, "expiry_date": [">", today()]},
+		["is_valid", "validation_data", "validation_date", "expiry_date"],
+		as_dict=True,
+		order_by="validation_date desc",
+	)
+	if not row:
+		_cache_set(key, _MISS, NEGATIVE_TTL_SECONDS)
+		return None
+
+	entry = {
+		"is_valid": cint(row.is_valid),
+		"data": _parse(row.validation_data),
+		"validation_date": str(row.validation_date),
+		"expiry_date": str(row.expiry_date),
+	}
+	_cache_set(key, entry, _ttl(entry["expiry_date"]))
+	return frappe._dict(entry)
+
+
+def put(validation_type: str, lookup_value: str, is_valid: bool, data: dict | None = None) -> frappe._dict:
+	"""Guardar en Redis de inmediato y encolar la persistencia en BD (write-behind)."""
+	validation_type, value = normalize(validation_type, lookup_value)
+	validation_date = now()
+	entry = {
+		"is_valid": cint(is_valid),
+		"data": data or {},
+		"validation_date": validation_date,
+		"expiry_date": str(add_days(getdate(validation_date), get_cache_days(validation_type))),
+	}
+	_cache_set(_key(validation_type, value), entry, _ttl(entry["expiry_date"]))
+	try:
+		cache = frappe.cache()
+		pipe = cache.pipeline()
+		pipe.hset(
+			cache.make_key(PENDING_KEY), f"{validation_type}\x1f{value}", json.dumps(entry, default=str)
+		)
+		pipe.execute()
+	except Exception:
+		# Sin Redis no hay write-behind: persistir en línea para no perder la validación
+		_persist({(validation_type, value): entry})
+	return frappe._dict(entry)
+
+
+def invalidate(validation_type: str, lookup_value: str) -> None:
+	validation_type, value = normalize(validation_type, lookup_value)
+	try:
+		frappe.cache().delete_value(_key(validation_type, value))
+	except Exception:
+		pass
+
+
+def flush_pending() -> int:
+	"""Persistir por lotes las validaciones encoladas por `put` (scheduler). Devuelve filas escritas.
+
+	Cada lote se retira del hash pendiente solo después de su commit; si un lote falla, él y los
+	siguientes siguen encolados para la próxima ejecución.
+	"""
+	cache = frappe.cache()
+	redis_key = cache.make_key(PENDING_KEY)
+	pipe = cache.pipeline()
+	pipe.hgetall(redis_key)
+	(raw,) = pipe.execute()
+	if not raw:
+		return 0
+
+	items = []
+	for raw_field, raw_value in raw.items():
+		field = raw_field.decode() if isinstance(raw_field, bytes) else raw_field
+		validation_type, _sep, lookup_value = field.partition("\x1f")
+		items.append(((validation_type, lookup_value), _parse(raw_value), (raw_field, raw_value)))
+
+	written = 0
+	for start in range(0, len(items), FLUSH_BATCH_SIZE):
+		batch = items[start : start + FLUSH_BATCH_SIZE]
+		_persist({key: entry for key, entry, _raw in batch})
+		frappe.db.commit()  # nosemgrep: frappe-manual-commit - write-behind por lotes desde el scheduler
+		cache.eval(
+			_DELETE_IF_UNCHANGED,
+			1,
+			redis_key,
+			*(part for _key, _entry, raw_pair in batch for part in raw_pair),
+		)
+		written += len(batch)
+	return written
+
+
+# ---------------------------------------------------------------------------
+# Internos
+# ---------------------------------------------------------------------------
+
+
+def _persist(entries: dict[tuple[str, str], dict]) -> None:
+	existing = {
+		(r.validation_type, r.lookup_value): r
+		for r in frappe.get_all(
+			DOCTYPE,
+			filters={"lookup_value": ["in", list({value for _t, value in entries})]},
+			fields=["name", "validation_type", "lookup_value", "validation_count"],
+		)
+	}
+	user = frappe.session.user
+	timestamp = now_datetime()
+	updates, inserts = {}, []
+	for (validation_type, value), entry in entries.items():
+		values = {
+			"is_valid": entry["is_valid"],
+			"validation_data": json.dumps(entry["data"], default=str),
+			"validation_date": entry["validation_date"],
+			"expiry_date": entry["expiry_date"],
+			"last_updated_by": user,
+		}
+		row = existing.get((validation_type, value))
+		if row:
+			values["validation_count"] = cint(row.validation_count) + 1
+			updates[row.name] = values
+		else:
+			inserts.append(
+				(
+					frappe.generate_hash(length=10),
+					timestamp,
+					timestamp,
+					user,
+					user,
+					validation_type,
+					value,
+					*values.values(),
+					1,
+				)
+			)
+
+	if inserts:
+		frappe.db.bulk_insert(
+			DOCTYPE,
+			[
+				"name",
+				"creation",
+				"modified",
+				"owner",
+				"modified_by",
+				"validation_type",
+				"lookup_value",
+				"is_valid",
+				"validation_data",
+				"validation_date",
+				"expiry_date",
+				"last_updated_by",
+				"validation_count",
+			],
+			inserts,
+		)
+	if updates:
+		frappe.db.bulk_update(DOCTYPE, updates)
+
+
+def _key(validation_type: str, value: str) -> str:
+	return f"{KEY_PREFIX}:{validation_type}:{value}"
+
+
+def _ttl(expiry_date: str) -> int:
+	seconds = (getdate(expiry_date) - getdate(today())).days * 86400
+	return max(seconds, 60)
+
+
+def _parse(value) -> dict:
+	if isinstance(value, dict):
+		return value
+	try:
+		return json.loads(value or "{}")
+	except (TypeError, ValueError):
+		return {}
+
+
+def _cache_get(key: str):
+	try:
+		return frappe.cache().get_value(key)
+	except Exception:
+		return None
+
+
+def _cache_set(key: str, value: dict, ttl: int) -> None:
+	try:
+		frappe.cache().set_value(key, value, expires_in_sec=ttl)
+	except Exception:
+		pass